@@ -12,6 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import errno
 import io
 import logging
 import os
@@ -42,6 +43,7 @@ except ImportError:
 import mrjob
 from mrjob.compat import map_version
 from mrjob.conf import combine_dicts
+from mrjob.fs.asyncfs import AsyncFilesystem
 from mrjob.fs.composite import CompositeFilesystem
 from mrjob.fs.local import LocalFilesystem
 from mrjob.fs.gcs import GCSFilesystem
@@ -61,6 +63,7 @@ from mrjob.setup import parse_setup_cmd
 from mrjob.step import StepFailedException
 from mrjob.util import cmd_line
 from mrjob.util import random_identifier
+from mrjob.util import _thread_map
 
 log = logging.getLogger(__name__)
 
@@ -78,6 +81,7 @@ _DEFAULT_IMAGE_VERSION = '1.0'
 _DEFAULT_CHECK_CLUSTER_EVERY = 10.0
 _DEFAULT_MAX_HOURS_IDLE = 0.1
 _DEFAULT_CLOUD_FS_SYNC_SECS = 5.0
+_DEFAULT_CLOUD_UPLOAD_THREADS = 4
 _DEFAULT_CLOUD_TMP_DIR_OBJECT_TTL_DAYS = 90
 
 # https://cloud.google.com/dataproc/reference/rest/v1/projects.regions.clusters#GceClusterConfig  # noqa
@@ -242,6 +246,8 @@ class DataprocRunnerOptionStore(RunnerOptionStore):
             'num_task_instances': 0,
 
             'cloud_fs_sync_secs': _DEFAULT_CLOUD_FS_SYNC_SECS,
+            'cloud_upload_part_size': 100,  # 100 MB
+            'cloud_upload_threads': _DEFAULT_CLOUD_UPLOAD_THREADS,
 
             'max_hours_idle': _DEFAULT_MAX_HOURS_IDLE,
             'sh_bin': ['/bin/sh', '-ex'],
@@ -324,7 +330,17 @@ class DataprocJobRunner(MRJobRunner):
         # manage local files that we want to upload to GCS. We'll add them
         # to this manager just before we need them.
         fs_files_dir = self._job_tmpdir + 'files/'
-        self._upload_mgr = UploadDirManager(fs_files_dir)
+
+        # optionally, upload files by their MD5 sum so that later jobs
+        # can re-use them
+        if self._opts['cloud_upload_cache_dir']:
+            self._opts['cloud_upload_cache_dir'] = _check_and_fix_fs_dir(
+                self._opts['cloud_upload_cache_dir'])
+
+        self._upload_mgr = UploadDirManager(
+            fs_files_dir,
+            cache_prefix=self._opts['cloud_upload_cache_dir'],
+            md5sum=lambda path: self.fs.md5sum(path))
 
         self._bootstrap = self._bootstrap_python() + self._parse_bootstrap()
 
@@ -375,9 +391,13 @@ class DataprocJobRunner(MRJobRunner):
         if self._fs is not None:
             return self._fs
 
-        self._gcs_fs = GCSFilesystem()
+        self._gcs_fs = GCSFilesystem(
+            upload_part_size=self._get_upload_part_size(),
+            upload_threads=self._opts['cloud_upload_threads'])
 
-        self._fs = CompositeFilesystem(self._gcs_fs, LocalFilesystem())
+        self._fs = CompositeFilesystem(
+            self._gcs_fs,
+            LocalFilesystem(md5_cache_path=self._opts['local_md5_cache']))
         return self._fs
 
     def _get_tmpdir(self, given_tmpdir):
@@ -435,16 +455,23 @@ class DataprocJobRunner(MRJobRunner):
         if not self._opts['check_input_paths']:
             return
 
-        for path in self._input_paths:
-            if path == '-':
-                continue  # STDIN always exists
+        # check all the paths at once, rather than one round trip at a time
+        with AsyncFilesystem(self.fs) as async_fs:
+            path_to_exists = []
+
+            for path in self._input_paths:
+                if path == '-':
+                    continue  # STDIN always exists
+
+                if is_uri(path) and not is_gcs_uri(path):
+                    continue  # can't check non-GCS URIs, hope for the best
 
-            if is_uri(path) and not is_gcs_uri(path):
-                continue  # can't check non-GCS URIs, hope for the best
+                path_to_exists.append((path, async_fs.exists(path)))
 
-            if not self.fs.exists(path):
-                raise AssertionError(
-                    'Input path %s does not exist!' % (path,))
+            for path, exists in path_to_exists:
+                if not exists.result():
+                    raise AssertionError(
+                        'Input path %s does not exist!' % (path,))
 
     def _check_output_not_exists(self):
         """Verify the output path does not already exist. This avoids
@@ -502,16 +529,51 @@ class DataprocJobRunner(MRJobRunner):
         bucket_name, _ = parse_gcs_uri(self._job_tmpdir)
         self._create_fs_tmp_bucket(bucket_name)
 
-        log.info('Copying non-input files into %s' % self._upload_mgr.prefix)
+        log.info('Copying non-input files into %s' % (
+            self._upload_mgr.cache_prefix or self._upload_mgr.prefix))
+
+        part_size = self._get_upload_part_size()
+
+        # upload small files in parallel, and big files one at a time
+        # (their parts are uploaded in parallel). This way, we never have
+        # more than cloud_upload_threads uploads going at once
+        small_files = []
+        big_files = []
+
+        for path, gcs_uri in sorted(self._upload_mgr.path_to_uri().items()):
+            if part_size and os.path.getsize(path) > part_size:
+                big_files.append((path, gcs_uri))
+            else:
+                small_files.append((path, gcs_uri))
+
+        def upload(path_and_gcs_uri):
+            path, gcs_uri = path_and_gcs_uri
 
-        for path, gcs_uri in self._upload_mgr.path_to_uri().items():
             log.debug('uploading %s -> %s' % (path, gcs_uri))
 
             # TODO - mtai @ davidmarin - Implement put function for other FSs
-            self.fs.put(path, gcs_uri)
+            try:
+                self.fs.put(path, gcs_uri)
+            except IOError as e:
+                # files in the upload cache are named by their contents,
+                # so if one's already there, we're done
+                if not (self._upload_mgr.cache_prefix and
+                        e.errno == errno.EEXIST):
+                    raise
+
+                log.debug('%s already uploaded to %s' % (path, gcs_uri))
+
+        _thread_map(upload, small_files, self._opts['cloud_upload_threads'])
+
+        for path_and_gcs_uri in big_files:
+            upload(path_and_gcs_uri)
 
         self._wait_for_fs_sync()
 
+    def _get_upload_part_size(self):
+        # part size is in MB
+        return int((self._opts['cloud_upload_part_size'] or 0) * 1024 * 1024)
+
     def _create_fs_tmp_bucket(self, bucket_name, location=None):
         """Create a temp bucket if missing
 
@@ -543,6 +605,10 @@ class DataprocJobRunner(MRJobRunner):
     def cleanup(self, mode=None):
         super(DataprocJobRunner, self).cleanup(mode=mode)
 
+        # shut down threads for reading from GCS
+        if self._gcs_fs is not None:
+            self._gcs_fs.close()
+
         # stop the cluster if it belongs to us (it may have stopped on its
         # own already, but that's fine)
         if self._cluster_id and not self._opts['cluster_id']:
@@ -555,7 +621,7 @@ class DataprocJobRunner(MRJobRunner):
 
         try:
             log.info('Removing all files in %s' % self._job_tmpdir)
-            self.fs.rm(self._job_tmpdir)
+            self._log_rm_counts(self.fs.rm(self._job_tmpdir))
             self._job_tmpdir = None
         except Exception as e:
             log.exception(e)
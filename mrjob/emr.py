@@ -24,6 +24,7 @@ import re
 import signal
 import socket
 import sys
+import threading
 import time
 from collections import defaultdict
 from datetime import datetime
@@ -42,6 +43,7 @@ try:
     import boto.exception
     import boto.https_connection
     import boto.regioninfo
+    import boto.s3.multipart
     import boto.utils
     boto  # quiet "redefinition of unused ..." warning from pyflakes
 except ImportError:
@@ -65,6 +67,7 @@ from mrjob.aws import s3_location_constraint_for_region
 from mrjob.compat import map_version
 from mrjob.compat import version_gte
 from mrjob.conf import combine_dicts
+from mrjob.fs.asyncfs import AsyncFilesystem
 from mrjob.fs.composite import CompositeFilesystem
 from mrjob.fs.local import LocalFilesystem
 from mrjob.fs.s3 import S3Filesystem
@@ -116,6 +119,7 @@ from mrjob.step import _is_spark_step_type
 from mrjob.util import cmd_line
 from mrjob.util import shlex_split
 from mrjob.util import random_identifier
+from mrjob.util import _thread_map
 
 
 log = logging.getLogger(__name__)
@@ -183,6 +187,17 @@ _DEFAULT_IMAGE_VERSION = '4.8.2'
 # (2.4.2 isn't actually the latest version by a long shot)
 _IMAGE_VERSION_LATEST = '2.4.2'
 
+# how many files (or parts of files) to upload to S3 at once
+_DEFAULT_CLOUD_UPLOAD_THREADS = 4
+
+# how many times to try uploading each part of a multipart upload, and
+# how long to wait (in seconds) before the first retry
+_UPLOAD_PART_MAX_TRIES = 3
+_UPLOAD_PART_BACKOFF = 1.0
+
+# how many local files to compute MD5 sums of at once
+_MAX_MD5SUM_THREADS = 4
+
 # Hadoop streaming jar on 1-3.x AMIs
 _PRE_4_X_STREAMING_JAR = '/home/hadoop/contrib/streaming/hadoop-streaming.jar'
 
@@ -433,6 +448,7 @@ class EMRRunnerOptionStore(RunnerOptionStore):
             'pool_wait_minutes': 0,
             'cloud_fs_sync_secs': 5.0,
             'cloud_upload_part_size': 100,  # 100 MB
+            'cloud_upload_threads': _DEFAULT_CLOUD_UPLOAD_THREADS,
             'sh_bin': ['/bin/sh', '-ex'],
             'ssh_bin': ['ssh'],
             # don't use a list because it makes it hard to read option values
@@ -615,6 +631,11 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
         """
         super(EMRJobRunner, self).__init__(**kwargs)
 
+        # parts of self.fs that cleanup() shuts down; set along with
+        # self._fs (see fs)
+        self._s3_fs = None
+        self._ssh_fs = None
+
         # if we're going to create a bucket to use as temp space, we don't
         # want to actually create it until we run the job (Issue #50).
         # This variable helps us create the bucket as needed
@@ -639,7 +660,17 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
         # manage local files that we want to upload to S3. We'll add them
         # to this manager just before we need them.
         s3_files_dir = self._cloud_tmp_dir + 'files/'
-        self._upload_mgr = UploadDirManager(s3_files_dir)
+
+        # optionally, upload files by their MD5 sum so that later jobs
+        # can re-use them
+        if self._opts['cloud_upload_cache_dir']:
+            self._opts['cloud_upload_cache_dir'] = self._check_and_fix_s3_dir(
+                self._opts['cloud_upload_cache_dir'])
+
+        self._upload_mgr = UploadDirManager(
+            s3_files_dir,
+            cache_prefix=self._opts['cloud_upload_cache_dir'],
+            md5sum=lambda path: self.fs.md5sum(path))
 
         # manage working dir for bootstrap script
         self._bootstrap_dir_mgr = BootstrapWorkingDirManager()
@@ -853,11 +884,15 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
         local filesystem.
         """
         if self._fs is None:
-            s3_fs = S3Filesystem(
+            self._s3_fs = s3_fs = S3Filesystem(
                 aws_access_key_id=self._opts['aws_access_key_id'],
                 aws_secret_access_key=self._opts['aws_secret_access_key'],
                 aws_security_token=self._opts['aws_security_token'],
-                s3_endpoint=self._opts['s3_endpoint'])
+                s3_endpoint=self._opts['s3_endpoint'],
+                region_cache_path=self._opts['s3_region_cache'])
+
+            local_fs = LocalFilesystem(
+                md5_cache_path=self._opts['local_md5_cache'])
 
             if self._opts['ec2_key_pair_file']:
                 self._ssh_fs = SSHFilesystem(
@@ -865,10 +900,12 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                     ec2_key_pair_file=self._opts['ec2_key_pair_file'])
 
                 self._fs = CompositeFilesystem(
-                    self._ssh_fs, s3_fs, LocalFilesystem())
+                    self._ssh_fs, s3_fs, local_fs,
+                    cache_secs=self._opts['fs_cache_secs'])
             else:
                 self._ssh_fs = None
-                self._fs = CompositeFilesystem(s3_fs, LocalFilesystem())
+                self._fs = CompositeFilesystem(
+                    s3_fs, local_fs, cache_secs=self._opts['fs_cache_secs'])
 
         return self._fs
 
@@ -910,7 +947,13 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
     def _check_input_exists(self):
         """Make sure all input exists before continuing with our job.
         """
-        if self._opts['check_input_paths']:
+        if not self._opts['check_input_paths']:
+            return
+
+        # check all the paths at once, rather than one round trip at a time
+        with AsyncFilesystem(self.fs) as async_fs:
+            path_to_exists = []
+
             for path in self._input_paths:
                 if path == '-':
                     continue  # STDIN always exists
@@ -918,7 +961,10 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                 if is_uri(path) and not is_s3_uri(path):
                     continue  # can't check non-S3 URIs, hope for the best
 
-                if not self.fs.exists(path):
+                path_to_exists.append((path, async_fs.exists(path)))
+
+            for path, exists in path_to_exists:
+                if not exists.result():
                     raise AssertionError(
                         'Input path %s does not exist!' % (path,))
 
@@ -1012,12 +1058,39 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
         """Copy local files tracked by self._upload_mgr to S3."""
         self._create_s3_tmp_bucket_if_needed()
 
-        log.info('Copying local files to %s...' % self._upload_mgr.prefix)
+        log.info('Copying local files to %s...' % (
+            self._upload_mgr.cache_prefix or self._upload_mgr.prefix))
+
+        part_size = self._get_upload_part_size()
+
+        # upload small files in parallel, and big files one at a time
+        # (their parts are uploaded in parallel). This way, we never have
+        # more than cloud_upload_threads uploads going at once
+        small_files = []
+        big_files = []
+
+        for path, s3_uri in sorted(self._upload_mgr.path_to_uri().items()):
+            if part_size and os.path.getsize(path) > part_size:
+                big_files.append((path, s3_uri))
+            else:
+                small_files.append((path, s3_uri))
+
+        def upload(path_and_s3_uri):
+            path, s3_uri = path_and_s3_uri
+
+            # files in the upload cache are named by their contents
+            if self._upload_mgr.cache_prefix and self.fs.exists(s3_uri):
+                log.debug('  %s already uploaded to %s' % (path, s3_uri))
+                return
 
-        for path, s3_uri in self._upload_mgr.path_to_uri().items():
             log.debug('  %s -> %s' % (path, s3_uri))
             self._upload_contents(s3_uri, path)
 
+        _thread_map(upload, small_files, self._opts['cloud_upload_threads'])
+
+        for path_and_s3_uri in big_files:
+            upload(path_and_s3_uri)
+
     def _upload_contents(self, s3_uri, path):
         """Uploads the file at the given path to S3, possibly using
         multipart upload."""
@@ -1026,35 +1099,86 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
 
         s3_key = self.fs.make_s3_key(s3_uri)
 
-        if self._should_use_multipart_upload(fsize, part_size, path):
-            log.debug("Starting multipart upload of %s" % (path,))
-            mpul = s3_key.bucket.initiate_multipart_upload(s3_key.name)
-
-            try:
-                self._upload_parts(mpul, path, fsize, part_size)
-            except:
-                mpul.cancel_upload()
-                raise
+        try:
+            if self._should_use_multipart_upload(fsize, part_size, path):
+                log.debug("Starting multipart upload of %s" % (path,))
+                mpul = s3_key.bucket.initiate_multipart_upload(s3_key.name)
 
-            mpul.complete_upload()
-            log.debug("Completed multipart upload of %s to %s" % (
-                      path, s3_key.name))
-        else:
-            s3_key.set_contents_from_filename(path)
+                try:
+                    self._upload_parts(mpul, path, fsize, part_size)
+                except:
+                    mpul.cancel_upload()
+                    raise
+
+                mpul.complete_upload()
+                log.debug("Completed multipart upload of %s to %s" % (
+                          path, s3_key.name))
+            else:
+                s3_key.set_contents_from_filename(path)
+        finally:
+            # the key doesn't exist until we're done writing it, so
+            # clear the exists()/ls() cache now, not when we made the key
+            self.fs.clear_cache()
 
     def _upload_parts(self, mpul, path, fsize, part_size):
-        offsets = range(0, fsize, part_size)
+        """Upload the parts of *path* in parallel, retrying each part
+        if it fails. Parts are read straight from the file, so we only have
+        about one part per thread in memory at once."""
+        offsets = list(range(0, fsize, part_size))
 
-        for i, offset in enumerate(offsets):
+        progress = dict(num_bytes=0, percent=0)
+        progress_lock = threading.Lock()
+
+        bucket_name = mpul.bucket.name
+
+        def upload_part(i):
             part_num = i + 1
+            offset = offsets[i]
+            chunk_bytes = min(part_size, fsize - offset)
 
             log.debug("uploading %d/%d of %s" % (
                 part_num, len(offsets), path))
-            chunk_bytes = min(part_size, fsize - offset)
 
-            with filechunkio.FileChunkIO(
-                    path, 'r', offset=offset, bytes=chunk_bytes) as fp:
-                mpul.upload_part_from_file(fp, part_num)
+            # the same upload, but on this thread's S3 connection
+            thread_mpul = boto.s3.multipart.MultiPartUpload(
+                self.fs.get_bucket(bucket_name))
+            thread_mpul.key_name = mpul.key_name
+            thread_mpul.id = mpul.id
+
+            self._upload_part(
+                thread_mpul, path, part_num, offset, chunk_bytes)
+
+            # log progress every 10%
+            with progress_lock:
+                progress['num_bytes'] += chunk_bytes
+                percent = progress['num_bytes'] * 100 // fsize
+                if percent // 10 > progress['percent'] // 10:
+                    log.info('  %s: %d%% uploaded' % (path, percent))
+                progress['percent'] = percent
+
+        _thread_map(upload_part, range(len(offsets)),
+                    self._opts['cloud_upload_threads'])
+
+    def _upload_part(self, mpul, path, part_num, offset, num_bytes):
+        """Upload one part of a multipart upload, trying up to
+        ``_UPLOAD_PART_MAX_TRIES`` times."""
+        backoff = _UPLOAD_PART_BACKOFF
+
+        for tries in range(1, _UPLOAD_PART_MAX_TRIES + 1):
+            try:
+                with filechunkio.FileChunkIO(
+                        path, 'r', offset=offset, bytes=num_bytes) as fp:
+                    mpul.upload_part_from_file(fp, part_num)
+                return
+            except (boto.exception.BotoServerError, IOError, OSError) as ex:
+                if tries == _UPLOAD_PART_MAX_TRIES:
+                    raise
+
+                log.warning('Failed to upload part %d of %s (%r),'
+                            ' retrying in %.1fs' % (
+                                part_num, path, ex, backoff))
+                time.sleep(backoff)
+                backoff *= 2
 
     def _get_upload_part_size(self):
         # part size is in MB, as the minimum is 5 MB
@@ -1245,6 +1369,14 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                 except Exception as e:
                     log.exception(e)
 
+        # likewise, shut down multiplexed SSH connections
+        if self._ssh_fs:
+            self._ssh_fs.close()
+
+        # and threads for reading from S3
+        if self._s3_fs:
+            self._s3_fs.close()
+
         # stop the cluster if it belongs to us (it may have stopped on its
         # own already, but that's fine)
         # don't stop it if it was created due to --pool because the user
@@ -1263,7 +1395,7 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
             try:
                 log.info('Removing s3 temp directory %s...' %
                          self._cloud_tmp_dir)
-                self.fs.rm(self._cloud_tmp_dir)
+                self._log_rm_counts(self.fs.rm(self._cloud_tmp_dir))
                 self._cloud_tmp_dir = None
             except Exception as e:
                 log.exception(e)
@@ -1277,7 +1409,7 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                 and not self._opts['pool_clusters']:
             try:
                 log.info('Removing log files in %s...' % self._s3_log_dir())
-                self.fs.rm(self._s3_log_dir())
+                self._log_rm_counts(self.fs.rm(self._s3_log_dir()))
             except Exception as e:
                 log.exception(e)
 
@@ -2006,6 +2138,9 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                     # was it because a bootstrap action failed?
                     self._check_for_failed_bootstrap_action(cluster)
 
+            # the step wrote new output and logs
+            self.fs.clear_cache()
+
             # spark steps require different log parsing. The master node
             # setup script is a JAR step (albeit one that never produces
             # counters)
@@ -3128,6 +3263,32 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
                               cluster_id,
                               num_steps + 1)
 
+    def _bootstrap_file_md5sums(self):
+        """Return a list of ``(name, md5sum)`` for each bootstrap file
+        (except mrjob.zip), hashing several files at once."""
+        names_and_paths = [
+            (name, path) for name, path
+            in self._bootstrap_dir_mgr.name_to_path('file').items()
+            if not path == self._mrjob_zip_path]
+
+        def md5sum(path):
+            try:
+                return self.fs.md5sum(path)
+            except IOError:
+                # S3 keys uploaded in parts have no MD5 sum, but their
+                # etag identifies their contents just as well
+                s3_key = is_s3_uri(path) and self.fs.get_s3_key(path)
+                if not s3_key:
+                    raise
+                return 'etag:' + s3_key.etag.strip('"')
+
+        md5sums = _thread_map(md5sum,
+                              [path for _, path in names_and_paths],
+                              _MAX_MD5SUM_THREADS)
+
+        return [(name, md5sum) for (name, _), md5sum
+                in zip(names_and_paths, md5sums)]
+
     def _pool_hash(self):
         """Generate a hash of the bootstrap configuration so it can be used to
         match jobs and clusters. This first argument passed to the bootstrap
@@ -3138,17 +3299,14 @@ class EMRJobRunner(MRJobRunner, LogInterpretationMixin):
         """
         things_to_hash = [
             # exclude mrjob.zip because it's only created if the
-            # job starts its own cluster (also, its hash changes every time
-            # since the zip file contains different timestamps).
+            # job starts its own cluster (we hash mrjob's version
+            # below instead).
             # The filenames/md5sums are sorted because we need to
             # ensure the order they're added doesn't affect the hash
             # here. Previously this used a dict, but Python doesn't
             # guarantee the ordering of dicts -- they can vary
             # depending on insertion/deletion order.
-            sorted(
-                (name, self.fs.md5sum(path)) for name, path
-                in self._bootstrap_dir_mgr.name_to_path('file').items()
-                if not path == self._mrjob_zip_path),
+            sorted(self._bootstrap_file_md5sums()),
             self._opts['additional_emr_info'],
             self._bootstrap,
             self._bootstrap_actions(),
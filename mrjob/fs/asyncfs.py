@@ -0,0 +1,119 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Issue filesystem operations without waiting for them to finish, so
+that slow operations (e.g. checking many input paths on S3) can overlap.
+
+For now, this is an adapter that runs the methods of an ordinary
+:py:class:`~mrjob.fs.base.Filesystem` in a thread pool. Each method
+returns a future; call its ``result()`` method to wait for the result
+(or have the operation's exception re-raised). Filesystems can grow
+natively asynchronous implementations later without changing callers.
+"""
+import threading
+from multiprocessing.pool import ThreadPool
+
+# how many operations to have in flight at once
+_DEFAULT_MAX_THREADS = 16
+
+
+class _FSFuture(object):
+    """The eventual result of a filesystem operation. This has the
+    same names as :py:class:`concurrent.futures.Future`, so that we can
+    switch to real futures once we no longer support Python 2."""
+
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def done(self):
+        """Has the operation finished (or failed)?"""
+        return self._async_result.ready()
+
+    def result(self, timeout=None):
+        """Wait for the operation to finish, and return its result.
+        Re-raises the operation's exception, if any."""
+        return self._async_result.get(timeout)
+
+
+class AsyncFilesystem(object):
+    """Wrap a :py:class:`~mrjob.fs.base.Filesystem` so that its methods
+    run in the background, at most *max_threads* at a time.
+
+    Use this as a context manager, or call :py:meth:`close` when done, so
+    that the thread pool gets cleaned up. :py:meth:`close` waits for
+    operations already in flight to finish.
+    """
+    def __init__(self, fs, max_threads=_DEFAULT_MAX_THREADS):
+        """
+        :param fs: the :py:class:`~mrjob.fs.base.Filesystem` to wrap
+        :param max_threads: how many operations to run at once
+        """
+        if max_threads < 1:
+            raise ValueError('max_threads must be at least 1')
+
+        self.fs = fs
+        self._max_threads = max_threads
+
+        # created lazily, so that wrapping a filesystem is cheap
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """Wait for operations in flight to finish, and shut down our
+        threads."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def _submit(self, func, *args):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self._max_threads)
+
+            return _FSFuture(self._pool.apply_async(func, args))
+
+    def cat(self, path_glob):
+        """Read all the (decompressed) data in files matching *path_glob*.
+        Result is a single bytestring, so only use this on files that
+        fit in memory."""
+        return self._submit(lambda: b''.join(self.fs.cat(path_glob)))
+
+    def du(self, path_glob):
+        """Get the total size of files matching *path_glob*."""
+        return self._submit(self.fs.du, path_glob)
+
+    def exists(self, path_glob):
+        """Does the given path/URI exist?"""
+        return self._submit(self.fs.exists, path_glob)
+
+    def ls(self, path_glob):
+        """List all the files matching *path_glob*. Result is a list."""
+        return self._submit(lambda: list(self.fs.ls(path_glob)))
+
+    def put(self, src, path):
+        """Upload the local file *src* to *path*. Only works with
+        filesystems that have a ``_put()`` method (e.g. HDFS)."""
+        return self._submit(self.fs._put, src, path)
+
+    def rm(self, path_glob):
+        """Recursively delete the given file/directory, if it exists."""
+        return self._submit(self.fs.rm, path_glob)
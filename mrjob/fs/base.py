@@ -36,6 +36,7 @@ class Filesystem(object):
     * :py:class:`mrjob.fs.s3.S3Filesystem`: ``s3://bucket/path``,
       ``s3n://bucket/path``
     * :py:class:`mrjob.fs.ssh.SSHFilesystem`: ``ssh://hostname/path``
+    * :py:class:`mrjob.fs.webhdfs.WebHDFSFilesystem`: ``hdfs://``
     """
 
     def can_handle_path(self, path):
@@ -65,6 +66,26 @@ class Filesystem(object):
         """
         raise NotImplementedError
 
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, except that we yield a dictionary for
+        each file, with the following keys:
+
+        * *uri*: the path/URI of the file (what :py:meth:`ls` would yield)
+        * *size*: size of the file, in bytes
+        * *mtime*: when the file was last modified, as a UNIX timestamp,
+          or ``None`` if unknown
+        * *checksum*: the file's MD5 sum as a hex string, or ``None`` if
+          it isn't available without reading the file (e.g. for S3 keys
+          uploaded in parts, whose etag isn't an MD5 sum)
+
+        Filesystems that get this information for free from a listing
+        override this. By default, we call :py:meth:`du` on each path.
+
+        .. versionadded:: 0.5.8
+        """
+        for path in self.ls(path_glob):
+            yield dict(uri=path, size=self.du(path), mtime=None, checksum=None)
+
     def _cat_file(self, path):
         raise NotImplementedError
 
@@ -119,6 +140,8 @@ class Filesystem(object):
         """Recursively delete the given file/directory, if it exists
 
         Corresponds roughly to: ``hadoop fs -rm -R path_glob``
+
+        Cloud filesystems (S3, GCS) return ``(num_deleted, num_failed)``.
         """
         raise NotImplementedError
 
@@ -13,30 +13,142 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+import threading
+import time
 
 from mrjob.fs.base import Filesystem
 
 
 log = logging.getLogger(__name__)
 
+# methods of our children that write to the filesystem; calling them
+# through __getattr__() clears our cache. (Not make_s3_key(); the key
+# isn't written until later, so whoever writes it should clear the cache.)
+_WRITE_METHODS = set([
+    '_put',
+    '_put_many',
+    'create_bucket',
+    'delete_bucket',
+    'put',
+])
+
 
 class CompositeFilesystem(Filesystem):
     """Combine multiple filesystem objects to allow access to a variety of
     storage locations such as the local filesystem, S3, a remote machine via
     SSH, or HDFS.
+
+    If you set *cache_secs*, we remember what :py:meth:`exists`,
+    :py:meth:`ls`, and :py:meth:`ls_detailed` return for that many seconds,
+    so that checking the same paths over and over (e.g. when looking for
+    logs) doesn't go back to the remote filesystem every time. Any file
+    we list is also assumed to exist. The cache is cleared whenever we
+    write to the filesystem (:py:meth:`mkdir`, :py:meth:`rm`,
+    :py:meth:`touchz`, or uploading files), and you can clear it yourself
+    with :py:meth:`clear_cache` (e.g. when a job may have written files).
     """
 
-    def __init__(self, *filesystems):
+    def __init__(self, *filesystems, **kwargs):
+        """
+        :param filesystems: filesystems to try, in order
+        :param cache_secs: how long to remember the results of
+                           :py:meth:`exists`, :py:meth:`ls`, and
+                           :py:meth:`ls_detailed` (by default, we don't)
+
+        .. versionchanged:: 0.5.8
+
+           added *cache_secs*
+        """
+        cache_secs = kwargs.pop('cache_secs', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments: %s' %
+                            ', '.join(sorted(kwargs)))
+
         super(CompositeFilesystem, self).__init__()
         self.filesystems = filesystems
 
+        self._cache_secs = cache_secs
+        # map from (method name, path) to (expiration time, result)
+        self._cache = {}
+        # logs may be listed from several threads
+        self._cache_lock = threading.Lock()
+
     def __getattr__(self, name):
         # Forward through to children for backward compatibility
         for fs in self.filesystems:
             if hasattr(fs, name):
-                return getattr(fs, name)
+                attr = getattr(fs, name)
+                if name in _WRITE_METHODS and callable(attr):
+                    return self._clearing_cache(attr)
+                return attr
         raise AttributeError(name)
 
+    ### caching ###
+
+    def clear_cache(self):
+        """Forget the cached results of :py:meth:`exists`, :py:meth:`ls`,
+        and :py:meth:`ls_detailed` (see *cache_secs*).
+
+        .. versionadded:: 0.5.8
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _clearing_cache(self, func):
+        """Wrap *func* so that it clears our cache when it's done."""
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.clear_cache()
+
+        return wrapper
+
+    def _cached(self, action, path, get_result):
+        """Return the cached result of *action* on *path*, or, if it's
+        expired or we don't have one, cache and return ``get_result()``.
+        We don't cache exceptions."""
+        if not self._cache_secs:
+            return get_result()
+
+        key = (action, path)
+        now = time.time()
+
+        with self._cache_lock:
+            expires, result = self._cache.get(key, (0, None))
+        if expires > now:
+            return result
+
+        result = get_result()
+
+        with self._cache_lock:
+            self._cache[key] = (now + self._cache_secs, result)
+
+        return result
+
+    def _cached_ls(self, action, path_glob):
+        """Cache the output of *action* (``'ls'`` or ``'ls_detailed'``) as a
+        list, and yield from it."""
+        def ls():
+            results = list(self._do_action(action, path_glob))
+
+            # anything we listed exists
+            expires = time.time() + self._cache_secs
+            with self._cache_lock:
+                for result in results:
+                    uri = result['uri'] if action == 'ls_detailed' else result
+                    self._cache[('exists', uri)] = (expires, True)
+
+            return results
+
+        for result in self._cached(action, path_glob, ls):
+            # don't let callers modify dictionaries in the cache
+            if isinstance(result, dict):
+                result = dict(result)
+            yield result
+
+    ### Filesystem interface ###
+
     def can_handle_path(self, path):
         """We can handle a path if any sub-filesystem can."""
         return any(fs.can_handle_path(path) for fs in self.filesystems)
@@ -62,30 +174,50 @@ class CompositeFilesystem(Filesystem):
         else:
             raise first_exception
 
+    def cat(self, path_glob):
+        return self._do_action('cat', path_glob)
+
     def du(self, path_glob):
         return self._do_action('du', path_glob)
 
     def ls(self, path_glob):
+        if self._cache_secs:
+            return self._cached_ls('ls', path_glob)
         return self._do_action('ls', path_glob)
 
+    def ls_detailed(self, path_glob):
+        if self._cache_secs:
+            return self._cached_ls('ls_detailed', path_glob)
+        return self._do_action('ls_detailed', path_glob)
+
     def _cat_file(self, path):
         for line in self._do_action('_cat_file', path):
             yield line
 
     def mkdir(self, path):
-        return self._do_action('mkdir', path)
+        try:
+            return self._do_action('mkdir', path)
+        finally:
+            self.clear_cache()
 
     def exists(self, path_glob):
-        return self._do_action('exists', path_glob)
+        return self._cached('exists', path_glob,
+                            lambda: self._do_action('exists', path_glob))
 
     def join(self, path, *paths):
         return self._do_action('join', path, *paths)
 
     def rm(self, path_glob):
-        return self._do_action('rm', path_glob)
+        try:
+            return self._do_action('rm', path_glob)
+        finally:
+            self.clear_cache()
 
     def touchz(self, path):
-        return self._do_action('touchz', path)
+        try:
+            return self._do_action('touchz', path)
+        finally:
+            self.clear_cache()
 
     def md5sum(self, path_glob):
         return self._do_action('md5sum', path_glob)
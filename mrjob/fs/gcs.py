@@ -12,14 +12,28 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import fnmatch
+import calendar
+import errno
 import logging
 import mimetypes
+import os
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 from mrjob.fs.base import Filesystem
+from mrjob.fs.globbing import _ls_prefix_glob
+from mrjob.fs.globbing import _split_bucket_glob
+from mrjob.fs.readahead import _DEFAULT_READ_CHUNK_SIZE
+from mrjob.fs.readahead import _DEFAULT_READ_THREADS
+from mrjob.fs.readahead import _ReadAheadReader
 from mrjob.parse import urlparse
+from mrjob.py2 import to_string
 from mrjob.runner import GLOB_RE
+from mrjob.util import random_identifier
 from mrjob.util import read_file
+from mrjob.util import _thread_map
 
 try:
     from oauth2client.client import GoogleCredentials
@@ -35,8 +49,6 @@ except ImportError:
     google_http = None
 
 import io
-import os
-import tempfile
 import base64
 import binascii
 
@@ -47,11 +59,31 @@ _GCS_API_VERSION = 'v1'
 
 _BINARY_MIMETYPE = 'application/octet-stream'
 _LS_FIELDS_TO_RETURN = 'nextPageToken,items(name,size,timeCreated,md5Hash)'
+_LS_DIRS_FIELDS_TO_RETURN = 'nextPageToken,prefixes'
+
+# how many times to retry each chunk of a resumable upload
+_UPLOAD_NUM_RETRIES = 2
+
+# GCS won't accept more calls than this in one batch request
+_MAX_CALLS_PER_BATCH = 100
+
+# how many batch delete requests to send at once
+_DEFAULT_DELETE_THREADS = 4
+
+# how many files (or parts of files) to upload at once
+_DEFAULT_UPLOAD_THREADS = 4
+
+# GCS can compose at most this many objects into one
+_MAX_COMPOSE_SOURCES = 32
+
+# GCS timestamps look like 2016-06-27T21:37:48.163Z
+_GCS_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+_SUBSECOND_RE = re.compile(r'\.[0-9]+')
 
 
 def _base64_to_hex(base64_encoded):
-    base64_decoded = base64.decodestring(base64_encoded)
-    return binascii.hexlify(base64_decoded)
+    base64_decoded = base64.b64decode(base64_encoded)
+    return to_string(binascii.hexlify(base64_decoded))
 
 
 def _hex_to_base64(hex_encoded):
@@ -59,6 +91,11 @@ def _hex_to_base64(hex_encoded):
     return base64.encodestring(hex_decoded)
 
 
+def _gcs_time_to_timestamp(gcs_time):
+    return calendar.timegm(
+        time.strptime(_SUBSECOND_RE.sub('', gcs_time), _GCS_TIME_FORMAT))
+
+
 def _path_glob_to_parsed_gcs_uri(path_glob):
     # support globs
     glob_match = GLOB_RE.match(path_glob)
@@ -81,17 +118,88 @@ class GCSFilesystem(Filesystem):
     :py:class:`~mrjob.fs.ssh.SSHFilesystem` and
     :py:class:`~mrjob.fs.local.LocalFilesystem`.
     """
-    def __init__(self):
+    def __init__(self, list_threads=1,
+                 read_threads=_DEFAULT_READ_THREADS,
+                 read_chunk_size=_DEFAULT_READ_CHUNK_SIZE,
+                 delete_threads=_DEFAULT_DELETE_THREADS,
+                 upload_part_size=None,
+                 upload_threads=_DEFAULT_UPLOAD_THREADS):
+        """
+        :param list_threads: When expanding globs, list up to this many
+                             "directories" at once.
+        :param read_threads: When reading objects, fetch up to this many
+                             chunks at once.
+        :param read_chunk_size: How many bytes to fetch at a time when
+                                reading objects. The first few chunks are
+                                smaller, so that we can start reading
+                                lines right away.
+        :param delete_threads: When removing objects, send up to this many
+                               batch requests at once.
+        :param upload_part_size: If set, upload files bigger than this many
+                                 bytes as separate parts, and then compose
+                                 them into one object on GCS.
+        :param upload_threads: When uploading a file in parts, upload up to
+                               this many parts at once.
+        """
         self._api_client = None
+        self._list_threads = list_threads
+        self._delete_threads = delete_threads
+
+        self._read_threads = read_threads
+        self._read_chunk_size = read_chunk_size
+        # shared by all reads, so that its threads keep their API clients.
+        # Created when we first need it; see close()
+        self._read_pool = None
+        self._read_pool_lock = threading.Lock()
+
+        self._upload_part_size = upload_part_size
+        self._upload_threads = upload_threads
+
+        # API clients aren't thread-safe, so threads other than the one
+        # that created us get their own client. Building a client is slow,
+        # so when a thread exits (e.g. because _thread_map() is done with
+        # its pool), its client goes back on a free list to be re-used
+        self._api_client_thread = threading.current_thread()
+        self._thread_api_clients = {}
+        self._free_api_clients = []
+        self._api_clients_lock = threading.Lock()
 
     @property
     def api_client(self):
-        if not self._api_client:
-            credentials = GoogleCredentials.get_application_default()
-            self._api_client = discovery.build(
-                _GCS_API_ENDPOINT, _GCS_API_VERSION, credentials=credentials)
+        thread = threading.current_thread()
 
-        return self._api_client
+        if thread is self._api_client_thread:
+            if not self._api_client:
+                self._api_client = self._make_api_client()
+
+            return self._api_client
+
+        with self._api_clients_lock:
+            api_client = self._thread_api_clients.get(thread)
+            if api_client:
+                return api_client
+
+            # reclaim clients from threads that have exited
+            for other_thread in list(self._thread_api_clients):
+                if not other_thread.is_alive():
+                    self._free_api_clients.append(
+                        self._thread_api_clients.pop(other_thread))
+
+            if self._free_api_clients:
+                api_client = self._free_api_clients.pop()
+
+        if not api_client:
+            api_client = self._make_api_client()
+
+        with self._api_clients_lock:
+            self._thread_api_clients[thread] = api_client
+
+        return api_client
+
+    def _make_api_client(self):
+        credentials = GoogleCredentials.get_application_default()
+        return discovery.build(
+            _GCS_API_ENDPOINT, _GCS_API_VERSION, credentials=credentials)
 
     def can_handle_path(self, path):
         return is_gcs_uri(path)
@@ -104,6 +212,24 @@ class GCSFilesystem(Filesystem):
         for item in self._ls_detailed(path_glob):
             yield item['_uri']
 
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, but yield dictionaries with *uri*, *size*,
+        *mtime*, and *checksum* (the object's MD5 hash, in hex, or ``None``
+        for composite objects, which have no MD5 hash).
+
+        .. versionadded:: 0.5.8
+        """
+        for item in self._ls_detailed(path_glob):
+            if item.get('md5Hash'):
+                checksum = _base64_to_hex(item['md5Hash'])
+            else:
+                checksum = None
+
+            yield dict(uri=item['_uri'],
+                       size=item['size'],
+                       mtime=_gcs_time_to_timestamp(item['timeCreated']),
+                       checksum=checksum)
+
     def _ls_detailed(self, path_glob):
         """Recursively list files on GCS and includes some metadata about them:
         - object name
@@ -112,24 +238,53 @@ class GCSFilesystem(Filesystem):
         - _uri
 
         *path_glob* can include ``?`` to match single characters or
-        ``*`` to match 0 or more characters. Both ``?`` and ``*`` can match
-        ``/``.
+        ``*`` to match 0 or more characters. In the last part of the path,
+        both ``?`` and ``*`` can match ``/``; elsewhere, they only match
+        a single "directory" name.
         """
 
         scheme = urlparse(path_glob).scheme
 
-        bucket_name, base_name = _path_glob_to_parsed_gcs_uri(path_glob)
+        bucket_name, _ = _path_glob_to_parsed_gcs_uri(path_glob)
+        _, key_glob = _split_bucket_glob(path_glob)
 
-        # allow subdirectories of the path/glob
-        if path_glob and not path_glob.endswith('/'):
-            dir_glob = path_glob + '/*'
-        else:
-            dir_glob = path_glob + '*'
+        def list_dirs(prefix):
+            dirs = []
+            for resp in self._list_pages(
+                    bucket=bucket_name, prefix=prefix, delimiter='/',
+                    fields=_LS_DIRS_FIELDS_TO_RETURN):
+                dirs.extend(resp.get('prefixes') or [])
+            return dirs
 
-        list_request = self.api_client.objects().list(
-            bucket=bucket_name, prefix=base_name, fields=_LS_FIELDS_TO_RETURN)
+        def list_keys(prefix):
+            for resp in self._list_pages(
+                    bucket=bucket_name, prefix=prefix,
+                    fields=_LS_FIELDS_TO_RETURN):
+                for item in resp.get('items') or []:
+                    yield item['name'], item
 
         uri_prefix = '%s://%s' % (scheme, bucket_name)
+        for name, item in _ls_prefix_glob(
+                key_glob, list_dirs, list_keys,
+                max_threads=self._list_threads):
+            # We generate the item URI by adding the "gs://" prefix
+            uri = "%s/%s" % (uri_prefix, name)
+
+            # filter out folders
+            if uri.endswith('/'):
+                continue
+
+            item['_uri'] = uri
+            item['bucket'] = bucket_name
+            item['size'] = int(item['size'])
+            yield item
+
+    def _list_pages(self, **kwargs):
+        """Call ``objects().list()`` with the given keyword args, and
+        yield each page of the response. Yield nothing if the bucket
+        doesn't exist."""
+        list_request = self.api_client.objects().list(**kwargs)
+
         while list_request:
             try:
                 resp = list_request.execute()
@@ -139,49 +294,68 @@ class GCSFilesystem(Filesystem):
 
                 raise
 
-            resp_items = resp.get('items') or []
-            for item in resp_items:
-                # We generate the item URI by adding the "gs://" prefix
-                uri = "%s/%s" % (uri_prefix, item['name'])
-
-                # enforce globbing
-                if not (fnmatch.fnmatchcase(uri, path_glob) or
-                        fnmatch.fnmatchcase(uri, dir_glob)):
-                    continue
-
-                # filter out folders
-                if uri.endswith('/'):
-                    continue
-
-                item['_uri'] = uri
-                item['bucket'] = bucket_name
-                item['size'] = int(item['size'])
-                yield item
+            yield resp
 
             list_request = self.api_client.objects().list_next(
                 list_request, resp)
 
     def md5sum(self, path):
-        object_list = list(self._ls_detailed(path))
+        object_list = list(self.ls_detailed(path))
         if len(object_list) != 1:
             raise Exception(
                 "path for md5 sum doesn't resolve to single object" + path)
 
-        item = object_list[0]
-        return _base64_to_hex(item['md5Hash'])
+        checksum = object_list[0]['checksum']
+        if checksum is None:
+            raise IOError(
+                "%s has no MD5 hash (it's a composite object)" % path)
 
-    def _cat_file(self, gcs_uri):
-        tmp_fd, tmp_path = tempfile.mkstemp()
-
-        with os.fdopen(tmp_fd, 'w+b') as tmp_fileobj:
-            self._download_io(gcs_uri, tmp_fileobj)
+        return checksum
 
-            tmp_fileobj.seek(0)
+    def _cat_file(self, gcs_uri):
+        bucket_name, object_name = parse_gcs_uri(gcs_uri)
+
+        object_meta = self.api_client.objects().get(
+            bucket=bucket_name, object=object_name).execute()
+        size = int(object_meta['size'])
+        # make sure the object doesn't change while we read it
+        generation = object_meta.get('generation')
+
+        def read_range(start, end):
+            return self._download_range(
+                gcs_uri, start, end, generation=generation)
+
+        # big objects are read several chunks at a time
+        reader = _ReadAheadReader(read_range, size,
+                                  pool=self._get_read_pool(),
+                                  chunk_size=self._read_chunk_size,
+                                  num_threads=self._read_threads)
+
+        line_gen = read_file(gcs_uri, fileobj=reader, yields_lines=False,
+                             cleanup=reader.close)
+        for current_line in line_gen:
+            yield current_line
+
+    def _get_read_pool(self):
+        with self._read_pool_lock:
+            if self._read_pool is None:
+                self._read_pool = ThreadPool(self._read_threads)
+
+            return self._read_pool
+
+    def close(self):
+        """Shut down the threads we use to read big objects. Call this when
+        you're done reading. It's fine to keep using this filesystem
+        afterwards; we'll just start new threads.
+
+        .. versionadded:: 0.5.8
+        """
+        with self._read_pool_lock:
+            pool, self._read_pool = self._read_pool, None
 
-            line_gen = read_file(
-                gcs_uri, fileobj=tmp_fileobj, yields_lines=False)
-            for current_line in line_gen:
-                yield current_line
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     def mkdir(self, dest):
         """Make a directory. This does nothing on GCS because there are
@@ -204,24 +378,143 @@ class GCSFilesystem(Filesystem):
         return any(paths)
 
     def rm(self, path_glob):
-        """Remove all files matching the given glob."""
+        """Remove all files matching the given glob.
+
+        Objects are deleted with batch requests of up to 100 deletes
+        each, sending up to *delete_threads* batches at once.
+
+        :return: ``(num_deleted, num_failed)``. Objects we couldn't delete
+                 are logged as warnings.
+
+        .. versionchanged:: 0.5.8
+
+           Use batch requests, and return counts.
+        """
         bucket_name, base_name = _path_glob_to_parsed_gcs_uri(path_glob)
 
+        object_names = []
+
         for item in self._ls_detailed(path_glob):
-            req = self.api_client.objects().delete(
-                bucket=bucket_name, object=item['name'])
             log.debug("deleting " + item['_uri'])
-            req.execute()
+            object_names.append(item['name'])
+
+        return self._delete_objects(bucket_name, object_names)
+
+    def _delete_objects(self, bucket_name, object_names):
+        """Delete the given objects from *bucket_name*, using batch
+        requests. Return ``(num_deleted, num_failed)``."""
+        batches = [object_names[i:i + _MAX_CALLS_PER_BATCH]
+                   for i in range(0, len(object_names), _MAX_CALLS_PER_BATCH)]
+
+        def delete_batch(object_names):
+            failed = []
+
+            def callback(request_id, response, exception):
+                # objects that are already gone count as deleted
+                if (exception is not None and not (
+                        isinstance(exception, google_errors.HttpError) and
+                        exception.resp.status == 404)):
+                    object_name = object_names[int(request_id)]
+                    log.warning('Could not delete gs://%s/%s: %s' %
+                                (bucket_name, object_name, exception))
+                    failed.append(object_name)
+
+            # use this thread's API client
+            api_client = self.api_client
+            batch = api_client.new_batch_http_request(callback=callback)
+
+            for i, object_name in enumerate(object_names):
+                batch.add(api_client.objects().delete(
+                    bucket=bucket_name, object=object_name),
+                    request_id=str(i))
+
+            try:
+                batch.execute()
+            except google_errors.HttpError as e:
+                log.warning('Could not delete %d objects from gs://%s/: %s' %
+                            (len(object_names), bucket_name, e))
+                return 0, len(object_names)
+
+            return len(object_names) - len(failed), len(failed)
+
+        results = _thread_map(delete_batch, batches, self._delete_threads)
+
+        return (sum(num_deleted for num_deleted, _ in results),
+                sum(num_failed for _, num_failed in results))
 
     def touchz(self, dest_uri):
         with io.BytesIO() as io_obj:
             return self._upload_io(io_obj, dest_uri)
 
     def put(self, src_path, dest_uri):
-        """Uploads a local file to a specific destination."""
+        """Uploads a local file to a specific destination.
+
+        Files bigger than *upload_part_size* are uploaded in parts, several
+        at a time, and then composed into one object.
+
+        Raises :py:class:`IOError` (with errno ``EEXIST``) if *dest_uri*
+        already exists.
+        """
+        size = os.path.getsize(src_path)
+
+        if self._upload_part_size and size > self._upload_part_size:
+            return self._composite_upload(src_path, dest_uri, size)
+
         with io.FileIO(src_path) as io_obj:
             return self._upload_io(io_obj, dest_uri)
 
+    def _composite_upload(self, src_path, dest_uri, size):
+        """Upload *src_path* as several temporary objects in parallel,
+        compose them into *dest_uri*, and delete the parts."""
+        bucket_name, object_name = parse_gcs_uri(dest_uri)
+
+        # GCS can only compose so many objects, so use bigger parts
+        # if we need to
+        part_size = max(self._upload_part_size,
+                        -(-size // _MAX_COMPOSE_SOURCES))
+        offsets = list(range(0, size, part_size))
+
+        # random, so that simultaneous uploads don't clobber each other
+        part_prefix = '%s._mrjob-part-%s-' % (object_name, random_identifier())
+        part_names = ['%s%05d' % (part_prefix, i) for i in range(len(offsets))]
+
+        def upload_part(i):
+            log.debug('uploading part %d/%d of %s' % (
+                i + 1, len(offsets), src_path))
+
+            length = min(part_size, size - offsets[i])
+            with _FileRangeIO(src_path, offsets[i], length) as io_obj:
+                self._upload_io(io_obj, 'gs://%s/%s' % (
+                    bucket_name, part_names[i]))
+
+        try:
+            _thread_map(upload_part, range(len(offsets)),
+                        self._upload_threads)
+
+            mimetype, _ = mimetypes.guess_type(dest_uri)
+
+            compose_req = self.api_client.objects().compose(
+                destinationBucket=bucket_name,
+                destinationObject=object_name,
+                ifGenerationMatch=0,
+                body=dict(
+                    sourceObjects=[dict(name=name) for name in part_names],
+                    destination=dict(
+                        contentType=(mimetype or _BINARY_MIMETYPE)),
+                ))
+
+            try:
+                compose_req.execute()
+            except google_errors.HttpError as e:
+                if e.resp.status == 412:
+                    raise _already_exists_error(dest_uri)
+                raise
+        finally:
+            # parts that never got uploaded are already "deleted"
+            self._delete_objects(bucket_name, part_names)
+
+        log.debug('Composed %d parts into %s' % (len(part_names), dest_uri))
+
     def _download_io(self, src_uri, io_obj):
         bucket_name, object_name = parse_gcs_uri(src_uri)
 
@@ -248,22 +541,43 @@ class GCSFilesystem(Filesystem):
         log.debug("Download Complete for %s", src_uri)
         return io_obj
 
+    def _download_range(self, src_uri, start, end, generation=None):
+        """Return bytes *start* up to (but not including) *end* of the
+        given object."""
+        bucket_name, object_name = parse_gcs_uri(src_uri)
+
+        kwargs = {}
+        if generation:
+            kwargs['generation'] = generation
+
+        req = self.api_client.objects().get_media(
+            bucket=bucket_name, object=object_name, **kwargs)
+        req.headers['range'] = 'bytes=%d-%d' % (start, end - 1)
+
+        return req.execute()
+
     def _upload_io(self, io_obj, dest_uri, metadata=False):
         bucket, name = parse_gcs_uri(dest_uri)
-        if self.exists(dest_uri):
-            raise Exception("File already exists: " + dest_uri)
 
         mimetype, _ = mimetypes.guess_type(dest_uri)
         mimetype = mimetype or _BINARY_MIMETYPE
 
-        # Chunked file upload
+        # Chunked file upload. ifGenerationMatch=0 means "only if the object
+        # doesn't exist", which saves checking first
         media = google_http.MediaIoBaseUpload(io_obj, mimetype, resumable=True)
         upload_req = self.api_client.objects().insert(
-            bucket=bucket, name=name, media_body=media)
+            bucket=bucket, name=name, media_body=media, ifGenerationMatch=0)
 
         upload_resp = None
         while upload_resp is None:
-            status, upload_resp = upload_req.next_chunk()
+            try:
+                status, upload_resp = upload_req.next_chunk(
+                    num_retries=_UPLOAD_NUM_RETRIES)
+            except google_errors.HttpError as e:
+                if e.resp.status == 412:
+                    raise _already_exists_error(dest_uri)
+                raise
+
             if status:
                 log.debug("Uploaded %d%%." % int(status.progress() * 100))
 
@@ -314,6 +628,59 @@ class GCSFilesystem(Filesystem):
         return req.execute()
 
 
+class _FileRangeIO(io.RawIOBase):
+    """Read-only, seekable file object for *length* bytes of the file at
+    *path*, starting at *offset*. Used to upload parts of files."""
+
+    def __init__(self, path, offset, length):
+        super(_FileRangeIO, self).__init__()
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+
+    def close(self):
+        self._file.close()
+        super(_FileRangeIO, self).close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._length
+
+        self._pos = max(0, min(pos, self._length))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._length - self._pos:
+            size = self._length - self._pos
+
+        self._file.seek(self._offset + self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _already_exists_error(uri):
+    return IOError(errno.EEXIST, 'File already exists', uri)
+
+
 # The equivalent S3 methods are in parse.py but it's cleaner to keep them
 # in the filesystem module; let's do that going forward
 
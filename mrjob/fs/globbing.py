@@ -0,0 +1,120 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Expand globs on filesystems that list keys by prefix (S3, GCS) one
+"directory" at a time, so that we only list keys that could match.
+
+Wildcards in every part of the glob but the last match a single
+"directory" name. In the last part, ``*`` and ``?`` can also match ``/``
+(and we also match everything "inside" a matching path), the same as
+:py:meth:`~mrjob.fs.base.Filesystem.ls`.
+"""
+import fnmatch
+import re
+
+from mrjob.util import _thread_map
+
+# any of the characters that make a string a glob
+_WILDCARD_RE = re.compile(r'[\[\*\?]')
+
+
+def _split_bucket_glob(path_glob):
+    """Split a URI glob like ``s3://bucket/dir/*.gz`` into *bucket*
+    and *key_glob* (``'bucket'`` and ``'dir/*.gz'``).
+
+    We can't use :py:func:`~mrjob.parse.urlparse` for this because
+    it treats ``?`` as the start of a query string."""
+    rest = path_glob.split('://', 1)[-1]
+    bucket_name, _, key_glob = rest.partition('/')
+    return bucket_name, key_glob
+
+
+def _glob_literal_prefix(glob):
+    """Return the part of *glob* before the first wildcard."""
+    m = _WILDCARD_RE.search(glob)
+    if m:
+        return glob[:m.start()]
+    else:
+        return glob
+
+
+def _ls_prefix_glob(key_glob, list_dirs, list_keys, max_threads=1):
+    """Yield ``(key_name, item)`` for every key in a bucket that matches
+    *key_glob*.
+
+    :param key_glob: glob to match, relative to the bucket
+    :param list_dirs: function that takes a prefix ending in ``/`` and
+                      returns the "directories" (common prefixes, each
+                      ending in ``/``) directly under that prefix
+    :param list_keys: function that takes a prefix and yields
+                      ``(key_name, item)`` for every key starting with that
+                      prefix. *item* is passed through as-is.
+    :param max_threads: if more than 1, list several prefixes at the
+                        same level in parallel, using this many threads
+
+    Results are yielded in the same order *list_keys* yields them if we
+    only have to list one prefix, and sorted by prefix otherwise.
+    """
+    parts = key_glob.split('/')
+    dir_parts, last_part = parts[:-1], parts[-1]
+
+    # find the "directories" that match, one level at a time
+    prefixes = ['']
+
+    for part in dir_parts:
+        if not _WILDCARD_RE.search(part):
+            # no need to list anything
+            prefixes = [prefix + part + '/' for prefix in prefixes]
+            continue
+
+        part_re = re.compile(fnmatch.translate(part))
+
+        matching_prefixes = []
+        for prefix, dirs in zip(
+                prefixes, _thread_map(list_dirs, prefixes, max_threads)):
+            for d in dirs:
+                if part_re.match(d[len(prefix):-1]):
+                    matching_prefixes.append(d)
+
+        if not matching_prefixes:
+            return
+
+        prefixes = sorted(matching_prefixes)
+
+    # match the last part of the glob against keys, relative to the
+    # "directory" they're in. We match both the glob itself and anything
+    # "inside" it (if the glob ends with /, that's just everything)
+    if last_part:
+        last_part_res = [re.compile(fnmatch.translate(last_part)),
+                         re.compile(fnmatch.translate(last_part + '/*'))]
+    else:
+        last_part_res = [re.compile(fnmatch.translate('*'))]
+
+    list_prefix = _glob_literal_prefix(last_part)
+
+    def list_matching_keys(prefix):
+        for key_name, item in list_keys(prefix + list_prefix):
+            rel_name = key_name[len(prefix):]
+            if any(r.match(rel_name) for r in last_part_res):
+                yield key_name, item
+
+    if len(prefixes) == 1 or max_threads <= 1:
+        for prefix in prefixes:
+            for key_name, item in list_matching_keys(prefix):
+                yield key_name, item
+    else:
+        results = _thread_map(lambda p: list(list_matching_keys(p)),
+                              prefixes, max_threads)
+        for matches in results:
+            for key_name, item in matches:
+                yield key_name, item
@@ -15,7 +15,9 @@
 # limitations under the License.
 import logging
 import os.path
+import posixpath
 import re
+import time
 from io import BytesIO
 from subprocess import Popen
 from subprocess import PIPE
@@ -23,6 +25,7 @@ from subprocess import CalledProcessError
 
 from mrjob.compat import uses_yarn
 from mrjob.fs.base import Filesystem
+from mrjob.logs.log4j import _HADOOP_LOG4J_LINE_RE
 from mrjob.py2 import to_string
 from mrjob.parse import is_uri
 from mrjob.parse import urlparse
@@ -43,6 +46,14 @@ _HADOOP_LS_NO_SUCH_FILE = re.compile(br'^lsr?: .*No such file.*$')
 # used by rm() (see below)
 _HADOOP_RM_NO_SUCH_FILE = re.compile(br'^rmr?: .*No such file.*$')
 
+# used by _exists_many() to tell which paths don't exist
+_HADOOP_LS_MISSING_PATH_RE = re.compile(
+    br'^lsr?: (?:Cannot access (?P<path>.*)|`(?P<quoted_path>.*)\'):'
+    br' No such file or directory\.?$')
+
+# don't put more than this many paths on one hadoop fs command line
+_MAX_PATHS_PER_CMD = 500
+
 # find version string in "Hadoop 0.20.203" etc.
 _HADOOP_VERSION_RE = re.compile(br'^.*?(?P<version>(\d|\.)+).*?$')
 
@@ -202,6 +213,16 @@ class HadoopFilesystem(Filesystem):
                 'Unexpected output from hadoop fs -du: %r' % stdout)
 
     def ls(self, path_glob):
+        for item in self.ls_detailed(path_glob):
+            yield item['uri']
+
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, but yield dictionaries with *uri*, *size*,
+        and *mtime* (parsed from the output of ``hadoop fs -ls -R``, so
+        it's only accurate to the minute). *checksum* is always ``None``.
+
+        .. versionadded:: 0.5.8
+        """
         components = urlparse(path_glob)
         hdfs_prefix = '%s://%s' % (components.scheme, components.netloc)
 
@@ -252,10 +273,21 @@ class HadoopFilesystem(Filesystem):
             path = to_string(line.split(b' ', path_index)[-1])
             # handle fully qualified URIs from newer versions of Hadoop ls
             # (see Pull Request #577)
-            if is_uri(path):
-                yield path
-            else:
-                yield hdfs_prefix + path
+            if not is_uri(path):
+                path = hdfs_prefix + path
+
+            # size is the last non-empty field before the date
+            size_fields = [f for f in fields[:path_index - 2] if f]
+            try:
+                size = int(size_fields[-1])
+            except (ValueError, IndexError):
+                raise IOError("Could not locate size in string %r" % line)
+
+            yield dict(uri=path,
+                       size=size,
+                       mtime=_hadoop_ls_time_to_timestamp(
+                           fields[path_index - 2], fields[path_index - 1]),
+                       checksum=None)
 
     def _cat_file(self, filename):
         # stream from HDFS
@@ -309,6 +341,52 @@ class HadoopFilesystem(Filesystem):
         except CalledProcessError:
             raise IOError("Could not check path %s" % path_glob)
 
+    def _exists_many(self, path_globs):
+        """Like :py:meth:`exists`, but check several paths with a single
+        ``hadoop fs -ls`` (per :py:data:`_MAX_PATHS_PER_CMD` paths),
+        rather than starting a JVM for each one.
+
+        Returns a list of booleans, one for each path."""
+        results = []
+
+        for i in range(0, len(path_globs), _MAX_PATHS_PER_CMD):
+            results.extend(self._exists_batch(
+                path_globs[i:i + _MAX_PATHS_PER_CMD]))
+
+        return results
+
+    def _exists_batch(self, path_globs):
+        args = self.get_hadoop_bin() + ['fs', '-ls'] + list(path_globs)
+        log.debug('> %s' % cmd_line(args))
+
+        proc = Popen(args, stdout=PIPE, stderr=PIPE)
+        _, stderr = proc.communicate()
+
+        if proc.returncode == 0:
+            return [True] * len(path_globs)
+
+        # hadoop fs -ls complains about each path that doesn't exist
+        missing = set()
+
+        for line in BytesIO(stderr):
+            line = line.rstrip(b'\r\n')
+
+            m = _HADOOP_LS_MISSING_PATH_RE.match(line)
+            if m:
+                missing.add(to_string(m.group('path') or
+                                      m.group('quoted_path')))
+            elif line and not _HADOOP_LOG4J_LINE_RE.match(to_string(line)):
+                missing = None
+                break
+
+        if not missing or not missing <= set(path_globs):
+            # something else went wrong, or hadoop wrote a path differently
+            # than we did; check paths one at a time so that errors are
+            # handled the same way as exists()
+            return [self.exists(path_glob) for path_glob in path_globs]
+
+        return [path_glob not in missing for path_glob in path_globs]
+
     def _put(self, local_path, target):
         # used by HadoopMRJobRunner._upload_to_hdfs()
 
@@ -316,6 +394,29 @@ class HadoopFilesystem(Filesystem):
         # interface. Probably want to add cp() at some point
         self.invoke_hadoop(['fs', '-put', local_path, target])
 
+    def _put_many(self, paths_and_targets):
+        """Like :py:meth:`_put`, but takes a list of
+        ``(local_path, target)``. Files going to the same (existing)
+        directory under their own names are uploaded with a single
+        ``hadoop fs -put src1 src2 ... dir/``.
+        """
+        # map from directory to list of local paths
+        dir_to_paths = {}
+
+        for local_path, target in paths_and_targets:
+            target_dir, target_name = posixpath.split(target)
+
+            if target_name == os.path.basename(local_path):
+                dir_to_paths.setdefault(target_dir, []).append(local_path)
+            else:
+                self._put(local_path, target)
+
+        for target_dir, local_paths in sorted(dir_to_paths.items()):
+            for i in range(0, len(local_paths), _MAX_PATHS_PER_CMD):
+                self.invoke_hadoop(
+                    ['fs', '-put'] + local_paths[i:i + _MAX_PATHS_PER_CMD] +
+                    [target_dir + '/'])
+
     def rm(self, path_glob):
         if not is_uri(path_glob):
             super(HadoopFilesystem, self).rm(path_glob)
@@ -338,3 +439,14 @@ class HadoopFilesystem(Filesystem):
             self.invoke_hadoop(['fs', '-touchz', dest])
         except CalledProcessError:
             raise IOError("Could not touchz %s" % dest)
+
+
+def _hadoop_ls_time_to_timestamp(date, hour_minute):
+    """Convert date and time fields from ``hadoop fs -ls`` (e.g.
+    ``b'2010-01-13'`` and ``b'14:00'``, in local time) to a UNIX timestamp,
+    or return ``None`` if they can't be parsed."""
+    try:
+        return time.mktime(time.strptime(
+            to_string(date + b' ' + hour_minute), '%Y-%m-%d %H:%M'))
+    except ValueError:
+        return None
@@ -12,9 +12,12 @@
 # limitations under the License.
 import glob
 import hashlib
+import json
 import logging
 import os
 import shutil
+import threading
+from multiprocessing.pool import ThreadPool
 
 from mrjob.fs.base import Filesystem
 from mrjob.parse import is_uri
@@ -22,16 +25,44 @@ from mrjob.util import read_file
 
 log = logging.getLogger(__name__)
 
+# stat files in parallel if there are at least this many
+_MIN_FILES_TO_STAT_IN_PARALLEL = 64
+
+# number of threads to stat files with
+_NUM_STAT_THREADS = 16
+
+# how many bytes to read at a time when computing MD5 sums
+_MD5_BLOCK_SIZE = 1024 * 1024
+
 
 class LocalFilesystem(Filesystem):
     """Filesystem for local files. Typically you will get one of these via
     ``MRJobRunner().fs``.
     """
+    def __init__(self, md5_cache_path=None):
+        """
+        :param md5_cache_path: If set, remember the MD5 sum of each file we
+                               hash in this (JSON) file, along with its
+                               size, modification time, and inode, so
+                               that later jobs don't have to re-read
+                               files that haven't changed.
+
+        .. versionadded:: 0.5.8
+        """
+        super(LocalFilesystem, self).__init__()
+
+        self._md5_cache_path = md5_cache_path
+
+        # map from real path to [size, mtime_ns, inode, md5sum]. Loaded
+        # from *md5_cache_path* the first time we need it
+        self._md5_cache = None
+        self._md5_cache_lock = threading.Lock()
+
     def can_handle_path(self, path):
         return not is_uri(path)
 
     def du(self, path_glob):
-        return sum(os.path.getsize(path) for path in self.ls(path_glob))
+        return sum(item['size'] for item in self.ls_detailed(path_glob))
 
     def ls(self, path_glob):
         for path in glob.glob(path_glob):
@@ -42,6 +73,13 @@ class LocalFilesystem(Filesystem):
             else:
                 yield path
 
+    def ls_detailed(self, path_glob):
+        paths = list(self.ls(path_glob))
+
+        for path, st in zip(paths, _stat_files(paths)):
+            yield dict(uri=path, size=st.st_size, mtime=st.st_mtime,
+                       checksum=None)
+
     def _cat_file(self, filename):
         return read_file(filename)
 
@@ -69,7 +107,7 @@ class LocalFilesystem(Filesystem):
         with open(path, 'w'):
             pass
 
-    def _md5sum_file(self, fileobj, block_size=(512 ** 2)):  # 256K default
+    def _md5sum_file(self, fileobj, block_size=_MD5_BLOCK_SIZE):
         md5 = hashlib.md5()
         while True:
             data = fileobj.read(block_size)
@@ -79,5 +117,83 @@ class LocalFilesystem(Filesystem):
         return md5.hexdigest()
 
     def md5sum(self, path):
-        with open(path, 'rb') as f:
-            return self._md5sum_file(f)
+        if not self._md5_cache_path:
+            with open(path, 'rb') as f:
+                return self._md5sum_file(f)
+
+        # resolve symlinks, so that different links to the same file
+        # share an entry
+        real_path = os.path.realpath(path)
+        st = os.stat(real_path)
+        key = [st.st_size, _mtime_ns(st), st.st_ino]
+
+        with self._md5_cache_lock:
+            if self._md5_cache is None:
+                self._md5_cache = self._load_md5_cache()
+
+            entry = self._md5_cache.get(real_path)
+
+        # entries written by older versions of mrjob have a different
+        # length, and never match
+        if entry and len(entry) == len(key) + 1 and entry[:-1] == key:
+            return entry[-1]
+
+        with open(real_path, 'rb') as f:
+            md5 = self._md5sum_file(f)
+
+        with self._md5_cache_lock:
+            self._md5_cache[real_path] = key + [md5]
+            self._save_md5_cache()
+
+        return md5
+
+    def _load_md5_cache(self):
+        """Read the MD5 cache file, dropping entries for files that no
+        longer exist."""
+        try:
+            with open(self._md5_cache_path) as f:
+                md5_cache = json.load(f)
+            return dict((path, list(entry))
+                        for path, entry in md5_cache.items()
+                        if os.path.exists(path))
+        except (IOError, OSError, ValueError, AttributeError) as e:
+            if os.path.exists(self._md5_cache_path):
+                log.warning("Couldn't read MD5 cache %s: %s" %
+                            (self._md5_cache_path, e))
+            return {}
+
+    def _save_md5_cache(self):
+        # write to a temp file and rename, so that other processes never
+        # see a partially written cache
+        tmp_path = '%s.%d.tmp' % (self._md5_cache_path, os.getpid())
+
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._md5_cache, f)
+            os.rename(tmp_path, self._md5_cache_path)
+        except (IOError, OSError) as e:
+            log.warning("Couldn't write MD5 cache %s: %s" %
+                        (self._md5_cache_path, e))
+
+
+def _mtime_ns(st):
+    """Get modification time from an ``os.stat()`` result, in integer
+    nanoseconds (``st_mtime_ns`` doesn't exist in Python 2)."""
+    if hasattr(st, 'st_mtime_ns'):
+        return st.st_mtime_ns
+    else:
+        return int(st.st_mtime * 1e9)
+
+
+def _stat_files(paths):
+    """Return a list of ``os.stat()`` results for the given paths. If there
+    are a lot of them, stat them in parallel."""
+    if len(paths) < _MIN_FILES_TO_STAT_IN_PARALLEL:
+        return [os.stat(path) for path in paths]
+
+    pool = ThreadPool(_NUM_STAT_THREADS)
+    try:
+        return pool.map(os.stat, paths)
+    finally:
+        pool.close()
+        pool.join()
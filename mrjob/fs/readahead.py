@@ -0,0 +1,175 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Read objects on filesystems that support ranged GETs (S3, GCS) using
+several connections at once, so that reading big objects isn't limited
+by the throughput of a single connection."""
+from collections import deque
+
+# how many bytes to fetch with each ranged GET
+_DEFAULT_READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+# how many ranged GETs to have in flight at once
+_DEFAULT_READ_THREADS = 4
+
+# how many bytes to fetch with the first ranged GET. Chunks double in size
+# from here up to the chunk size, so that we can start yielding data
+# without waiting for a whole (big) chunk to download
+_DEFAULT_FIRST_READ_CHUNK_SIZE = 256 * 1024
+
+
+class _ReadAheadReader(object):
+    """Read-only file-like object that reads an object of known size by
+    fetching *chunk_size*-byte ranges of it, up to *num_threads* at a
+    time, ahead of where we're reading, using *pool*.
+
+    Chunks are returned in order. At most *num_threads* chunks are being
+    fetched or waiting to be read at once, so memory use is bounded.
+
+    The first chunk is only *first_chunk_size* bytes, and each chunk after
+    that is twice as big as the one before it (up to *chunk_size*), so
+    that the first bytes are available quickly. This is true even if we
+    fetch chunks one at a time.
+
+    *pool* belongs to the caller, so that several readers can share it
+    (and its threads' connections); we never start threads of our own.
+
+    Like :py:class:`boto.s3.key.Key`, iterating over this yields chunks
+    of bytes, not lines.
+    """
+    def __init__(self, read_range, size, pool=None,
+                 chunk_size=_DEFAULT_READ_CHUNK_SIZE,
+                 num_threads=_DEFAULT_READ_THREADS,
+                 first_chunk_size=_DEFAULT_FIRST_READ_CHUNK_SIZE):
+        """
+        :param read_range: function that takes *start* and *end* and
+                           returns bytes *start* up to (but not
+                           including) *end* of the object
+        :param size: size of the object, in bytes
+        :param pool: :py:class:`~multiprocessing.pool.ThreadPool` to fetch
+                     chunks with. If ``None``, we just fetch chunks in
+                     this thread as we need them.
+        :param chunk_size: how many bytes to fetch at a time
+        :param num_threads: how many chunks to fetch at once. If 1, we
+                            just fetch chunks as we need them.
+        :param first_chunk_size: how many bytes to fetch with the first
+                                 request
+        """
+        self._read_range = read_range
+        self._size = size
+        self._pool = pool
+        self._chunk_size = chunk_size
+        self._num_threads = num_threads
+
+        # offset and size of the next chunk to fetch
+        self._next_offset = 0
+        self._next_chunk_size = max(min(first_chunk_size, chunk_size), 1)
+
+        # don't bother with threads if there's only one chunk to fetch
+        self._use_threads = (
+            pool is not None and num_threads > 1 and
+            size > self._next_chunk_size)
+
+        # results of fetches, in order
+        self._pending = deque()
+
+        # the chunk we're currently reading from, and where we are in it
+        self._buf = b''
+        self._buf_pos = 0
+
+    def _fetch(self, start, end):
+        data = self._read_range(start, end)
+
+        if len(data) != end - start:
+            raise IOError('Expected %d bytes at offset %d, got %d' % (
+                end - start, start, len(data)))
+
+        return data
+
+    def _next_range(self):
+        """Return *start* and *end* of the next chunk to fetch, and make
+        the chunk after it bigger."""
+        start = self._next_offset
+        end = min(start + self._next_chunk_size, self._size)
+        self._next_offset = end
+
+        self._next_chunk_size = min(
+            self._next_chunk_size * 2, self._chunk_size)
+
+        return start, end
+
+    def _start_fetches(self):
+        """Start fetching chunks until we have *num_threads* in flight
+        or there are no more chunks."""
+        while (len(self._pending) < self._num_threads and
+               self._next_offset < self._size):
+            self._pending.append(
+                self._pool.apply_async(self._fetch, self._next_range()))
+
+    def _next_chunk(self):
+        """Return the next chunk of the object, or ``b''`` at EOF."""
+        if not self._use_threads:
+            if self._next_offset >= self._size:
+                return b''
+
+            return self._fetch(*self._next_range())
+
+        self._start_fetches()
+        if not self._pending:
+            self.close()
+            return b''
+
+        result = self._pending.popleft()
+        # keep the pipeline full while we wait
+        self._start_fetches()
+
+        return result.get()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size  # read everything
+
+        chunks = []
+
+        while size > 0:
+            if self._buf_pos >= len(self._buf):
+                self._buf = self._next_chunk()
+                self._buf_pos = 0
+                if not self._buf:
+                    break
+
+            end = min(self._buf_pos + size, len(self._buf))
+            size -= end - self._buf_pos
+
+            chunks.append(self._buf[self._buf_pos:end])
+            self._buf_pos = end
+
+        return b''.join(chunks)
+
+    def __iter__(self):
+        if self._buf_pos < len(self._buf):
+            rest = self._buf[self._buf_pos:]
+            self._buf, self._buf_pos = b'', 0
+            yield rest
+
+        while True:
+            chunk = self._next_chunk()
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """Stop fetching chunks. Chunks already being fetched are thrown
+        away when they arrive."""
+        self._pending.clear()
+        self._next_offset = self._size
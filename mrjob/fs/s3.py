@@ -11,12 +11,19 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import fnmatch
+import json
 import logging
+import os
+import os.path
 import socket
+import threading
+import time
+from itertools import islice
+from multiprocessing.pool import ThreadPool
 
 try:
     import boto
+    import boto.s3.prefix
     boto  # quiet "redefinition of unused ..." warning from pyflakes
 except ImportError:
     # don't require boto; MRJobs don't actually need it when running
@@ -25,12 +32,19 @@ except ImportError:
 
 from mrjob.aws import s3_endpoint_for_region
 from mrjob.fs.base import Filesystem
+from mrjob.fs.globbing import _ls_prefix_glob
+from mrjob.fs.globbing import _split_bucket_glob
+from mrjob.fs.readahead import _DEFAULT_READ_CHUNK_SIZE
+from mrjob.fs.readahead import _DEFAULT_READ_THREADS
+from mrjob.fs.readahead import _ReadAheadReader
 from mrjob.parse import is_s3_uri
+from mrjob.parse import iso8601_to_timestamp
 from mrjob.parse import parse_s3_uri
 from mrjob.parse import urlparse
 from mrjob.retry import RetryWrapper
 from mrjob.runner import GLOB_RE
 from mrjob.util import read_file
+from mrjob.util import _thread_map
 
 
 log = logging.getLogger(__name__)
@@ -40,6 +54,18 @@ _EMR_BACKOFF = 20
 _EMR_BACKOFF_MULTIPLIER = 1.5
 _EMR_MAX_TRIES = 20  # this takes about a day before we run out of tries
 
+# how long to trust bucket locations in the region cache (in seconds)
+_DEFAULT_REGION_CACHE_TTL = 24 * 60 * 60
+
+# how many "directories" to list at once when expanding globs
+_DEFAULT_LIST_THREADS = 8
+
+# how many multi-object delete requests to make at once
+_DEFAULT_DELETE_THREADS = 4
+
+# S3 won't delete more keys than this in one request
+_MAX_KEYS_PER_DELETE = 1000
+
 
 def s3_key_to_uri(s3_key):
     """Convert a boto Key object into an ``s3://`` URI"""
@@ -76,13 +102,40 @@ class S3Filesystem(Filesystem):
     """
 
     def __init__(self, aws_access_key_id=None, aws_secret_access_key=None,
-                 aws_security_token=None, s3_endpoint=None):
+                 aws_security_token=None, s3_endpoint=None,
+                 region_cache_path=None,
+                 region_cache_ttl=_DEFAULT_REGION_CACHE_TTL,
+                 list_threads=_DEFAULT_LIST_THREADS,
+                 read_threads=_DEFAULT_READ_THREADS,
+                 read_chunk_size=_DEFAULT_READ_CHUNK_SIZE,
+                 delete_threads=_DEFAULT_DELETE_THREADS):
         """
         :param aws_access_key_id: Your AWS access key ID
         :param aws_secret_access_key: Your AWS secret access key
         :param aws_security_token: security token for use with temporary
                                    AWS credentials
         :param s3_endpoint: If set, always use this endpoint
+        :param region_cache_path: If set, save bucket locations to this
+                                  (JSON) file, so they can be re-used
+                                  by other processes
+        :param region_cache_ttl: How long to trust bucket locations
+                                 (in seconds)
+        :param list_threads: When expanding globs, list up to this many
+                             "directories" at once
+        :param read_threads: When reading keys, fetch up to this many
+                             chunks at once
+        :param read_chunk_size: How many bytes to fetch at a time when
+                                reading keys. The first few chunks are
+                                smaller, so that we can start reading
+                                lines right away.
+        :param delete_threads: When removing keys, make up to this many
+                               delete requests at once
+
+        .. versionchanged:: 0.5.8
+
+           Connections and bucket locations are cached and re-used, so
+           once we know where a bucket is, :py:meth:`get_bucket` doesn't
+           make any requests.
         """
         super(S3Filesystem, self).__init__()
         self._s3_endpoint = s3_endpoint
@@ -90,27 +143,84 @@ class S3Filesystem(Filesystem):
         self._aws_secret_access_key = aws_secret_access_key
         self._aws_security_token = aws_security_token
 
+        self._region_cache_path = region_cache_path
+        self._region_cache_ttl = region_cache_ttl
+
+        self._list_threads = list_threads
+
+        self._delete_threads = delete_threads
+
+        self._read_threads = read_threads
+        self._read_chunk_size = read_chunk_size
+        # shared by all reads, so that its threads keep their connections.
+        # Created when we first need it; see close()
+        self._read_pool = None
+        self._read_pool_lock = threading.Lock()
+
+        # map from bucket name to (location, time we looked it up). Loaded
+        # from *region_cache_path* the first time we need it
+        self._bucket_locations = None
+        self._bucket_locations_lock = threading.Lock()
+
+        # buckets whose location we only assumed (because of s3_endpoint,
+        # or because we couldn't read it). These aren't written to
+        # *region_cache_path*, where other processes would trust them
+        self._assumed_bucket_locations = set()
+
+        # boto connections aren't thread-safe, so each thread gets its own
+        # map from host to connection
+        self._thread_local = threading.local()
+
     def can_handle_path(self, path):
         return is_s3_uri(path)
 
     def du(self, path_glob):
         """Get the size of all files matching path_glob."""
-        return sum(self.get_s3_key(uri).size for uri in self.ls(path_glob))
+        return sum(item['size'] for item in self.ls_detailed(path_glob))
 
     def ls(self, path_glob):
         """Recursively list files on S3.
 
         *path_glob* can include ``?`` to match single characters or
-        ``*`` to match 0 or more characters. Both ``?`` and ``*`` can match
-        ``/``.
+        ``*`` to match 0 or more characters. In the last part of the path,
+        both ``?`` and ``*`` can match ``/``.
 
         .. versionchanged:: 0.5.0
 
             You no longer need a trailing slash to list "directories" on S3;
             both ``ls('s3://b/dir')`` and `ls('s3://b/dir/')` will list
             all keys starting with ``dir/``.
+
+        .. versionchanged:: 0.5.8
+
+            Globs are expanded one "directory" at a time, so wildcards
+            before the last ``/`` only match a single directory name (e.g.
+            ``s3://b/*/2016-10-16/*.gz`` doesn't list all of ``s3://b/``).
         """
+        for uri, key in self._ls_keys(path_glob):
+            yield uri
+
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, but yield dictionaries with *uri*, *size*,
+        *mtime*, and *checksum* (the key's etag), all of which come from
+        the listing itself.
 
+        The etag of a key uploaded in parts isn't an MD5 sum (it looks
+        like ``<hex>-<num parts>``), so *checksum* is ``None`` for those.
+
+        .. versionadded:: 0.5.8
+        """
+        for uri, key in self._ls_keys(path_glob):
+            etag = key.etag.strip('"')
+            yield dict(uri=uri,
+                       size=key.size,
+                       mtime=iso8601_to_timestamp(key.last_modified),
+                       checksum=None if '-' in etag else etag)
+
+    def _ls_keys(self, path_glob):
+        """Like :py:meth:`ls`, except that we yield ``(uri, key)``, where
+        *key* is the boto Key object from the listing (which includes
+        size, etag, etc.)."""
         # clean up the  base uri to ensure we have an equal uri to boto (s3://)
         # just in case we get passed s3n://
         scheme = urlparse(path_glob).scheme
@@ -125,35 +235,84 @@ class S3Filesystem(Filesystem):
         else:
             base_uri = path_glob
 
-        bucket_name, base_name = parse_s3_uri(base_uri)
+        # make sure the bucket part of the glob is valid
+        bucket_name, _ = parse_s3_uri(base_uri)
+        _, key_glob = _split_bucket_glob(path_glob)
 
-        # allow subdirectories of the path/glob
-        if path_glob and not path_glob.endswith('/'):
-            dir_glob = path_glob + '/*'
-        else:
-            dir_glob = path_glob + '*'
-
-        bucket = self.get_bucket(bucket_name)
-        for key in bucket.list(base_name):
-            uri = "%s://%s/%s" % (scheme, bucket_name, key.name)
+        def list_dirs(prefix):
+            bucket = self.get_bucket(bucket_name)
+            return [item.name for item in bucket.list(prefix, '/')
+                    if isinstance(item, boto.s3.prefix.Prefix)]
 
-            # enforce globbing
-            if not (fnmatch.fnmatchcase(uri, path_glob) or
-                    fnmatch.fnmatchcase(uri, dir_glob)):
-                continue
+        def list_keys(prefix):
+            bucket = self.get_bucket(bucket_name)
+            for key in bucket.list(prefix):
+                yield key.name, key
 
-            yield uri
+        for key_name, key in _ls_prefix_glob(
+                key_glob, list_dirs, list_keys,
+                max_threads=self._list_threads):
+            yield '%s://%s/%s' % (scheme, bucket_name, key_name), key
 
     def md5sum(self, path):
-        k = self.get_s3_key(path)
-        return k.etag.strip('"')
+        # use the listing, rather than a HEAD request for the key
+        items = [item for item in self.ls_detailed(path)
+                 if item['uri'] == path]
+        if not items:
+            raise IOError("%s doesn't exist" % path)
+
+        checksum = items[0]['checksum']
+        if checksum is None:
+            raise IOError(
+                "%s has no MD5 sum (it was uploaded in parts)" % path)
+
+        return checksum
 
     def _cat_file(self, filename):
         # stream lines from the s3 key
         s3_key = self.get_s3_key(filename)
-        # yields_lines=False: warn read_file that s3_key yields chunks of bytes
-        return read_file(
-            s3_key_to_uri(s3_key), fileobj=s3_key, yields_lines=False)
+
+        bucket_name = s3_key.bucket.name
+        # If-Match: make sure the key doesn't change while we read
+        etag = s3_key.etag
+
+        def read_range(start, end):
+            # use this thread's connection
+            key = self.get_bucket(bucket_name).new_key(s3_key.name)
+            return key.get_contents_as_string(headers={
+                'If-Match': etag,
+                'Range': 'bytes=%d-%d' % (start, end - 1)})
+
+        # big keys are read several chunks at a time
+        reader = _ReadAheadReader(read_range, s3_key.size,
+                                  pool=self._get_read_pool(),
+                                  chunk_size=self._read_chunk_size,
+                                  num_threads=self._read_threads)
+
+        # yields_lines=False: warn read_file that reader yields chunks of bytes
+        return read_file(s3_key_to_uri(s3_key), fileobj=reader,
+                         yields_lines=False, cleanup=reader.close)
+
+    def _get_read_pool(self):
+        with self._read_pool_lock:
+            if self._read_pool is None:
+                self._read_pool = ThreadPool(self._read_threads)
+
+            return self._read_pool
+
+    def close(self):
+        """Shut down the threads we use to read big keys. Call this when
+        you're done reading. It's fine to keep using this filesystem
+        afterwards; we'll just start new threads.
+
+        .. versionadded:: 0.5.8
+        """
+        with self._read_pool_lock:
+            pool, self._read_pool = self._read_pool, None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     def mkdir(self, dest):
         """Make a directory. This does nothing on S3 because there are
@@ -175,12 +334,81 @@ class S3Filesystem(Filesystem):
         return any(paths)
 
     def rm(self, path_glob):
-        """Remove all files matching the given glob."""
-        for uri in self.ls(path_glob):
-            key = self.get_s3_key(uri)
-            if key:
+        """Remove all files matching the given glob.
+
+        Keys are deleted up to 1,000 at a time with S3's multi-object
+        delete, making up to *delete_threads* requests at once.
+
+        :return: ``(num_deleted, num_failed)``. Keys we couldn't delete
+                 are logged as warnings.
+
+        .. versionchanged:: 0.5.8
+
+           Use multi-object delete, and return counts.
+        """
+        def keys():
+            for uri, key in self._ls_keys(path_glob):
                 log.debug('deleting ' + uri)
-                key.delete()
+                yield key
+
+        return self._rm_keys(keys())
+
+    def _rm_keys(self, keys):
+        """Delete the given boto keys, using multi-object delete.
+
+        *keys* can be any iterable (e.g. a listing we're filtering as we
+        go); we only read as many keys from it as we can delete at once.
+
+        :return: ``(num_deleted, num_failed)``
+        """
+        def batches():
+            bucket_name, key_names = None, []
+
+            for key in keys:
+                if key_names and (key.bucket.name != bucket_name or
+                                  len(key_names) >= _MAX_KEYS_PER_DELETE):
+                    yield bucket_name, key_names
+                    key_names = []
+
+                bucket_name = key.bucket.name
+                key_names.append(key.name)
+
+            if key_names:
+                yield bucket_name, key_names
+
+        def delete_batch(batch):
+            bucket_name, key_names = batch
+
+            try:
+                # use this thread's connection
+                result = self.get_bucket(bucket_name).delete_keys(
+                    key_names, quiet=True)
+            except boto.exception.S3ResponseError as e:
+                log.warning('Could not delete %d keys from s3://%s/: %s' %
+                            (len(key_names), bucket_name, e))
+                return 0, len(key_names)
+
+            # in quiet mode, S3 only tells us about errors
+            for error in result.errors:
+                log.warning('Could not delete s3://%s/%s: %s' %
+                            (bucket_name, error.key, error.message))
+
+            return len(key_names) - len(result.errors), len(result.errors)
+
+        num_deleted = 0
+        num_failed = 0
+
+        batch_iter = batches()
+        while True:
+            group = list(islice(batch_iter, max(self._delete_threads, 1)))
+            if not group:
+                break
+
+            for d, f in _thread_map(delete_batch, group, self._delete_threads):
+                num_deleted += d
+                num_failed += f
+
+        return num_deleted, num_failed
 
     def touchz(self, dest):
         """Make an empty file in the given location. Raises an error if
@@ -225,12 +453,36 @@ class S3Filesystem(Filesystem):
             security_token=self._aws_security_token)
         return wrap_aws_conn(raw_s3_conn)
 
+    def _s3_conn(self, region=''):
+        """Like :py:meth:`make_s3_conn`, except that we re-use one
+        connection per endpoint (per thread)."""
+        host = self._s3_endpoint or s3_endpoint_for_region(region)
+
+        if not hasattr(self._thread_local, 'conns'):
+            self._thread_local.conns = {}
+        conns = self._thread_local.conns
+
+        if host not in conns:
+            conns[host] = self.make_s3_conn(region)
+
+        return conns[host]
+
     def get_bucket(self, bucket_name):
-        """Get the bucket, connecting through the appropriate endpoint."""
-        s3_conn = self.make_s3_conn()
+        """Get the bucket, connecting through the appropriate endpoint.
+
+        Once we know a bucket's location, this doesn't make any requests.
+        """
+        location = self._get_bucket_location(bucket_name)
+        if location is not None:
+            return self._s3_conn(location).get_bucket(
+                bucket_name, validate=False)
+
+        s3_conn = self._s3_conn()
 
         bucket = s3_conn.get_bucket(bucket_name)
         if self._s3_endpoint:
+            # location doesn't matter; we only need to know the bucket exists
+            self._set_bucket_location(bucket_name, '', assumed=True)
             return bucket
 
         try:
@@ -242,16 +494,87 @@ class S3Filesystem(Filesystem):
             if e.status == 403:
                 log.warning('Could not infer endpoint for bucket %s; '
                             'assuming %s', bucket_name, s3_conn.host)
+                self._set_bucket_location(bucket_name, '', assumed=True)
                 return bucket
 
             raise
 
+        self._set_bucket_location(bucket_name, location)
+
         if (s3_endpoint_for_region(location) != s3_conn.host):
-            s3_conn = self.make_s3_conn(location)
-            bucket = s3_conn.get_bucket(bucket_name)
+            bucket = self._s3_conn(location).get_bucket(
+                bucket_name, validate=False)
 
         return bucket
 
+    def _get_bucket_location(self, bucket_name):
+        """Return the cached location of the given bucket, or ``None``
+        if we don't know it (or the cached value is too old)."""
+        with self._bucket_locations_lock:
+            if self._bucket_locations is None:
+                self._bucket_locations = self._load_region_cache()
+
+            if bucket_name not in self._bucket_locations:
+                return None
+
+            location, fetched = self._bucket_locations[bucket_name]
+
+        if time.time() - fetched > self._region_cache_ttl:
+            return None
+
+        return location
+
+    def _set_bucket_location(self, bucket_name, location, assumed=False):
+        """Remember *location* for the given bucket. If *assumed* is true,
+        *location* didn't come from S3, so only remember it in memory."""
+        with self._bucket_locations_lock:
+            if self._bucket_locations is None:
+                self._bucket_locations = self._load_region_cache()
+
+            self._bucket_locations[bucket_name] = (location, time.time())
+
+            if assumed:
+                self._assumed_bucket_locations.add(bucket_name)
+            else:
+                self._assumed_bucket_locations.discard(bucket_name)
+                self._save_region_cache()
+
+    def _load_region_cache(self):
+        """Read the region cache file, if any. Returns a dictionary
+        mapping bucket name to ``(location, time)``."""
+        if not self._region_cache_path:
+            return {}
+
+        try:
+            with open(self._region_cache_path) as f:
+                return dict((bucket_name, tuple(value))
+                            for bucket_name, value in json.load(f).items())
+        except (IOError, OSError, ValueError, AttributeError) as e:
+            if os.path.exists(self._region_cache_path):
+                log.warning("Couldn't read S3 region cache %s: %s" %
+                            (self._region_cache_path, e))
+            return {}
+
+    def _save_region_cache(self):
+        """Write bucket locations to the region cache file, if any."""
+        if not self._region_cache_path:
+            return
+
+        # write to a temp file and rename, so that other processes never
+        # see a partially written cache
+        tmp_path = '%s.%d.tmp' % (self._region_cache_path, os.getpid())
+
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(
+                    (bucket_name, value) for bucket_name, value
+                    in self._bucket_locations.items()
+                    if bucket_name not in self._assumed_bucket_locations), f)
+            os.rename(tmp_path, self._region_cache_path)
+        except (IOError, OSError) as e:
+            log.warning("Couldn't write S3 region cache %s: %s" %
+                        (self._region_cache_path, e))
+
     def get_s3_key(self, uri):
         """Get the boto Key object matching the given S3 uri, or
         return None if that key doesn't exist.
@@ -294,9 +617,9 @@ class S3Filesystem(Filesystem):
 
     def get_all_buckets(self):
         """Get a stream of all buckets owned by this user on S3."""
-        return self.make_s3_conn().get_all_buckets()
+        return self._s3_conn().get_all_buckets()
 
     def create_bucket(self, bucket_name, location=''):
         """Create a bucket on S3, optionally setting location constraint."""
-        return self.make_s3_conn().create_bucket(
+        return self._s3_conn().create_bucket(
             bucket_name, location=location)
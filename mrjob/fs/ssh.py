@@ -13,14 +13,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
 
 from io import BytesIO
 from mrjob.fs.base import Filesystem
+from mrjob.ssh import _SSH_CONTROL_PERSIST_SECS
 from mrjob.ssh import _ssh_cat
 from mrjob.ssh import _ssh_copy_key
 from mrjob.ssh import _ssh_ls
+from mrjob.ssh import _ssh_ls_detailed
 from mrjob.ssh import _ssh_slave_addresses
+from mrjob.ssh import _ssh_start_master
+from mrjob.ssh import _ssh_stop_master
+from mrjob.ssh import _ssh_tar
 from mrjob.util import random_identifier
 from mrjob.util import read_file
 
@@ -36,12 +46,23 @@ class SSHFilesystem(Filesystem):
     one of these via ``EMRJobRunner().fs``, composed with
     :py:class:`~mrjob.fs.s3.S3Filesystem` and
     :py:class:`~mrjob.fs.local.LocalFilesystem`.
+
+    Unless you pass ``multiplex=False``, we use OpenSSH's connection
+    multiplexing to make one connection per host and run every command
+    through it; call :py:meth:`close` when you're done to shut those
+    connections down.
     """
 
-    def __init__(self, ssh_bin, ec2_key_pair_file):
+    def __init__(self, ssh_bin, ec2_key_pair_file, multiplex=True):
         """
         :param ssh_bin: path to ``ssh`` binary
         :param ec2_key_pair_file: path to an SSH keyfile
+        :param multiplex: reuse one SSH connection per host (ignored on
+                          Windows, which doesn't support it)
+
+        .. versionchanged:: 0.5.8
+
+           added *multiplex*
         """
         super(SSHFilesystem, self).__init__()
         self._ssh_bin = ssh_bin
@@ -59,11 +80,98 @@ class SSHFilesystem(Filesystem):
         # should we use sudo (for EMR)? Enable with use_sudo_over_ssh()
         self._sudo = False
 
+        # temp dir for control sockets of multiplexed connections, and
+        # which hosts we've connected to through it. See _ssh_control_dir()
+        self._multiplex = multiplex and os.name != 'nt'
+        self._control_dir = None
+        self._connected_hosts = set()
+
+        # map from address (possibly a bang path) to when we last started
+        # a command through its master connection
+        self._addr_to_master_time = {}
+
+        # we may be used from several threads at once (e.g. to list logs
+        # on every node); don't copy keys or make control dirs twice
+        self._lock = threading.RLock()
+
+    def close(self):
+        """Shut down multiplexed SSH connections and clean up their
+        control sockets. It's fine to keep using this filesystem
+        afterwards; we'll just make new connections.
+
+        .. versionadded:: 0.5.8
+        """
+        if not self._control_dir:
+            return
+
+        for host in sorted(self._connected_hosts):
+            try:
+                _ssh_stop_master(self._ssh_bin, host,
+                                 self._ec2_key_pair_file, self._control_dir)
+            except Exception as e:
+                log.debug('Failed to close SSH connection to %s: %s' %
+                          (host, e))
+
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+
+        self._control_dir = None
+        self._connected_hosts = set()
+        self._addr_to_master_time = {}
+
+    def _ssh_control_dir(self, addr=None):
+        """Get the directory to keep our control sockets in (creating it if
+        need be), or ``None`` if we're not multiplexing.
+
+        If *addr* is set, make sure there's a master connection to it (and
+        to its first host, if it's a bang path), and note that we've
+        connected to its first host, so :py:meth:`close` knows to
+        disconnect from it.
+        """
+        if not self._multiplex:
+            return None
+
+        with self._lock:
+            if not self._control_dir:
+                # keep this short; sockets' paths can't be much over 100
+                # chars
+                self._control_dir = tempfile.mkdtemp(prefix='mrjob-ssh-')
+
+            if addr:
+                host = addr.split('!')[0]
+                self._connected_hosts.add(host)
+
+                self._ensure_master(host)
+                if addr != host:
+                    self._ensure_master(addr)
+
+            return self._control_dir
+
+    def _ensure_master(self, addr):
+        """Start a master connection to *addr* unless we've started a
+        command through one in the last :py:data:`_SSH_CONTROL_PERSIST_SECS`
+        (in which case it's still open). Call this with ``self._lock``
+        held, so that we don't start two masters for the same host.
+
+        The master only starts counting down once its last command
+        finishes, so after a long command, it may still be running; in
+        that case, :py:func:`~mrjob.ssh._ssh_start_master` checks before
+        starting another one."""
+        now = time.time()
+        last_used = self._addr_to_master_time.get(addr)
+
+        if last_used is None or now - last_used >= _SSH_CONTROL_PERSIST_SECS:
+            _ssh_start_master(
+                self._ssh_bin, addr, self._ec2_key_pair_file,
+                self._control_dir, keyfile=self._key_filename_for(addr),
+                check=(last_used is not None))
+
+        self._addr_to_master_time[addr] = now
+
     def can_handle_path(self, path):
         return _SSH_URI_RE.match(path) is not None
 
     def du(self, path_glob):
-        raise IOError()  # not implemented
+        return sum(item['size'] for item in self.ls_detailed(path_glob))
 
     def ls(self, path_glob):
         if _SSH_URI_RE.match(path_glob):
@@ -71,6 +179,37 @@ class SSHFilesystem(Filesystem):
                 yield item
             return
 
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, but yield dictionaries with *uri*, *size*,
+        and *mtime*, all from a single ``find`` command. *checksum* is
+        always ``None``.
+
+        .. versionadded:: 0.5.8
+        """
+        m = _SSH_URI_RE.match(path_glob)
+        if not m:
+            return
+
+        addr = m.group('hostname')
+        if not addr:
+            raise ValueError
+
+        keyfile = self._key_filename_for(addr)
+
+        output = _ssh_ls_detailed(
+            self._ssh_bin,
+            addr,
+            self._ec2_key_pair_file,
+            m.group('filesystem_path'),
+            keyfile,
+            sudo=self._sudo,
+            control_dir=self._ssh_control_dir(addr),
+        )
+
+        for path, size, mtime in output:
+            yield dict(uri='ssh://' + addr + path, size=size, mtime=mtime,
+                       checksum=None)
+
     def _key_filename_for(self, addr):
         """If *addr* is a !-separated pair of hosts like ``master!slave``,
         get the name of the copy of our keypair file on ``master``. If there
@@ -83,15 +222,17 @@ class SSHFilesystem(Filesystem):
 
         host = addr.split('!')[0]
 
-        if host not in self._host_to_key_filename:
-            # copy the key if we haven't already
-            keyfile = 'mrjob-%s.pem' % random_identifier()
-            _ssh_copy_key(
-                self._ssh_bin, host, self._ec2_key_pair_file, keyfile)
-            # don't set above; _ssh_copy_key() may throw an IOError
-            self._host_to_key_filename[host] = keyfile
+        with self._lock:
+            if host not in self._host_to_key_filename:
+                # copy the key if we haven't already
+                keyfile = 'mrjob-%s.pem' % random_identifier()
+                _ssh_copy_key(
+                    self._ssh_bin, host, self._ec2_key_pair_file, keyfile,
+                    control_dir=self._ssh_control_dir(host))
+                # don't set above; _ssh_copy_key() may throw an IOError
+                self._host_to_key_filename[host] = keyfile
 
-        return self._host_to_key_filename[host]
+            return self._host_to_key_filename[host]
 
     def _ssh_ls(self, uri):
         """Helper for ls(); obeys globbing"""
@@ -109,6 +250,7 @@ class SSHFilesystem(Filesystem):
             m.group('filesystem_path'),
             keyfile,
             sudo=self._sudo,
+            control_dir=self._ssh_control_dir(addr),
         )
 
         for line in output:
@@ -116,6 +258,42 @@ class SSHFilesystem(Filesystem):
             if line and not line.endswith('/'):
                 yield 'ssh://' + addr + line
 
+    def cat(self, path_glob):
+        """Like :py:meth:`~mrjob.fs.base.Filesystem.cat`, except that we
+        fetch all the matching files with one remote ``tar`` command,
+        rather than listing them and then running ``cat`` on each.
+
+        .. versionadded:: 0.5.8
+        """
+        m = _SSH_URI_RE.match(path_glob)
+        addr = m.group('hostname')
+        if not addr:
+            raise ValueError
+
+        keyfile = self._key_filename_for(addr)
+
+        try:
+            files = _ssh_tar(
+                self._ssh_bin,
+                addr,
+                self._ec2_key_pair_file,
+                m.group('filesystem_path'),
+                keyfile,
+                sudo=self._sudo,
+                control_dir=self._ssh_control_dir(addr),
+            )
+        except IOError as e:
+            # maybe there's no (GNU) tar; do it the slow way
+            log.debug('Falling back on ls and cat: %s' % e)
+            for line in super(SSHFilesystem, self).cat(path_glob):
+                yield line
+            return
+
+        for path, data in files:
+            uri = 'ssh://' + addr + path
+            for line in read_file(uri, fileobj=BytesIO(data)):
+                yield line
+
     def md5sum(self, path):
         raise IOError()  # not implemented
 
@@ -132,6 +310,7 @@ class SSHFilesystem(Filesystem):
             ssh_match.group('filesystem_path'),
             keyfile,
             sudo=self._sudo,
+            control_dir=self._ssh_control_dir(addr),
         )
         return read_file(filename, fileobj=BytesIO(output))
 
@@ -155,7 +334,8 @@ class SSHFilesystem(Filesystem):
         """Get a list of the slave hosts reachable through *hosts*"""
         if force or host not in self._host_to_slave_hosts:
             self._host_to_slave_hosts[host] = _ssh_slave_addresses(
-                self._ssh_bin, host, self._ec2_key_pair_file)
+                self._ssh_bin, host, self._ec2_key_pair_file,
+                control_dir=self._ssh_control_dir(host))
 
         return self._host_to_slave_hosts[host]
 
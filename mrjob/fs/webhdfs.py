@@ -0,0 +1,512 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Talk to HDFS through the namenode's WebHDFS REST API, rather than
+starting a ``hadoop fs`` JVM for every operation."""
+import errno
+import fnmatch
+import getpass
+import json
+import logging
+import os
+import os.path
+import posixpath
+import re
+import socket
+import threading
+
+try:
+    from http.client import HTTPConnection
+    from http.client import HTTPException
+    from http.client import HTTPSConnection
+except ImportError:
+    from httplib import HTTPConnection
+    from httplib import HTTPException
+    from httplib import HTTPSConnection
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+from mrjob.fs.base import Filesystem
+from mrjob.fs.globbing import _WILDCARD_RE
+from mrjob.py2 import quote
+from mrjob.py2 import to_string
+from mrjob.py2 import urlparse
+from mrjob.util import read_file
+
+log = logging.getLogger(__name__)
+
+# every WebHDFS path starts with this
+_WEBHDFS_PATH_PREFIX = '/webhdfs/v1'
+
+# OPEN and CREATE redirect us from the namenode to a datanode
+_REDIRECT_STATUSES = (301, 302, 303, 307)
+
+# how many bytes to read from a response at a time in _cat_file()
+_READ_BUFSIZE = 1024 * 1024
+
+# seconds to wait for the namenode or a datanode to respond
+_DEFAULT_TIMEOUT = 60.0
+
+
+class WebHDFSFilesystem(Filesystem):
+    """Filesystem for ``hdfs://`` URIs that uses the namenode's WebHDFS
+    REST API rather than invoking ``hadoop fs``. Each operation is one or
+    a few HTTP requests over connections we keep open, rather than a new
+    JVM.
+
+    We handle ``hdfs:///`` URIs (no host) and ``hdfs://`` URIs whose host
+    is the namenode at *webhdfs_url* (with any port); URIs on other
+    clusters are left to :py:class:`~mrjob.fs.hadoop.HadoopFilesystem`.
+    Globs support the same wildcards as :py:mod:`fnmatch` (no ``{a,b}``).
+
+    Typically you get one of these through ``HadoopJobRunner().fs`` by
+    setting :mrjob-opt:`webhdfs_url`; it's composed with
+    :py:class:`~mrjob.fs.hadoop.HadoopFilesystem`, which still handles
+    other URIs and invoking ``hadoop``.
+
+    .. versionadded:: 0.5.8
+    """
+    def __init__(self, webhdfs_url, user=None, timeout=_DEFAULT_TIMEOUT):
+        """
+        :param webhdfs_url: base URL of the namenode's web server (e.g.
+                            ``http://namenode:50070``)
+        :param user: user to act as (``user.name``). Defaults to
+                     ``$HADOOP_USER_NAME``, or the current user, like
+                     ``hadoop fs`` does.
+        :param timeout: socket timeout, in seconds
+        """
+        super(WebHDFSFilesystem, self).__init__()
+
+        parsed = urlparse(webhdfs_url)
+        scheme, netloc = parsed[:2]
+        if scheme not in ('http', 'https') or not netloc:
+            raise ValueError('Bad WebHDFS URL: %r' % webhdfs_url)
+
+        self._scheme = scheme
+        self._netloc = netloc
+        self._host = parsed.hostname
+        self._user = (user or os.environ.get('HADOOP_USER_NAME') or
+                      getpass.getuser())
+        self._timeout = timeout
+
+        # map from (scheme, netloc) to list of idle connections. Guarded
+        # by self._lock, so one filesystem can be shared between threads
+        self._idle_conns = {}
+        self._lock = threading.Lock()
+
+    def can_handle_path(self, path):
+        if not path.startswith('hdfs://'):
+            return False
+
+        # the namenode's RPC port (in the URI) differs from its web port,
+        # so just compare hosts
+        netloc = path[len('hdfs://'):].partition('/')[0]
+        return not netloc or (
+            netloc.rpartition(':')[0] or netloc).lower() == self._host
+
+    ### connections ###
+
+    def _get_conn(self, scheme, netloc):
+        """Get an idle connection to *netloc*, or open a new one.
+        Returns ``(conn, is_reused)``."""
+        with self._lock:
+            idle = self._idle_conns.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+
+        if scheme == 'https':
+            return HTTPSConnection(netloc, timeout=self._timeout), False
+        else:
+            return HTTPConnection(netloc, timeout=self._timeout), False
+
+    def _release_conn(self, scheme, netloc, conn, resp):
+        """Put *conn* back in the pool once we've read all of *resp*
+        (or close it, if the server won't keep it open)."""
+        if resp.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle_conns.setdefault((scheme, netloc), []).append(conn)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            all_conns = [c for conns in self._idle_conns.values()
+                         for c in conns]
+            self._idle_conns.clear()
+
+        for conn in all_conns:
+            conn.close()
+
+    def _send(self, method, url, body=None, headers=None):
+        """Send a request to *url*, and return ``(conn, resp)``. The caller
+        must read *resp* and then pass both to :py:meth:`_release_conn`.
+
+        If a connection from the pool turns out to have been closed by the
+        server, we try the next one (and eventually a new connection).
+        """
+        scheme, netloc, path, params, query = urlparse(url)[:5]
+        if query:
+            path += '?' + query
+
+        while True:
+            conn, is_reused = self._get_conn(scheme, netloc)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                return conn, conn.getresponse()
+            except (HTTPException, socket.error):
+                conn.close()
+                if not is_reused:
+                    raise
+                # stale connection; rewind body and try a fresh one
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+
+    def _read_response(self, method, url, body=None, headers=None):
+        """Send a request, and return ``(status, location, body)``."""
+        scheme, netloc = urlparse(url)[:2]
+
+        conn, resp = self._send(method, url, body=body, headers=headers)
+        try:
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+
+        self._release_conn(scheme, netloc, conn, resp)
+
+        return resp.status, resp.getheader('Location'), data
+
+    ### WebHDFS calls ###
+
+    def _op_url(self, path, op, **params):
+        """Build the namenode URL for *op* on the HDFS path *path*"""
+        params['op'] = op
+        params['user.name'] = self._user
+
+        return '%s://%s%s%s?%s' % (
+            self._scheme, self._netloc, _WEBHDFS_PATH_PREFIX,
+            quote(path), urlencode(sorted(params.items())))
+
+    def _call(self, method, path, op, **params):
+        """Call a WebHDFS operation that returns JSON, and return the
+        decoded result. Raises :py:class:`IOError` if the operation
+        fails (with *errno* set to ``ENOENT`` if the file isn't found).
+        """
+        status, _, data = self._read_response(
+            method, self._op_url(path, op, **params))
+
+        _check_status(status, data, op, path)
+
+        if data:
+            return json.loads(to_string(data))
+        else:
+            return {}
+
+    def _call_with_redirect(self, method, path, op, body=None, headers=None,
+                            **params):
+        """Call an operation that the namenode redirects to a datanode
+        (``OPEN``, ``CREATE``). Returns ``(scheme, netloc, conn, resp)``
+        for the datanode's response, which the caller must read.
+
+        We don't send *body* to the namenode, since it would just be
+        thrown away."""
+        status, location, data = self._read_response(
+            method, self._op_url(path, op, **params))
+
+        if status not in _REDIRECT_STATUSES or not location:
+            _check_status(status, data, op, path)
+            raise IOError('Expected redirect for %s %s, got HTTP status'
+                          ' %d' % (op, path, status))
+
+        scheme, netloc = urlparse(location)[:2]
+        conn, resp = self._send(method, location, body=body, headers=headers)
+
+        if resp.status >= 400:
+            try:
+                data = resp.read()
+            finally:
+                conn.close()
+            _check_status(resp.status, data, op, path)
+
+        return scheme, netloc, conn, resp
+
+    def _get_file_status(self, path):
+        """Return the ``FileStatus`` dictionary for *path*, or ``None``
+        if it doesn't exist."""
+        try:
+            return self._call('GET', path, 'GETFILESTATUS')['FileStatus']
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+    def _list_status(self, path):
+        """Return a list of ``FileStatus`` dictionaries for the contents of
+        the directory *path*, or ``[]`` if it doesn't exist."""
+        try:
+            return self._call('GET', path, 'LISTSTATUS')[
+                'FileStatuses']['FileStatus']
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return []
+            raise
+
+    ### globbing ###
+
+    def _glob(self, path_glob):
+        """Yield ``(path, status)`` for each file or directory matching
+        *path_glob*, an absolute HDFS path.
+
+        We only list the directories that wildcards appear in.
+        """
+        matches = [('/', None)]  # (path, status, if we know it)
+
+        for part in path_glob.split('/'):
+            if not part:
+                continue
+
+            if not _WILDCARD_RE.search(part):
+                matches = [(posixpath.join(path, part), None)
+                           for path, status in matches
+                           if _is_dir_or_unknown(status)]
+                continue
+
+            part_re = re.compile(fnmatch.translate(part))
+
+            new_matches = []
+            for path, status in matches:
+                if not _is_dir_or_unknown(status):
+                    continue
+
+                for child in self._list_status(path):
+                    # LISTSTATUS on a file returns that file, with no name
+                    name = child['pathSuffix']
+                    if name and part_re.match(name):
+                        new_matches.append(
+                            (posixpath.join(path, name), child))
+
+            matches = new_matches
+
+        for path, status in matches:
+            if status is None:
+                status = self._get_file_status(path)
+            if status is not None:
+                yield path, status
+
+    def _walk(self, path, status):
+        """Yield ``(path, status)`` for *path* if it's a file, or every file
+        inside it, if it's a directory."""
+        if status['type'] != 'DIRECTORY':
+            yield path, status
+            return
+
+        for child in self._list_status(path):
+            name = child['pathSuffix']
+            if name:
+                for item in self._walk(posixpath.join(path, name), child):
+                    yield item
+
+    ### Filesystem interface ###
+
+    def du(self, path_glob):
+        """Get the size of a file or directory (recursively), or 0
+        if it doesn't exist."""
+        prefix, path_glob = _split_hdfs_uri(path_glob)
+
+        total = 0
+
+        for path, status in self._glob(path_glob):
+            if status['type'] == 'DIRECTORY':
+                total += self._call('GET', path, 'GETCONTENTSUMMARY')[
+                    'ContentSummary']['length']
+            else:
+                total += status['length']
+
+        return total
+
+    def ls(self, path_glob):
+        for item in self.ls_detailed(path_glob):
+            yield item['uri']
+
+    def ls_detailed(self, path_glob):
+        """Like :py:meth:`ls`, but yield dictionaries with *uri*, *size*,
+        and *mtime* (to the millisecond). *checksum* is always ``None``.
+        """
+        prefix, path_glob = _split_hdfs_uri(path_glob)
+
+        for match_path, match_status in self._glob(path_glob):
+            for path, status in self._walk(match_path, match_status):
+                yield dict(uri=prefix + path,
+                           size=status['length'],
+                           mtime=status['modificationTime'] / 1000.0,
+                           checksum=None)
+
+    def _cat_file(self, filename):
+        prefix, path = _split_hdfs_uri(filename)
+
+        scheme, netloc, conn, resp = self._call_with_redirect(
+            'GET', path, 'OPEN', buffersize=_READ_BUFSIZE)
+
+        reader = _ResponseReader(resp)
+
+        def cleanup():
+            if reader.eof:
+                self._release_conn(scheme, netloc, conn, resp)
+            else:
+                # don't reuse a connection with unread data on it
+                conn.close()
+
+        for line in read_file(
+                filename, reader, yields_lines=False, cleanup=cleanup):
+            yield line
+
+    def mkdir(self, path):
+        prefix, path = _split_hdfs_uri(path)
+
+        if not self._call('PUT', path, 'MKDIRS').get('boolean'):
+            raise IOError('Could not mkdir %s' % path)
+
+    def exists(self, path_glob):
+        """Does the given path exist?
+
+        If dest is a directory (ends with a "/"), we check if there are
+        any files starting with that path.
+        """
+        prefix, path_glob = _split_hdfs_uri(path_glob)
+
+        for _ in self._glob(path_glob):
+            return True
+        else:
+            return False
+
+    def _put(self, local_path, target):
+        # used by HadoopMRJobRunner._upload_to_hdfs()
+        if not self.can_handle_path(target):
+            raise IOError("Can't handle path: %s" % target)
+
+        prefix, path = _split_hdfs_uri(target)
+
+        headers = {
+            'Content-Length': str(os.path.getsize(local_path)),
+            'Content-Type': 'application/octet-stream',
+        }
+
+        with open(local_path, 'rb') as f:
+            self._create(path, f, headers)
+
+    def _create(self, path, body, headers):
+        """Create a file at *path* (which must not exist already)"""
+        scheme, netloc, conn, resp = self._call_with_redirect(
+            'PUT', path, 'CREATE', body=body, headers=headers,
+            overwrite='false')
+
+        try:
+            resp.read()
+        except Exception:
+            conn.close()
+            raise
+
+        self._release_conn(scheme, netloc, conn, resp)
+
+    def rm(self, path_glob):
+        if not self.can_handle_path(path_glob):
+            return super(WebHDFSFilesystem, self).rm(path_glob)
+
+        prefix, path_glob = _split_hdfs_uri(path_glob)
+
+        if _WILDCARD_RE.search(path_glob):
+            paths = [path for path, _ in self._glob(path_glob)]
+        else:
+            paths = [path_glob]  # no need to check that it exists
+
+        for path in paths:
+            self._call('DELETE', path, 'DELETE', recursive='true')
+
+    def touchz(self, dest):
+        prefix, path = _split_hdfs_uri(dest)
+
+        status = self._get_file_status(path)
+
+        if status is None:
+            self._create(path, b'', {'Content-Length': '0'})
+        elif status['type'] == 'DIRECTORY' or status['length']:
+            raise IOError('Non-empty file %r already exists!' % (dest,))
+
+
+class _ResponseReader(object):
+    """Wrap an HTTP response so that iterating over it yields chunks of
+    bytes (:py:class:`httplib.HTTPResponse` isn't iterable on Python 2),
+    and keep track of whether we read all of it."""
+
+    def __init__(self, resp, bufsize=_READ_BUFSIZE):
+        self._resp = resp
+        self._bufsize = bufsize
+        self.eof = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._resp.read()
+        else:
+            data = self._resp.read(size)
+
+        if not data or size is None or size < 0:
+            self.eof = True
+
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self._bufsize)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _split_hdfs_uri(uri):
+    """Split an ``hdfs://`` URI (which may be a glob) into the
+    ``hdfs://netloc`` prefix and an absolute path.
+
+    We can't use :py:func:`~mrjob.parse.urlparse` because it treats ``?``
+    as the start of a query string."""
+    scheme, rest = uri.split('://', 1)
+    netloc, _, path = rest.partition('/')
+    return '%s://%s' % (scheme, netloc), '/' + path
+
+
+def _is_dir_or_unknown(status):
+    return status is None or status['type'] == 'DIRECTORY'
+
+
+def _check_status(status, data, op, path):
+    """Raise :py:class:`IOError` if *status* is an error, using the
+    ``RemoteException`` in *data*, if there is one."""
+    if status < 400:
+        return
+
+    try:
+        remote_exception = json.loads(to_string(data))['RemoteException']
+        message = '%s: %s' % (remote_exception.get('exception'),
+                              remote_exception.get('message'))
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+        message = 'HTTP status %d' % status
+
+    message = '%s %s failed: %s' % (op, path, message)
+
+    if status == 404:
+        raise IOError(errno.ENOENT, message)
+    else:
+        raise IOError(message)
@@ -29,9 +29,11 @@ except ImportError:
 from mrjob.compat import translate_jobconf
 from mrjob.compat import uses_yarn
 from mrjob.conf import combine_dicts
+from mrjob.fs.asyncfs import AsyncFilesystem
 from mrjob.fs.composite import CompositeFilesystem
 from mrjob.fs.hadoop import HadoopFilesystem
 from mrjob.fs.local import LocalFilesystem
+from mrjob.fs.webhdfs import WebHDFSFilesystem
 from mrjob.logs.counters import _format_counters
 from mrjob.logs.counters import _pick_counters
 from mrjob.logs.errors import _format_error
@@ -190,9 +192,16 @@ class HadoopJobRunner(MRJobRunner, LogInterpretationMixin):
         filesystem.
         """
         if self._fs is None:
+            self._hadoop_fs = HadoopFilesystem(self._opts['hadoop_bin'])
+            filesystems = [self._hadoop_fs, LocalFilesystem()]
+
+            # handle hdfs:// URIs over HTTP, without a JVM per operation
+            if self._opts['webhdfs_url']:
+                filesystems.insert(
+                    0, WebHDFSFilesystem(self._opts['webhdfs_url']))
+
             self._fs = CompositeFilesystem(
-                HadoopFilesystem(self._opts['hadoop_bin']),
-                LocalFilesystem())
+                *filesystems, cache_secs=self._opts['fs_cache_secs'])
         return self._fs
 
     def get_hadoop_version(self):
@@ -374,14 +383,43 @@ class HadoopJobRunner(MRJobRunner, LogInterpretationMixin):
     def _check_input_exists(self):
         """Make sure all input exists before continuing with our job.
         """
-        for path in self._input_paths:
-            if path == '-':
-                continue  # STDIN always exists
+        if not self._opts['check_input_paths']:
+            return
 
-            if self._opts['check_input_paths']:
-                if not self.fs.exists(path):
-                    raise AssertionError(
-                        'Input path %s does not exist!' % (path,))
+        # STDIN always exists
+        paths = [path for path in self._input_paths if path != '-']
+
+        for path, exists in zip(paths, self._exists_many(paths)):
+            if not exists:
+                raise AssertionError(
+                    'Input path %s does not exist!' % (path,))
+
+    def _uses_hadoop_fs(self, path):
+        """Is *path* handled by the ``hadoop`` binary (as opposed to
+        WebHDFS or the local filesystem)?"""
+        for fs in self.fs.filesystems:
+            if fs.can_handle_path(path):
+                return fs is self._hadoop_fs
+        return False
+
+    def _exists_many(self, paths):
+        """Check if each of *paths* exists, using a single ``hadoop fs``
+        command for all the paths the ``hadoop`` binary handles."""
+        hadoop_paths = [p for p in paths if self._uses_hadoop_fs(p)]
+
+        hadoop_paths_exist = {}
+        if hadoop_paths:
+            hadoop_paths_exist = dict(zip(
+                hadoop_paths, self._hadoop_fs._exists_many(hadoop_paths)))
+
+        # check everything else (local paths, WebHDFS) concurrently
+        with AsyncFilesystem(self.fs) as async_fs:
+            other_paths_exist = dict(
+                (p, async_fs.exists(p)) for p in paths
+                if p not in hadoop_paths_exist)
+
+            return [hadoop_paths_exist[p] if p in hadoop_paths_exist
+                    else other_paths_exist[p].result() for p in paths]
 
     def _add_job_files_for_upload(self):
         """Add files needed for running the job (setup and input)
@@ -398,6 +436,16 @@ class HadoopJobRunner(MRJobRunner, LogInterpretationMixin):
         self.fs.mkdir(self._upload_mgr.prefix)
 
         log.info('Copying local files to %s...' % self._upload_mgr.prefix)
+
+        # start one JVM for all the uploads, not one per file
+        if self._uses_hadoop_fs(self._upload_mgr.prefix):
+            paths_and_uris = sorted(self._upload_mgr.path_to_uri().items())
+            for path, uri in paths_and_uris:
+                log.debug('  %s -> %s' % (path, uri))
+            self._hadoop_fs._put_many(paths_and_uris)
+            self.fs.clear_cache()
+            return
+
         for path, uri in self._upload_mgr.path_to_uri().items():
             self._upload_to_hdfs(path, uri)
 
@@ -475,6 +523,9 @@ class HadoopJobRunner(MRJobRunner, LogInterpretationMixin):
                                 record_callback=_log_record_from_hadoop))
                         _, returncode = os.waitpid(pid, 0)
 
+            # the step wrote new output and logs
+            self.fs.clear_cache()
+
             # make sure output_dir is filled
             if 'output_dir' not in step_interpretation:
                 step_interpretation['output_dir'] = (
@@ -18,11 +18,13 @@ process. Useful for debugging."""
 import logging
 import os
 from io import BytesIO
-from shutil import copyfile
 
 from mrjob.job import MRJob
 from mrjob.parse import parse_mr_job_stderr
 from mrjob.sim import SimMRJobRunner
+from mrjob.sim import _copy_range
+from mrjob.sim import _is_compressed
+from mrjob.util import read_input
 from mrjob.util import save_current_environment
 from mrjob.util import save_cwd
 
@@ -111,13 +113,21 @@ class InlineMRJobRunner(SimMRJobRunner):
 
         return self._steps
 
-    def _run_step(self, step_num, step_type, input_path, output_path,
+    def _run_step(self, step_num, step_type, input_paths, output_path,
                   working_dir, env, child_stdin=None):
         step = self._get_step(step_num)
 
         # if no mapper, just pass the data through (see #1141)
         if step_type == 'mapper' and not step.get('mapper'):
-            copyfile(input_path, output_path)
+            with open(output_path, 'wb') as output:
+                for input_path in input_paths:
+                    if _is_compressed(input_path):
+                        for line in read_input(input_path):
+                            output.write(line)
+                    else:
+                        with open(input_path, 'rb') as f:
+                            _copy_range(f, output, 0,
+                                        os.fstat(f.fileno()).st_size)
             return
 
         # Passing local=False ensures the job uses proper names for file
@@ -127,10 +137,10 @@ class InlineMRJobRunner(SimMRJobRunner):
 
         if step_type == 'mapper':
             child_args = (
-                ['--mapper'] + [input_path] + common_args)
+                ['--mapper'] + input_paths + common_args)
         elif step_type == 'reducer':
             child_args = (
-                ['--reducer'] + [input_path] + common_args)
+                ['--reducer'] + input_paths + common_args)
         elif step_type == 'combiner':
             child_args = ['--combiner'] + common_args + ['-']
 
@@ -25,6 +25,7 @@ import sys
 from optparse import OptionGroup
 
 # don't use relative imports, to allow this script to be invoked as __main__
+from mrjob.compat import translate_jobconf_for_all_versions
 from mrjob.conf import combine_dicts
 from mrjob.conf import combine_lists
 from mrjob.launch import MRJobLauncher
@@ -693,9 +694,36 @@ class MRJob(MRJobLauncher):
         """
         paths = self.args or ['-']
         for path in paths:
+            if len(paths) > 1 and path != '-':
+                self._set_input_file_in_env(path)
+
             for line in read_input(path, stdin=self.stdin):
                 yield line
 
+    def _set_input_file_in_env(self, path):
+        """Update ``mapreduce.map.input.file`` (and ``.start`` and
+        ``.length``) in the environment, so that mappers reading several
+        files (small files packed together by the sim runners) can tell
+        which one they're on.
+
+        We only update variables that are already set, so this does
+        nothing outside the sim runners.
+        """
+        if not os.path.isfile(path):
+            return
+
+        values = {
+            'mapreduce.map.input.file': path,
+            'mapreduce.map.input.start': '0',
+            'mapreduce.map.input.length': str(os.path.getsize(path)),
+        }
+
+        for name, value in values.items():
+            for variant in translate_jobconf_for_all_versions(name):
+                env_var = variant.replace('.', '_')
+                if env_var in os.environ:
+                    os.environ[env_var] = value
+
     def _wrap_protocols(self, step_num, step_type):
         """Pick the protocol classes to use for reading and writing
         for the given step, and wrap them so that bad input and output
@@ -997,9 +1025,19 @@ class MRJob(MRJobLauncher):
             runner.run()
             for line in runner.stream_output():
                 key, value = mr_job.parse_output_line(line)
+
+        (or just use :py:meth:`~mrjob.runner.MRJobRunner.cat_output`)
         """
         return self.output_protocol().read(line)
 
+    def _job_kwargs(self):
+        """Pass our output protocol to the runner, so that
+        :py:meth:`~mrjob.runner.MRJobRunner.cat_output` can decode
+        our output."""
+        return combine_dicts(
+            super(MRJob, self)._job_kwargs(),
+            dict(output_protocol=self.output_protocol()))
+
     ### Hadoop Input/Output Formats ###
 
     #: Optional name of an optional Hadoop ``InputFormat`` class, e.g.
@@ -73,6 +73,21 @@ def _chain_procs(procs_args, **kwargs):
     return procs
 
 
+def _cat_args(paths):
+    """Command to write the (decompressed) contents of *paths* to stdout,
+    for mappers that read from stdin. *paths* should all be compressed
+    the same way (see :py:meth:`~mrjob.sim.SimMRJobRunner._get_file_splits`).
+    """
+    if paths[0].endswith('.gz'):
+        return ['gzip', '-dc'] + paths
+    elif paths[0].endswith('.bz2'):
+        return ['bzip2', '-dc'] + paths
+    elif paths[0].endswith('.xz'):
+        return ['xz', '-dc'] + paths
+    else:
+        return ['cat'] + paths
+
+
 class LocalMRJobRunner(SimMRJobRunner):
     """Runs an :py:class:`~mrjob.job.MRJob` locally, for testing purposes.
     Invoked when you run your job with ``-r local``.
@@ -116,16 +131,16 @@ class LocalMRJobRunner(SimMRJobRunner):
         # running the job)
         self._internal_jobconf = {}
 
-    def _run_step(self, step_num, step_type, input_path, output_path,
+    def _run_step(self, step_num, step_type, input_paths, output_path,
                   working_dir, env):
         step = self._get_step(step_num)
 
         if step_type == 'mapper':
             procs_args = self._mapper_arg_chain(
-                step, step_num, input_path)
+                step, step_num, input_paths)
         elif step_type == 'reducer':
             procs_args = self._reducer_arg_chain(
-                step, step_num, input_path)
+                step, step_num, input_paths)
 
         proc_dicts = self._invoke_processes(
             procs_args, output_path, working_dir, env)
@@ -143,30 +158,30 @@ class LocalMRJobRunner(SimMRJobRunner):
                 return shlex_split(substep_dict['pre_filter'])
         return None
 
-    def _substep_args(self, step_dict, step_num, mrc, input_path=None):
+    def _substep_args(self, step_dict, step_num, mrc, input_paths=None):
         if step_dict['type'] != 'streaming':
             raise Exception("LocalMRJobRunner cannot run %s steps." %
                             step_dict['type'])
         if step_dict[mrc]['type'] == 'command':
-            if input_path is None:
+            if input_paths is None:
                 return [shlex_split(step_dict[mrc]['command'])]
             else:
                 return [
-                    ['cat', input_path],
+                    _cat_args(input_paths),
                     shlex_split(step_dict[mrc]['command'])]
         if step_dict[mrc]['type'] == 'script':
             args = self._script_args_for_step(step_num, mrc)
-            if input_path is None:
+            if input_paths is None:
                 return [args]
             else:
-                return [args + [input_path]]
+                return [args + input_paths]
 
-    def _substep_arg_chain(self, mrc, step_dict, step_num, input_path):
+    def _substep_arg_chain(self, mrc, step_dict, step_num, input_paths):
         procs_args = []
 
         filter_args = self._filter_if_any(step_dict[mrc])
         if filter_args:
-            procs_args.append(['cat', input_path])
+            procs_args.append(_cat_args(input_paths))
             procs_args.append(filter_args)
             # _substep_args may return more than one process
             procs_args.extend(
@@ -174,10 +189,10 @@ class LocalMRJobRunner(SimMRJobRunner):
         else:
             # _substep_args may return more than one process
             procs_args.extend(
-                self._substep_args(step_dict, step_num, mrc, input_path))
+                self._substep_args(step_dict, step_num, mrc, input_paths))
         return procs_args
 
-    def _mapper_arg_chain(self, step_dict, step_num, input_path):
+    def _mapper_arg_chain(self, step_dict, step_num, input_paths):
         # sometimes the mapper isn't actually there, so if it isn't, use cat
         if 'mapper' not in step_dict:
             new_step_dict = {
@@ -190,7 +205,7 @@ class LocalMRJobRunner(SimMRJobRunner):
             step_dict = new_step_dict
 
         procs_args = self._substep_arg_chain(
-            'mapper', step_dict, step_num, input_path)
+            'mapper', step_dict, step_num, input_paths)
 
         if 'combiner' in step_dict:
             procs_args.append(['sort'])
@@ -212,9 +227,9 @@ class LocalMRJobRunner(SimMRJobRunner):
             self._substep_args(step_dict, step_num, 'combiner'))
         return procs_args
 
-    def _reducer_arg_chain(self, step_dict, step_num, input_path):
+    def _reducer_arg_chain(self, step_dict, step_num, input_paths):
         return self._substep_arg_chain(
-            'reducer', step_dict, step_num, input_path)
+            'reducer', step_dict, step_num, input_paths)
 
     def _invoke_processes(self, procs_args, output_path, working_dir, env):
         """invoke the process described by *args* and write to *output_path*
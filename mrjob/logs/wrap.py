@@ -16,11 +16,16 @@
 from logging import getLogger
 
 from mrjob.py2 import to_string
+from mrjob.util import _thread_map
 
 from .ids import _sort_by_recency
 
 log = getLogger(__name__)
 
+# how many log dirs (e.g. the same dir on each node of a cluster) to
+# list at once
+_MAX_LS_THREADS = 20
+
 
 def _cat_log(fs, path):
     """fs.cat() the given log, converting lines to strings, and logging
@@ -53,24 +58,30 @@ def _ls_logs(fs, log_dir_stream, matcher, **kwargs):
     and returns either None (no match) or a dictionary with information
     about the path (e.g. the corresponding job_id). It's okay to return
     an empty dict.
+
+    The log dirs in each list are listed in parallel (this matters when
+    they're on different nodes, accessed via SSH).
     """
     # wrapper for fs.ls() that turns IOErrors into warnings
-    def _fs_ls(path):
+    def _fs_ls(log_dir):
+        paths = []
         try:
             if fs.exists(log_dir):
                 for path in fs.ls(log_dir):
-                    yield path
+                    paths.append(path)
         except (IOError, OSError) as e:
             log.warning("couldn't ls() %s: %r" % (log_dir, e))
 
+        return paths
+
     for log_dirs in log_dir_stream:
         if isinstance(log_dirs, str):
             raise TypeError
 
         matches = []
 
-        for log_dir in log_dirs:
-            for path in _fs_ls(log_dir):
+        for paths in _thread_map(_fs_ls, log_dirs, _MAX_LS_THREADS):
+            for path in paths:
                 m = matcher(path, **kwargs)
                 if m is not None:
                     m['path'] = path
@@ -425,20 +425,44 @@ _RUNNER_OPTS = dict(
             )),
         ],
     ),
+    cloud_upload_cache_dir=dict(
+        cloud_role='launch',
+        combiner=combine_paths,
+        runners=['dataproc', 'emr'],
+        switches=[
+            (['--cloud-upload-cache-dir'], dict(
+                help=('URI on remote FS to upload local files into by'
+                      ' their MD5 sum, so that files that haven\'t changed'
+                      ' since a previous job are not uploaded again.'
+                      ' By default, we upload into our temp directory.'),
+            )),
+        ],
+    ),
     cloud_upload_part_size=dict(
         cloud_role='launch',
         deprecated_aliases=['s3_upload_part_size'],
-        runners=['emr'],
+        runners=['dataproc', 'emr'],
         switches=[
             (['--cloud-upload-part-size'], dict(
                 deprecated_aliases=['--s3-upload-part-size'],
-                help=('Upload files to S3 in parts no bigger than this many'
-                      ' megabytes. Default is 100 MiB. Set to 0 to disable'
-                      ' multipart uploading entirely.'),
+                help=('Upload files to S3 or GCS in parts no bigger than'
+                      ' this many megabytes. Default is 100 MiB. Set to 0'
+                      ' to disable uploading in parts entirely.'),
                 type='float',
             )),
         ],
     ),
+    cloud_upload_threads=dict(
+        cloud_role='launch',
+        runners=['dataproc', 'emr'],
+        switches=[
+            (['--cloud-upload-threads'], dict(
+                help=('How many files (or parts of files) to upload at'
+                      ' once. Default is 4.'),
+                type='int',
+            )),
+        ],
+    ),
     cluster_id=dict(
         deprecated_aliases=['emr_job_flow_id'],
         runners=['dataproc', 'emr'],
@@ -588,6 +612,17 @@ _RUNNER_OPTS = dict(
             )),
         ],
     ),
+    fs_cache_secs=dict(
+        runners=['emr', 'hadoop'],
+        switches=[
+            (['--fs-cache-secs'], dict(
+                help=('Remember whether paths exist and what files are in'
+                      ' them for this many seconds, rather than asking the'
+                      ' (remote) filesystem again. By default, we don\'t'),
+                type='float',
+            )),
+        ],
+    ),
     gcp_project=dict(
         runners=['dataproc'],
         switches=[
@@ -778,6 +813,41 @@ _RUNNER_OPTS = dict(
         deprecated_aliases=['base_tmp_dir'],
         # no switches, use $TMPDIR etc.
     ),
+    local_archive_cache_dir=dict(
+        cloud_role='launch',
+        combiner=combine_paths,
+        switches=[
+            (['--local-archive-cache-dir'], dict(
+                help=('Keep archives we build (e.g. mrjob.zip) in this'
+                      ' directory, so that later jobs can re-use them'
+                      ' rather than building them again.'),
+            )),
+        ],
+    ),
+    local_gzip_index_dir=dict(
+        combiner=combine_paths,
+        runners=['inline', 'local'],
+        switches=[
+            (['--local-gzip-index-dir'], dict(
+                help=('Cache the index of members of each multi-member'
+                      ' .gz input file in this directory, so that later'
+                      ' jobs can split it without decompressing it'
+                      ' again.'),
+            )),
+        ],
+    ),
+    local_md5_cache=dict(
+        cloud_role='launch',
+        combiner=combine_paths,
+        runners=['dataproc', 'emr'],
+        switches=[
+            (['--local-md5-cache'], dict(
+                help=("Remember the MD5 sum of each local file we upload"
+                      " in this (JSON) file, so that later jobs can skip"
+                      " re-reading files that haven't changed."),
+            )),
+        ],
+    ),
     master_instance_bid_price=dict(
         cloud_role='launch',
         deprecated_aliases=['ec2_master_instance_bid_price'],
@@ -977,6 +1047,19 @@ _RUNNER_OPTS = dict(
             )),
         ],
     ),
+    s3_region_cache=dict(
+        cloud_role='connect',
+        combiner=combine_paths,
+        runners=['emr'],
+        switches=[
+            (['--s3-region-cache'], dict(
+                help=("Remember the location of each S3 bucket in this"
+                      " (JSON) file, so that later jobs can skip looking"
+                      " it up. By default, we only remember bucket"
+                      " locations while mrjob is running."),
+            )),
+        ],
+    ),
     setup=dict(
         combiner=combine_lists,
         switches=[
@@ -1226,6 +1309,17 @@ _RUNNER_OPTS = dict(
             )),
         ],
     ),
+    webhdfs_url=dict(
+        runners=['hadoop'],
+        switches=[
+            (['--webhdfs-url'], dict(
+                help=('URL of your namenode\'s WebHDFS REST API (e.g.'
+                      ' http://namenode:50070). If set, talk to HDFS over'
+                      ' HTTP rather than running "hadoop fs" for every'
+                      ' filesystem operation'),
+            )),
+        ],
+    ),
     zone=dict(
         cloud_role='launch',
         deprecated_aliases=['aws_availability_zone'],
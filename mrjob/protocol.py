@@ -31,6 +31,8 @@ For more information, see :ref:`job-protocols` and :ref:`writing-protocols`.
 # don't add imports here that aren't part of the standard Python library,
 # since MRJobs need to run in Amazon's generic EMR environment
 import json
+from base64 import b64decode
+from base64 import b64encode
 
 try:
     import cPickle as pickle  # Python 2 only
@@ -53,6 +55,12 @@ try:
 except ImportError:
     ujson = None
 
+try:
+    import numpy
+    numpy  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    numpy = None
+
 
 class _KeyCachingProtocol(object):
     """Protocol that caches the last decoded key.
@@ -461,3 +469,168 @@ class ReprValueProtocol(object):
     else:
         def write(self, key, value):
             return repr(value).encode('utf_8')
+
+
+# NumPy protocols encode an array as its dtype, its shape, and its raw
+# buffer, separated by colons. The buffer is base64-encoded so that the
+# encoded array contains no tabs or newlines, e.g.:
+#
+#    <f8:2,3:AAAAAAAA8D8AAAAAAAAAQAAAAAAAAAhAAAAAAAAAEEAAAAAAAAAUQAAAAAAAABhA
+
+def _check_numpy():
+    if numpy is None:
+        raise ImportError('You must install numpy to use NumPy protocols')
+
+
+def _dumps_array(value):
+    value = numpy.asarray(value)
+
+    if value.dtype.hasobject:
+        raise ValueError("Can't encode arrays with dtype %r" % value.dtype)
+
+    return b':'.join([
+        value.dtype.str.encode('ascii'),
+        b','.join(str(d).encode('ascii') for d in value.shape),
+        b64encode(value.tobytes()),
+    ])
+
+
+def _loads_array(value):
+    raw_dtype, raw_shape, raw_data = value.split(b':', 2)
+
+    if raw_shape:
+        shape = tuple(int(d) for d in raw_shape.split(b','))
+    else:
+        shape = ()
+
+    # frombuffer() doesn't copy, so the array we return is read-only
+    return numpy.frombuffer(
+        b64decode(raw_data),
+        dtype=numpy.dtype(raw_dtype.decode('ascii'))).reshape(shape)
+
+
+class NumpyProtocol(_KeyCachingProtocol):
+    """Encode ``key`` as JSON and ``value`` (a :py:class:`numpy.ndarray`,
+    or anything :py:func:`numpy.asarray` accepts) as its dtype,
+    shape, and base64-encoded raw buffer, separated by a tab.
+
+    This is much more compact and faster than encoding arrays as JSON lists.
+    Decoded arrays are wrapped around the decoded buffer without copying
+    (see :py:func:`numpy.frombuffer`), so they are read-only; use ``.copy()``
+    if you need to modify one in place.
+
+    Arrays with ``object`` dtype can't be encoded.
+
+    Raises :py:class:`ImportError` when instantiated if :py:mod:`numpy` is
+    not installed.
+    """
+    def __init__(self):
+        _check_numpy()
+        self._key_protocol = JSONProtocol()
+
+    def _loads(self, value):
+        return self._key_protocol._loads(value)
+
+    def _dumps(self, value):
+        return self._key_protocol._dumps(value)
+
+    def read(self, line):
+        raw_key, raw_value = line.split(b'\t', 1)
+
+        if raw_key != self._last_key_encoded:
+            self._last_key_encoded = raw_key
+            self._last_key_decoded = self._loads(raw_key)
+        return (self._last_key_decoded, _loads_array(raw_value.rstrip(b'\t')))
+
+    def write(self, key, value):
+        return self._dumps(key) + b'\t' + _dumps_array(value)
+
+
+class NumpyValueProtocol(object):
+    """Encode ``value`` as in :py:class:`NumpyProtocol`, and discard ``key``
+    (``key`` is read in as ``None``).
+    """
+    def __init__(self):
+        _check_numpy()
+
+    def read(self, line):
+        return (None, _loads_array(line.rstrip(b'\t')))
+
+    def write(self, key, value):
+        return _dumps_array(value)
+
+
+def sum_arrays(values):
+    """Element-wise sum of *values*, an iterable of equally-shaped arrays.
+    Handy in reducers and combiners::
+
+        def reducer(self, key, vectors):
+            yield key, sum_arrays(vectors)
+
+    If :py:mod:`numpy` is installed, this adds each array into a single
+    accumulator in place, and returns a :py:class:`numpy.ndarray`. Otherwise,
+    *values* should be (possibly nested) lists of numbers, and we return a
+    list.
+
+    Raises :py:class:`ValueError` if *values* is empty.
+    """
+    total, _ = _sum_and_count(values)
+    return total
+
+
+def mean_arrays(values):
+    """Element-wise mean of *values*, an iterable of equally-shaped arrays.
+
+    See :py:func:`sum_arrays` for details.
+    """
+    total, count = _sum_and_count(values)
+
+    if numpy is None:
+        return _map_nested(lambda x: float(x) / count, total)
+    else:
+        # always return floats, like numpy.mean()
+        return numpy.true_divide(total, count)
+
+
+def _sum_and_count(values):
+    values = iter(values)
+
+    try:
+        first = next(values)
+    except StopIteration:
+        raise ValueError("Can't sum an empty sequence of arrays")
+
+    count = 1
+
+    if numpy is None:
+        total = first
+        for value in values:
+            total = _add_nested(total, value)
+            count += 1
+    else:
+        # copy, since the first array may be read-only (see NumpyProtocol)
+        total = numpy.array(first)
+        for value in values:
+            value = numpy.asarray(value)
+            # upcast the accumulator if need be (e.g. int + float)
+            dtype = numpy.result_type(total, value)
+            if dtype != total.dtype:
+                total = total.astype(dtype)
+            numpy.add(total, value, out=total)
+            count += 1
+
+    return total, count
+
+
+def _add_nested(a, b):
+    if isinstance(a, (list, tuple)):
+        return [_add_nested(x, y) for x, y in zip(a, b)]
+    else:
+        return a + b
+
+
+def _map_nested(func, a):
+    if isinstance(a, (list, tuple)):
+        return [_map_nested(func, x) for x in a]
+    else:
+        return func(a)
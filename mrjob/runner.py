@@ -56,10 +56,18 @@ from mrjob.step import _is_spark_step_type
 from mrjob.util import bash_wrap
 from mrjob.util import cmd_line
 from mrjob.util import zip_dir
+from mrjob.util import _hash_dir
+from mrjob.util import _prefetch_chain
 
 
 log = logging.getLogger(__name__)
 
+# how many output files stream_output() reads at once
+_DEFAULT_STREAM_OUTPUT_THREADS = 4
+
+# how many bytes of output stream_output() can read ahead
+_DEFAULT_STREAM_OUTPUT_BUFFER_BYTES = 64 * 1024 * 1024
+
 # use to detect globs and break into the part before and after the glob
 GLOB_RE = re.compile(r'^(.*?)([\[\*\?].*)$')
 
@@ -191,8 +199,8 @@ class MRJobRunner(object):
     def __init__(self, mr_job_script=None, conf_paths=None,
                  extra_args=None, file_upload_args=None,
                  hadoop_input_format=None, hadoop_output_format=None,
-                 input_paths=None, output_dir=None, partitioner=None,
-                 stdin=None, **opts):
+                 input_paths=None, output_dir=None, output_protocol=None,
+                 partitioner=None, stdin=None, **opts):
         """All runners take the following keyword arguments:
 
         :type mr_job_script: str
@@ -248,6 +256,11 @@ class MRJobRunner(object):
                            hadoop runner, this path does not need to be fully
                            qualified with ``hdfs://`` URIs because it's
                            understood that it has to be on HDFS.
+        :param output_protocol: instance of the protocol used to write the
+                                job's final output. If you use
+                                :py:meth:`~mrjob.job.MRJob.make_runner`,
+                                this is set for you. Used by
+                                :py:meth:`cat_output`.
         :type partitioner: str
         :param partitioner: Optional name of a Hadoop partitoner class, e.g.
                             ``'org.apache.hadoop.mapred.lib.HashPartitioner'``.
@@ -276,6 +289,7 @@ class MRJobRunner(object):
         self._upload_mgr = None  # define in subclasses that use this
 
         self._script_path = mr_job_script
+        self._output_protocol = output_protocol
         if self._script_path:
             self._working_dir_mgr.add('file', self._script_path)
 
@@ -416,10 +430,27 @@ class MRJobRunner(object):
         self._run()
         self._ran_job = True
 
-    def stream_output(self):
+    def stream_output(self, ordered=True,
+                      num_threads=_DEFAULT_STREAM_OUTPUT_THREADS,
+                      max_buffer_bytes=_DEFAULT_STREAM_OUTPUT_BUFFER_BYTES):
         """Stream raw lines from the job's output. You can parse these
         using the read() method of the appropriate HadoopStreamingProtocol
-        class."""
+        class, or use :py:meth:`cat_output` instead.
+
+        :param ordered: if false, yield lines from the output files in
+                        whatever order we read them, rather than one
+                        file at a time. Lines from any one file are
+                        still in order.
+        :param num_threads: read up to this many output files at once,
+                            in background threads
+        :param max_buffer_bytes: how many bytes of lines read ahead by
+                                 background threads to hold in memory
+
+        .. versionchanged:: 0.5.8
+
+           Added *ordered*, *num_threads*, and *max_buffer_bytes*; output
+           files are read ahead in the background.
+        """
         output_dir = self.get_output_dir()
         if output_dir is None:
             raise AssertionError('Run the job before streaming output')
@@ -443,12 +474,40 @@ class MRJobRunner(object):
 
                 path = base
 
+        def cat_func(filename):
+            return lambda: self.fs._cat_file(filename)
+
         # TODO - mtai @ davidmarin - why aren't we using self.fs.cat ?
+        cat_funcs = []
         for filename in self.fs.ls(output_dir):
             subpath = filename[len(output_dir):]
             if not any(name.startswith('_') for name in split_path(subpath)):
-                for line in self.fs._cat_file(filename):
-                    yield line
+                cat_funcs.append(cat_func(filename))
+
+        for line in _prefetch_chain(cat_funcs,
+                                    num_threads=num_threads,
+                                    max_bytes=max_buffer_bytes,
+                                    ordered=ordered):
+            yield line
+
+    def cat_output(self, **kwargs):
+        """Stream the job's output, decoded into ``(key, value)`` pairs
+        with the job's output protocol (see the *output_protocol*
+        argument to the constructor).
+
+        Takes the same keyword arguments as :py:meth:`stream_output`.
+
+        .. versionadded:: 0.5.8
+        """
+        if self._output_protocol is None:
+            raise ValueError(
+                "Don't know the job's output protocol; make the runner"
+                " with MRJob.make_runner() or pass in output_protocol")
+
+        read = self._output_protocol.read
+
+        for line in self.stream_output(**kwargs):
+            yield read(line)
 
     def _cleanup_mode(self, mode=None):
         """Actual cleanup action to take based on various options"""
@@ -499,6 +558,19 @@ class MRJobRunner(object):
         """
         pass  # this only happens on EMR
 
+    def _log_rm_counts(self, rm_result):
+        """Log the ``(num_deleted, num_failed)`` returned by cloud
+        filesystems' :py:meth:`~mrjob.fs.base.Filesystem.rm`."""
+        if not rm_result:
+            return
+
+        num_deleted, num_failed = rm_result
+        if num_failed:
+            log.warning('  could not delete %d of %d files' %
+                        (num_failed, num_deleted + num_failed))
+        else:
+            log.info('  deleted %d files' % num_deleted)
+
     def _cleanup_job(self):
         """Stop any jobs that we created that are still running."""
         pass  # currently disabled (see #1241)
@@ -1134,8 +1206,6 @@ class MRJobRunner(object):
 
             mrjob_dir = os.path.dirname(mrjob.__file__) or '.'
 
-            zip_path = os.path.join(self._get_local_tmp_dir(), 'mrjob.zip')
-
             def filter_path(path):
                 filename = os.path.basename(path)
                 return not(filename.lower().endswith('.pyc') or
@@ -1147,9 +1217,34 @@ class MRJobRunner(object):
                            # filter out MacFuse resource forks
                            filename.startswith('._'))
 
+            cache_dir = self._opts['local_archive_cache_dir']
+
+            if cache_dir:
+                # zip_dir() is reproducible, so we can key the zip file
+                # by what would go into it
+                zip_hash = _hash_dir(
+                    mrjob_dir, filter=filter_path, prefix='mrjob')
+                zip_path = os.path.join(cache_dir, zip_hash, 'mrjob.zip')
+
+                if os.path.exists(zip_path):
+                    log.debug('using cached %s' % zip_path)
+                    self._mrjob_zip_path = zip_path
+                    return zip_path
+
+                self.fs.mkdir(os.path.dirname(zip_path))
+            else:
+                zip_path = os.path.join(
+                    self._get_local_tmp_dir(), 'mrjob.zip')
+
             log.debug('archiving %s -> %s as %s' % (
                 mrjob_dir, zip_path, os.path.join('mrjob', '')))
-            zip_dir(mrjob_dir, zip_path, filter=filter_path, prefix='mrjob')
+
+            # write to a temp file and rename, so that other jobs using
+            # the same cache never see a partially written zip file
+            tmp_zip_path = '%s.%d.tmp' % (zip_path, os.getpid())
+            zip_dir(mrjob_dir, tmp_zip_path,
+                    filter=filter_path, prefix='mrjob')
+            os.rename(tmp_zip_path, zip_path)
 
             self._mrjob_zip_path = zip_path
 
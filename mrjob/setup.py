@@ -39,6 +39,7 @@ import os.path
 import posixpath
 import re
 
+from mrjob.fs.local import LocalFilesystem
 from mrjob.parse import is_uri
 from mrjob.py2 import string_types
 from mrjob.util import expand_path
@@ -265,20 +266,42 @@ class UploadDirManager(object):
 
     :py:class:`UploadDirManager` assumes URIs to not need to be uploaded
     and thus does not store them. :py:meth:`uri` maps URIs to themselves.
+
+    If *cache_prefix* is set, files are instead assigned URIs based on
+    their contents (``<cache_prefix>/<md5sum>/<name>``), so that a file
+    that was uploaded by a previous job doesn't need to be uploaded again.
     """
-    def __init__(self, prefix):
+    def __init__(self, prefix, cache_prefix=None, md5sum=None):
         """Make an :py:class`UploadDirManager`.
 
         :param string prefix: The URI for the directory (e.g.
                               `s3://bucket/dir/`). It doesn't matter if
                               *prefix* has a trailing slash; :py:meth:`uri`
                               will do the right thing.
+        :param string cache_prefix: If set, the URI of a directory to upload
+                                    files into by content rather than into
+                                    *prefix*.
+        :param md5sum: function that takes a local path and returns its MD5
+                       sum as a hex string (used with *cache_prefix*).
+                       Defaults to
+                       :py:meth:`LocalFilesystem.md5sum()
+                       <mrjob.fs.local.LocalFilesystem.md5sum>`
+
+        .. versionchanged:: 0.5.8
+
+           added *cache_prefix* and *md5sum*
         """
         self.prefix = prefix
+        self.cache_prefix = cache_prefix
+
+        self._md5sum = md5sum or LocalFilesystem().md5sum
 
         self._path_to_name = {}
         self._names_taken = set()
 
+        # MD5 sums of files, computed the first time we need their URI
+        self._path_to_md5sum = {}
+
     def add(self, path):
         """Add a path. If *path* hasn't been added before, assign it a name.
                        If *path* is a URI don't add it; just return the URI.
@@ -303,11 +326,20 @@ class UploadDirManager(object):
         if is_uri(path):
             return path
 
-        if path in self._path_to_name:
-            return posixpath.join(self.prefix, self._path_to_name[path])
-        else:
+        if path not in self._path_to_name:
             raise ValueError('%r is not a URI or a known local file' % (path,))
 
+        name = self._path_to_name[path]
+
+        if self.cache_prefix:
+            if path not in self._path_to_md5sum:
+                self._path_to_md5sum[path] = self._md5sum(path)
+
+            return posixpath.join(
+                self.cache_prefix, self._path_to_md5sum[path], name)
+        else:
+            return posixpath.join(self.prefix, name)
+
     def path_to_uri(self):
         """Get a map from path to URI for all paths that were added,
         so we can figure out which files we need to upload."""
@@ -15,11 +15,14 @@
 # limitations under the License.
 """Run an MRJob locally by forking off a bunch of processes and piping
 them together. Useful for testing."""
+import errno
 import itertools
 import logging
+import math
+import mmap
 import os
 import shutil
-import stat
+import sys
 
 from mrjob.compat import jobconf_from_dict
 from mrjob.compat import translate_jobconf
@@ -31,12 +34,25 @@ from mrjob.options import _combiners
 from mrjob.options import _deprecated_aliases
 from mrjob.runner import MRJobRunner
 from mrjob.runner import RunnerOptionStore
+from mrjob.split import _is_splittable
+from mrjob.split import _split_compressed_file
 from mrjob.util import read_input
 from mrjob.util import unarchive
 
 
 log = logging.getLogger(__name__)
 
+# copy at most this many bytes at a time when copying between files
+_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# errors meaning the kernel can't copy between these two files, so we
+# should fall back to reading and writing them ourselves
+_KERNEL_COPY_UNSUPPORTED_ERRNOS = set(
+    getattr(errno, name) for name in
+    ('EBADF', 'EINVAL', 'ENOSYS', 'ENOTSOCK', 'ENOTSUP', 'EOPNOTSUPP',
+     'ESPIPE', 'EXDEV')
+    if hasattr(errno, name))
+
 
 class SimRunnerOptionStore(RunnerOptionStore):
     # these are the same for 'local' and 'inline' runners
@@ -122,14 +138,26 @@ class SimMRJobRunner(MRJobRunner):
     def _symlink_to_file_or_copy(self, path, dest):
         """Symlink from *dest* to the absolute version of *path*.
 
-        If symlinks aren't available, copy *path* to *dest* instead."""
+        If symlinks aren't available, hard link or copy *path* to *dest*
+        instead."""
         if hasattr(os, 'symlink'):
             path = os.path.abspath(path)
             log.debug('creating symlink %s <- %s' % (path, dest))
             os.symlink(path, dest)
-        else:
-            log.debug('copying %s -> %s' % (path, dest))
-            shutil.copyfile(path, dest)
+            return
+
+        if hasattr(os, 'link'):
+            try:
+                log.debug('creating hard link %s <- %s' % (path, dest))
+                os.link(path, dest)
+                return
+            except OSError:
+                pass  # e.g. different filesystems
+
+        log.debug('copying %s -> %s' % (path, dest))
+        with open(path, 'rb') as src:
+            with open(dest, 'wb') as dst:
+                _copy_range(src, dst, 0, os.fstat(src.fileno()).st_size)
 
     def _setup_working_dir(self, working_dir):
         """Make a working directory with symlinks to our script and
@@ -237,27 +265,32 @@ class SimMRJobRunner(MRJobRunner):
         # otherwise, split the files needed for mappers and reducers
         # and setup the task environment for each
 
-        # The correctly-ordered list of task_num, file_name pairs
-        file_tasks = sorted([
-            (t['task_num'], file_name) for file_name, t
-            in file_splits.items()], key=lambda t: t[0])
+        # The correctly-ordered list of task_num, file_names pairs (small
+        # files may be packed into the same task)
+        task_to_file_names = {}
+        for file_name, t in file_splits.items():
+            task_to_file_names.setdefault(t['task_num'], []).append(file_name)
+
+        for task_num, input_paths in sorted(task_to_file_names.items()):
+            input_paths.sort()
 
-        for task_num, input_path in file_tasks:
             # make a new working_dir for each task
             working_dir = os.path.join(
                 self._get_local_tmp_dir(),
                 'job_local_dir', str(step_num), step_type, str(task_num))
             self._setup_working_dir(working_dir)
 
-            log.debug("File name %s" % input_path)
+            log.debug("File names %s" % ', '.join(input_paths))
             # setup environment variables
             split_kwargs = {}
             if step_type == 'mapper':
-                # mappers have extra file split info
+                # mappers have extra file split info (the job updates
+                # this as it reads each file)
+                first_split = file_splits[input_paths[0]]
                 split_kwargs = dict(
-                    input_file=file_splits[input_path]['orig_name'],
-                    input_start=file_splits[input_path]['start'],
-                    input_length=file_splits[input_path]['length'])
+                    input_file=first_split['orig_name'],
+                    input_start=first_split['start'],
+                    input_length=first_split['length'])
 
             env = self._subprocess_env(
                 step_num, step_type, task_num, working_dir, **split_kwargs)
@@ -267,7 +300,7 @@ class SimMRJobRunner(MRJobRunner):
                 outfile_prefix + '_part-%05d' % task_num)
             log.debug('Writing to %s' % output_path)
 
-            self._run_step(step_num, step_type, input_path, output_path,
+            self._run_step(step_num, step_type, input_paths, output_path,
                            working_dir, env)
 
             self._prev_outfiles.append(output_path)
@@ -277,10 +310,12 @@ class SimMRJobRunner(MRJobRunner):
         if counters:
             log.info(_format_counters(counters))
 
-    def _run_step(self, step_num, step_type, input_path, output_path,
+    def _run_step(self, step_num, step_type, input_paths, output_path,
                   working_dir, env):
         """ Runner specific per step method
         Inline and local runners override this method
+
+        *input_paths* is a list of files for the task to read, in order.
         """
         raise NotImplementedError("Subclass must implement this method")
 
@@ -291,8 +326,16 @@ class SimMRJobRunner(MRJobRunner):
         pass
 
     def _get_file_splits(self, input_paths, num_splits, keep_sorted=False):
-        """ Split the input files into (roughly) *num_splits* files. Gzipped
-        files are not split, but each gzipped file counts as one split.
+        """ Split the input files into (roughly) *num_splits* files.
+
+        bzip2 files are split on block boundaries, and gzipped files
+        with more than one member are split on member boundaries (see
+        :py:mod:`mrjob.split`); each piece is itself a compressed file.
+        Other gzipped files are not split, but each counts as one split.
+
+        Files smaller than a split are packed together (like Hadoop's
+        ``CombineFileInputFormat``), and read in place; several files may
+        share the same *task_num*.
 
         :param input_paths: Iterable of paths to be split
         :param num_splits: Number of splits to target
@@ -305,12 +348,24 @@ class SimMRJobRunner(MRJobRunner):
                           the split
         * *start*: where the split starts
         * *length*: the length of the split
+        * *task_num*: which task should read the split
         """
         # sanity check: if keep_sorted is True, we should only have one file
         assert(not keep_sorted or len(input_paths) == 1)
 
         file_names = {}
         input_paths_to_split = []
+        compressed_paths = []
+        small_compressed_paths = []
+
+        tmp_directory = self._get_local_tmp_dir()
+
+        # list input files and their sizes once, up front
+        items = [item
+                 for input_path in input_paths
+                 for item in self.fs.ls_detailed(input_path)]
+        paths = [item['uri'] for item in items]
+        sizes = [item['size'] for item in items]
 
         # Each file is assigned a 'task number' as if coming from some previous
         # task. The task number is used to choose the split file name, and
@@ -318,22 +373,58 @@ class SimMRJobRunner(MRJobRunner):
         # when the output files are combined after the final step, they are in
         # sorted order due to already being lexicographically sorted.
 
-        for input_path in input_paths:
-            for path in self.fs.ls(input_path):
-                if path.endswith('.gz'):
-                    # do not split compressed files
-                    absolute_path = os.path.abspath(path)
-                    file_names[absolute_path] = {
-                        'orig_name': absolute_path,
-                        'start': 0,
-                        'task_num': len(file_names),
-                        'length': os.stat(absolute_path)[stat.ST_SIZE],
-                    }
-                    # this counts as "one split"
-                    num_splits -= 1
-                else:
-                    # do split uncompressed files
-                    input_paths_to_split.append(path)
+        for path, size in zip(paths, sizes):
+            if path.endswith('.gz') or (
+                    _is_splittable(path) and not keep_sorted):
+                # split compressed files without decompressing them
+                compressed_paths.append((os.path.abspath(path), size))
+            else:
+                # do split uncompressed files
+                input_paths_to_split.append((path, size))
+
+        # give each compressed file its share of splits, based on size.
+        # (Nothing shares a task yet, so len(file_names) is the next
+        # task number.)
+        all_size = sum(sizes)
+        orig_num_splits = num_splits
+
+        # compressed files smaller than this get packed together
+        target_size = all_size / float(max(orig_num_splits, 1))
+
+        for path, size in compressed_paths:
+            splits = None
+            file_num_splits = int(round(
+                orig_num_splits * size / float(all_size or 1)))
+
+            if file_num_splits > 1:
+                first_task_num = len(file_names)
+                splits = _split_compressed_file(
+                    path, file_num_splits,
+                    lambda i: os.path.join(
+                        tmp_directory,
+                        'input_part-%05d' % (first_task_num + i)),
+                    index_dir=self._opts['local_gzip_index_dir'])
+
+            if not splits:
+                if size < target_size:
+                    small_compressed_paths.append((path, size))
+                    continue
+
+                splits = [dict(path=path, start=0, length=size)]
+
+            for split in splits:
+                file_names[split['path']] = {
+                    'orig_name': path,
+                    'start': split['start'],
+                    'task_num': len(file_names),
+                    'length': split['length'],
+                }
+
+            # each piece counts as "one split"
+            num_splits -= len(splits)
+
+        num_splits -= self._pack_small_files(
+            small_compressed_paths, target_size, file_names)
 
         # exit early if no uncompressed files given
         if not input_paths_to_split:
@@ -343,20 +434,27 @@ class SimMRJobRunner(MRJobRunner):
         num_splits = max(num_splits, 1)
 
         # determine the size of each file split
-        total_size = 0
-        for input_path in input_paths_to_split:
-            for path in self.fs.ls(input_path):
-                total_size += os.stat(path)[stat.ST_SIZE]
+        total_size = sum(size for _, size in input_paths_to_split)
         split_size = total_size / num_splits
 
+        # read small files in place, several to a task
+        if not keep_sorted:
+            small_paths = [(os.path.abspath(path), size)
+                           for path, size in input_paths_to_split
+                           if size < split_size]
+            self._pack_small_files(small_paths, split_size, file_names)
+
+            input_paths_to_split = [(path, size)
+                                    for path, size in input_paths_to_split
+                                    if size >= split_size]
+
         # we want each file split to be as close to split_size as possible
         # we also want different input files to be in different splits
-        tmp_directory = self._get_local_tmp_dir()
 
         # Helper functions:
         def create_outfile(orig_name='', start=''):
             # create a new output file and initialize its properties dict
-            task_num = len(file_names)
+            task_num = _num_tasks(file_names)
             outfile_name = os.path.join(tmp_directory,
                                         'input_part-%05d' % task_num)
             new_file = {
@@ -385,7 +483,20 @@ class SimMRJobRunner(MRJobRunner):
                 for line in read_input(input_path):
                     yield (line,)
 
-        for path in input_paths_to_split:
+        for path, size in input_paths_to_split:
+            if not keep_sorted and not _is_compressed(path):
+                # find line boundaries and copy byte ranges, rather than
+                # reading the file line by line
+                with open(path, 'rb') as src:
+                    start = 0
+                    for end in _split_ends(src, size, split_size):
+                        outfile_name = create_outfile(path, start)
+                        with open(outfile_name, 'wb') as outfile:
+                            _copy_range(src, outfile, start, end - start)
+                        file_names[outfile_name]['length'] = end - start
+                        start = end
+                continue
+
             # create a new split file for each new path
 
             # initialize file and accumulators
@@ -422,6 +533,40 @@ class SimMRJobRunner(MRJobRunner):
 
         return file_names
 
+    def _pack_small_files(self, paths, target_size, file_names):
+        """Pack *paths* (a list of ``(path, size)``) into tasks reading
+        about *target_size* bytes each, and add them to *file_names*
+        (see :py:meth:`_get_file_splits`). Only files that are compressed
+        the same way share a task.
+
+        Returns the number of tasks added.
+        """
+        first_task_num = _num_tasks(file_names)
+        num_tasks = 0
+
+        for ext in sorted(set(_compression_ext(path) for path, _ in paths)):
+            task_num = None
+            task_size = 0
+
+            for path, size in paths:
+                if _compression_ext(path) != ext:
+                    continue
+
+                if task_num is None or task_size + size > target_size:
+                    task_num = first_task_num + num_tasks
+                    task_size = 0
+                    num_tasks += 1
+
+                file_names[path] = {
+                    'orig_name': path,
+                    'start': 0,
+                    'task_num': task_num,
+                    'length': size,
+                }
+                task_size += size
+
+        return num_tasks
+
     def _subprocess_env(self, step_num, step_type, task_num, working_dir,
                         **split_kwargs):
         """Set up environment variables for a subprocess (mapper, etc.)
@@ -562,3 +707,110 @@ def _error_on_bad_paths(fs, paths):
 
     raise ValueError("At least one valid path is required. "
                      "None found in %s" % paths)
+
+
+def _compression_ext(path):
+    """Return ``'.gz'``, ``'.bz2'`` or ``'.xz'`` if *path* has that
+    extension, and ``''`` otherwise."""
+    for ext in ('.gz', '.bz2', '.xz'):
+        if path.endswith(ext):
+            return ext
+    return ''
+
+
+def _is_compressed(path):
+    """Would :py:func:`~mrjob.util.read_input` decompress *path*?"""
+    return bool(_compression_ext(path))
+
+
+def _split_ends(fileobj, size, split_size):
+    """Yield the offsets where each split of the uncompressed file
+    *fileobj* (of *size* bytes) should end: just after the first line
+    break at least *split_size* bytes past the start of the split. We
+    always yield at least one offset (*size*), even for empty files.
+
+    We search the file with :py:mod:`mmap`, so we don't have to read
+    each line into Python.
+    """
+    if size == 0:
+        yield 0
+        return
+
+    min_length = max(int(math.ceil(split_size)), 1)
+
+    m = mmap.mmap(fileobj.fileno(), size, access=mmap.ACCESS_READ)
+    try:
+        start = 0
+        while start < size:
+            i = m.find(b'\n', start + min_length - 1)
+            end = size if i == -1 else i + 1
+            yield end
+            start = end
+    finally:
+        m.close()
+
+
+def _copy_range(src, dst, start, length):
+    """Copy *length* bytes of the file object *src*, starting at *start*,
+    to the current position of the file object *dst*.
+
+    Where we can, have the kernel copy the data (using
+    ``os.copy_file_range()`` or ``os.sendfile()``), rather than reading it
+    into Python and writing it back out.
+    """
+    dst.flush()
+
+    offset = start
+    end = start + length
+
+    for kernel_copy in _kernel_copy_funcs():
+        try:
+            while offset < end:
+                copied = kernel_copy(src.fileno(), dst.fileno(), offset,
+                                     min(end - offset, _COPY_CHUNK_SIZE))
+                if not copied:
+                    return  # src is shorter than we thought
+                offset += copied
+            return
+        except OSError as e:
+            if e.errno not in _KERNEL_COPY_UNSUPPORTED_ERRNOS:
+                raise
+
+    src.seek(offset)
+    while offset < end:
+        data = src.read(min(end - offset, _COPY_CHUNK_SIZE))
+        if not data:
+            return
+        dst.write(data)
+        offset += len(data)
+
+
+def _kernel_copy_funcs():
+    """Functions that copy *count* bytes starting at *offset* from file
+    descriptor *in_fd* to the current position of *out_fd* without going
+    through Python, and return the number of bytes copied. These take
+    *in_fd*, *out_fd*, *offset*, and *count*, and are listed in order of
+    preference; which ones exist depends on the version of Python
+    and the platform."""
+    funcs = []
+
+    # copy_file_range() can use reflinks on filesystems that support them
+    if hasattr(os, 'copy_file_range'):
+        funcs.append(lambda in_fd, out_fd, offset, count:
+                     os.copy_file_range(in_fd, out_fd, count, offset))
+
+    # elsewhere (e.g. macOS), sendfile() can only write to a socket
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        funcs.append(lambda in_fd, out_fd, offset, count:
+                     os.sendfile(out_fd, in_fd, offset, count))
+
+    return funcs
+
+
+def _num_tasks(file_names):
+    """Return the number of tasks in *file_names*
+    (see :py:meth:`SimMRJobRunner._get_file_splits`). Task numbers are
+    assigned in order, starting at 0."""
+    if not file_names:
+        return 0
+    return max(t['task_num'] for t in file_names.values()) + 1
@@ -0,0 +1,584 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Split compressed input files for the sim runners, so that each mapper
+only has to decompress part of a large file.
+
+We can split:
+
+* bzip2 files on block boundaries. Blocks aren't byte-aligned, so we
+  find them by scanning for the (48-bit) block magic number at every bit
+  offset, and re-pack each split's blocks into a new bzip2 stream.
+* gzip files with multiple members (e.g. several gzipped files
+  concatenated together) on member boundaries. Finding member boundaries
+  requires decompressing the file, so we can cache an index of members
+  in a directory of the user's choosing (see :py:func:`_gzip_index_path`
+  and the :mrjob-opt:`local_gzip_index_dir` option).
+
+Splits rarely fall on line boundaries, so we decompress the unit (block or
+member) at the start of each split, and move everything up to and
+including its first newline into the previous split. Each split file is
+written as a concatenation of compressed streams, which
+:py:func:`~mrjob.util.read_file` can read.
+"""
+import binascii
+import hashlib
+import json
+import logging
+import os
+import os.path
+import zlib
+from bisect import bisect_right
+from io import BytesIO
+
+try:
+    import bz2
+    bz2  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    bz2 = None
+
+from mrjob.util import _at_eof
+
+log = logging.getLogger(__name__)
+
+# how much to read at a time when scanning or copying files
+_BUFSIZE = 1 << 24
+
+# magic numbers marking the start of a bzip2 block and the end of a stream
+_BZ2_BLOCK_MAGIC = 0x314159265359
+_BZ2_EOS_MAGIC = 0x177245385090
+_BZ2_MAGIC_BITS = 48
+
+# header for bzip2 streams we write (900k blocks, so we can handle blocks
+# from streams with any block size)
+_BZ2_HEADER = b'BZh9'
+
+# start of every gzip member (magic number plus "deflate" method)
+_GZIP_MEMBER_HEADER = b'\x1f\x8b\x08'
+
+# how much of a possible gzip member to decompress to see if it's real
+_GZIP_CHECK_SIZE = 1 << 16
+
+# don't split before a gzip member bigger than this (compressed) if we'd
+# have to decompress it to find a line boundary
+_MAX_GZIP_FIXUP_SIZE = 1 << 22
+
+# suffix for gzip member index files
+_GZIP_INDEX_SUFFIX = '.mrjob-index'
+
+# compress the pieces of lines we move between splits quickly
+_FIXUP_COMPRESSLEVEL = 1
+
+
+def _is_splittable(path):
+    """Can we split the given file (based on its extension)?"""
+    return ((path.endswith('.bz2') and bz2 is not None) or
+            path.endswith('.gz'))
+
+
+def _split_compressed_file(path, num_splits, split_path, index_dir=None):
+    """Split the compressed file at *path* into (at most) *num_splits*
+    pieces, each of which is a compressed file containing whole lines.
+
+    :param split_path: function that takes a split number (starting at 0)
+                       and returns the path to write the split to.
+    :param index_dir: directory to cache gzip member indexes in, so they
+                      can be re-used by later jobs. If not set, we don't
+                      cache them.
+
+    Returns a list of dictionaries with the keys *path*, *start*
+    and *length*, where *start* and *length* are the (approximate) byte
+    range of the original file that the split covers. If the file isn't
+    splittable, returns ``None``.
+    """
+    if path.endswith('.bz2') and bz2 is not None:
+        units = _Bzip2Units(path)
+    elif path.endswith('.gz'):
+        units = _GzipUnits(path, index_dir=index_dir)
+    else:
+        return None
+
+    if len(units) < 2 or num_splits < 2:
+        return None
+
+    groups = _plan_groups(units, _pick_boundaries(units, num_splits))
+    if len(groups) < 2:
+        return None
+
+    ext = os.path.splitext(path)[1]
+    file_size = os.path.getsize(path)
+    splits = []
+
+    for prefix, raw_start, raw_end, suffix in groups:
+        out_path = split_path(len(splits)) + ext
+
+        with open(out_path, 'wb') as out:
+            if prefix:
+                out.write(units.compress(prefix))
+            if raw_start < raw_end:
+                units.write(out, raw_start, raw_end)
+            if suffix:
+                out.write(units.compress(suffix))
+
+        # byte range of the original file covered by this split (including
+        # headers and trailers, for the first and last splits)
+        first = raw_start - 1 if prefix else raw_start
+        last = raw_end if suffix else raw_end - 1
+
+        start = units.start(first) if first else 0
+        end = units.end(last) if last < len(units) - 1 else file_size
+
+        splits.append(dict(path=out_path, start=start, length=end - start))
+
+    return splits
+
+
+def _pick_boundaries(units, num_splits):
+    """Choose up to *num_splits - 1* indexes of units to split before,
+    so that splits are (roughly) the same size."""
+    total_size = units.end(len(units) - 1)
+    boundaries = []
+
+    for k in range(1, len(units)):
+        if len(boundaries) >= num_splits - 1:
+            break
+
+        target = total_size * (len(boundaries) + 1) / float(num_splits)
+        if units.start(k) >= target and units.can_split_before(k):
+            boundaries.append(k)
+
+    return boundaries
+
+
+def _plan_groups(units, boundaries):
+    """Given indexes of units to split before, decide what goes in
+    each split.
+
+    Returns a list of ``(prefix, raw_start, raw_end, suffix)``, meaning
+    the split should contain *prefix* (decompressed data), then units
+    *raw_start* through *raw_end - 1* (copied without decompression), then
+    *suffix* (decompressed data).
+    """
+    groups = []
+    prefix = b''
+    raw_start = 0
+
+    for b in boundaries:
+        if b < raw_start:
+            continue  # this boundary was swallowed by a long line
+
+        if units.ends_with_newline(b - 1):
+            groups.append((prefix, raw_start, b, b''))
+            prefix = b''
+            raw_start = b
+            continue
+
+        # find the first newline at or after the start of unit b
+        for k in range(b, len(units)):
+            data = units.decompress(k)
+            i = data.find(b'\n')
+            if i != -1:
+                break
+        else:
+            break  # no more newlines; the rest of the file is one line
+
+        groups.append((prefix, raw_start, k, data[:i + 1]))
+        prefix = data[i + 1:]
+        raw_start = k + 1
+
+    if prefix or raw_start < len(units):
+        groups.append((prefix, raw_start, len(units), b''))
+
+    return groups
+
+
+class _Bzip2Units(object):
+    """The blocks of a bzip2 file. Each block is represented as
+    ``(start_bit, end_bit, crc)``."""
+
+    def __init__(self, path):
+        self._path = path
+
+        with open(path, 'rb') as f:
+            block_starts = _find_bit_pattern(
+                f, _BZ2_BLOCK_MAGIC, _BZ2_MAGIC_BITS)
+            f.seek(0)
+            eos_starts = _find_bit_pattern(
+                f, _BZ2_EOS_MAGIC, _BZ2_MAGIC_BITS)
+
+            # each block ends where the next block or end-of-stream starts
+            ends = sorted(block_starts[1:] + eos_starts)
+
+            self._blocks = []
+            for start in block_starts:
+                end = ends[bisect_right(ends, start)]
+                crc = _read_bits(f, start + _BZ2_MAGIC_BITS,
+                                 start + _BZ2_MAGIC_BITS + 32)
+                self._blocks.append((start, end, crc))
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def start(self, k):
+        return self._blocks[k][0] // 8
+
+    def end(self, k):
+        return (self._blocks[k][1] + 7) // 8
+
+    def can_split_before(self, k):
+        return True
+
+    def ends_with_newline(self, k):
+        return None  # can't tell without decompressing
+
+    def decompress(self, k):
+        out = BytesIO()
+        self.write(out, k, k + 1)
+        return bz2.decompress(out.getvalue())
+
+    def compress(self, data):
+        return bz2.compress(data, _FIXUP_COMPRESSLEVEL)
+
+    def write(self, out, i, j):
+        """Write blocks *i* through *j - 1* to *out* as a bzip2 stream."""
+        writer = _BitWriter(out)
+        writer.write(_bytes_to_int(_BZ2_HEADER), len(_BZ2_HEADER) * 8)
+
+        combined_crc = 0
+
+        with open(self._path, 'rb') as f:
+            for start, end, crc in self._blocks[i:j]:
+                for chunk_start in range(start, end, _BUFSIZE * 8):
+                    chunk_end = min(chunk_start + _BUFSIZE * 8, end)
+                    writer.write(_read_bits(f, chunk_start, chunk_end),
+                                 chunk_end - chunk_start)
+
+                combined_crc = (((combined_crc << 1) |
+                                 (combined_crc >> 31)) & 0xffffffff) ^ crc
+
+        writer.write(_BZ2_EOS_MAGIC, _BZ2_MAGIC_BITS)
+        writer.write(combined_crc, 32)
+        writer.close()
+
+
+class _GzipUnits(object):
+    """The members of a gzip file. Each member is represented as
+    ``(start, end, ends_with_newline)``."""
+
+    def __init__(self, path, index_dir=None):
+        self._path = path
+        self._members = _gzip_members(path, index_dir=index_dir)
+
+    def __len__(self):
+        return len(self._members)
+
+    def start(self, k):
+        return self._members[k][0]
+
+    def end(self, k):
+        return self._members[k][1]
+
+    def can_split_before(self, k):
+        return (self.ends_with_newline(k - 1) or
+                self.end(k) - self.start(k) <= _MAX_GZIP_FIXUP_SIZE)
+
+    def ends_with_newline(self, k):
+        return self._members[k][2]
+
+    def decompress(self, k):
+        with open(self._path, 'rb') as f:
+            f.seek(self.start(k))
+            data = f.read(self.end(k) - self.start(k))
+
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+
+    def compress(self, data):
+        c = zlib.compressobj(
+            _FIXUP_COMPRESSLEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return c.compress(data) + c.flush()
+
+    def write(self, out, i, j):
+        """Copy members *i* through *j - 1* to *out*."""
+        with open(self._path, 'rb') as f:
+            f.seek(self.start(i))
+            remaining = self.end(j - 1) - self.start(i)
+
+            while remaining > 0:
+                chunk = f.read(min(remaining, _BUFSIZE))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+
+
+### gzip member index ###
+
+def _gzip_index_path(path, index_dir):
+    """Where to cache the index of members of the gzip file at *path*,
+    in *index_dir*. We include a hash of the (real) absolute path, so that
+    files with the same name in different directories don't collide."""
+    path_hash = hashlib.md5(
+        os.path.realpath(path).encode('utf_8')).hexdigest()[:16]
+    return os.path.join(index_dir, '%s-%s%s' % (
+        os.path.basename(path), path_hash, _GZIP_INDEX_SUFFIX))
+
+
+def _gzip_members(path, index_dir=None):
+    """Return a list of ``(start, end, ends_with_newline)`` for each member
+    of the gzip file at *path*. If *index_dir* is set, use an index cached
+    there if it's up-to-date, and cache the index of multi-member files.
+
+    If the file is corrupt, returns ``[]``.
+    """
+    st = os.stat(path)
+    index_path = None if index_dir is None else _gzip_index_path(
+        path, index_dir)
+
+    if index_path:
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            if (index['size'] == st.st_size and
+                    index['mtime'] == st.st_mtime):
+                return [tuple(m) for m in index['members']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+    if _may_have_multiple_members(path):
+        members = _scan_gzip_members(path)
+    else:
+        members = [(0, st.st_size, None)]
+
+    # single-member files are cheap to recognize; don't bother caching them
+    if not index_path or len(members) < 2:
+        return members
+
+    # write to a temp file and rename, so that other jobs never see a
+    # partially written index
+    tmp_path = '%s.%d.tmp' % (index_path, os.getpid())
+
+    try:
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(size=st.st_size, mtime=st.st_mtime,
+                           members=members), f)
+        os.rename(tmp_path, index_path)
+    except (IOError, OSError) as e:
+        log.warning("Couldn't write gzip index to %s: %s" % (index_path, e))
+
+    return members
+
+
+def _may_have_multiple_members(path):
+    """Quickly check if the gzip file at *path* might contain more than
+    one member, without decompressing the entire thing.
+
+    We look for the member header anywhere past the start of the file, and
+    try to decompress a little data from there. A real member will always
+    pass this check; random data that happens to look like a header almost
+    never does.
+    """
+    with open(path, 'rb') as f:
+        offset = 0
+        tail = b''
+
+        while True:
+            chunk = f.read(_BUFSIZE)
+            if not chunk:
+                return False
+
+            data = tail + chunk
+            base = offset - len(tail)
+
+            i = data.find(_GZIP_MEMBER_HEADER, 1 if base == 0 else 0)
+            while i != -1:
+                if i + len(_GZIP_MEMBER_HEADER) > len(data):
+                    break
+
+                pos = f.tell()
+                f.seek(base + i)
+                candidate = f.read(_GZIP_CHECK_SIZE)
+                f.seek(pos)
+
+                try:
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    d.decompress(candidate)
+                    return True
+                except zlib.error:
+                    pass
+
+                i = data.find(_GZIP_MEMBER_HEADER, i + 1)
+
+            offset += len(chunk)
+            tail = data[-(len(_GZIP_MEMBER_HEADER) - 1):]
+
+
+def _scan_gzip_members(path):
+    """Decompress the gzip file at *path*, and return a list of
+    ``(start, end, ends_with_newline)`` for each member."""
+    members = []
+
+    with open(path, 'rb') as f:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        member_start = 0
+        offset = 0  # offset of start of chunk in file
+        chunk = b''
+        last_byte = b''
+
+        try:
+            while True:
+                if not chunk:
+                    chunk = f.read(_BUFSIZE)
+                    if not chunk:
+                        break
+
+                if d is None:
+                    if not chunk.startswith(_GZIP_MEMBER_HEADER[:2]):
+                        break  # trailing garbage
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    member_start = offset
+
+                data = d.decompress(chunk)
+                if data:
+                    last_byte = data[-1:]
+
+                if _at_eof(d):
+                    end = offset + len(chunk) - len(d.unused_data)
+                    members.append((member_start, end, last_byte == b'\n'))
+                    chunk = d.unused_data
+                    offset = end
+                    d = None
+                else:
+                    offset += len(chunk)
+                    chunk = b''
+        except zlib.error as e:
+            log.warning('Error decompressing %s: %s' % (path, e))
+            return []
+
+        if d is not None and offset > member_start:
+            log.warning('%s appears to be truncated' % path)
+            return []
+
+    return members
+
+
+### bit twiddling ###
+
+def _bytes_to_int(data):
+    if not data:
+        return 0
+    elif hasattr(int, 'from_bytes'):  # Python 3
+        return int.from_bytes(data, 'big')
+    else:
+        return int(binascii.hexlify(data), 16)
+
+
+def _int_to_bytes(value, length):
+    if hasattr(value, 'to_bytes'):  # Python 3
+        return value.to_bytes(length, 'big')
+    else:
+        return binascii.unhexlify('%0*x' % (length * 2, value))
+
+
+def _read_bits(f, start, end):
+    """Read bits *start* through *end - 1* of *f* (counting from the
+    most significant bit of the first byte) and return them as an int."""
+    first_byte = start // 8
+    last_byte = (end + 7) // 8
+
+    f.seek(first_byte)
+    value = _bytes_to_int(f.read(last_byte - first_byte))
+
+    return (value >> (last_byte * 8 - end)) & ((1 << (end - start)) - 1)
+
+
+def _find_bit_pattern(f, pattern, num_bits):
+    """Return a list of bit offsets in *f* where the *num_bits*-bit
+    *pattern* occurs (at any bit alignment). *num_bits* must be at least
+    24."""
+    # window of bytes that can contain the pattern at any bit offset
+    window_len = (num_bits + 7) // 8 + 1
+    mask = (1 << num_bits) - 1
+
+    # for each bit offset within a byte, bytes 1 through window_len - 2
+    # of the window are entirely part of the pattern. Search for those.
+    searches = []
+    for shift in range(8):
+        window = pattern << (window_len * 8 - num_bits - shift)
+        searches.append(
+            (shift, _int_to_bytes(window, window_len)[1:window_len - 1]))
+
+    offsets = []
+    offset = 0
+    tail = b''
+
+    while True:
+        chunk = f.read(_BUFSIZE)
+        if not chunk:
+            break
+
+        data = tail + chunk
+        base = offset - len(tail)
+
+        for shift, middle in searches:
+            i = data.find(middle)
+            while i != -1:
+                p = i - 1
+                if p >= 0 and p + window_len <= len(data):
+                    window = _bytes_to_int(data[p:p + window_len])
+                    if ((window >> (window_len * 8 - num_bits - shift)) &
+                            mask) == pattern:
+                        offsets.append((base + p) * 8 + shift)
+                i = data.find(middle, i + 1)
+
+        offset += len(chunk)
+        # keep enough bytes to catch patterns we couldn't check
+        tail = data[-(window_len - 1):]
+
+    return sorted(set(offsets))
+
+
+class _BitWriter(object):
+    """Write a sequence of bits to a file object."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._value = 0
+        self._num_bits = 0
+
+    def write(self, value, num_bits):
+        """Write the low *num_bits* bits of *value*."""
+        self._value = (self._value << num_bits) | value
+        self._num_bits += num_bits
+
+        if self._num_bits >= _BUFSIZE * 8:
+            self._flush()
+
+    def close(self):
+        """Pad with zeros to a whole number of bytes, and flush."""
+        if self._num_bits % 8:
+            self.write(0, 8 - self._num_bits % 8)
+        self._flush()
+
+    def _flush(self):
+        leftover_bits = self._num_bits % 8
+        num_bytes = self._num_bits // 8
+
+        if num_bytes:
+            self._fileobj.write(
+                _int_to_bytes(self._value >> leftover_bits, num_bytes))
+
+        self._value &= (1 << leftover_bits) - 1
+        self._num_bits = leftover_bits
@@ -19,6 +19,10 @@
 
 import logging
 import os
+import pipes
+import tarfile
+import threading
+from io import BytesIO
 from subprocess import Popen
 from subprocess import PIPE
 
@@ -27,19 +31,81 @@ from mrjob.util import cmd_line
 
 log = logging.getLogger(__name__)
 
+# how long a multiplexed master connection should stay open after its
+# last client exits
+_SSH_CONTROL_PERSIST_SECS = 60
 
-def _ssh_args(ssh_bin, address, ec2_key_pair_file):
+# where to put control sockets for connections from the master node to
+# slaves (ssh expands ~ and the % escapes itself)
+_REMOTE_SSH_CONTROL_PATH = '~/.ssh/mrjob-%r@%h:%p'
+
+
+def _ssh_args(ssh_bin, address, ec2_key_pair_file, control_dir=None):
     """Helper method for :py:func:`_ssh_run` to build an argument list for
     ``subprocess``. Specifies an identity, disables strict host key checking,
     and adds the ``hadoop`` username.
+
+    If *control_dir* is set, share one connection per host through a control
+    socket in that directory (see :py:func:`_ssh_multiplex_args`).
     """
     if ec2_key_pair_file is None:
         raise ValueError('SSH key file path is None')
-    return ssh_bin + [
+
+    args = ssh_bin + [
         '-i', ec2_key_pair_file,
         '-o', 'StrictHostKeyChecking=no',
         '-o', 'UserKnownHostsFile=/dev/null',
-        'hadoop@%s' % (address,),
+    ]
+
+    if control_dir:
+        args += _ssh_multiplex_args(_ssh_control_path(control_dir))
+
+    return args + ['hadoop@%s' % (address,)]
+
+
+def _ssh_control_path(control_dir):
+    """Path of the control socket for each host in *control_dir* (ssh
+    expands the % escapes)."""
+    return os.path.join(control_dir, '%r@%h:%p')
+
+
+def _ssh_multiplex_args(control_path):
+    """Options to make ``ssh`` run its command through the master
+    connection whose control socket is at *control_path* (see
+    :py:func:`_ssh_start_master`), or make its own connection if there
+    isn't one.
+
+    These never make ``ssh`` a master itself; a master stays open in the
+    background, and would keep open the stdout and stderr we're reading
+    from."""
+    return [
+        '-o', 'ControlMaster=no',
+        '-o', 'ControlPath=%s' % control_path,
+    ]
+
+
+def _ssh_master_args(control_path):
+    """Options to make ``ssh`` open a master connection with its control
+    socket at *control_path*, and go into the background once it's
+    connected. The master exits after :py:data:`_SSH_CONTROL_PERSIST_SECS`
+    without any commands running through it."""
+    return [
+        '-f', '-N', '-M',
+        '-o', 'ControlPath=%s' % control_path,
+        '-o', 'ControlPersist=%d' % _SSH_CONTROL_PERSIST_SECS,
+    ]
+
+
+def _remote_ssh_args(keyfile):
+    """Arguments for ``ssh`` on the master node to connect to a slave with
+    the key file *keyfile* (see :py:func:`_ssh_copy_key`)."""
+    if keyfile is None:
+        raise ValueError('SSH key file path cannot be None')
+
+    return [
+        'ssh', '-i', keyfile,
+        '-o', 'StrictHostKeyChecking=no',
+        '-o', 'UserKnownHostsFile=/dev/null',
     ]
 
 
@@ -56,7 +122,8 @@ def _check_output(out, err):
     return out
 
 
-def _ssh_run(ssh_bin, address, ec2_key_pair_file, cmd_args, stdin=''):
+def _ssh_run(ssh_bin, address, ec2_key_pair_file, cmd_args, stdin='',
+             control_dir=None, timeout=None):
     """Shortcut to call ssh on a Hadoop node via ``subprocess``.
 
     :param ssh_bin: Path to ``ssh`` binary
@@ -64,17 +131,47 @@ def _ssh_run(ssh_bin, address, ec2_key_pair_file, cmd_args, stdin=''):
     :param ec2_key_pair_file: Path to the key pair file (argument to ``-i``)
     :param cmd_args: The command you want to run
     :param stdin: String to pass to the process's standard input
+    :param control_dir: Directory to keep multiplexed connections' control
+                        sockets in, or ``None`` to make a new connection
+    :param timeout: If set, kill ``ssh`` after this many seconds, and add
+                    a message saying so to stderr
 
     :return: (stdout, stderr)
     """
-    args = _ssh_args(ssh_bin, address, ec2_key_pair_file) + list(cmd_args)
+    args = _ssh_args(ssh_bin, address, ec2_key_pair_file,
+                     control_dir=control_dir) + list(cmd_args)
     log.debug('> %s' % cmd_line(args))
     p = Popen(args, stdout=PIPE, stderr=PIPE, stdin=PIPE)
-    return p.communicate(stdin)
+
+    # kill ssh if it takes too long
+    timed_out = threading.Event()
+    timer = None
+
+    if timeout:
+        def kill():
+            timed_out.set()
+            try:
+                p.kill()
+            except OSError:
+                pass  # already exited
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+
+    try:
+        stdout, stderr = p.communicate(stdin)
+    finally:
+        if timer:
+            timer.cancel()
+
+    if timed_out.is_set():
+        stderr += ('Timed out after %s seconds\n' % timeout).encode('ascii')
+
+    return stdout, stderr
 
 
 def _ssh_run_with_recursion(ssh_bin, address, ec2_key_pair_file, keyfile,
-                            cmd_args):
+                            cmd_args, control_dir=None, timeout=None):
     """Some files exist on the master and can be accessed directly via SSH,
     but some files are on the slaves which can only be accessed via the master
     node. To differentiate between hosts, we adopt the UUCP "bang path" syntax
@@ -86,24 +183,100 @@ def _ssh_run_with_recursion(ssh_bin, address, ec2_key_pair_file, keyfile,
 
     For bang paths to work, :py:func:`_ssh_copy_key` must have been run, and
     the ``keyfile`` argument must be the same as was passed to that function.
+
+    If *control_dir* is set, we also multiplex the connection from ``host1``
+    to ``host2``, keeping its control socket in ``host1``'s ``~/.ssh``.
+    *timeout* works as in :py:func:`_ssh_run`.
     """
     if '!' in address:
-        if keyfile is None:
-            raise ValueError('SSH key file path cannot be None')
         host1, host2 = address.split('!')
-        more_args = [
-            'ssh', '-i', keyfile,
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            'hadoop@%s' % (host2,),
-        ]
+        more_args = _remote_ssh_args(keyfile)
+        if control_dir:
+            more_args += _ssh_multiplex_args(_REMOTE_SSH_CONTROL_PATH)
+        more_args.append('hadoop@%s' % (host2,))
+
         return _ssh_run(ssh_bin, host1, ec2_key_pair_file,
-                        more_args + list(cmd_args))
+                        more_args + list(cmd_args), control_dir=control_dir,
+                        timeout=timeout)
     else:
-        return _ssh_run(ssh_bin, address, ec2_key_pair_file, cmd_args)
+        return _ssh_run(ssh_bin, address, ec2_key_pair_file, cmd_args,
+                        control_dir=control_dir, timeout=timeout)
+
+
+def _ssh_start_master(ssh_bin, address, ec2_key_pair_file, control_dir,
+                      keyfile=None, check=False):
+    """Open a multiplexed master connection to *address*, with its control
+    socket in *control_dir*, and leave it running in the background (see
+    :py:func:`_ssh_master_args`). Its stdin, stdout, and stderr are
+    ``/dev/null``, so it doesn't hold anyone's pipes open.
+
+    If *check* is true, first ask (with ``ssh -O check``) if there's
+    already a master using the control socket, and if so, leave it be.
+    Otherwise the new ``ssh`` would find the socket in use, and linger in
+    the background as an ordinary connection that nothing ever closes.
+
+    If *address* is a bang path (``host1!host2``), open the master
+    connection from ``host1`` to ``host2``, with its control socket in
+    ``host1``'s ``~/.ssh``. This goes through ``host1``'s master
+    connection, which should already be open. Other jobs may share that
+    control socket, so we always check for a master first.
+
+    It's fine if this fails; commands will just make their own
+    connections.
+    """
+    if '!' in address:
+        host1, host2 = address.split('!')
+        dest = 'hadoop@%s' % (host2,)
+        args = (_remote_ssh_args(keyfile) +
+                ['-O', 'check',
+                 '-o', 'ControlPath=%s' % _REMOTE_SSH_CONTROL_PATH,
+                 dest, '>/dev/null', '2>&1', '||'] +
+                _remote_ssh_args(keyfile) +
+                _ssh_master_args(_REMOTE_SSH_CONTROL_PATH) +
+                [dest, '</dev/null', '>/dev/null', '2>&1'])
+
+        _ssh_run(ssh_bin, host1, ec2_key_pair_file, args,
+                 control_dir=control_dir)
+        return
+
+    control_path = _ssh_control_path(control_dir)
+
+    with open(os.devnull, 'r+b') as devnull:
+        if check:
+            check_args = _ssh_args(ssh_bin, address, ec2_key_pair_file)
+            # options go before the destination
+            check_args[-1:-1] = [
+                '-O', 'check', '-o', 'ControlPath=%s' % control_path]
+
+            log.debug('> %s' % cmd_line(check_args))
+            if not Popen(check_args, stdin=devnull, stdout=devnull,
+                         stderr=devnull).wait():
+                return  # master is still running
+
+        args = _ssh_args(ssh_bin, address, ec2_key_pair_file)
+        args[-1:-1] = _ssh_master_args(control_path)
+
+        log.debug('> %s' % cmd_line(args))
+        # with -f, ssh exits once the master is connected and in the
+        # background
+        Popen(args, stdin=devnull, stdout=devnull, stderr=devnull).wait()
+
+
+def _ssh_stop_master(ssh_bin, address, ec2_key_pair_file, control_dir):
+    """Tell the multiplexed master connection to *address* (see
+    :py:func:`_ssh_args`) to exit. Does nothing if it's already gone."""
+    args = _ssh_args(ssh_bin, address, ec2_key_pair_file,
+                     control_dir=control_dir)
+    # -O goes before the destination
+    args[-1:-1] = ['-O', 'exit']
+
+    log.debug('> %s' % cmd_line(args))
+    p = Popen(args, stdout=PIPE, stderr=PIPE, stdin=PIPE)
+    p.communicate()
 
 
-def _ssh_copy_key(ssh_bin, master_address, ec2_key_pair_file, keyfile):
+def _ssh_copy_key(ssh_bin, master_address, ec2_key_pair_file, keyfile,
+                  control_dir=None):
     """Prepare master to SSH to slaves by copying the EMR private key to the
     master node. This is done via ``cat`` to avoid having to store an
     ``scp_bin`` variable.
@@ -112,14 +285,18 @@ def _ssh_copy_key(ssh_bin, master_address, ec2_key_pair_file, keyfile):
     :param master_address: Address of node to copy keyfile to
     :param ec2_key_pair_file: Path to the key pair file (argument to ``-i``)
     :param keyfile: What to call the key file on the master
+    :param control_dir: Directory for multiplexed connections' control
+                        sockets (see :py:func:`_ssh_run`)
     """
     with open(ec2_key_pair_file, 'rb') as f:
         args = ['bash -c "cat > %s" && chmod 600 %s' % (keyfile, keyfile)]
         _check_output(*_ssh_run(ssh_bin, master_address, ec2_key_pair_file,
-                                args, stdin=f.read()))
+                                args, stdin=f.read(),
+                                control_dir=control_dir))
 
 
-def _ssh_slave_addresses(ssh_bin, master_address, ec2_key_pair_file):
+def _ssh_slave_addresses(ssh_bin, master_address, ec2_key_pair_file,
+                         control_dir=None):
     """Get the IP addresses of the slave nodes. Fails silently because it
     makes testing easier and if things are broken they will fail before this
     function is called.
@@ -130,12 +307,13 @@ def _ssh_slave_addresses(ssh_bin, master_address, ec2_key_pair_file):
     cmd = "hadoop dfsadmin -report | grep ^Name | cut -f2 -d: | cut -f2 -d' '"
     args = ['bash -c "%s"' % cmd]
     ips = to_string(_check_output(
-        *_ssh_run(ssh_bin, master_address, ec2_key_pair_file, args)))
+        *_ssh_run(ssh_bin, master_address, ec2_key_pair_file, args,
+                  control_dir=control_dir)))
     return [ip for ip in ips.split('\n') if ip]
 
 
 def _ssh_cat(ssh_bin, address, ec2_key_pair_file, path,
-             keyfile=None, sudo=False):
+             keyfile=None, sudo=False, control_dir=None):
     """Return the file at ``path`` as a string. Raises ``IOError`` if the
     file doesn't exist or SSH access fails.
 
@@ -146,18 +324,21 @@ def _ssh_cat(ssh_bin, address, ec2_key_pair_file, path,
     :param keyfile: Name of the EMR private key file on the master node in case
                     ``path`` exists on one of the slave nodes
     :param sudo: if true, run command with ``sudo``
+    :param control_dir: Directory for multiplexed connections' control
+                        sockets (see :py:func:`_ssh_run`)
     """
     cmd_args = ['cat', path]
     if sudo:
         cmd_args = ['sudo'] + cmd_args
 
     out = _check_output(*_ssh_run_with_recursion(
-        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args))
+        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args,
+        control_dir=control_dir))
     return out
 
 
 def _ssh_ls(ssh_bin, address, ec2_key_pair_file, path,
-            keyfile=None, sudo=False):
+            keyfile=None, sudo=False, control_dir=None):
     """Recursively list files under ``path`` on the specified SSH host.
     Return the file at ``path`` as a string. Raises ``IOError`` if the
     path doesn't exist or SSH access fails.
@@ -169,13 +350,82 @@ def _ssh_ls(ssh_bin, address, ec2_key_pair_file, path,
     :param keyfile: Name of the EMR private key file on the master node in case
                     ``path`` exists on one of the slave nodes
     :param sudo: if true, run command with ``sudo``
+    :param control_dir: Directory for multiplexed connections' control
+                        sockets (see :py:func:`_ssh_run`)
     """
     cmd_args = ['find', '-L', path, '-type', 'f']
     if sudo:
         cmd_args = ['sudo'] + cmd_args
 
     out = to_string(_check_output(*_ssh_run_with_recursion(
-        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args)))
+        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args,
+        control_dir=control_dir)))
     if 'No such file or directory' in out:
         raise IOError("No such file or directory: %s" % path)
     return out.split('\n')
+
+
+def _ssh_ls_detailed(ssh_bin, address, ec2_key_pair_file, path,
+                     keyfile=None, sudo=False, control_dir=None):
+    """Like :py:func:`_ssh_ls`, except that we return a list of
+    ``(path, size, mtime)`` for each file, all from one ``find`` command.
+
+    Takes the same arguments as :py:func:`_ssh_ls`.
+    """
+    # find -printf's format has spaces and backslashes, so quote it for
+    # the remote shell (and again for each hop in a bang path)
+    fmt = '%s %T@ %p\\n'
+    for _ in range(address.count('!') + 1):
+        fmt = pipes.quote(fmt)
+
+    cmd_args = ['find', '-L', path, '-type', 'f', '-printf', fmt]
+    if sudo:
+        cmd_args = ['sudo'] + cmd_args
+
+    out = to_string(_check_output(*_ssh_run_with_recursion(
+        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args,
+        control_dir=control_dir)))
+    if 'No such file or directory' in out:
+        raise IOError("No such file or directory: %s" % path)
+
+    results = []
+    for line in out.split('\n'):
+        if not line:
+            continue
+        size, mtime, file_path = line.split(' ', 2)
+        results.append((file_path, int(size), float(mtime)))
+
+    return results
+
+
+def _ssh_tar(ssh_bin, address, ec2_key_pair_file, path,
+             keyfile=None, sudo=False, control_dir=None):
+    """Fetch every file under ``path`` on the specified SSH host with a
+    single ``tar`` command, rather than listing them and then ``cat``-ing
+    each one. Follows symlinks, like :py:func:`_ssh_ls`.
+
+    Returns a list of ``(path, data)`` for each file. Raises ``IOError``
+    if the path doesn't exist or SSH access fails.
+
+    Takes the same arguments as :py:func:`_ssh_ls`.
+    """
+    # -P keeps absolute paths; files that are still being written to (e.g.
+    # logs of running tasks) aren't an error
+    cmd_args = ['tar', '-chPf', '-', '--warning=no-file-changed', path]
+    if sudo:
+        cmd_args = ['sudo'] + cmd_args
+
+    out = _check_output(*_ssh_run_with_recursion(
+        ssh_bin, address, ec2_key_pair_file, keyfile, cmd_args,
+        control_dir=control_dir))
+
+    results = []
+
+    with tarfile.open(fileobj=BytesIO(out), mode='r:') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            file_path = '/' + to_string(member.name).lstrip('/')
+            results.append((file_path, tar.extractfile(member).read()))
+
+    return results
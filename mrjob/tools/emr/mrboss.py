@@ -22,6 +22,9 @@ Usage::
 Options::
 
   -h, --help            show this help message and exit
+  --max-threads=MAX_THREADS
+                        Run the command on at most this many nodes at once
+                        (default: 20)
   -c CONF_PATHS, --conf-path=CONF_PATHS
                         Path to alternate mrjob.conf file to read from
   --no-conf             Don't load mrjob.conf even if it's available
@@ -43,6 +46,8 @@ Options::
                         endpoint for each S3 bucket based on its location.
   --ssh-bin=SSH_BIN     Name/path of ssh binary. Arguments are allowed (e.g.
                         --ssh-bin 'ssh -v')
+  --timeout=TIMEOUT     Give up on a node if the command hasn't finished
+                        after this many seconds
   -v, --verbose         print more messages to stderr
 """
 from __future__ import print_function
@@ -60,9 +65,13 @@ from mrjob.options import _pick_runner_opts
 from mrjob.py2 import to_string
 from mrjob.ssh import _ssh_copy_key
 from mrjob.ssh import _ssh_run_with_recursion
+from mrjob.util import _thread_imap_unordered
 from mrjob.util import random_identifier
 from mrjob.util import shlex_split
 
+# how many nodes to run the command on at once, by default
+_DEFAULT_MAX_THREADS = 20
+
 
 def main(cl_args=None):
     usage = 'usage: %prog CLUSTER_ID [options] "command string"'
@@ -74,6 +83,15 @@ def main(cl_args=None):
                              default=None,
                              help="Specify an output directory (default:"
                              " CLUSTER_ID)")
+    option_parser.add_option('--max-threads', dest='max_threads',
+                             default=_DEFAULT_MAX_THREADS, type='int',
+                             help=('Run the command on at most this many'
+                                   ' nodes at once (default: %d)' %
+                                   _DEFAULT_MAX_THREADS))
+    option_parser.add_option('--timeout', dest='timeout',
+                             default=None, type='float',
+                             help=("Give up on a node if the command hasn't"
+                                   " finished after this many seconds"))
     _add_basic_options(option_parser)
     _add_runner_options(
         option_parser,
@@ -88,7 +106,8 @@ def main(cl_args=None):
     MRJob.set_up_logging(quiet=options.quiet, verbose=options.verbose)
 
     runner_kwargs = options.__dict__.copy()
-    for unused_arg in ('output_dir', 'quiet', 'verbose'):
+    for unused_arg in ('output_dir', 'quiet', 'verbose',
+                       'max_threads', 'timeout'):
         del runner_kwargs[unused_arg]
 
     if len(args) < 2:
@@ -101,14 +120,22 @@ def main(cl_args=None):
     output_dir = os.path.abspath(options.output_dir or cluster_id)
 
     with EMRJobRunner(cluster_id=cluster_id, **runner_kwargs) as runner:
-        _run_on_all_nodes(runner, output_dir, cmd_args)
+        _run_on_all_nodes(runner, output_dir, cmd_args,
+                          max_threads=options.max_threads,
+                          timeout=options.timeout)
 
 
-def _run_on_all_nodes(runner, output_dir, cmd_args, print_stderr=True):
+def _run_on_all_nodes(runner, output_dir, cmd_args, print_stderr=True,
+                      max_threads=_DEFAULT_MAX_THREADS, timeout=None):
     """Given an :py:class:`EMRJobRunner`, run the command specified by
     *cmd_args* on all nodes in the cluster and save the stdout and stderr of
     each run to subdirectories of *output_dir*.
 
+    We run the command on up to *max_threads* nodes at once, and write
+    each node's output as soon as it finishes. If *timeout* is set, we
+    kill the command on any node where it's taking longer than that many
+    seconds (what output we got is still saved).
+
     You should probably have run :py:meth:`_enable_slave_ssh_access()` on the
     runner before calling this function.
     """
@@ -118,6 +145,9 @@ def _run_on_all_nodes(runner, output_dir, cmd_args, print_stderr=True):
     ssh_bin = runner._opts['ssh_bin']
     ec2_key_pair_file = runner._opts['ec2_key_pair_file']
 
+    # share the filesystem's connections to the master node
+    control_dir = runner.fs._ssh_control_dir(master_addr)
+
     keyfile = None
     slave_addrs = runner.fs.ssh_slave_hosts(master_addr)
 
@@ -126,18 +156,23 @@ def _run_on_all_nodes(runner, output_dir, cmd_args, print_stderr=True):
                       for slave_addr in slave_addrs]
         # copying key file like a boss (name of keyfile doesn't really matter)
         keyfile = 'mrboss-%s.pem' % random_identifier()
-        _ssh_copy_key(ssh_bin, master_addr, ec2_key_pair_file, keyfile)
+        _ssh_copy_key(ssh_bin, master_addr, ec2_key_pair_file, keyfile,
+                      control_dir=control_dir)
 
-    for addr in addresses:
-
-        stdout, stderr = _ssh_run_with_recursion(
+    def run(addr):
+        return _ssh_run_with_recursion(
             ssh_bin,
             addr,
             ec2_key_pair_file,
             keyfile,
             cmd_args,
+            control_dir=control_dir,
+            timeout=timeout,
         )
 
+    for addr, (stdout, stderr) in _thread_imap_unordered(
+            run, addresses, max_threads):
+
         if print_stderr:
             print('---')
             print('Command completed on %s.' % addr)
@@ -42,7 +42,7 @@ Options::
                         this; by default mrjob will choose the correct
                         endpoint for each S3 bucket based on its location.
   -t, --test            Don't actually delete any files; just log that we
-                        would
+                        would, and how many files and bytes that is
   -v, --verbose         print more messages to stderr
 """
 from datetime import datetime
@@ -56,7 +56,6 @@ from mrjob.job import MRJob
 from mrjob.options import _add_basic_options
 from mrjob.options import _add_runner_options
 from mrjob.options import _alphabetize_options
-from mrjob.parse import parse_s3_uri
 
 
 log = logging.getLogger(__name__)
@@ -84,25 +83,48 @@ def _s3_cleanup(glob_path, time_old, dry_run=False, **runner_kwargs):
     """Delete all files older than *time_old* in *path*.
 
     If *dry_run* is true, then just log the files that need to be
-    deleted without actually deleting them
+    deleted without actually deleting them.
+
+    We list *glob_path* only once, filtering keys by age as the listing
+    comes in, and delete old keys in batches.
+
+    :return: ``(num_files, num_bytes)`` of the files that were old enough
+             to delete (whether or not we actually deleted them)
     """
     runner = EMRJobRunner(**runner_kwargs)
 
     log.info('Deleting all files in %s that are older than %s' %
              (glob_path, time_old))
 
-    for path in runner.fs.ls(glob_path):
-        bucket_name, key_name = parse_s3_uri(path)
-        bucket = runner.fs.get_bucket(bucket_name)
+    # number of files and bytes that are old enough to delete
+    totals = [0, 0]
 
-        for key in bucket.list(key_name):
-            last_modified = iso8601_to_datetime(key.last_modified)
-            age = datetime.utcnow() - last_modified
+    def old_keys():
+        now = datetime.utcnow()
+
+        for uri, key in runner.fs._ls_keys(glob_path):
+            age = now - iso8601_to_datetime(key.last_modified)
             if age > time_old:
-                # Delete it
-                log.info('Deleting %s; is %s old' % (key.name, age))
-                if not dry_run:
-                    key.delete()
+                log.info('Deleting %s; is %s old' % (uri, age))
+                totals[0] += 1
+                totals[1] += key.size
+                yield key
+
+    if dry_run:
+        for _ in old_keys():
+            pass
+
+        log.info('Would delete %d files (%d bytes)' % tuple(totals))
+    else:
+        num_deleted, num_failed = runner.fs._rm_keys(old_keys())
+
+        if num_failed:
+            log.warning('Deleted %d of %d files; could not delete %d' %
+                        (num_deleted, totals[0], num_failed))
+        else:
+            log.info('Deleted %d files (%d bytes)' % tuple(totals))
+
+    return tuple(totals)
 
 
 def _runner_kwargs(options):
@@ -140,12 +162,13 @@ def _make_option_parser():
     option_parser.add_option(
         '-t', '--test', dest='test', default=False,
         action='store_true',
-        help="Don't actually delete any files; just log that we would")
+        help=("Don't actually delete any files; just log that we would,"
+              " and how many files and bytes that is"))
 
     _add_basic_options(option_parser)
     _add_runner_options(
         option_parser,
-        set(['region', 's3_endpoint']),
+        set(['region', 's3_endpoint', 's3_region_cache']),
     )
 
     _alphabetize_options(option_parser)
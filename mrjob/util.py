@@ -17,6 +17,7 @@
 # since MRJobs need to run in Amazon's generic EMR environment
 import contextlib
 import glob
+import hashlib
 import itertools
 import logging
 import os
@@ -24,17 +25,25 @@ import pipes
 import random
 import shlex
 import shutil
+import struct
 import sys
 import tarfile
+import tempfile
+import threading
 import zlib
+from subprocess import PIPE
+from subprocess import Popen
 from collections import defaultdict
+from collections import deque
 from copy import deepcopy
 from datetime import timedelta
 from distutils.spawn import find_executable
 from logging import getLogger
+from multiprocessing.pool import ThreadPool
 from zipfile import ZIP_DEFLATED
 from zipfile import ZIP_STORED
 from zipfile import ZipFile
+from zipfile import ZipInfo
 from zipfile import is_zipfile
 
 try:
@@ -43,10 +52,44 @@ try:
 except ImportError:
     bz2 = None
 
+try:
+    import lzma  # Python 3.3+
+    lzma  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    try:
+        from backports import lzma  # backports.lzma on PyPI
+        lzma
+    except ImportError:
+        lzma = None
+
 from mrjob.py2 import PY2
 
 log = getLogger(__name__)
 
+# how many bytes of compressed data to read at a time. Reading in large
+# blocks means decompression happens in C rather than in a Python loop
+_DECOMPRESS_BUFSIZE = 1 << 20
+
+# timestamp for files in archives we create, so that archives of the same
+# files are identical (1980-01-01, the earliest date zip files support)
+_ARCHIVE_MTIME = 315532800
+
+# gzip header with no timestamp or filename, for tar_and_gzip(): magic
+# number, deflate, no flags, no mtime, max compression, unknown OS
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+
+# read_file() will decompress local files at least this big in a separate
+# process, if there's a suitable binary (see _DECOMPRESS_CMDS)
+_EXTERNAL_DECOMPRESS_MIN_SIZE = 1 << 23
+
+# map from file extension to a list of commands we can use to decompress
+# a file to stdout, in order of preference. pigz, lbzip2 and pbzip2
+# decompress using multiple threads.
+_DECOMPRESS_CMDS = {
+    '.bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']],
+    '.gz': [['pigz', '-dc']],
+}
+
 
 class NullHandler(logging.Handler):
     def emit(self, record):
@@ -158,8 +201,10 @@ def buffer_iterator_to_line_iterator(chunks):
     return to_lines(chunks)
 
 
-def bunzip2_stream(fileobj, bufsize=1024):
-    """Decompress gzipped data on the fly.
+def bunzip2_stream(fileobj, bufsize=_DECOMPRESS_BUFSIZE):
+    """Decompress bzip2ed data on the fly.
+
+    Handles multi-stream files (e.g. from ``pbzip2``).
 
     :param fileobj: object supporting ``read()``
     :param bufsize: number of bytes to read from *fileobj* at a time.
@@ -173,16 +218,9 @@ def bunzip2_stream(fileobj, bufsize=1024):
         raise Exception(
             'bz2 module was not successfully imported (likely not installed).')
 
-    d = bz2.BZ2Decompressor()
-
-    while True:
-        chunk = fileobj.read(bufsize)
-        if not chunk:
-            return
-
-        part = d.decompress(chunk)
-        if part:
-            yield part
+    for data in _decompress_stream(
+            fileobj, bz2.BZ2Decompressor, bufsize, magic=b'BZh'):
+        yield data
 
 
 def cmd_line(args):
@@ -215,12 +253,14 @@ def file_ext(filename):
     return filename[dot_index:]
 
 
-def gunzip_stream(fileobj, bufsize=1024):
+def gunzip_stream(fileobj, bufsize=_DECOMPRESS_BUFSIZE):
     """Decompress gzipped data on the fly.
 
+    Handles multi-member files (e.g. several gzipped files concatenated
+    together), like :command:`gunzip` does.
+
     :param fileobj: object supporting ``read()``
-    :param bufsize: number of bytes to read from *fileobj* at a time. The
-                    default is the same as in :py:mod:`gzip`.
+    :param bufsize: number of bytes to read from *fileobj* at a time.
 
     .. warning::
 
@@ -232,15 +272,106 @@ def gunzip_stream(fileobj, bufsize=1024):
     # we need this flag to read gzip rather than raw zlib, but it's not
     # actually defined in zlib, so we define it here.
     READ_GZIP_DATA = 16
-    d = zlib.decompressobj(READ_GZIP_DATA | zlib.MAX_WBITS)
+
+    def decompressor():
+        return zlib.decompressobj(READ_GZIP_DATA | zlib.MAX_WBITS)
+
+    for data in _decompress_stream(
+            fileobj, decompressor, bufsize, magic=b'\x1f\x8b'):
+        yield data
+
+
+def unxz_stream(fileobj, bufsize=_DECOMPRESS_BUFSIZE):
+    """Decompress xz (or legacy lzma) data on the fly.
+
+    This requires the :py:mod:`lzma` module, which is part of the standard
+    library in Python 3.3+ (install ``backports.lzma`` on older Pythons).
+
+    :param fileobj: object supporting ``read()``
+    :param bufsize: number of bytes to read from *fileobj* at a time.
+
+    .. warning::
+
+        This yields decompressed chunks; it does *not* split on lines. To get
+        lines, wrap this in :py:func:`to_lines`.
+    """
+    if lzma is None:
+        raise Exception(
+            'lzma module was not successfully imported (likely not'
+            ' installed).')
+
+    # don't try to decompress .lzma files with multiple streams, just .xz
+    for data in _decompress_stream(
+            fileobj, lzma.LZMADecompressor, bufsize, magic=b'\xfd7zXZ\x00'):
+        yield data
+
+
+def _decompress_stream(fileobj, make_decompressor, bufsize, magic):
+    """Yield decompressed chunks of data from *fileobj*, reading *bufsize*
+    bytes at a time. *make_decompressor* is a function that returns a new
+    decompressor object (like ``zlib.decompressobj()``).
+
+    When a decompressor hits the end of its stream, and the remaining data
+    starts with *magic* (the magic number for the compression format),
+    we start a new decompressor, so that we can handle files that are
+    several compressed streams concatenated together. Anything else after
+    the end of a stream is ignored (like :command:`gunzip` does).
+    """
+    d = make_decompressor()
+    chunk = b''
+
     while True:
-        chunk = fileobj.read(bufsize)
         if not chunk:
-            return
-        data = d.decompress(chunk)
+            chunk = fileobj.read(bufsize)
+            if not chunk:
+                break
+
+        if d is None:
+            # previous stream ended. is this the start of another one?
+            while len(chunk) < len(magic):
+                more = fileobj.read(bufsize)
+                if not more:
+                    break
+                chunk += more
+
+            if not chunk.startswith(magic):
+                return  # trailing garbage
+
+            d = make_decompressor()
+
+        try:
+            data = d.decompress(chunk)
+        except EOFError:
+            # Python 2's BZ2Decompressor doesn't have an eof attribute;
+            # it raises EOFError when fed data past the end of the stream
+            d = None
+            continue
+
         if data:
             yield data
 
+        if _at_eof(d):
+            chunk = d.unused_data
+            d = None
+        else:
+            chunk = b''
+
+    if d is not None and hasattr(d, 'flush'):  # zlib only
+        data = d.flush()
+        if data:
+            yield data
+
+
+def _at_eof(d):
+    """Has decompressor *d* reached the end of its stream?"""
+    if hasattr(d, 'eof'):
+        return d.eof
+    else:
+        # Python 2 (zlib only). There's no way to tell if a stream ended
+        # exactly at the end of the data we fed the decompressor, but
+        # feeding it more data will just add to unused_data.
+        return bool(d.unused_data)
+
 
 def log_to_null(name=None):
     """Set up a null handler for the given stream, to suppress
@@ -381,8 +512,12 @@ def read_file(path, fileobj=None, yields_lines=True, cleanup=None):
     """Yields lines from a file, possibly decompressing it based on file
     extension.
 
-    Currently we handle compressed files with the extensions ``.gz`` and
-    ``.bz2``.
+    Currently we handle compressed files with the extensions ``.gz``,
+    ``.bz2`` and ``.xz`` (``.xz`` requires the :py:mod:`lzma` module).
+
+    If *fileobj* is omitted and *path* is a large compressed file,
+    we decompress it in a separate process, using :command:`pigz`,
+    :command:`lbzip2` or :command:`pbzip2` if they're installed.
 
     :param string path: file path. Need not be a path on the local filesystem
                         (URIs are okay) as long as you specify *fileobj* too.
@@ -397,7 +532,16 @@ def read_file(path, fileobj=None, yields_lines=True, cleanup=None):
     # sometimes values declared in the ``try`` block aren't accessible from the
     # ``finally`` block. not sure why.
     f = None
+    cmd_lines = None
     try:
+        if fileobj is None:
+            decompress_args = _external_decompress_args(path)
+            if decompress_args:
+                cmd_lines = _read_from_cmd(decompress_args)
+                for line in cmd_lines:
+                    yield line
+                return
+
         # open path if we need to
         if fileobj is None:
             f = open(path, 'rb')
@@ -407,11 +551,9 @@ def read_file(path, fileobj=None, yields_lines=True, cleanup=None):
         if path.endswith('.gz'):
             lines = to_lines(gunzip_stream(f))
         elif path.endswith('.bz2'):
-            if bz2 is None:
-                raise Exception('bz2 module was not successfully imported'
-                                ' (likely not installed).')
-            else:
-                lines = to_lines(bunzip2_stream(f))
+            lines = to_lines(bunzip2_stream(f))
+        elif path.endswith('.xz'):
+            lines = to_lines(unxz_stream(f))
         else:
             if yields_lines:
                 lines = f
@@ -423,6 +565,8 @@ def read_file(path, fileobj=None, yields_lines=True, cleanup=None):
             yield line
     finally:
         try:
+            if cmd_lines is not None:
+                cmd_lines.close()  # kill subprocess if we stopped early
             if f and f is not fileobj:
                 f.close()
         finally:
@@ -430,11 +574,61 @@ def read_file(path, fileobj=None, yields_lines=True, cleanup=None):
                 cleanup()
 
 
+def _external_decompress_args(path):
+    """If *path* is a large, compressed local file, and we have a binary
+    that can decompress it, return args for a command that will decompress
+    it to stdout. Otherwise, return ``None``.
+    """
+    cmds = _DECOMPRESS_CMDS.get(os.path.splitext(path)[1])
+    if not cmds:
+        return None
+
+    try:
+        if os.path.getsize(path) < _EXTERNAL_DECOMPRESS_MIN_SIZE:
+            return None
+    except OSError:
+        return None  # let open() raise the error
+
+    for cmd in cmds:
+        if which(cmd[0]):
+            return cmd + [path]
+
+    return None
+
+
+def _read_from_cmd(args):
+    """Yield lines from the stdout of the given command. Raise
+    :py:class:`IOError` if the command fails."""
+    # if stderr were a pipe, a command that wrote a lot to it would block
+    # forever, since we don't read stderr until stdout is done
+    with tempfile.TemporaryFile() as stderr:
+        proc = Popen(args, stdout=PIPE, stderr=stderr,
+                     bufsize=_DECOMPRESS_BUFSIZE)
+
+        try:
+            for line in proc.stdout:
+                yield line
+
+            returncode = proc.wait()
+            if returncode:
+                stderr.seek(0)
+                raise IOError('%s failed with status %d: %s' % (
+                    cmd_line(args), returncode,
+                    stderr.read().decode('utf_8', 'replace').strip()))
+        finally:
+            if proc.returncode is None:
+                # caller stopped reading early
+                proc.kill()
+                proc.wait()
+
+            proc.stdout.close()
+
+
 def read_input(path, stdin=None):
     """Stream input the way Hadoop would.
 
     - Resolve globs (``foo_*.gz``).
-    - Decompress ``.gz`` and ``.bz2`` files.
+    - Decompress ``.gz``, ``.bz2`` and ``.xz`` files.
     - If path is ``'-'``, read from stdin
     - If path is a directory, recursively read its contents.
 
@@ -611,6 +805,9 @@ def tar_and_gzip(dir, out_path, filter=None, prefix=''):
 
     If we encounter symlinks, include the actual file, not the symlink.
 
+    Files are added in sorted order, with fixed timestamps and ownership,
+    so archiving the same files always produces the same tarball.
+
     :type dir: str
     :param dir: dir to tar up
     :type out_path: str
@@ -620,27 +817,61 @@ def tar_and_gzip(dir, out_path, filter=None, prefix=''):
     :type prefix: str
     :param prefix: subdirectory inside the tarball to put everything into (e.g.
                    ``'mrjob'``)
+
+    .. versionchanged:: 0.5.8
+
+       output is reproducible
     """
-    if not os.path.isdir(dir):
-        raise IOError('Not a directory: %r' % (dir,))
+    with open(out_path, 'wb') as f:
+        gz = _GzipWriter(f)
+        tar_gz = tarfile.open(fileobj=gz, mode='w')
+        try:
+            for real_path, path_in_tar_gz in _archive_paths(
+                    dir, filter, prefix):
+                st = os.stat(real_path)
+
+                # fixed timestamp and ownership
+                tar_info = tarfile.TarInfo(path_in_tar_gz)
+                tar_info.size = st.st_size
+                tar_info.mode = st.st_mode & 0o7777
+                tar_info.mtime = _ARCHIVE_MTIME
+                tar_info.uid = tar_info.gid = 0
+                tar_info.uname = tar_info.gname = ''
+
+                with open(real_path, 'rb') as src:
+                    tar_gz.addfile(tar_info, src)
+        finally:
+            tar_gz.close()
+            gz.close()
 
-    if not filter:
-        filter = lambda path: True
 
-    tar_gz = tarfile.open(out_path, mode='w:gz')
+class _GzipWriter(object):
+    """Write-only file object that gzips data into *fileobj*, for
+    :py:func:`tar_and_gzip`. Unlike :py:class:`gzip.GzipFile`, its header
+    never includes the time or a filename (``GzipFile``'s *mtime*
+    argument needs Python 2.7)."""
 
-    for dirpath, dirnames, filenames in os.walk(dir, followlinks=True):
-        for filename in filenames:
-            path = os.path.join(dirpath, filename)
-            # janky version of os.path.relpath() (Python 2.6):
-            rel_path = path[len(os.path.join(dir, '')):]
-            if filter(rel_path):
-                # copy over real files, not symlinks
-                real_path = os.path.realpath(path)
-                path_in_tar_gz = os.path.join(prefix, rel_path)
-                tar_gz.add(real_path, arcname=path_in_tar_gz, recursive=False)
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._compressor = zlib.compressobj(
+            9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = zlib.crc32(b'')
+        self._size = 0
+
+        fileobj.write(_GZIP_HEADER)
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._fileobj.write(self._compressor.compress(data))
 
-    tar_gz.close()
+    def tell(self):
+        return self._size
+
+    def close(self):
+        self._fileobj.write(self._compressor.flush())
+        self._fileobj.write(struct.pack(
+            '<LL', self._crc & 0xffffffff, self._size & 0xffffffff))
 
 
 def zip_dir(dir, out_path, filter=None, prefix=''):
@@ -648,6 +879,9 @@ def zip_dir(dir, out_path, filter=None, prefix=''):
 
     If we encounter symlinks, include the actual file, not the symlink.
 
+    Files are added in sorted order, with fixed timestamps, so zipping
+    the same files always produces the same zip file.
+
     :type dir: str
     :param dir: dir to tar up
     :type out_path: str
@@ -657,30 +891,272 @@ def zip_dir(dir, out_path, filter=None, prefix=''):
     :type prefix: str
     :param prefix: subdirectory inside the tarball to put everything into (e.g.
                    ``'mrjob'``)
-    """
-    if not os.path.isdir(dir):
-        raise IOError('Not a directory: %r' % (dir,))
 
-    if not filter:
-        filter = lambda path: True
+    .. versionchanged:: 0.5.8
+
+       output is reproducible
+    """
+    paths = list(_archive_paths(dir, filter, prefix))
 
     try:
         zip_file = ZipFile(out_path, mode='w', compression=ZIP_DEFLATED)
     except RuntimeError:  # zlib not available
         zip_file = ZipFile(out_path, mode='w', compression=ZIP_STORED)
 
+    try:
+        for real_path, path_in_zip_file in paths:
+            st = os.stat(real_path)
+
+            # ZipInfo defaults to a fixed timestamp (1980-01-01)
+            zip_info = ZipInfo(path_in_zip_file)
+            zip_info.compress_type = zip_file.compression
+            zip_info.external_attr = (st.st_mode & 0xFFFF) << 16
+            # lets ZipFile decide whether it needs ZIP64 up front
+            zip_info.file_size = st.st_size
+
+            _zip_write_file(zip_file, zip_info, real_path)
+    finally:
+        zip_file.close()
+
+
+def _zip_write_file(zip_file, zip_info, path):
+    """Copy the file at *path* into *zip_file*, with the metadata in
+    *zip_info*. Like :py:meth:`ZipFile.write`, this streams the file,
+    except on Python versions before 3.6, which can only write a
+    :py:class:`ZipInfo` from a string in memory."""
+    with open(path, 'rb') as src:
+        try:
+            dest = zip_file.open(zip_info, mode='w')
+        except RuntimeError:
+            # before Python 3.6, ZipFile.open() can only read
+            zip_file.writestr(zip_info, src.read())
+            return
+
+        try:
+            shutil.copyfileobj(src, dest, _DECOMPRESS_BUFSIZE)
+        finally:
+            dest.close()
+
+
+def _archive_paths(dir, filter=None, prefix=''):
+    """Helper for :py:func:`tar_and_gzip`, :py:func:`zip_dir`, and
+    :py:func:`_hash_dir`. Yield ``(real_path, path_in_archive)`` for each
+    file in *dir* that we want to archive, in sorted order."""
+    if not os.path.isdir(dir):
+        raise IOError('Not a directory: %r' % (dir,))
+
+    if not filter:
+        filter = lambda path: True
+
     for dirpath, dirnames, filenames in os.walk(dir, followlinks=True):
-        for filename in filenames:
+        # walk in a consistent order
+        dirnames.sort()
+
+        for filename in sorted(filenames):
             path = os.path.join(dirpath, filename)
             # janky version of os.path.relpath() (Python 2.6):
             rel_path = path[len(os.path.join(dir, '')):]
             if filter(rel_path):
                 # copy over real files, not symlinks
                 real_path = os.path.realpath(path)
-                path_in_zip_file = os.path.join(prefix, rel_path)
-                zip_file.write(real_path, arcname=path_in_zip_file)
+                yield real_path, os.path.join(prefix, rel_path)
+
+
+def _hash_dir(dir, filter=None, prefix=''):
+    """Return the MD5 sum (as a hex string) of the names and contents of
+    the files that :py:func:`zip_dir` or :py:func:`tar_and_gzip` would
+    put in an archive, given the same arguments.
+
+    Two directories have the same hash if and only if (barring MD5
+    collisions) they would produce the same archive.
+    """
+    m = hashlib.md5()
+
+    for real_path, path_in_archive in _archive_paths(dir, filter, prefix):
+        st = os.stat(real_path)
+
+        # include the size so that file boundaries are unambiguous
+        m.update(('%s\0%d\0%d\0' % (
+            path_in_archive, st.st_mode, st.st_size)).encode('utf_8'))
+
+        with open(real_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                m.update(chunk)
+
+    return m.hexdigest()
+
+
+def _thread_map(func, args, num_threads):
+    """Like ``map()``, except that we always return a list, and we call
+    *func* in up to *num_threads* threads if there's more than one thing
+    to do. Exceptions from *func* are re-raised in the calling thread."""
+    args = list(args)
+
+    if num_threads <= 1 or len(args) <= 1:
+        return [func(arg) for arg in args]
+
+    pool = ThreadPool(min(num_threads, len(args)))
+    try:
+        return pool.map(func, args)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _thread_imap_unordered(func, args, num_threads):
+    """Like :py:func:`_thread_map`, except that we yield ``(arg, result)``
+    for each item in *args* as soon as *func* returns, in whatever order
+    the calls finish. Exceptions from *func* are re-raised in the calling
+    thread."""
+    args = list(args)
+
+    if num_threads <= 1 or len(args) <= 1:
+        for arg in args:
+            yield arg, func(arg)
+        return
 
-    zip_file.close()
+    pool = ThreadPool(min(num_threads, len(args)))
+    try:
+        for arg_and_result in pool.imap_unordered(
+                lambda arg: (arg, func(arg)), args):
+            yield arg_and_result
+    finally:
+        pool.close()
+        pool.join()
+
+
+class _PrefetchBuffer(object):
+    """Bytestrings read ahead by one background thread in
+    :py:func:`_prefetch_chain`."""
+
+    def __init__(self):
+        self.items = deque()
+        self.num_bytes = 0
+        self.done = False
+        self.error = None
+
+
+def _prefetch_chain(funcs, num_threads, max_bytes, ordered=True):
+    """Call each function in *funcs* (which should return an iterable of
+    bytestrings, like :py:meth:`~mrjob.fs.base.Filesystem._cat_file`) and
+    yield everything they return, reading up to *num_threads* of them
+    ahead in background threads.
+
+    We buffer no more than about *max_bytes* at once; background threads
+    wait until we've yielded what they've read so far.
+
+    If *ordered* is true, we yield the output of each function in turn,
+    as if we'd just called them one at a time. Otherwise, we yield
+    output in whatever order it arrives (output from any one function
+    is still in order).
+
+    Exceptions from *funcs* are re-raised in the calling thread.
+    """
+    funcs = list(funcs)
+
+    if num_threads <= 1 or len(funcs) <= 1:
+        for func in funcs:
+            for item in func():
+                yield item
+        return
+
+    cond = threading.Condition()
+    # set when we stop iterating, so that background threads exit
+    closed = []
+
+    def fill(buf, budget, func_iter):
+        try:
+            while True:
+                with cond:
+                    try:
+                        func = next(func_iter)
+                    except StopIteration:
+                        return
+
+                for item in func():
+                    with cond:
+                        # always let at least one item through, so that we
+                        # can't get stuck on items bigger than the budget
+                        while (buf.items and buf.num_bytes >= budget and
+                               not closed):
+                            cond.wait()
+
+                        if closed:
+                            return
+
+                        buf.items.append(item)
+                        buf.num_bytes += len(item)
+                        cond.notify_all()
+        except Exception as e:
+            with cond:
+                buf.error = e
+        finally:
+            with cond:
+                buf.done = True
+                cond.notify_all()
+
+    def start(buf, budget, func_iter):
+        t = threading.Thread(target=fill, args=(buf, budget, func_iter))
+        t.daemon = True
+        t.start()
+
+    def drain(bufs):
+        """Yield items from *bufs* (in whatever order they arrive) until
+        all of them are done."""
+        while True:
+            with cond:
+                while not (any(buf.items for buf in bufs) or
+                           all(buf.done for buf in bufs)):
+                    cond.wait()
+
+                for buf in bufs:
+                    if buf.error:
+                        raise buf.error
+
+                for buf in bufs:
+                    if buf.items:
+                        item = buf.items.popleft()
+                        buf.num_bytes -= len(item)
+                        cond.notify_all()
+                        break
+                else:
+                    return
+
+            yield item
+
+    try:
+        if ordered:
+            # one buffer per function; start the next function only when
+            # we're done with an earlier one
+            budget = max(max_bytes // num_threads, 1)
+            bufs = [_PrefetchBuffer() for _ in funcs]
+
+            for i in range(min(num_threads, len(funcs))):
+                start(bufs[i], budget, iter([funcs[i]]))
+
+            for i, buf in enumerate(bufs):
+                for item in drain([buf]):
+                    yield item
+
+                if i + num_threads < len(funcs):
+                    start(bufs[i + num_threads], budget,
+                          iter([funcs[i + num_threads]]))
+        else:
+            # each thread calls functions until there are none left
+            func_iter = iter(funcs)
+            bufs = [_PrefetchBuffer()
+                    for _ in range(min(num_threads, len(funcs)))]
+            budget = max(max_bytes // len(bufs), 1)
+
+            for buf in bufs:
+                start(buf, budget, func_iter)
+
+            for item in drain(bufs):
+                yield item
+    finally:
+        with cond:
+            closed.append(True)
+            cond.notify_all()
 
 
 def to_lines(chunks):
@@ -698,28 +1174,64 @@ def to_lines(chunks):
     leftovers = []
 
     for chunk in chunks:
-        start = 0
+        if not chunk:
+            continue
+
+        # chunk is exactly one line
+        if not leftovers and chunk.find(b'\n') == len(chunk) - 1:
+            yield chunk
+            continue
 
-        while start < len(chunk):
-            end = chunk.find(b'\n', start) + 1
+        # bytes.splitlines() splits lines in C, but it also breaks on \r
+        if b'\r' in chunk:
+            lines = _split_on_newlines(chunk)
+        else:
+            lines = chunk.splitlines(True)
 
-            if end == 0:  # no newlines found
-                leftovers.append(chunk[start:])
-                break
+        # the last line may be incomplete
+        last = lines.pop()
 
+        if lines:
             if leftovers:
-                leftovers.append(chunk[start:end])
-                yield b''.join(leftovers)
+                leftovers.append(lines[0])
+                lines[0] = b''.join(leftovers)
                 leftovers = []
-            else:
-                yield chunk[start:end]
 
-            start = end
+            for line in lines:
+                yield line
+
+        if last.endswith(b'\n'):
+            if leftovers:
+                leftovers.append(last)
+                last = b''.join(leftovers)
+                leftovers = []
+
+            yield last
+        else:
+            leftovers.append(last)
 
     if leftovers:
         yield b''.join(leftovers)
 
 
+def _split_on_newlines(chunk):
+    """Like ``chunk.splitlines(True)``, but only break on ``\\n``."""
+    lines = chunk.split(b'\n')
+
+    if lines[-1]:
+        last = lines.pop()
+    else:
+        lines.pop()  # chunk ended with a newline
+        last = None
+
+    lines = [line + b'\n' for line in lines]
+
+    if last is not None:
+        lines.append(last)
+
+    return lines
+
+
 def unique(items):
     """Yield items from *item* in order, skipping duplicates."""
     seen = set()
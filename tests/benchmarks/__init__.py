@@ -0,0 +1,262 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Offline benchmarks for mrjob's hot paths (protocols, line splitting,
+decompression, running tasks, and the sim runners).
+
+Run them with::
+
+    python -m tests.benchmarks -o before.json
+    ... (make changes) ...
+    python -m tests.benchmarks -o after.json --compare before.json
+
+Each benchmark is a function decorated with :py:func:`benchmark`. It's
+called with a scratch directory and a scale factor, does any setup it
+needs, and returns ``(run, num_records, num_bytes)``, where *run* is a
+zero-argument function that does the work to be timed. We time *run*
+several times and report the fastest time, along with records/sec and
+MB/sec.
+"""
+import json
+import logging
+import os
+import platform
+import sys
+from optparse import OptionParser
+from shutil import rmtree
+from subprocess import PIPE
+from subprocess import Popen
+from tempfile import mkdtemp
+from time import gmtime
+from time import strftime
+from timeit import default_timer
+
+import mrjob
+from mrjob.util import log_to_stream
+
+log = logging.getLogger(__name__)
+
+# modules (in this package) that define benchmarks
+_BENCHMARK_MODULES = [
+    'tests.benchmarks.bench_protocol',
+    'tests.benchmarks.bench_util',
+    'tests.benchmarks.bench_job',
+    'tests.benchmarks.bench_runner',
+]
+
+# list of (name, func), in the order they were defined
+_BENCHMARKS = []
+
+# default number of times to run each benchmark
+_DEFAULT_REPEAT = 3
+
+
+def benchmark(name):
+    """Decorator that registers a benchmark under the given *name*.
+    Names should be dotted, starting with the module or class being
+    benchmarked (e.g. ``'util.to_lines'``)."""
+    def decorator(func):
+        _BENCHMARKS.append((name, func))
+        return func
+
+    return decorator
+
+
+def load_benchmarks():
+    """Import all our benchmark modules, and return a list of
+    ``(name, func)``."""
+    for module_name in _BENCHMARK_MODULES:
+        __import__(module_name)
+
+    return list(_BENCHMARKS)
+
+
+def run_benchmarks(benchmarks, scale=1.0, repeat=_DEFAULT_REPEAT):
+    """Run the given benchmarks (a list of ``(name, func)``), and return
+    a dictionary mapping name to results (see :py:func:`run_benchmark`).
+    """
+    results = {}
+
+    for name, func in benchmarks:
+        log.info('running %s' % name)
+        results[name] = run_benchmark(func, scale=scale, repeat=repeat)
+
+    return results
+
+
+def run_benchmark(func, scale=1.0, repeat=_DEFAULT_REPEAT):
+    """Set up and time a single benchmark function.
+
+    Returns a dictionary with the keys ``seconds`` (fastest time),
+    ``mean_seconds``, ``records``, ``bytes``, ``records_per_sec`` and
+    ``mb_per_sec``.
+    """
+    tmp_dir = mkdtemp()
+
+    try:
+        run, num_records, num_bytes = func(tmp_dir, scale)
+
+        times = []
+        for _ in range(repeat):
+            start = default_timer()
+            run()
+            times.append(default_timer() - start)
+    finally:
+        rmtree(tmp_dir)
+
+    seconds = min(times)
+
+    return dict(
+        seconds=seconds,
+        mean_seconds=sum(times) / len(times),
+        records=num_records,
+        bytes=num_bytes,
+        records_per_sec=_rate(num_records, seconds),
+        mb_per_sec=_rate(num_bytes / float(1 << 20), seconds),
+    )
+
+
+def _rate(amount, seconds):
+    if not seconds:
+        return None
+    return amount / seconds
+
+
+def _meta(options):
+    """Information about the environment the benchmarks ran in."""
+    return dict(
+        git_commit=_git_commit(),
+        mrjob_version=mrjob.__version__,
+        platform=platform.platform(),
+        python_version=platform.python_version(),
+        python_implementation=platform.python_implementation(),
+        repeat=options.repeat,
+        scale=options.scale,
+        timestamp=strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()),
+    )
+
+
+def _git_commit():
+    """Return the commit of the mrjob source tree we're benchmarking,
+    or ``None`` if we can't tell."""
+    mrjob_dir = os.path.dirname(os.path.abspath(mrjob.__file__))
+
+    try:
+        proc = Popen(['git', 'rev-parse', 'HEAD'],
+                     cwd=mrjob_dir, stdout=PIPE, stderr=PIPE)
+        stdout, _ = proc.communicate()
+    except OSError:
+        return None
+
+    if proc.returncode:
+        return None
+
+    return stdout.decode('ascii').strip()
+
+
+def _print_results(results, old_results=None, out=None):
+    """Print a human-readable table of *results*, compared to
+    *old_results* if given."""
+    if out is None:
+        out = sys.stderr
+
+    for name in sorted(results):
+        r = results[name]
+        line = '%-50s %10.4fs' % (name, r['seconds'])
+
+        if r['mb_per_sec'] is not None:
+            line += ' %10.2f MB/s' % r['mb_per_sec']
+
+        if old_results and name in old_results:
+            old_seconds = old_results[name]['seconds']
+            if r['seconds']:
+                line += '  (%.2fx)' % (old_seconds / r['seconds'])
+
+        out.write(line + '\n')
+
+
+def main(cl_args=None):
+    option_parser = _make_option_parser()
+    options, args = option_parser.parse_args(cl_args)
+
+    if args:
+        option_parser.error('takes no arguments')
+
+    if not options.quiet:
+        log_to_stream(name=__name__, level=logging.INFO)
+
+    benchmarks = load_benchmarks()
+
+    if options.filters:
+        benchmarks = [(name, func) for name, func in benchmarks
+                      if any(f in name for f in options.filters)]
+
+    if options.list:
+        for name, _ in benchmarks:
+            print(name)
+        return
+
+    results = run_benchmarks(
+        benchmarks, scale=options.scale, repeat=options.repeat)
+
+    old_results = None
+    if options.compare:
+        with open(options.compare) as f:
+            old_results = json.load(f)['results']
+
+    if not options.quiet:
+        _print_results(results, old_results)
+
+    output = json.dumps(dict(meta=_meta(options), results=results),
+                        indent=2, sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+def _make_option_parser():
+    usage = '%prog [options]'
+    description = (
+        "Benchmark mrjob's protocols, utilities, tasks, and sim runners,"
+        ' and write the results as JSON.')
+
+    option_parser = OptionParser(usage=usage, description=description)
+
+    option_parser.add_option(
+        '--compare', dest='compare', default=None,
+        help='Print speedups relative to results in this JSON file')
+    option_parser.add_option(
+        '-k', '--filter', dest='filters', default=[], action='append',
+        help=('Only run benchmarks whose names contain this string.'
+              ' You may use this option multiple times.'))
+    option_parser.add_option(
+        '-l', '--list', dest='list', default=False, action='store_true',
+        help="List benchmarks, but don't run them")
+    option_parser.add_option(
+        '-o', '--output', dest='output', default=None,
+        help='Write JSON results to this file rather than stdout')
+    option_parser.add_option(
+        '-q', '--quiet', dest='quiet', default=False, action='store_true',
+        help="Don't print anything to stderr")
+    option_parser.add_option(
+        '-r', '--repeat', dest='repeat', default=_DEFAULT_REPEAT, type='int',
+        help='Number of times to run each benchmark (default: %default)')
+    option_parser.add_option(
+        '-s', '--scale', dest='scale', default=1.0, type='float',
+        help=('Multiply the size of each benchmark\'s input by this much'
+              ' (default: %default)'))
+
+    return option_parser
@@ -0,0 +1,70 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark running individual tasks (mappers, combiners, reducers)
+inside :py:meth:`~mrjob.job.MRJob.sandbox`."""
+from io import BytesIO
+
+from mrjob.examples.mr_word_freq_count import MRWordFreqCount
+
+from tests.benchmarks import benchmark
+from tests.benchmarks.bench_util import make_lines
+
+# lines of input, at scale 1.0
+_NUM_LINES = 20000
+
+
+def _reducer_input(lines):
+    """Simulate sorted mapper output for MRWordFreqCount."""
+    job = MRWordFreqCount(['--mapper'])
+    job.sandbox(stdin=BytesIO(b''.join(lines)))
+    job.run_mapper()
+
+    return b''.join(sorted(job.stdout.getvalue().splitlines(True)))
+
+
+@benchmark('job.run_mapper')
+def run_mapper_benchmark(tmp_dir, scale):
+    lines = make_lines(int(_NUM_LINES * scale))
+    data = b''.join(lines)
+
+    def run():
+        job = MRWordFreqCount(['--mapper'])
+        job.sandbox(stdin=BytesIO(data))
+        job.run_mapper()
+
+    return run, len(lines), len(data)
+
+
+@benchmark('job.run_combiner')
+def run_combiner_benchmark(tmp_dir, scale):
+    data = _reducer_input(make_lines(int(_NUM_LINES * scale)))
+
+    def run():
+        job = MRWordFreqCount(['--combiner'])
+        job.sandbox(stdin=BytesIO(data))
+        job.run_combiner()
+
+    return run, data.count(b'\n'), len(data)
+
+
+@benchmark('job.run_reducer')
+def run_reducer_benchmark(tmp_dir, scale):
+    data = _reducer_input(make_lines(int(_NUM_LINES * scale)))
+
+    def run():
+        job = MRWordFreqCount(['--reducer'])
+        job.sandbox(stdin=BytesIO(data))
+        job.run_reducer()
+
+    return run, data.count(b'\n'), len(data)
@@ -0,0 +1,105 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark reading and writing every protocol in :py:mod:`mrjob.protocol`.
+"""
+from mrjob import protocol
+
+from tests.benchmarks import benchmark
+
+# records per benchmark, at scale 1.0
+_NUM_RECORDS = 20000
+
+# structured data, for JSON, pickle, and repr protocols
+_KEY = [u'user', 1234]
+_VALUE = {
+    u'name': u'Qu\xe9bec',
+    u'counts': [1, 2, 3, 5, 8, 13],
+    u'score': 0.5,
+    u'tags': [u'foo', u'bar'],
+    u'active': True,
+}
+
+# (protocol name, optional module it depends on or None)
+_STRUCTURED_PROTOCOLS = [
+    ('PickleProtocol', None),
+    ('PickleValueProtocol', None),
+    ('ReprProtocol', None),
+    ('ReprValueProtocol', None),
+    ('SimpleJSONProtocol', 'simplejson'),
+    ('SimpleJSONValueProtocol', 'simplejson'),
+    ('StandardJSONProtocol', None),
+    ('StandardJSONValueProtocol', None),
+    ('UltraJSONProtocol', 'ujson'),
+    ('UltraJSONValueProtocol', 'ujson'),
+]
+
+# (protocol name, key, value) for protocols that take strings
+_STRING_PROTOCOLS = [
+    ('BytesProtocol', b'user_1234', b'x' * 100),
+    ('BytesValueProtocol', None, b'x' * 100),
+    ('TextProtocol', u'user_1234', u'x' * 100),
+    ('TextValueProtocol', None, u'x' * 100),
+]
+
+# size of arrays for NumPy protocols
+_ARRAY_SIZE = 100
+
+
+def _register(name, make_protocol, key, value):
+    """Register read and write benchmarks for the given protocol."""
+
+    @benchmark('protocol.%s.read' % name)
+    def read(tmp_dir, scale):
+        p = make_protocol()
+        line = p.write(key, value)
+        lines = [line] * int(_NUM_RECORDS * scale)
+
+        def run():
+            read = make_protocol().read
+            for line in lines:
+                read(line)
+
+        return run, len(lines), len(line) * len(lines)
+
+    @benchmark('protocol.%s.write' % name)
+    def write(tmp_dir, scale):
+        num_records = int(_NUM_RECORDS * scale)
+        num_bytes = len(make_protocol().write(key, value)) * num_records
+
+        def run():
+            write = make_protocol().write
+            for _ in range(num_records):
+                write(key, value)
+
+        return run, num_records, num_bytes
+
+
+def _register_all():
+    for name, dependency in _STRUCTURED_PROTOCOLS:
+        if dependency and getattr(protocol, dependency) is None:
+            continue
+        _register(name, getattr(protocol, name), _KEY, _VALUE)
+
+    for name, key, value in _STRING_PROTOCOLS:
+        _register(name, getattr(protocol, name), key, value)
+
+    if protocol.numpy is not None:
+        array = protocol.numpy.arange(float(_ARRAY_SIZE))
+
+        _register('NumpyProtocol', protocol.NumpyProtocol, _KEY, array)
+        _register('NumpyValueProtocol', protocol.NumpyValueProtocol,
+                  None, array)
+
+
+_register_all()
@@ -0,0 +1,52 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark the sim runners (inline and local) end to end."""
+import os
+
+from mrjob.examples.mr_word_freq_count import MRWordFreqCount
+
+from tests.benchmarks import benchmark
+from tests.benchmarks.bench_util import make_lines
+from tests.quiet import no_handlers_for_logger
+
+# lines of input, at scale 1.0
+_NUM_LINES = 20000
+
+
+def _register(runner_alias):
+
+    @benchmark('runner.%s' % runner_alias)
+    def run_job(tmp_dir, scale):
+        lines = make_lines(int(_NUM_LINES * scale))
+
+        input_path = os.path.join(tmp_dir, 'input.txt')
+        with open(input_path, 'wb') as f:
+            f.writelines(lines)
+
+        def run():
+            job = MRWordFreqCount(
+                ['-r', runner_alias, '--no-conf', input_path])
+            job.sandbox()
+
+            with no_handlers_for_logger('mrjob'):
+                with job.make_runner() as runner:
+                    runner.run()
+                    for _ in runner.stream_output():
+                        pass
+
+        return run, len(lines), os.path.getsize(input_path)
+
+
+_register('inline')
+_register('local')
@@ -0,0 +1,161 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark line splitting, decompression, and reading input."""
+import bz2
+import os
+import random
+from io import BytesIO
+
+from mrjob.util import bunzip2_stream
+from mrjob.util import gunzip_stream
+from mrjob.util import read_file
+from mrjob.util import read_input
+from mrjob.util import to_lines
+
+from tests.benchmarks import benchmark
+from tests.compress import gzip_compress
+from tests.sandbox import random_seed
+
+# lines of input, at scale 1.0
+_NUM_LINES = 100000
+
+# size of chunks fed to to_lines()
+_CHUNK_SIZE = 64 * 1024
+
+# number of files of each type for read_input()
+_NUM_FILES = 4
+
+_WORDS = [b'apple', b'banana', b'cherry', b'durian', b'elderberry',
+          b'fig', b'grape', b'huckleberry', b'\xe9clair', b'zucchini']
+
+
+def make_lines(num_lines, seed=0):
+    """Return a list of *num_lines* lines of pseudo-random text (with
+    trailing newlines), roughly like log lines."""
+    with random_seed(seed):
+        return [
+            b' '.join(random.choice(_WORDS)
+                      for _ in range(random.randint(1, 20))) + b'\n'
+            for _ in range(num_lines)
+        ]
+
+
+def _chunks(data, chunk_size=_CHUNK_SIZE):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def _consume(iterable):
+    for _ in iterable:
+        pass
+
+
+@benchmark('util.to_lines')
+def to_lines_benchmark(tmp_dir, scale):
+    lines = make_lines(int(_NUM_LINES * scale))
+    data = b''.join(lines)
+    chunks = _chunks(data)
+
+    def run():
+        _consume(to_lines(chunks))
+
+    return run, len(lines), len(data)
+
+
+@benchmark('util.to_lines.line_chunks')
+def to_lines_line_chunks_benchmark(tmp_dir, scale):
+    # chunks that are already lines (idempotency case)
+    lines = make_lines(int(_NUM_LINES * scale))
+
+    def run():
+        _consume(to_lines(lines))
+
+    return run, len(lines), sum(len(line) for line in lines)
+
+
+@benchmark('util.gunzip_stream')
+def gunzip_stream_benchmark(tmp_dir, scale):
+    lines = make_lines(int(_NUM_LINES * scale))
+    data = b''.join(lines)
+    gz_data = gzip_compress(data)
+
+    def run():
+        _consume(gunzip_stream(BytesIO(gz_data)))
+
+    return run, len(lines), len(data)
+
+
+@benchmark('util.bunzip2_stream')
+def bunzip2_stream_benchmark(tmp_dir, scale):
+    lines = make_lines(int(_NUM_LINES * scale))
+    data = b''.join(lines)
+    bz2_data = bz2.compress(data)
+
+    def run():
+        _consume(bunzip2_stream(BytesIO(bz2_data)))
+
+    return run, len(lines), len(data)
+
+
+def _register_read_file(ext, compress):
+
+    @benchmark('util.read_file.%s' % (ext.lstrip('.') or 'plain'))
+    def read_file_benchmark(tmp_dir, scale):
+        lines = make_lines(int(_NUM_LINES * scale))
+        data = b''.join(lines)
+
+        path = os.path.join(tmp_dir, 'input' + ext)
+        with open(path, 'wb') as f:
+            f.write(compress(data) if compress else data)
+
+        def run():
+            _consume(read_file(path))
+
+        return run, len(lines), len(data)
+
+
+_register_read_file('', None)
+_register_read_file('.gz', gzip_compress)
+_register_read_file('.bz2', bz2.compress)
+
+
+@benchmark('util.read_input')
+def read_input_benchmark(tmp_dir, scale):
+    # a directory of plain, gzipped, and bzip2ed files
+    input_dir = os.path.join(tmp_dir, 'input')
+    os.mkdir(input_dir)
+
+    lines_per_file = int(_NUM_LINES * scale / (_NUM_FILES * 3))
+    num_lines = 0
+    num_bytes = 0
+
+    for i in range(_NUM_FILES):
+        for ext, compress in [('', None),
+                              ('.gz', gzip_compress),
+                              ('.bz2', bz2.compress)]:
+            lines = make_lines(lines_per_file, seed=i)
+            data = b''.join(lines)
+            num_lines += len(lines)
+            num_bytes += len(data)
+
+            if compress:
+                data = compress(data)
+
+            path = os.path.join(input_dir, 'part-%05d%s' % (i, ext))
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def run():
+        _consume(read_input(input_dir))
+
+    return run, num_lines, num_bytes
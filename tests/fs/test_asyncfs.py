@@ -0,0 +1,138 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import threading
+import time
+
+from mrjob.fs.asyncfs import AsyncFilesystem
+from mrjob.fs.local import LocalFilesystem
+
+from tests.py2 import patch
+from tests.sandbox import SandboxedTestCase
+
+
+class SlowLocalFilesystem(LocalFilesystem):
+    """LocalFilesystem whose exists() blocks until *release* is set, and
+    which keeps track of how many calls to exists() are in flight."""
+
+    def __init__(self):
+        super(SlowLocalFilesystem, self).__init__()
+        self.release = threading.Event()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def exists(self, path_glob):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            self.release.wait()
+            return super(SlowLocalFilesystem, self).exists(path_glob)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _put(self, local_path, target):
+        shutil.copy(local_path, target)
+
+
+class AsyncFilesystemTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(AsyncFilesystemTestCase, self).setUp()
+
+        self.fs = AsyncFilesystem(LocalFilesystem())
+        self.addCleanup(self.fs.close)
+
+        self.dir = self.makedirs('data')
+
+    def test_bad_max_threads(self):
+        self.assertRaises(ValueError, AsyncFilesystem, LocalFilesystem(), 0)
+
+    def test_cat(self):
+        self.makefile(os.path.join(self.dir, 'a'), b'foo\nbar\n')
+
+        self.assertEqual(self.fs.cat(self.dir + '/a').result(),
+                         b'foo\nbar\n')
+
+    def test_du(self):
+        self.makefile(os.path.join(self.dir, 'a'), b'foo\n')
+        self.assertEqual(self.fs.du(self.dir).result(), 4)
+
+    def test_exists(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+
+        self.assertTrue(self.fs.exists(foo_path).result())
+        self.assertFalse(self.fs.exists(self.dir + '/bar').result())
+
+    def test_ls(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+        self.assertEqual(self.fs.ls(self.dir).result(), [foo_path])
+
+    def test_put(self):
+        fs = AsyncFilesystem(SlowLocalFilesystem())
+        self.addCleanup(fs.close)
+
+        local_path = self.makefile('foo', b'bar')
+        foo_path = os.path.join(self.dir, 'foo')
+
+        fs.put(local_path, foo_path).result()
+
+        with open(foo_path, 'rb') as f:
+            self.assertEqual(f.read(), b'bar')
+
+    def test_rm(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+        self.fs.rm(foo_path).result()
+        self.assertFalse(os.path.exists(foo_path))
+
+    def test_reraises_errors(self):
+        with patch.object(self.fs.fs, 'exists', side_effect=IOError):
+            future = self.fs.exists(self.dir)
+            self.assertRaises(IOError, future.result)
+
+    def test_operations_overlap(self):
+        slow_fs = SlowLocalFilesystem()
+
+        with AsyncFilesystem(slow_fs, max_threads=3) as fs:
+            futures = [fs.exists(self.dir) for _ in range(5)]
+            self.assertFalse(any(f.done() for f in futures))
+
+            # wait for the pool to fill up
+            while slow_fs.in_flight < 3:
+                time.sleep(0.01)
+
+            slow_fs.release.set()
+            self.assertTrue(all(f.result() for f in futures))
+
+        # ran three at a time, no more
+        self.assertEqual(slow_fs.max_in_flight, 3)
+
+    def test_close_waits_for_operations(self):
+        slow_fs = SlowLocalFilesystem()
+        fs = AsyncFilesystem(slow_fs)
+
+        future = fs.exists(self.dir)
+        slow_fs.release.set()
+        fs.close()
+
+        self.assertTrue(future.done())
+        self.assertTrue(future.result())
+
+    def test_can_reuse_after_close(self):
+        self.fs.close()
+        self.assertTrue(self.fs.exists(self.dir).result())
@@ -0,0 +1,156 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+
+from mrjob.fs.composite import CompositeFilesystem
+from mrjob.fs.local import LocalFilesystem
+
+from tests.py2 import patch
+from tests.sandbox import SandboxedTestCase
+
+
+class CountingLocalFilesystem(LocalFilesystem):
+    """LocalFilesystem that counts how many times each method is called,
+    and has a ``_put()`` method, like the Hadoop filesystems."""
+
+    def __init__(self):
+        super(CountingLocalFilesystem, self).__init__()
+        self.calls = []
+
+    def exists(self, path_glob):
+        self.calls.append('exists')
+        return super(CountingLocalFilesystem, self).exists(path_glob)
+
+    def ls(self, path_glob):
+        self.calls.append('ls')
+        return super(CountingLocalFilesystem, self).ls(path_glob)
+
+    def ls_detailed(self, path_glob):
+        self.calls.append('ls_detailed')
+        return super(CountingLocalFilesystem, self).ls_detailed(path_glob)
+
+    def _put(self, local_path, target):
+        shutil.copy(local_path, target)
+
+
+class CompositeFSCacheTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(CompositeFSCacheTestCase, self).setUp()
+
+        self.local_fs = CountingLocalFilesystem()
+        self.fs = CompositeFilesystem(self.local_fs, cache_secs=60)
+
+        self.dir = self.makedirs('data')
+
+    def test_no_cache_by_default(self):
+        fs = CompositeFilesystem(self.local_fs)
+
+        self.assertFalse(fs.exists(self.dir + '/foo'))
+        self.assertFalse(fs.exists(self.dir + '/foo'))
+
+        self.assertEqual(self.local_fs.calls, ['exists', 'exists'])
+
+    def test_bad_keyword_arg(self):
+        self.assertRaises(TypeError, CompositeFilesystem,
+                          self.local_fs, cache_sex=60)
+
+    def test_exists(self):
+        self.assertFalse(self.fs.exists(self.dir + '/foo'))
+        self.assertFalse(self.fs.exists(self.dir + '/foo'))
+
+        self.assertEqual(self.local_fs.calls, ['exists'])
+
+    def test_ls(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+
+        self.assertEqual(list(self.fs.ls(self.dir)), [foo_path])
+        self.assertEqual(list(self.fs.ls(self.dir)), [foo_path])
+
+        self.assertEqual(self.local_fs.calls, ['ls'])
+
+    def test_ls_detailed(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'), 'bar')
+
+        items = list(self.fs.ls_detailed(self.dir))
+        self.assertEqual([(item['uri'], item['size']) for item in items],
+                         [(foo_path, 3)])
+
+        # modifying results doesn't affect the cache
+        items[0]['size'] = 4
+
+        self.assertEqual(
+            [item['size'] for item in self.fs.ls_detailed(self.dir)], [3])
+        self.assertEqual(self.local_fs.calls.count('ls_detailed'), 1)
+
+    def test_listed_files_exist(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+
+        self.assertEqual(list(self.fs.ls(self.dir)), [foo_path])
+        self.assertTrue(self.fs.exists(foo_path))
+
+        self.assertEqual(self.local_fs.calls, ['ls'])
+
+    def test_cache_expires(self):
+        with patch('time.time', return_value=1000.0):
+            self.assertFalse(self.fs.exists(self.dir + '/foo'))
+
+        with patch('time.time', return_value=1059.0):
+            self.assertFalse(self.fs.exists(self.dir + '/foo'))
+
+        self.assertEqual(self.local_fs.calls, ['exists'])
+
+        with patch('time.time', return_value=1061.0):
+            self.assertFalse(self.fs.exists(self.dir + '/foo'))
+
+        self.assertEqual(self.local_fs.calls, ['exists', 'exists'])
+
+    def test_doesnt_cache_errors(self):
+        with patch.object(self.local_fs, 'exists', side_effect=IOError):
+            self.assertRaises(IOError, self.fs.exists, self.dir)
+
+        self.assertTrue(self.fs.exists(self.dir))
+
+    def test_clear_cache(self):
+        self.assertFalse(self.fs.exists(self.dir + '/foo'))
+        self.fs.clear_cache()
+        self.assertFalse(self.fs.exists(self.dir + '/foo'))
+
+        self.assertEqual(self.local_fs.calls, ['exists', 'exists'])
+
+    def test_mkdir_clears_cache(self):
+        self.assertFalse(self.fs.exists(self.dir + '/foo'))
+        self.fs.mkdir(self.dir + '/foo')
+        self.assertTrue(self.fs.exists(self.dir + '/foo'))
+
+    def test_touchz_clears_cache(self):
+        self.assertEqual(list(self.fs.ls(self.dir)), [])
+        self.fs.touchz(self.dir + '/foo')
+        self.assertEqual(list(self.fs.ls(self.dir)), [self.dir + '/foo'])
+
+    def test_rm_clears_cache(self):
+        foo_path = self.makefile(os.path.join(self.dir, 'foo'))
+
+        self.assertTrue(self.fs.exists(foo_path))
+        self.fs.rm(foo_path)
+        self.assertFalse(self.fs.exists(foo_path))
+
+    def test_put_clears_cache(self):
+        local_path = self.makefile('foo')
+        foo_path = os.path.join(self.dir, 'foo')
+
+        self.assertFalse(self.fs.exists(foo_path))
+        self.fs._put(local_path, foo_path)
+        self.assertTrue(self.fs.exists(foo_path))
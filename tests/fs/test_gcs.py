@@ -12,8 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import bz2
+import errno
+import hashlib
 import io
 import sys
+import threading
+import time
 from tests.py2 import patch
 from tests.py2 import mock
 from tests.py2 import skipIf
@@ -32,9 +36,11 @@ except ImportError:
     google_http = None
 
 from mrjob.fs.gcs import GCSFilesystem
+from mrjob.util import _thread_map
 
 from tests.compress import gzip_compress
 from tests.mockgoogleapiclient import MockGoogleAPITestCase
+from tests.quiet import no_handlers_for_logger
 from tests.sandbox import PatcherTestCase
 
 
@@ -43,6 +49,7 @@ class GCSFSTestCase(MockGoogleAPITestCase):
     def setUp(self):
         super(GCSFSTestCase, self).setUp()
         self.fs = GCSFilesystem()
+        self.addCleanup(self.fs.close)
 
     def test_cat_uncompressed(self):
         self.put_gcs_multi({
@@ -68,6 +75,69 @@ class GCSFSTestCase(MockGoogleAPITestCase):
         self.assertEqual(list(self.fs._cat_file('gs://walrus/data/foo.gz')),
                          [b'foo\n'] * 10000)
 
+    def test_cat_in_chunks(self):
+        data = b''.join(('%05d\n' % i).encode('ascii') for i in range(1000))
+        self.put_gcs_multi({'gs://walrus/data/foo': data})
+
+        fs = GCSFilesystem(read_chunk_size=1000)
+        self.addCleanup(fs.close)
+
+        self.assertEqual(b''.join(fs._cat_file('gs://walrus/data/foo')),
+                         data)
+
+    def test_reads_share_thread_pool(self):
+        data = b'foo\n' * 1000
+        self.put_gcs_multi({'gs://walrus/data/foo': data,
+                            'gs://walrus/data/bar': data})
+
+        fs = GCSFilesystem(read_chunk_size=100)
+
+        self.assertEqual(b''.join(fs._cat_file('gs://walrus/data/foo')),
+                         data)
+        pool = fs._read_pool
+        self.assertIsNotNone(pool)
+
+        self.assertEqual(b''.join(fs._cat_file('gs://walrus/data/bar')),
+                         data)
+        self.assertIs(fs._read_pool, pool)
+
+        fs.close()
+        self.assertIsNone(fs._read_pool)
+
+    def test_cat_gz_in_chunks(self):
+        self.put_gcs_multi({
+            'gs://walrus/data/foo.gz': gzip_compress(b'foo\n' * 10000)
+        })
+
+        fs = GCSFilesystem(read_chunk_size=10)
+        self.addCleanup(fs.close)
+
+        self.assertEqual(list(fs._cat_file('gs://walrus/data/foo.gz')),
+                         [b'foo\n'] * 10000)
+
+    def test_cat_starts_with_small_chunk(self):
+        data = b''.join(('%07d\n' % i).encode('ascii')
+                        for i in range(128 * 1024))  # 1 MiB
+        self.put_gcs_multi({'gs://walrus/data/foo': data})
+
+        ranges = []
+        download_range = self.fs._download_range
+
+        def record_download_range(src_uri, start, end, generation=None):
+            ranges.append((start, end))
+            return download_range(src_uri, start, end, generation)
+
+        with patch.object(self.fs, '_download_range',
+                          side_effect=record_download_range):
+            lines = self.fs._cat_file('gs://walrus/data/foo')
+            self.assertEqual(next(lines), b'0000000\n')
+            self.assertEqual(b''.join(lines), data[8:])
+
+        # didn't wait for a whole (8 MiB) chunk to get the first line
+        self.assertEqual(sorted(ranges), [
+            (0, 256 * 1024), (256 * 1024, 768 * 1024),
+            (768 * 1024, 1024 * 1024)])
+
     def test_ls_key(self):
         self.put_gcs_multi({
             'gs://walrus/data/foo': b''
@@ -124,6 +194,20 @@ class GCSFSTestCase(MockGoogleAPITestCase):
         self.assertEqual(set(self.fs.ls('gs://w/*b')),
                          set(['gs://w/a/b', 'gs://w/ab', 'gs://w/b']))
 
+    def test_ls_globs_prune_directories(self):
+        self.put_gcs_multi({
+            'gs://logs/j-1/2016-10-15/a.gz': b'',
+            'gs://logs/j-1/2016-10-16/a.gz': b'',
+            'gs://logs/j-1/2016-10-16/b.txt': b'',
+            'gs://logs/j-2/2016-10-16/c.gz': b'',
+        })
+
+        self.assertEqual(sorted(self.fs.ls('gs://logs/*/2016-10-16/*.gz')),
+                         ['gs://logs/j-1/2016-10-16/a.gz',
+                          'gs://logs/j-2/2016-10-16/c.gz'])
+
+        self.assertEqual(list(self.fs.ls('gs://logs/*/a.gz')), [])
+
     def test_du(self):
         self.put_gcs_multi({
             'gs://walrus/data/foo': b'abcde',
@@ -134,6 +218,32 @@ class GCSFSTestCase(MockGoogleAPITestCase):
         self.assertEqual(self.fs.du('gs://walrus/data/foo'), 5)
         self.assertEqual(self.fs.du('gs://walrus/data/bar/baz'), 3)
 
+    def test_ls_detailed(self):
+        self.put_gcs_multi({
+            'gs://walrus/data/foo': b'abcde',
+            'gs://walrus/data/bar/baz': b'fgh'
+        })
+
+        items = sorted(self.fs.ls_detailed('gs://walrus/data'),
+                       key=lambda item: item['uri'])
+
+        self.assertEqual([item['uri'] for item in items],
+                         ['gs://walrus/data/bar/baz', 'gs://walrus/data/foo'])
+        self.assertEqual([item['size'] for item in items], [3, 5])
+        self.assertEqual([item['checksum'] for item in items],
+                         [hashlib.md5(b'fgh').hexdigest(),
+                          hashlib.md5(b'abcde').hexdigest()])
+        for item in items:
+            self.assertAlmostEqual(item['mtime'], time.time(), delta=60)
+
+    def test_md5sum(self):
+        self.put_gcs_multi({
+            'gs://walrus/data/foo': b'abcde',
+        })
+
+        self.assertEqual(self.fs.md5sum('gs://walrus/data/foo'),
+                         hashlib.md5(b'abcde').hexdigest())
+
     def test_exists(self):
         self.put_gcs_multi({
             'gs://walrus/data/foo': b'abcd'
@@ -162,6 +272,185 @@ class GCSFSTestCase(MockGoogleAPITestCase):
         self.assertEqual(self.fs.exists('gs://walrus/data/foo'), False)
         self.assertEqual(self.fs.exists('gs://walrus/data/bar/baz'), False)
 
+    def test_rm_returns_counts(self):
+        self.put_gcs_multi({
+            'gs://walrus/data/foo': b'',
+            'gs://walrus/data/bar/baz': b'',
+        })
+
+        self.assertEqual(self.fs.rm('gs://walrus/data'), (2, 0))
+        self.assertEqual(self.fs.rm('gs://walrus/data'), (0, 0))
+
+    def test_rm_many_objects(self):
+        self.put_gcs_multi(dict(
+            ('gs://walrus/tmp/part-%05d' % i, b'') for i in range(250)))
+
+        self.assertEqual(self.fs.rm('gs://walrus/tmp/'), (250, 0))
+        self.assertEqual(list(self.fs.ls('gs://walrus/tmp/')), [])
+
+        # 100 deletes per batch
+        self.assertEqual(sorted(self._gcs_client.mock_batch_sizes),
+                         [50, 100, 100])
+
+    def test_rm_with_failures(self):
+        self.put_gcs_multi({
+            'gs://walrus/data/foo': b'',
+            'gs://walrus/data/bar': b'',
+        })
+
+        objects = self._gcs_client.objects()
+        orig_delete = objects.delete
+
+        def delete(bucket=None, object=None):
+            if object == 'data/bar':
+                req = mock.MagicMock(google_http.HttpRequest)
+                req.execute.side_effect = _http_exception(403)
+                return req
+            return orig_delete(bucket=bucket, object=object)
+
+        with patch.object(objects, 'delete', side_effect=delete):
+            with no_handlers_for_logger('mrjob.fs.gcs'):
+                self.assertEqual(self.fs.rm('gs://walrus/data'), (1, 1))
+
+        self.assertEqual(list(self.fs.ls('gs://walrus/data')),
+                         ['gs://walrus/data/bar'])
+
+    def test_put(self):
+        self._gcs_fs.create_bucket(project='test-project', name='walrus')
+        path = self.makefile('foo.txt', b'bar\n')
+
+        self.fs.put(path, 'gs://walrus/data/foo.txt')
+
+        self.assertEqual(list(self.fs.cat('gs://walrus/data/foo.txt')),
+                         [b'bar\n'])
+        # no need to check if the file exists first
+        self.assertEqual(self._gcs_client.mock_requests[0], 'insert')
+
+    def test_put_doesnt_overwrite(self):
+        self.put_gcs_multi({'gs://walrus/data/foo.txt': b'baz\n'})
+        path = self.makefile('foo.txt', b'bar\n')
+
+        try:
+            self.fs.put(path, 'gs://walrus/data/foo.txt')
+        except IOError as e:
+            self.assertEqual(e.errno, errno.EEXIST)
+        else:
+            self.fail('expected IOError')
+
+        self.assertEqual(list(self.fs.cat('gs://walrus/data/foo.txt')),
+                         [b'baz\n'])
+
+    def test_put_in_parts(self):
+        self._gcs_fs.create_bucket(project='test-project', name='walrus')
+        data = b''.join(('%04d\n' % i).encode('ascii') for i in range(1000))
+        path = self.makefile('foo.txt', data)
+
+        fs = GCSFilesystem(upload_part_size=1000)
+        fs.put(path, 'gs://walrus/data/foo.txt')
+
+        self.assertEqual(b''.join(fs.cat('gs://walrus/data/foo.txt')), data)
+
+        requests = self._gcs_client.mock_requests
+        self.assertEqual(requests.count('insert'), 5)
+        self.assertEqual(requests.count('compose'), 1)
+
+        # cleaned up parts
+        self.assertEqual(list(fs.ls('gs://walrus/data/')),
+                         ['gs://walrus/data/foo.txt'])
+
+    def test_put_in_parts_has_no_md5_hash(self):
+        self._gcs_fs.create_bucket(project='test-project', name='walrus')
+        path = self.makefile('foo.txt', b'bar\n' * 1000)
+
+        fs = GCSFilesystem(upload_part_size=1000)
+        fs.put(path, 'gs://walrus/data/foo.txt')
+
+        self.assertEqual(
+            [item['checksum'] for item in fs.ls_detailed('gs://walrus/data')],
+            [None])
+        self.assertRaises(IOError, fs.md5sum, 'gs://walrus/data/foo.txt')
+
+    def test_put_in_parts_max_compose_sources(self):
+        self._gcs_fs.create_bucket(project='test-project', name='walrus')
+        data = b'x' * 1000
+        path = self.makefile('foo.txt', data)
+
+        fs = GCSFilesystem(upload_part_size=10)
+        fs.put(path, 'gs://walrus/data/foo.txt')
+
+        self.assertEqual(b''.join(fs.cat('gs://walrus/data/foo.txt')), data)
+        # 1000 / 32 rounds up to 32 bytes per part
+        self.assertEqual(self._gcs_client.mock_requests.count('insert'), 32)
+
+    def test_put_in_parts_doesnt_overwrite(self):
+        self.put_gcs_multi({'gs://walrus/data/foo.txt': b'baz\n'})
+        path = self.makefile('foo.txt', b'bar\n' * 1000)
+
+        fs = GCSFilesystem(upload_part_size=1000)
+        self.assertRaises(IOError, fs.put, path, 'gs://walrus/data/foo.txt')
+
+        self.assertEqual(list(fs.cat('gs://walrus/data/foo.txt')),
+                         [b'baz\n'])
+        self.assertEqual(list(fs.ls('gs://walrus/data/')),
+                         ['gs://walrus/data/foo.txt'])
+
+    def test_touchz(self):
+        self._gcs_fs.create_bucket(project='test-project', name='walrus')
+
+        self.fs.touchz('gs://walrus/empty')
+        self.assertEqual(self.fs.du('gs://walrus/empty'), 0)
+
+        self.assertRaises(IOError, self.fs.touchz, 'gs://walrus/empty')
+
+
+class GCSFSAPIClientTestCase(PatcherTestCase):
+
+    def setUp(self):
+        super(GCSFSAPIClientTestCase, self).setUp()
+
+        self.fs = GCSFilesystem()
+
+        self.mock_make_api_client = self.start(patch.object(
+            self.fs, '_make_api_client', side_effect=mock.Mock))
+
+    def get_api_clients(self, num_threads):
+        # don't let threads exit until they've all got their client
+        all_started = threading.Condition()
+        started = []
+
+        def get_api_client(_):
+            api_client = self.fs.api_client
+
+            with all_started:
+                started.append(api_client)
+                all_started.notify_all()
+                while len(started) < num_threads:
+                    all_started.wait()
+
+            return api_client
+
+        return _thread_map(get_api_client, range(num_threads), num_threads)
+
+    def test_one_client_per_thread(self):
+        api_clients = self.get_api_clients(3)
+
+        self.assertEqual(len(set(map(id, api_clients))), 3)
+        self.assertEqual(self.mock_make_api_client.call_count, 3)
+
+    def test_reuse_clients_from_exited_threads(self):
+        api_clients = self.get_api_clients(3)
+        more_api_clients = self.get_api_clients(4)
+
+        self.assertEqual(self.mock_make_api_client.call_count, 4)
+        self.assertTrue(set(map(id, api_clients)) <=
+                        set(map(id, more_api_clients)))
+
+    def test_main_thread_has_own_client(self):
+        api_client = self.fs.api_client
+        self.assertIs(self.fs.api_client, api_client)
+
+        self.assertNotIn(id(api_client), map(id, self.get_api_clients(2)))
+
 
 def _http_exception(status_code):
     mock_resp = mock.Mock()
@@ -0,0 +1,145 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from mrjob.fs.globbing import _glob_literal_prefix
+from mrjob.fs.globbing import _ls_prefix_glob
+from mrjob.fs.globbing import _split_bucket_glob
+
+from tests.py2 import TestCase
+
+
+class SplitBucketGlobTestCase(TestCase):
+
+    def test_basic(self):
+        self.assertEqual(_split_bucket_glob('s3://walrus/logs/*.gz'),
+                         ('walrus', 'logs/*.gz'))
+
+    def test_question_mark_isnt_a_query(self):
+        self.assertEqual(_split_bucket_glob('gs://walrus/data?/x'),
+                         ('walrus', 'data?/x'))
+
+    def test_bucket_only(self):
+        self.assertEqual(_split_bucket_glob('s3://walrus'), ('walrus', ''))
+        self.assertEqual(_split_bucket_glob('s3://walrus/'), ('walrus', ''))
+
+
+class GlobLiteralPrefixTestCase(TestCase):
+
+    def test_literal_prefix(self):
+        self.assertEqual(_glob_literal_prefix('part-*'), 'part-')
+        self.assertEqual(_glob_literal_prefix('a?c'), 'a')
+        self.assertEqual(_glob_literal_prefix('[ab]c'), '')
+        self.assertEqual(_glob_literal_prefix('abc'), 'abc')
+
+
+class LsPrefixGlobTestCase(TestCase):
+
+    KEYS = [
+        'logs/2016-10-15/a.gz',
+        'logs/2016-10-16/a.gz',
+        'logs/2016-10-16/b.txt',
+        'logs/2016-10-16/sub/c.gz',
+        'other/2016-10-16/a.gz',
+        'top',
+    ]
+
+    def setUp(self):
+        self.listed = []
+
+    def list_dirs(self, prefix):
+        self.listed.append(('dirs', prefix))
+
+        dirs = set()
+        for key in self.KEYS:
+            if key.startswith(prefix) and '/' in key[len(prefix):]:
+                dirs.add(key[:key.index('/', len(prefix)) + 1])
+        return sorted(dirs)
+
+    def list_keys(self, prefix):
+        self.listed.append(('keys', prefix))
+
+        for key in self.KEYS:
+            if key.startswith(prefix):
+                yield key, None
+
+    def ls(self, key_glob, max_threads=1):
+        return [name for name, _ in _ls_prefix_glob(
+            key_glob, self.list_dirs, self.list_keys,
+            max_threads=max_threads)]
+
+    def test_no_wildcards(self):
+        self.assertEqual(self.ls('logs/2016-10-16'), [
+            'logs/2016-10-16/a.gz',
+            'logs/2016-10-16/b.txt',
+            'logs/2016-10-16/sub/c.gz',
+        ])
+        self.assertEqual(self.listed, [('keys', 'logs/2016-10-16')])
+
+    def test_doesnt_match_partial_names(self):
+        self.assertEqual(self.ls('to'), [])
+        self.assertEqual(self.ls('top'), ['top'])
+
+    def test_everything(self):
+        self.assertEqual(self.ls(''), self.KEYS)
+        self.assertEqual(self.ls('*'), self.KEYS)
+
+    def test_prune_directories(self):
+        self.assertEqual(self.ls('*/2016-10-16/*.gz'), [
+            'logs/2016-10-16/a.gz',
+            # * can match / in the last part of the glob
+            'logs/2016-10-16/sub/c.gz',
+            'other/2016-10-16/a.gz',
+        ])
+
+        # didn't list 2016-10-15
+        self.assertEqual(self.listed, [
+            ('dirs', ''),
+            ('keys', 'logs/2016-10-16/'),
+            ('keys', 'other/2016-10-16/'),
+        ])
+
+    def test_wildcard_dirs_match_one_level(self):
+        self.assertEqual(self.ls('*/a.gz'), [])
+        self.assertEqual(self.ls('logs/*/a.gz'), [
+            'logs/2016-10-15/a.gz',
+            'logs/2016-10-16/a.gz',
+        ])
+
+    def test_list_literal_prefix_of_last_part(self):
+        self.assertEqual(self.ls('logs/2016-10-16/a*'),
+                         ['logs/2016-10-16/a.gz'])
+        self.assertEqual(self.listed, [('keys', 'logs/2016-10-16/a')])
+
+    def test_trailing_slash(self):
+        self.assertEqual(self.ls('logs/*/sub/'),
+                         ['logs/2016-10-16/sub/c.gz'])
+
+    def test_no_matching_dirs(self):
+        self.assertEqual(self.ls('logs/2017-*/*'), [])
+        self.assertEqual(self.listed, [('dirs', 'logs/')])
+
+    def test_bracket_expressions(self):
+        self.assertEqual(self.ls('logs/2016-10-1[56]/a.gz'), [
+            'logs/2016-10-15/a.gz',
+            'logs/2016-10-16/a.gz',
+        ])
+
+    def test_threads(self):
+        self.assertEqual(self.ls('*/*/*.gz', max_threads=4),
+                         self.ls('*/*/*.gz'))
+        self.assertEqual(self.ls('*/*/*.gz', max_threads=4), [
+            'logs/2016-10-15/a.gz',
+            'logs/2016-10-16/a.gz',
+            'logs/2016-10-16/sub/c.gz',
+            'other/2016-10-16/a.gz',
+        ])
@@ -15,6 +15,8 @@
 # limitations under the License.
 import bz2
 import os
+import re
+import time
 from os.path import join
 
 from mrjob.fs.hadoop import HadoopFilesystem
@@ -23,6 +25,7 @@ from mrjob.util import which
 
 from tests.compress import gzip_compress
 from tests.fs import MockSubprocessTestCase
+from tests.mockhadoop import get_mock_hadoop_cmd_args
 from tests.mockhadoop import get_mock_hdfs_root
 from tests.mockhadoop import main as mock_hadoop_main
 from tests.py2 import MagicMock
@@ -139,6 +142,31 @@ class HadoopFSTestCase(MockSubprocessTestCase):
     def test_du_non_existent(self):
         self.assertEqual(self.fs.du('hdfs:///does-not-exist'), 0)
 
+    def test_ls_detailed(self):
+        self.make_mock_file('data1', 'abcd')
+        self.make_mock_file('more/data  2', 'defghi' * 100)
+
+        items = sorted(self.fs.ls_detailed('hdfs:///'),
+                       key=lambda item: item['uri'])
+
+        # mockhadoop always says files were modified at 2010-10-01 15:16
+        mtime = time.mktime((2010, 10, 1, 15, 16, 0, 0, 0, -1))
+
+        self.assertEqual(
+            items,
+            [dict(uri='hdfs:///data1', size=4, mtime=mtime, checksum=None),
+             dict(uri='hdfs:///more/data  2', size=600, mtime=mtime,
+                  checksum=None)])
+
+    def test_ls_detailed_s3n(self):
+        # no user and group info when reading from s3
+        self.make_mock_file('f', 'foo')
+
+        self.assertEqual(
+            [(item['uri'], item['size'])
+             for item in self.fs.ls_detailed('s3n://bucket/')],
+            [('s3n://bucket/f', 3)])
+
     def test_mkdir(self):
         self.fs.mkdir('hdfs:///d/ave')
         local_path = os.path.join(get_mock_hdfs_root(self.env), 'd', 'ave')
@@ -153,6 +181,99 @@ class HadoopFSTestCase(MockSubprocessTestCase):
         path = 'hdfs:///f'
         self.assertEqual(self.fs.exists(path), True)
 
+    def test_exists_many(self):
+        self.make_mock_file('f')
+        self.make_mock_file('logs/part-00000')
+
+        self.assertEqual(
+            self.fs._exists_many(
+                ['hdfs:///f', 'hdfs:///g', 'hdfs:///logs/part-*',
+                 'hdfs:///logs/*.gz']),
+            [True, False, True, False])
+
+        # only ran hadoop once
+        self.assertEqual(len(get_mock_hadoop_cmd_args(self.env)), 1)
+
+    def test_exists_many_all_exist(self):
+        self.make_mock_file('f')
+        self.make_mock_file('g')
+
+        self.assertEqual(self.fs._exists_many(['hdfs:///f', 'hdfs:///g']),
+                         [True, True])
+
+    def test_exists_many_batches(self):
+        self.make_mock_file('f')
+
+        with patch.object(fs_hadoop, '_MAX_PATHS_PER_CMD', 2):
+            self.assertEqual(
+                self.fs._exists_many(['hdfs:///f', 'hdfs:///g'] * 2),
+                [True, False] * 2)
+
+        self.assertEqual(len(get_mock_hadoop_cmd_args(self.env)), 2)
+
+    def test_exists_many_with_unexpected_error(self):
+        self.make_mock_file('f')
+
+        # pretend we don't recognize the error for the missing path
+        with patch.object(fs_hadoop, '_HADOOP_LS_MISSING_PATH_RE',
+                          re.compile(b'^$')):
+            self.assertEqual(
+                self.fs._exists_many(['hdfs:///f', 'hdfs:///g']),
+                [True, False])
+
+        # fell back to checking paths one at a time
+        self.assertEqual(len(get_mock_hadoop_cmd_args(self.env)), 3)
+
+    def test_exists_many_with_unrecognized_missing_path(self):
+        self.make_mock_file('f')
+
+        # pretend hadoop wrote the missing path differently than we did
+        with patch.object(fs_hadoop, '_HADOOP_LS_MISSING_PATH_RE',
+                          re.compile(br'^lsr?: .*/(?P<path>\w+)\'?:'
+                                     br' No such file or directory\.?$')):
+            self.assertEqual(
+                self.fs._exists_many(['hdfs:///f', 'hdfs:///g']),
+                [True, False])
+
+        # fell back to checking paths one at a time
+        self.assertEqual(len(get_mock_hadoop_cmd_args(self.env)), 3)
+
+    def test_put(self):
+        local_path = self.makefile('foo', b'bar\n')
+
+        self.fs._put(local_path, 'hdfs:///tmp/files/foo')
+
+        with open(os.path.join(get_mock_hdfs_root(self.env),
+                               'tmp', 'files', 'foo'), 'rb') as f:
+            self.assertEqual(f.read(), b'bar\n')
+
+    def test_put_many(self):
+        self.fs.mkdir('hdfs:///tmp/files')
+
+        foo_path = self.makefile('foo', b'foo\n')
+        bar_path = self.makefile('bar', b'bar\n')
+        baz_path = self.makefile(join('sub', 'foo'), b'baz\n')
+
+        self.fs._put_many([
+            (foo_path, 'hdfs:///tmp/files/foo'),
+            (bar_path, 'hdfs:///tmp/files/bar'),
+            (baz_path, 'hdfs:///tmp/files/foo-1'),
+        ])
+
+        files_dir = os.path.join(get_mock_hdfs_root(self.env), 'tmp', 'files')
+        self.assertEqual(sorted(os.listdir(files_dir)),
+                         ['bar', 'foo', 'foo-1'])
+        with open(os.path.join(files_dir, 'foo-1'), 'rb') as f:
+            self.assertEqual(f.read(), b'baz\n')
+
+        # one -put for the files that keep their names, one for the other
+        put_args = [args for args in get_mock_hadoop_cmd_args(self.env)
+                    if args[:2] == ['fs', '-put']]
+        self.assertEqual(put_args, [
+            ['fs', '-put', baz_path, 'hdfs:///tmp/files/foo-1'],
+            ['fs', '-put', foo_path, bar_path, 'hdfs:///tmp/files/'],
+        ])
+
     def test_rm(self):
         local_path = self.make_mock_file('f')
         self.assertEqual(os.path.exists(local_path), True)
@@ -14,11 +14,14 @@
 # limitations under the License.
 import bz2
 import gzip
+import json
 import os
 from os.path import join
 
 from mrjob.fs.local import LocalFilesystem
 
+from tests.py2 import patch
+from tests.quiet import no_handlers_for_logger
 from tests.sandbox import SandboxedTestCase
 
 
@@ -44,6 +47,29 @@ class LocalFSTestCase(SandboxedTestCase):
         self.assertEqual(self.fs.du(data_path_1), 4)
         self.assertEqual(self.fs.du(data_path_2), 4)
 
+    def test_ls_detailed(self):
+        data_path_1 = self.makefile('data1', 'abcd')
+        data_path_2 = self.makefile('more/data2', 'defghi')
+        os.utime(data_path_1, (1000, 1000))
+
+        items = sorted(self.fs.ls_detailed(self.tmp_dir),
+                       key=lambda item: item['uri'])
+
+        self.assertEqual(
+            items,
+            [dict(uri=data_path_1, size=4, mtime=1000, checksum=None),
+             dict(uri=data_path_2, size=6,
+                  mtime=os.path.getmtime(data_path_2), checksum=None)])
+
+    def test_ls_detailed_stats_in_parallel(self):
+        paths = [self.makefile('data%d' % i, 'x' * i) for i in range(5)]
+
+        with patch('mrjob.fs.local._MIN_FILES_TO_STAT_IN_PARALLEL', 2):
+            items = list(self.fs.ls_detailed(self.tmp_dir))
+
+        self.assertEqual(sorted((item['uri'], item['size']) for item in items),
+                         [(path, i) for i, path in enumerate(paths)])
+
     def test_ls_empty(self):
         self.assertEqual(list(self.fs.ls(self.tmp_dir)), [])
 
@@ -125,3 +151,120 @@ class LocalFSTestCase(SandboxedTestCase):
         path = self.makefile('f', 'abcd')
         self.assertEqual(self.fs.md5sum(path),
                          'e2fc714c4727ee9395f324cd2e7f331f')
+
+
+class LocalMD5CacheTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(LocalMD5CacheTestCase, self).setUp()
+        self.md5_cache_path = join(self.tmp_dir, 'md5_cache.json')
+
+        self.md5sum_file = self.start(patch.object(
+            LocalFilesystem, '_md5sum_file',
+            side_effect=LocalFilesystem()._md5sum_file))
+
+    def test_persists_between_instances(self):
+        path = self.makefile('f', b'abcd')
+
+        fs1 = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        self.assertEqual(fs1.md5sum(path), 'e2fc714c4727ee9395f324cd2e7f331f')
+        self.assertEqual(self.md5sum_file.call_count, 1)
+
+        fs2 = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        self.assertEqual(fs2.md5sum(path), 'e2fc714c4727ee9395f324cd2e7f331f')
+        # didn't have to read the file again
+        self.assertEqual(self.md5sum_file.call_count, 1)
+
+    def test_changed_file(self):
+        path = self.makefile('f', b'abcd')
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        self.assertEqual(fs.md5sum(path), 'e2fc714c4727ee9395f324cd2e7f331f')
+
+        with open(path, 'wb') as f:
+            f.write(b'abcde')
+
+        self.assertEqual(fs.md5sum(path), 'ab56b4d92b40713acc5af89985d4b786')
+        self.assertEqual(self.md5sum_file.call_count, 2)
+
+    def test_changed_mtime(self):
+        path = self.makefile('f', b'abcd')
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        fs.md5sum(path)
+
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+        fs.md5sum(path)
+        self.assertEqual(self.md5sum_file.call_count, 2)
+
+    def test_changed_inode(self):
+        path = self.makefile('f', b'abcd')
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        fs.md5sum(path)
+
+        # replace the file with a copy with the same size and mtime
+        st = os.stat(path)
+        copy_path = self.makefile('g', b'abcd')
+        os.utime(copy_path, (st.st_atime, st.st_mtime))
+        os.rename(copy_path, path)
+
+        fs.md5sum(path)
+        self.assertEqual(self.md5sum_file.call_count, 2)
+
+    def test_symlinks_share_entry(self):
+        path = self.makefile('f', b'abcd')
+        link_path = join(self.tmp_dir, 'link')
+        os.symlink(path, link_path)
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        self.assertEqual(fs.md5sum(path), fs.md5sum(link_path))
+
+        self.assertEqual(self.md5sum_file.call_count, 1)
+
+    def test_ignores_old_cache_format(self):
+        path = self.makefile('f', b'abcd')
+        st = os.stat(path)
+
+        # entry from before we tracked mtime in ns and inodes
+        with open(self.md5_cache_path, 'w') as f:
+            json.dump({os.path.realpath(path): [
+                st.st_size, st.st_mtime, 'bad_md5']}, f)
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        self.assertEqual(fs.md5sum(path), 'e2fc714c4727ee9395f324cd2e7f331f')
+
+    def test_no_cache_path(self):
+        path = self.makefile('f', b'abcd')
+
+        fs = LocalFilesystem()
+        fs.md5sum(path)
+        fs.md5sum(path)
+
+        self.assertEqual(self.md5sum_file.call_count, 2)
+
+    def test_drops_deleted_files(self):
+        path = self.makefile('f', b'abcd')
+
+        LocalFilesystem(md5_cache_path=self.md5_cache_path).md5sum(path)
+        os.remove(path)
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        fs.md5sum(self.makefile('g', b'efgh'))
+
+        with open(self.md5_cache_path) as f:
+            self.assertEqual(list(json.load(f)), [os.path.realpath(
+                join(self.tmp_dir, 'g'))])
+
+    def test_corrupt_cache(self):
+        path = self.makefile('f', b'abcd')
+
+        with open(self.md5_cache_path, 'w') as f:
+            f.write('{bad json')
+
+        fs = LocalFilesystem(md5_cache_path=self.md5_cache_path)
+        with no_handlers_for_logger('mrjob.fs.local'):
+            self.assertEqual(fs.md5sum(path),
+                             'e2fc714c4727ee9395f324cd2e7f331f')
@@ -0,0 +1,181 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from multiprocessing.pool import ThreadPool
+
+from mrjob.fs.readahead import _ReadAheadReader
+
+from tests.py2 import TestCase
+
+
+class ReadAheadReaderTestCase(TestCase):
+
+    DATA = b''.join(('%03d\n' % i).encode('ascii') for i in range(250))
+
+    def setUp(self):
+        self.ranges = []
+        self.lock = threading.Lock()
+
+        self.pool = ThreadPool(4)
+        self.addCleanup(self.pool.terminate)
+
+    def read_range(self, start, end):
+        with self.lock:
+            self.ranges.append((start, end))
+        return self.DATA[start:end]
+
+    # the ranges we expect to fetch with a chunk size of 100
+    RANGES = [(i, min(i + 100, 1000)) for i in range(0, 1000, 100)]
+
+    def reader(self, **kwargs):
+        kwargs.setdefault('chunk_size', 100)
+        kwargs.setdefault('pool', self.pool)
+        return _ReadAheadReader(self.read_range, len(self.DATA), **kwargs)
+
+    def test_read_everything(self):
+        reader = self.reader()
+
+        self.assertEqual(reader.read(), self.DATA)
+
+        # fetched each range exactly once
+        self.assertEqual(sorted(self.ranges), self.RANGES)
+
+    def test_read_across_chunks(self):
+        reader = self.reader()
+
+        self.assertEqual(reader.read(150), self.DATA[:150])
+        self.assertEqual(reader.read(7), self.DATA[150:157])
+        self.assertEqual(reader.read(10000), self.DATA[157:])
+        self.assertEqual(reader.read(), b'')
+
+    def test_iterate(self):
+        chunks = list(self.reader())
+
+        self.assertEqual(b''.join(chunks), self.DATA)
+        self.assertEqual(len(chunks), 10)
+
+    def test_iterate_after_read(self):
+        reader = self.reader()
+
+        self.assertEqual(reader.read(50), self.DATA[:50])
+        self.assertEqual(b''.join(reader), self.DATA[50:])
+
+    def test_one_thread(self):
+        reader = self.reader(num_threads=1)
+
+        self.assertEqual(reader.read(), self.DATA)
+        # fetched in order, without using the pool
+        self.assertEqual(self.ranges, self.RANGES)
+        self.assertFalse(reader._use_threads)
+
+    def test_no_pool(self):
+        reader = self.reader(pool=None)
+
+        self.assertEqual(reader.read(), self.DATA)
+        self.assertEqual(self.ranges, self.RANGES)
+        self.assertFalse(reader._use_threads)
+
+    def test_single_chunk(self):
+        reader = self.reader(chunk_size=10000)
+
+        self.assertEqual(reader.read(), self.DATA)
+        self.assertEqual(self.ranges, [(0, 1000)])
+        self.assertFalse(reader._use_threads)
+
+    def test_first_chunk_size(self):
+        reader = self.reader(first_chunk_size=25)
+
+        self.assertEqual(reader.read(), self.DATA)
+
+        # chunks double in size up to chunk_size
+        self.assertEqual(sorted(self.ranges), [
+            (0, 25), (25, 75), (75, 175), (175, 275), (275, 375),
+            (375, 475), (475, 575), (575, 675), (675, 775), (775, 875),
+            (875, 975), (975, 1000)])
+
+    def test_object_smaller_than_first_chunk(self):
+        reader = self.reader(chunk_size=10000, first_chunk_size=5000)
+
+        self.assertEqual(reader.read(), self.DATA)
+        self.assertEqual(self.ranges, [(0, 1000)])
+        self.assertFalse(reader._use_threads)
+
+    def test_object_smaller_than_chunk(self):
+        reader = self.reader(chunk_size=10000, first_chunk_size=400)
+
+        self.assertEqual(list(reader), [
+            self.DATA[:400], self.DATA[400:1000]])
+
+    def test_one_thread_with_first_chunk_size(self):
+        reader = self.reader(num_threads=1, first_chunk_size=25)
+
+        self.assertEqual(reader.read(), self.DATA)
+        self.assertFalse(reader._use_threads)
+
+        # same ramp-up, but fetched in order
+        self.assertEqual(self.ranges, [
+            (0, 25), (25, 75), (75, 175), (175, 275), (275, 375),
+            (375, 475), (475, 575), (575, 675), (675, 775), (775, 875),
+            (875, 975), (975, 1000)])
+
+    def test_no_pool_with_first_chunk_size(self):
+        reader = self.reader(pool=None, first_chunk_size=25)
+
+        self.assertEqual(reader.read(100), self.DATA[:100])
+        self.assertEqual(self.ranges, [(0, 25), (25, 75), (75, 175)])
+
+    def test_empty(self):
+        reader = _ReadAheadReader(self.read_range, 0, pool=self.pool)
+
+        self.assertEqual(reader.read(), b'')
+        self.assertEqual(list(reader), [])
+        self.assertEqual(self.ranges, [])
+
+    def test_bounded_read_ahead(self):
+        reader = self.reader(num_threads=3)
+
+        reader.read(1)
+
+        # never more than 3 chunks in flight or waiting (plus the one
+        # we're reading from)
+        self.assertLessEqual(len(self.ranges), 4)
+
+        reader.close()
+
+    def test_short_read(self):
+        def read_range(start, end):
+            return self.DATA[start:end - 1]
+
+        reader = _ReadAheadReader(read_range, len(self.DATA),
+                                  pool=self.pool, chunk_size=100)
+
+        self.assertRaises(IOError, reader.read)
+        reader.close()
+
+    def test_close_early(self):
+        reader = self.reader()
+
+        self.assertEqual(reader.read(10), self.DATA[:10])
+        reader.close()
+
+        self.assertEqual(reader.read(), self.DATA[10:100])
+
+    def test_shared_pool(self):
+        for _ in range(2):
+            reader = self.reader()
+            self.assertEqual(reader.read(), self.DATA)
+            reader.close()
+
+        # closing the reader doesn't shut down the pool
+        self.assertEqual(self.pool.apply(sum, ([1, 2],)), 3)
@@ -13,6 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import bz2
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
 
 try:
     import boto
@@ -24,7 +29,9 @@ from mrjob.fs.s3 import S3Filesystem
 
 from tests.compress import gzip_compress
 from tests.mockboto import MockBotoTestCase
+from tests.mockboto import MockKey
 from tests.py2 import patch
+from tests.quiet import no_handlers_for_logger
 
 
 class S3FSTestCase(MockBotoTestCase):
@@ -54,6 +61,82 @@ class S3FSTestCase(MockBotoTestCase):
         self.assertEqual(list(self.fs._cat_file('s3://walrus/data/foo.gz')),
                          [b'foo\n'] * 10000)
 
+    def test_cat_in_chunks(self):
+        data = b''.join(('%05d\n' % i).encode('ascii') for i in range(1000))
+        self.add_mock_s3_data({'walrus': {'data/foo': data}})
+
+        fs = S3Filesystem(read_chunk_size=1000)
+        self.addCleanup(fs.close)
+
+        self.assertEqual(b''.join(fs._cat_file('s3://walrus/data/foo')),
+                         data)
+
+    def test_cat_starts_with_small_chunk(self):
+        data = b''.join(('%07d\n' % i).encode('ascii')
+                        for i in range(128 * 1024))  # 1 MiB
+        self.add_mock_s3_data({'walrus': {'data/foo': data}})
+
+        ranges = []
+        get_contents_as_string = MockKey.get_contents_as_string
+
+        def record_range(key, headers=None):
+            ranges.append(headers['Range'])
+            return get_contents_as_string(key, headers=headers)
+
+        fs = S3Filesystem()
+        self.addCleanup(fs.close)
+
+        with patch.object(MockKey, 'get_contents_as_string', record_range):
+            lines = fs._cat_file('s3://walrus/data/foo')
+            self.assertEqual(next(lines), b'0000000\n')
+            self.assertEqual(b''.join(lines), data[8:])
+
+        # didn't wait for a whole (8 MiB) chunk to get the first line
+        self.assertEqual(sorted(ranges), [
+            'bytes=0-262143', 'bytes=262144-786431', 'bytes=786432-1048575'])
+
+    def test_reads_share_thread_pool(self):
+        data = b'foo\n' * 1000
+        self.add_mock_s3_data({'walrus': {'data/foo': data,
+                                          'data/bar': data}})
+
+        fs = S3Filesystem(read_chunk_size=100)
+
+        self.assertEqual(b''.join(fs._cat_file('s3://walrus/data/foo')),
+                         data)
+        pool = fs._read_pool
+        self.assertIsNotNone(pool)
+
+        self.assertEqual(b''.join(fs._cat_file('s3://walrus/data/bar')),
+                         data)
+        self.assertIs(fs._read_pool, pool)
+
+        fs.close()
+        self.assertIsNone(fs._read_pool)
+
+    def test_cat_gz_in_chunks(self):
+        self.add_mock_s3_data(
+            {'walrus': {'data/foo.gz': gzip_compress(b'foo\n' * 10000)}})
+
+        fs = S3Filesystem(read_chunk_size=10)
+        self.addCleanup(fs.close)
+
+        self.assertEqual(list(fs._cat_file('s3://walrus/data/foo.gz')),
+                         [b'foo\n'] * 10000)
+
+    def test_cat_in_chunks_key_changed(self):
+        self.add_mock_s3_data({'walrus': {'data/foo': b'foo\n' * 1000}})
+
+        fs = S3Filesystem(read_chunk_size=100)
+        self.addCleanup(fs.close)
+        lines = fs._cat_file('s3://walrus/data/foo')
+        next(lines)
+
+        # overwrite the key while we're reading it
+        self.add_mock_s3_data({'walrus': {'data/foo': b'bar\n' * 1000}})
+
+        self.assertRaises(boto.exception.S3ResponseError, list, lines)
+
     def test_ls_key(self):
         self.add_mock_s3_data(
             {'walrus': {'data/foo': b''}})
@@ -105,6 +188,25 @@ class S3FSTestCase(MockBotoTestCase):
         self.assertEqual(list(self.fs.ls('s3://w/*b')),
                          ['s3://w/a/b', 's3://w/ab', 's3://w/b'])
 
+    def test_ls_globs_prune_directories(self):
+        self.add_mock_s3_data(
+            {'logs': {'j-1/2016-10-15/a.gz': b'',
+                      'j-1/2016-10-16/a.gz': b'',
+                      'j-1/2016-10-16/b.txt': b'',
+                      'j-2/2016-10-16/c.gz': b'',
+                      'j-2/2016-10-16': b''}})
+
+        self.assertEqual(list(self.fs.ls('s3://logs/*/2016-10-16/*.gz')),
+                         ['s3://logs/j-1/2016-10-16/a.gz',
+                          's3://logs/j-2/2016-10-16/c.gz'])
+
+        # one listing for the top-level "directories", and one for each
+        # matching one
+        self.assertEqual(self.mock_s3_requests.count('list'), 3)
+
+        # wildcards before the last / don't match /
+        self.assertEqual(list(self.fs.ls('s3://logs/*/a.gz')), [])
+
     def test_ls_s3n(self):
         self.add_mock_s3_data(
             {'walrus': {'data/bar': b'abc123',
@@ -121,8 +223,55 @@ class S3FSTestCase(MockBotoTestCase):
 
         self.assertEqual(self.fs.du('s3://walrus/'), 8)
         self.assertEqual(self.fs.du('s3://walrus/data/foo'), 5)
+
+    def test_ls_detailed(self):
+        self.add_mock_s3_data({
+            'walrus': {'data/foo': b'abcde',
+                       'data/bar/baz': b'fgh'}},
+            time_modified=datetime(2016, 1, 1))
+
+        self.assertEqual(
+            sorted(self.fs.ls_detailed('s3://walrus/data'),
+                   key=lambda item: item['uri']),
+            [dict(uri='s3://walrus/data/bar/baz', size=3,
+                  mtime=1451606400, checksum=hashlib.md5(b'fgh').hexdigest()),
+             dict(uri='s3://walrus/data/foo', size=5,
+                  mtime=1451606400,
+                  checksum=hashlib.md5(b'abcde').hexdigest())])
         self.assertEqual(self.fs.du('s3://walrus/data/bar/baz'), 3)
 
+    def test_md5sum(self):
+        self.add_mock_s3_data({'walrus': {'data/foo': b'abcde',
+                                          'data/foo2': b'fghij'}})
+
+        self.mock_s3_requests[:] = []
+        self.assertEqual(self.fs.md5sum('s3://walrus/data/foo'),
+                         hashlib.md5(b'abcde').hexdigest())
+
+        # came from the listing
+        self.assertNotIn('get_key', self.mock_s3_requests)
+
+    def test_md5sum_of_nonexistent_key(self):
+        self.add_mock_s3_data({'walrus': {'data/foo': b'abcde'}})
+
+        self.assertRaises(IOError, self.fs.md5sum, 's3://walrus/data/bar')
+
+    def test_md5sum_of_multipart_key(self):
+        self.add_mock_s3_data({'walrus': {'data/foo': b'abcde'}})
+
+        with patch.object(MockKey, 'etag', '"%s-2"' % ('0' * 32)):
+            self.assertRaises(IOError, self.fs.md5sum, 's3://walrus/data/foo')
+
+    def test_ls_detailed_multipart_etag(self):
+        self.add_mock_s3_data({'walrus': {'data/foo': b'abcde'}})
+
+        # etags of keys uploaded in parts aren't MD5 sums
+        with patch.object(MockKey, 'etag', '"%s-2"' % ('0' * 32)):
+            self.assertEqual(
+                [item['checksum']
+                 for item in self.fs.ls_detailed('s3://walrus/data')],
+                [None])
+
     def test_exists(self):
         self.add_mock_s3_data({
             'walrus': {'data/foo': b'abcd'}})
@@ -148,6 +297,36 @@ class S3FSTestCase(MockBotoTestCase):
         self.assertEqual(self.fs.exists('s3://walrus/data/foo'), False)
         self.assertEqual(self.fs.exists('s3://walrus/data/bar/baz'), False)
 
+    def test_rm_returns_counts(self):
+        self.add_mock_s3_data({
+            'walrus': {'data/foo': b'',
+                       'data/bar/baz': b''}})
+
+        self.assertEqual(self.fs.rm('s3://walrus/data'), (2, 0))
+        self.assertEqual(self.fs.rm('s3://walrus/data'), (0, 0))
+
+    def test_rm_many_keys(self):
+        self.add_mock_s3_data({
+            'walrus': dict(('tmp/part-%05d' % i, b'') for i in range(2500))})
+
+        self.assertEqual(self.fs.rm('s3://walrus/tmp/'), (2500, 0))
+        self.assertEqual(list(self.fs.ls('s3://walrus/tmp/')), [])
+
+        # 1,000 keys per request
+        self.assertEqual(self.mock_s3_requests.count('delete_keys'), 3)
+
+    def test_rm_with_failures(self):
+        self.add_mock_s3_data({
+            'walrus': {'data/foo': b'',
+                       'data/bar': b''}})
+        self.mock_s3_fs['walrus']['undeletable'] = set(['data/bar'])
+
+        with no_handlers_for_logger('mrjob.fs.s3'):
+            self.assertEqual(self.fs.rm('s3://walrus/data'), (1, 1))
+
+        self.assertEqual(list(self.fs.ls('s3://walrus/data')),
+                         ['s3://walrus/data/bar'])
+
 
 class S3FSRegionTestCase(MockBotoTestCase):
 
@@ -223,3 +402,159 @@ class S3FSRegionTestCase(MockBotoTestCase):
         # can't access this bucket from wrong endpoint!
         self.assertRaises(boto.exception.S3ResponseError,
                           fs.get_bucket, 'walrus-west')
+
+
+class S3FSCachingTestCase(MockBotoTestCase):
+
+    def setUp(self):
+        super(S3FSCachingTestCase, self).setUp()
+
+        self.mock_connect_s3 = self.start(patch.object(
+            boto, 'connect_s3', wraps=boto.connect_s3))
+
+    def test_get_bucket_only_looks_up_location_once(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+
+        fs = S3Filesystem()
+
+        fs.get_bucket('walrus')
+        self.assertEqual(self.mock_s3_requests,
+                         ['get_bucket', 'get_location'])
+
+        bucket = fs.get_bucket('walrus')
+        self.assertEqual(bucket.connection.host,
+                         's3-us-west-2.amazonaws.com')
+        self.assertEqual(self.mock_s3_requests,
+                         ['get_bucket', 'get_location'])
+
+    def test_one_connection_per_endpoint(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        self.add_mock_s3_data({'sea-lion': {}}, location='us-west-2')
+        self.add_mock_s3_data({'narwhal': {}}, location='')
+
+        fs = S3Filesystem()
+
+        for _ in range(3):
+            fs.get_bucket('walrus')
+            fs.get_bucket('sea-lion')
+            fs.get_bucket('narwhal')
+
+        self.assertEqual(
+            sorted(call[1]['host']
+                   for call in self.mock_connect_s3.call_args_list),
+            ['s3-us-west-2.amazonaws.com', 's3.amazonaws.com'])
+
+    def test_du_and_rm_use_listing(self):
+        self.add_mock_s3_data({
+            'walrus': dict(('data/%04d' % i, b'x' * i) for i in range(100))})
+
+        fs = S3Filesystem()
+
+        self.assertEqual(fs.du('s3://walrus/data'), sum(range(100)))
+        self.assertEqual(self.mock_s3_requests,
+                         ['get_bucket', 'get_location', 'list'])
+
+        fs.rm('s3://walrus/data')
+        self.assertEqual(self.mock_s3_requests,
+                         ['get_bucket', 'get_location', 'list', 'list',
+                          'delete_keys'])
+        self.assertEqual(self.mock_s3_fs['walrus']['keys'], {})
+
+    def test_forced_s3_endpoint(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-east-2')
+
+        fs = S3Filesystem(s3_endpoint='s3-us-east-2.amazonaws.com')
+
+        fs.get_bucket('walrus')
+        fs.get_bucket('walrus')
+
+        self.assertEqual(self.mock_s3_requests, ['get_bucket'])
+
+    def test_missing_bucket_is_not_cached(self):
+        fs = S3Filesystem()
+
+        self.assertEqual(fs.get_s3_key('s3://walrus/foo'), None)
+
+        self.add_mock_s3_data({'walrus': {'foo': b'bar'}})
+        self.assertEqual(
+            fs.get_s3_key('s3://walrus/foo').get_contents_as_string(), b'bar')
+
+    def test_region_cache_file(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        cache_path = os.path.join(self.tmp_dir, 'regions.json')
+
+        S3Filesystem(region_cache_path=cache_path).get_bucket('walrus')
+        self.assertEqual(len(self.mock_s3_requests), 2)
+
+        with open(cache_path) as f:
+            self.assertEqual(json.load(f)['walrus'][0], 'us-west-2')
+
+        # another filesystem (e.g. in another process) can use the cache
+        bucket = S3Filesystem(
+            region_cache_path=cache_path).get_bucket('walrus')
+        self.assertEqual(bucket.connection.host,
+                         's3-us-west-2.amazonaws.com')
+        self.assertEqual(len(self.mock_s3_requests), 2)
+
+    def test_forced_s3_endpoint_not_saved_to_region_cache(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        self.add_mock_s3_data({'narwhal': {}}, location='us-east-2')
+        cache_path = os.path.join(self.tmp_dir, 'regions.json')
+
+        S3Filesystem(region_cache_path=cache_path).get_bucket('walrus')
+        S3Filesystem(
+            region_cache_path=cache_path,
+            s3_endpoint='s3-us-east-2.amazonaws.com').get_bucket('narwhal')
+
+        with open(cache_path) as f:
+            self.assertEqual(sorted(json.load(f)), ['walrus'])
+
+        # a filesystem without s3_endpoint still looks up the location
+        bucket = S3Filesystem(
+            region_cache_path=cache_path).get_bucket('narwhal')
+        self.assertEqual(bucket.connection.host,
+                         's3-us-east-2.amazonaws.com')
+
+    def test_forbidden_location_not_saved_to_region_cache(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        self.add_mock_s3_data({'narwhal': {}}, location='')
+        cache_path = os.path.join(self.tmp_dir, 'regions.json')
+
+        fs = S3Filesystem(region_cache_path=cache_path)
+        fs.get_bucket('narwhal')
+
+        with patch(
+                'tests.mockboto.MockBucket.get_location',
+                side_effect=boto.exception.S3ResponseError(403, 'Forbidden')):
+            fs.get_bucket('walrus')
+
+        with open(cache_path) as f:
+            self.assertEqual(sorted(json.load(f)), ['narwhal'])
+
+        # still remembered in memory
+        self.mock_s3_requests[:] = []
+        fs.get_bucket('walrus')
+        self.assertEqual(self.mock_s3_requests, [])
+
+    def test_region_cache_ttl(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        cache_path = os.path.join(self.tmp_dir, 'regions.json')
+
+        with open(cache_path, 'w') as f:
+            json.dump({'walrus': ['us-west-2', time.time() - 7200]}, f)
+
+        S3Filesystem(region_cache_path=cache_path,
+                     region_cache_ttl=3600).get_bucket('walrus')
+        self.assertEqual(self.mock_s3_requests,
+                         ['get_bucket', 'get_location'])
+
+    def test_bad_region_cache_file(self):
+        self.add_mock_s3_data({'walrus': {}}, location='us-west-2')
+        cache_path = self.makefile('regions.json', b'{not JSON')
+
+        with no_handlers_for_logger('mrjob.fs.s3'):
+            bucket = S3Filesystem(
+                region_cache_path=cache_path).get_bucket('walrus')
+
+        self.assertEqual(bucket.connection.host,
+                         's3-us-west-2.amazonaws.com')
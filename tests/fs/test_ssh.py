@@ -21,6 +21,7 @@ from mrjob import ssh
 from tests.compress import gzip_compress
 from tests.fs import MockSubprocessTestCase
 from tests.mockssh import main as mock_ssh_main
+from tests.py2 import patch
 
 
 class SSHFSTestCase(MockSubprocessTestCase):
@@ -29,8 +30,17 @@ class SSHFSTestCase(MockSubprocessTestCase):
         super(SSHFSTestCase, self).setUp()
         self.ec2_key_pair_file = self.makefile('key.pem', 'i am an ssh key')
         self.fs = SSHFilesystem(['ssh'], self.ec2_key_pair_file)
+        self.addCleanup(self.fs.close)
         self.set_up_mock_ssh()
-        self.mock_popen(ssh, mock_ssh_main, self.env)
+
+        # record each ssh command line
+        self.ssh_args = []
+
+        def recording_ssh_main(stdin, stdout, stderr, args, environ):
+            self.ssh_args.append(list(args))
+            return mock_ssh_main(stdin, stdout, stderr, args, environ)
+
+        self.mock_popen(ssh, recording_ssh_main, self.env)
 
     def set_up_mock_ssh(self):
         self.master_ssh_root = self.makedirs('testmaster')
@@ -129,6 +139,28 @@ class SSHFSTestCase(MockSubprocessTestCase):
         self.assertEqual(list(self.fs.ls(remote_path)),
                          ['ssh://testmaster!testslave1/f'])
 
+    def test_ls_detailed(self):
+        path = self.make_master_file('d/f 2', 'contents')
+        os.utime(path, (1000.5, 1000.5))
+
+        self.assertEqual(list(self.fs.ls_detailed('ssh://testmaster/')),
+                         [dict(uri='ssh://testmaster/d/f 2', size=8,
+                               mtime=1000.5, checksum=None)])
+
+    def test_slave_ls_detailed_with_required_sudo(self):
+        self.add_slave()
+        self.make_slave_file(1, 'f', 'foo\nfoo\n')
+        remote_path = 'ssh://testmaster!testslave1/'
+
+        self.require_sudo()
+
+        self.fs.use_sudo_over_ssh()
+
+        self.assertEqual(
+            [(item['uri'], item['size'])
+             for item in self.fs.ls_detailed(remote_path)],
+            [('ssh://testmaster!testslave1/f', 8)])
+
     def test_cat_uncompressed(self):
         self.make_master_file(os.path.join('data', 'foo'), 'foo\nfoo\n')
         remote_path = self.fs.join('ssh://testmaster/data', 'foo')
@@ -198,9 +230,67 @@ class SSHFSTestCase(MockSubprocessTestCase):
         self.assertEqual(list(self.fs._cat_file(remote_path)),
                          [b'foo\n', b'foo\n'])
 
+    def test_cat_glob(self):
+        self.make_master_file(os.path.join('logs', 'a', 'syslog'), 'a\n')
+        self.make_master_file(os.path.join('logs', 'b', 'syslog.gz'),
+                              gzip_compress(b'b\n'))
+        self.make_master_file(os.path.join('logs', 'b', 'stderr'), 'c\n')
+
+        self.assertEqual(sorted(self.fs.cat('ssh://testmaster/logs')),
+                         [b'a\n', b'b\n', b'c\n'])
+
+    def test_cat_uses_one_command(self):
+        for i in range(10):
+            self.make_master_file(os.path.join('logs', 'task-%d' % i),
+                                  'line %d\n' % i)
+
+        self.assertEqual(len(list(self.fs.cat('ssh://testmaster/logs'))), 10)
+
+        commands = self.commands()
+        self.assertEqual(len(commands), 1)
+        self.assertIn('tar', commands[0])
+
+    def test_cat_nonexistent(self):
+        self.assertRaises(IOError, list, self.fs.cat('ssh://testmaster/f'))
+
+    def test_cat_glob_falls_back_on_ls_and_cat(self):
+        self.make_master_file(os.path.join('data', 'foo'), 'foo\n')
+
+        with patch('mrjob.fs.ssh._ssh_tar', side_effect=IOError):
+            self.assertEqual(list(self.fs.cat('ssh://testmaster/data')),
+                             [b'foo\n'])
+
+    def test_cat_glob_without_required_sudo(self):
+        self.make_master_file(os.path.join('data', 'foo'), 'foo\n')
+        self.require_sudo()
+
+        self.assertRaises(IOError, list, self.fs.cat('ssh://testmaster/data'))
+
+    def test_cat_glob_with_required_sudo(self):
+        self.make_master_file(os.path.join('data', 'foo'), 'foo\n')
+        self.require_sudo()
+
+        self.fs.use_sudo_over_ssh()
+
+        self.assertEqual(list(self.fs.cat('ssh://testmaster/data')),
+                         [b'foo\n'])
+
+    def test_slave_cat_glob(self):
+        self.add_slave()
+        self.make_slave_file(1, os.path.join('logs', 'f'), 'foo\nfoo\n')
+
+        self.assertEqual(
+            list(self.fs.cat('ssh://testmaster!testslave1/logs')),
+            [b'foo\n', b'foo\n'])
+
     def test_du(self):
         self.make_master_file('f', 'contents')
-        # not implemented
+        self.make_master_file('d/f2', 'foo')
+
+        self.assertEqual(self.fs.du('ssh://testmaster/f'), 8)
+        self.assertEqual(self.fs.du('ssh://testmaster/'), 11)
+
+    def test_du_nonexistent(self):
         self.assertRaises(IOError, self.fs.du, 'ssh://testmaster/f')
 
     def test_mkdir(self):
@@ -261,3 +351,143 @@ class SSHFSTestCase(MockSubprocessTestCase):
     def test_ssh_slave_hosts_doesnt_care_about_sudo(self):
         self.require_sudo()
         self.test_ssh_slave_hosts()
+
+    def commands(self):
+        """ssh command lines, other than ones starting master
+        connections"""
+        return [args for args in self.ssh_args if '-M' not in args]
+
+    def control_paths(self, args):
+        return [arg for arg in args if arg.startswith('ControlPath=')]
+
+    def test_multiplexing(self):
+        self.make_master_file('f', 'contents')
+
+        list(self.fs.ls('ssh://testmaster/'))
+        list(self.fs.cat('ssh://testmaster/f'))
+
+        self.assertEqual(len(self.ssh_args), 3)
+
+        # start a master connection in the background
+        master_args = self.ssh_args[0]
+        for arg in ('-f', '-N', '-M', 'ControlPersist=60'):
+            self.assertIn(arg, master_args)
+        control_path = self.control_paths(master_args)[0]
+
+        # commands go through it, and never become masters themselves
+        for args in self.ssh_args[1:]:
+            self.assertIn('ControlMaster=no', args)
+            self.assertFalse(any(arg.startswith('ControlPersist=')
+                                 for arg in args))
+            self.assertEqual(self.control_paths(args), [control_path])
+
+        # control sockets live in a directory we made
+        control_dir = os.path.dirname(control_path[len('ControlPath='):])
+        self.assertTrue(os.path.isdir(control_dir))
+
+    def test_restart_expired_master(self):
+        self.make_master_file('f', 'contents')
+
+        with patch('time.time', return_value=1000.0):
+            list(self.fs.ls('ssh://testmaster/'))
+        with patch('time.time', return_value=1030.0):
+            list(self.fs.ls('ssh://testmaster/'))
+
+        self.assertEqual(len(self.ssh_args), 3)
+
+        # master exits 60 seconds after its last command
+        os.remove(os.path.join(self.fs._control_dir,
+                               'hadoop@testmaster:22'))
+
+        with patch('time.time', return_value=1100.0):
+            list(self.fs.ls('ssh://testmaster/'))
+
+        # checked for the old master, then started a new one
+        self.assertEqual(len(self.ssh_args), 6)
+        self.assertIn('check', self.ssh_args[3])
+        self.assertIn('-M', self.ssh_args[4])
+
+    def test_dont_restart_master_still_in_use(self):
+        self.make_master_file('f', 'contents')
+
+        with patch('time.time', return_value=1000.0):
+            list(self.fs.ls('ssh://testmaster/'))
+
+        # the master only starts counting down once its last command
+        # finishes, so after a long command, it's still running
+        with patch('time.time', return_value=1100.0):
+            list(self.fs.ls('ssh://testmaster/'))
+
+        self.assertEqual(len(self.ssh_args), 4)
+        self.assertIn('check', self.ssh_args[2])
+        self.assertEqual(len([args for args in self.ssh_args
+                              if '-M' in args]), 1)
+
+    def test_slave_multiplexing(self):
+        self.add_slave()
+        self.make_slave_file(1, 'f', 'foo\n')
+
+        list(self.fs.ls('ssh://testmaster!testslave1/'))
+
+        # one connection to the master to copy the key file, one to start
+        # the master connection to the slave, one for ls
+        commands = self.commands()
+        self.assertEqual(len(commands), 2)
+        self.assertEqual(len(self.ssh_args), 4)
+
+        # the master connection from the master node to the slave runs in
+        # the background, without holding our ssh's stdout and stderr open
+        remote_master_args = self.ssh_args[2]
+        self.assertIn('-M', remote_master_args)
+        self.assertIn('ControlMaster=no', remote_master_args)
+        self.assertEqual(remote_master_args[-3:],
+                         ['</dev/null', '>/dev/null', '2>&1'])
+
+        # other jobs may share the control socket on the master node, so
+        # only start a master if there isn't one already
+        check_end = remote_master_args.index('||')
+        self.assertIn('check', remote_master_args[:check_end])
+        self.assertNotIn('-M', remote_master_args[:check_end])
+
+        # both the outer and the inner ssh are multiplexed
+        ls_args = commands[1]
+        self.assertEqual(len(self.control_paths(ls_args)), 2)
+        self.assertEqual(ls_args.count('ControlMaster=no'), 2)
+        self.assertEqual(set(self.control_paths(ls_args)),
+                         set(self.control_paths(remote_master_args)))
+
+    def test_close(self):
+        self.make_master_file('f', 'contents')
+        list(self.fs.ls('ssh://testmaster/'))
+
+        control_dir = self.fs._control_dir
+        self.assertTrue(os.path.isdir(control_dir))
+
+        self.fs.close()
+
+        self.assertFalse(os.path.exists(control_dir))
+        self.assertEqual(len(self.ssh_args), 3)
+        self.assertIn('-O', self.ssh_args[2])
+        self.assertIn('exit', self.ssh_args[2])
+        self.assertEqual(self.control_paths(self.ssh_args[2]),
+                         self.control_paths(self.ssh_args[0]))
+
+        # can keep using the filesystem (with a new master connection)
+        self.assertEqual(list(self.fs.ls('ssh://testmaster/')),
+                         ['ssh://testmaster/f'])
+        self.assertIn('-M', self.ssh_args[3])
+
+    def test_close_without_connecting(self):
+        self.fs.close()
+        self.assertEqual(self.ssh_args, [])
+
+    def test_no_multiplexing(self):
+        fs = SSHFilesystem(['ssh'], self.ec2_key_pair_file, multiplex=False)
+        self.make_master_file('f', 'contents')
+
+        self.assertEqual(list(fs.ls('ssh://testmaster/')),
+                         ['ssh://testmaster/f'])
+        self.assertEqual(self.control_paths(self.ssh_args[0]), [])
+
+        fs.close()
+        self.assertEqual(len(self.ssh_args), 1)
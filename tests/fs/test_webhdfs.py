@@ -0,0 +1,304 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bz2
+import os
+import os.path
+
+from mrjob.fs.webhdfs import WebHDFSFilesystem
+
+from tests.compress import gzip_compress
+from tests.mockwebhdfs import MockWebHDFSServer
+from tests.py2 import patch
+from tests.sandbox import SandboxedTestCase
+
+
+class WebHDFSFSTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(WebHDFSFSTestCase, self).setUp()
+
+        self.hdfs_root = self.makedirs('hdfs')
+
+        self.server = MockWebHDFSServer(self.hdfs_root)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.fs = WebHDFSFilesystem(self.server.url, user='mrjob_tests')
+        self.addCleanup(self.fs.close)
+
+    def make_mock_file(self, name, contents='contents'):
+        return self.makefile(os.path.join(self.hdfs_root, name), contents)
+
+    def test_bad_url(self):
+        self.assertRaises(ValueError, WebHDFSFilesystem, 'namenode:50070')
+
+    def test_can_handle_path(self):
+        self.assertTrue(self.fs.can_handle_path('hdfs:///tmp/foo'))
+        self.assertTrue(self.fs.can_handle_path('hdfs://127.0.0.1/tmp/foo'))
+        self.assertTrue(
+            self.fs.can_handle_path('hdfs://127.0.0.1:8020/tmp/foo'))
+        self.assertFalse(self.fs.can_handle_path('s3://walrus/foo'))
+        self.assertFalse(self.fs.can_handle_path('/tmp/foo'))
+
+    def test_ls_empty(self):
+        self.assertEqual(list(self.fs.ls('hdfs:///')), [])
+
+    def test_ls_basic(self):
+        self.make_mock_file('f')
+        self.assertEqual(list(self.fs.ls('hdfs:///')), ['hdfs:///f'])
+
+    def test_ls_recurse(self):
+        self.make_mock_file('f')
+        self.make_mock_file('d/f2')
+        self.assertEqual(sorted(self.fs.ls('hdfs:///')),
+                         ['hdfs:///d/f2', 'hdfs:///f'])
+
+    def test_ls_keeps_netloc(self):
+        self.make_mock_file('d/f')
+        self.assertEqual(list(self.fs.ls('hdfs://127.0.0.1:8020/d')),
+                         ['hdfs://127.0.0.1:8020/d/f'])
+
+    def test_cant_handle_other_namenodes(self):
+        # leave these to HadoopFilesystem
+        self.assertFalse(
+            self.fs.can_handle_path('hdfs://othernamenode:8020/tmp/foo'))
+        self.assertFalse(self.fs.can_handle_path('hdfs://othernamenode/'))
+
+    def test_rm_other_namenode(self):
+        self.make_mock_file('f')
+
+        self.assertRaises(NotImplementedError,
+                          self.fs.rm, 'hdfs://othernamenode/f')
+        self.assertTrue(os.path.exists(os.path.join(self.hdfs_root, 'f')))
+
+    def test_ls_nonexistent(self):
+        self.assertEqual(list(self.fs.ls('hdfs:///nothing/here')), [])
+
+    def test_ls_glob(self):
+        self.make_mock_file('logs/2016-10-15/a.gz')
+        self.make_mock_file('logs/2016-10-16/a.gz')
+        self.make_mock_file('logs/2016-10-16/b.txt')
+        self.make_mock_file('logs/2016-10-16/sub/c.gz')
+        self.make_mock_file('other/2016-10-16/a.gz')
+
+        self.assertEqual(sorted(self.fs.ls('hdfs:///*/2016-10-16/*.gz')), [
+            'hdfs:///logs/2016-10-16/a.gz',
+            'hdfs:///other/2016-10-16/a.gz',
+        ])
+
+        # matching directories are listed recursively
+        self.assertEqual(sorted(self.fs.ls('hdfs:///logs/*-16/s?b')),
+                         ['hdfs:///logs/2016-10-16/sub/c.gz'])
+
+        # didn't list 2016-10-15
+        self.assertNotIn(('GET', 'LISTSTATUS', '/logs/2016-10-15'),
+                         self.server.requests)
+
+    def test_ls_space(self):
+        self.make_mock_file('foo  bar')
+        self.assertEqual(list(self.fs.ls('hdfs:///')), ['hdfs:///foo  bar'])
+
+    def test_ls_detailed(self):
+        path = self.make_mock_file('d/f', 'foo')
+        os.utime(path, (1476300000, 1476300000))
+
+        self.assertEqual(list(self.fs.ls_detailed('hdfs:///d')), [
+            dict(uri='hdfs:///d/f', size=3, mtime=1476300000.0,
+                 checksum=None),
+        ])
+
+    def test_ls_file(self):
+        self.make_mock_file('d/f')
+        self.assertEqual(list(self.fs.ls('hdfs:///d/f')), ['hdfs:///d/f'])
+
+    def test_cat_uncompressed(self):
+        self.make_mock_file('data/foo', 'foo\nfoo\n')
+
+        self.assertEqual(list(self.fs._cat_file('hdfs:///data/foo')),
+                         [b'foo\n', b'foo\n'])
+
+    def test_cat_bz2(self):
+        self.make_mock_file('data/foo.bz2', bz2.compress(b'foo\n' * 1000))
+
+        self.assertEqual(list(self.fs._cat_file('hdfs:///data/foo.bz2')),
+                         [b'foo\n'] * 1000)
+
+    def test_cat_gz(self):
+        self.make_mock_file('data/foo.gz', gzip_compress(b'foo\n' * 10000))
+
+        self.assertEqual(list(self.fs._cat_file('hdfs:///data/foo.gz')),
+                         [b'foo\n'] * 10000)
+
+    def test_cat_nonexistent(self):
+        self.assertRaises(IOError, list, self.fs._cat_file('hdfs:///foo'))
+
+    def test_cat_follows_redirect(self):
+        self.make_mock_file('data/foo', 'foo\n')
+        list(self.fs._cat_file('hdfs:///data/foo'))
+
+        # once to the namenode, once to the datanode
+        self.assertEqual(self.server.requests, [
+            ('GET', 'OPEN', '/data/foo'),
+            ('GET', 'OPEN', '/data/foo'),
+        ])
+
+    def test_cat_glob(self):
+        self.make_mock_file('data/a', 'a\n')
+        self.make_mock_file('data/b', 'b\n')
+
+        self.assertEqual(list(self.fs.cat('hdfs:///data/*')), [b'a\n', b'b\n'])
+
+    def test_reuses_connections(self):
+        for i in range(10):
+            self.make_mock_file('data/part-%05d' % i, 'line %d\n' % i)
+
+        self.assertEqual(len(list(self.fs.cat('hdfs:///data'))), 10)
+        self.assertEqual(self.fs.du('hdfs:///data'), 70)
+        self.assertTrue(self.fs.exists('hdfs:///data/part-00009'))
+
+        self.assertGreater(len(self.server.requests), 20)
+        self.assertEqual(self.server.num_connections, 1)
+
+    def test_partial_read_doesnt_reuse_connection(self):
+        self.make_mock_file('data/foo', 'foo\n' * 100000)
+
+        lines = self.fs._cat_file('hdfs:///data/foo')
+        self.assertEqual(next(lines), b'foo\n')
+        lines.close()
+
+        self.assertTrue(self.fs.exists('hdfs:///data/foo'))
+        self.assertEqual(self.server.num_connections, 2)
+
+    def test_survives_dropped_connection(self):
+        self.make_mock_file('f')
+        self.assertTrue(self.fs.exists('hdfs:///f'))
+
+        # simulate the server timing out an idle connection
+        for conns in self.fs._idle_conns.values():
+            for conn in conns:
+                conn.sock.close()
+
+        self.assertTrue(self.fs.exists('hdfs:///f'))
+
+    def test_sends_user_name(self):
+        self.assertEqual(list(self.fs.ls('hdfs:///')), [])
+        self.assertEqual(set(self.server.user_names), set(['mrjob_tests']))
+
+    def test_user_name_from_environment(self):
+        with patch.dict(os.environ, HADOOP_USER_NAME='dave'):
+            fs = WebHDFSFilesystem(self.server.url)
+        self.addCleanup(fs.close)
+
+        self.assertEqual(list(fs.ls('hdfs:///')), [])
+        self.assertEqual(set(self.server.user_names), set(['dave']))
+
+    def test_du(self):
+        self.make_mock_file('data1', 'abcd')
+        self.make_mock_file('more/data2', 'defg')
+        self.make_mock_file('more/data3', 'hijk')
+
+        self.assertEqual(self.fs.du('hdfs:///'), 12)
+        self.assertEqual(self.fs.du('hdfs:///data1'), 4)
+        self.assertEqual(self.fs.du('hdfs:///more'), 8)
+        self.assertEqual(self.fs.du('hdfs:///more/*'), 8)
+        self.assertEqual(self.fs.du('hdfs:///more/data2'), 4)
+        self.assertEqual(self.fs.du('hdfs:///more/data3'), 4)
+
+    def test_du_non_existent(self):
+        self.assertEqual(self.fs.du('hdfs:///does-not-exist'), 0)
+
+    def test_mkdir(self):
+        self.fs.mkdir('hdfs:///d/ave')
+        self.assertTrue(os.path.isdir(os.path.join(self.hdfs_root, 'd/ave')))
+
+        # already exists, no problem
+        self.fs.mkdir('hdfs:///d/ave')
+
+    def test_mkdir_over_file(self):
+        self.make_mock_file('f')
+        self.assertRaises(IOError, self.fs.mkdir, 'hdfs:///f')
+
+    def test_exists_no(self):
+        self.assertFalse(self.fs.exists('hdfs:///f'))
+
+    def test_exists_yes(self):
+        self.make_mock_file('f')
+        self.assertTrue(self.fs.exists('hdfs:///f'))
+
+    def test_exists_empty_dir(self):
+        self.fs.mkdir('hdfs:///d')
+        self.assertTrue(self.fs.exists('hdfs:///d'))
+        self.assertTrue(self.fs.exists('hdfs:///d/'))
+
+    def test_exists_glob(self):
+        self.make_mock_file('logs/part-00000')
+        self.assertTrue(self.fs.exists('hdfs:///logs/part-*'))
+        self.assertFalse(self.fs.exists('hdfs:///logs/*.gz'))
+
+    def test_put(self):
+        local_path = self.makefile('foo', b'bar\n' * 1000)
+
+        self.fs._put(local_path, 'hdfs:///tmp/mrjob/files/foo')
+
+        with open(os.path.join(self.hdfs_root, 'tmp/mrjob/files/foo'),
+                  'rb') as f:
+            self.assertEqual(f.read(), b'bar\n' * 1000)
+
+    def test_put_doesnt_overwrite(self):
+        self.make_mock_file('foo')
+        local_path = self.makefile('foo', b'bar\n')
+
+        self.assertRaises(IOError, self.fs._put, local_path, 'hdfs:///foo')
+
+    def test_put_other_filesystem(self):
+        local_path = self.makefile('foo', b'bar\n')
+
+        self.assertRaises(IOError, self.fs._put, local_path, 's3://w/foo')
+
+    def test_rm(self):
+        local_path = self.make_mock_file('f')
+
+        self.fs.rm('hdfs:///f')
+        self.assertFalse(os.path.exists(local_path))
+
+    def test_rm_recursive(self):
+        local_path = self.make_mock_file('d/f')
+
+        self.fs.rm('hdfs:///d')
+        self.assertFalse(os.path.exists(local_path))
+        self.assertFalse(os.path.exists(os.path.dirname(local_path)))
+
+    def test_rm_nonexistent(self):
+        self.fs.rm('hdfs:///f')
+
+    def test_rm_glob(self):
+        self.make_mock_file('d/a.gz')
+        self.make_mock_file('d/b.txt')
+
+        self.fs.rm('hdfs:///d/*.gz')
+
+        self.assertEqual(list(self.fs.ls('hdfs:///d')), ['hdfs:///d/b.txt'])
+
+    def test_touchz(self):
+        self.fs.touchz('hdfs:///d/empty')
+
+        local_path = os.path.join(self.hdfs_root, 'd/empty')
+        self.assertEqual(os.path.getsize(local_path), 0)
+
+        # okay to touchz an empty file
+        self.fs.touchz('hdfs:///d/empty')
+
+    def test_touchz_non_empty_file(self):
+        self.make_mock_file('f', 'not empty')
+        self.assertRaises(IOError, self.fs.touchz, 'hdfs:///f')
@@ -12,6 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import threading
 from io import BytesIO
 
 from mrjob.logs.wrap import _cat_log
@@ -181,6 +182,31 @@ class LsLogsTestCase(TestCase):
             [dict(path='ssh://node1/logs/syslog'),
              dict(path='ssh://node2/logs/syslog')])
 
+    def test_lists_log_dirs_in_parallel(self):
+        self.mock_paths = [
+            'ssh://node1/logs/syslog',
+            'ssh://node2/logs/syslog',
+        ]
+
+        mock_fs_ls = self.mock_fs.ls.side_effect
+        node2_listed = threading.Event()
+
+        def blocking_mock_fs_ls(log_dir):
+            # node1 can't finish until we've started listing node2
+            if 'node2' in log_dir:
+                node2_listed.set()
+            elif not node2_listed.wait(5):
+                raise AssertionError('listed log dirs one at a time')
+
+            return mock_fs_ls(log_dir)
+
+        self.mock_fs.ls.side_effect = blocking_mock_fs_ls
+
+        self.assertEqual(
+            self._ls_logs([['ssh://node1/logs/', 'ssh://node2/logs/']]),
+            [dict(path='ssh://node1/logs/syslog'),
+             dict(path='ssh://node2/logs/syslog')])
+
     def test_stop_after_match(self):
         self.mock_paths = [
             's3://bucket/logs/node1/syslog',
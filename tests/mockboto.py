@@ -17,7 +17,9 @@ This is by no means a complete mock of boto, just what we need for tests.
 """
 import hashlib
 import itertools
+import multiprocessing.pool
 import os
+import re
 import shutil
 import tempfile
 import time
@@ -29,6 +31,9 @@ try:
     from boto.emr.instance_group import InstanceGroup
     from boto.emr.step import JarStep
     import boto.exception
+    import boto.s3.multidelete
+    import boto.s3.multipart
+    import boto.s3.prefix
     import boto.utils
     boto  # quiet "redefinition of unused ..." warning from pyflakes
 except ImportError:
@@ -136,6 +141,21 @@ def err_xml(message, type='Sender', code='ValidationError'):
 
 ### Test Case ###
 
+_real_sleep = time.sleep
+
+
+class _PoolTime(object):
+    """Stand-in for the :py:mod:`time` module inside
+    :py:mod:`multiprocessing.pool`, so that thread pools' housekeeping
+    threads keep (briefly) sleeping while :py:func:`time.sleep` is patched.
+    Otherwise they spin, slowing down every test that uses a pool."""
+
+    @staticmethod
+    def sleep(secs):
+        # don't make every pool.join() wait out a full 0.1-second tick
+        _real_sleep(min(secs, 0.001))
+
+
 class MockBotoTestCase(SandboxedTestCase):
 
     # if a test needs to create an EMR connection more than this many
@@ -164,6 +184,8 @@ class MockBotoTestCase(SandboxedTestCase):
         self.mock_iam_role_attached_policies = {}
         self.mock_iam_roles = {}
         self.mock_s3_fs = {}
+        # names of mock S3 requests made (e.g. 'get_key'), in order
+        self.mock_s3_requests = []
 
         self.emr_conn_iterator = itertools.repeat(
             None, self.MAX_EMR_CONNECTIONS)
@@ -172,6 +194,8 @@ class MockBotoTestCase(SandboxedTestCase):
         self.start(patch.object(boto, 'connect_iam', self.connect_iam))
         self.start(patch.object(
             boto.emr.connection, 'EmrConnection', self.connect_emr))
+        self.start(patch.object(
+            boto.s3.multipart, 'MultiPartUpload', MockMultiPartUpload))
 
         super(MockBotoTestCase, self).setUp()
 
@@ -184,7 +208,8 @@ class MockBotoTestCase(SandboxedTestCase):
             EMRJobRunner, '_create_mrjob_zip',
             fake_create_mrjob_zip))
 
-        self.start(patch.object(time, 'sleep'))
+        self.start(patch.object(multiprocessing.pool, 'time', _PoolTime))
+        self.mock_sleep = self.start(patch.object(time, 'sleep'))
 
     def add_mock_s3_data(self, data, time_modified=None, location=None):
         """Update self.mock_s3_fs with a map from bucket name
@@ -283,6 +308,7 @@ class MockBotoTestCase(SandboxedTestCase):
 
     def connect_s3(self, *args, **kwargs):
         kwargs['mock_s3_fs'] = self.mock_s3_fs
+        kwargs['mock_s3_requests'] = self.mock_s3_requests
         return MockS3Connection(*args, **kwargs)
 
     def connect_emr(self, *args, **kwargs):
@@ -336,7 +362,8 @@ class MockS3Connection(object):
                  proxy_user=None, proxy_pass=None,
                  host=None, debug=0, https_connection_factory=None,
                  calling_format=None, path='/', provider='aws',
-                 bucket_class=None, mock_s3_fs=None, security_token=None):
+                 bucket_class=None, mock_s3_fs=None, security_token=None,
+                 mock_s3_requests=None):
         """Mock out a connection to S3. Most of these args are the same
         as for the real S3Connection, and are ignored.
 
@@ -344,17 +371,29 @@ class MockS3Connection(object):
         by specifying mock_s3_fs, which is a map from bucket name to
         a dictionary with fields 'location' (bucket location constraint,
         a string) and 'keys' (a map from key to (bytes, time_modified).
+
+        If you specify mock_s3_requests (a list), we'll append the name of
+        each method that would make a request to S3 (e.g. 'get_key').
         """
         # use mock_s3_fs even if it's {}
         self.mock_s3_fs = combine_values({}, mock_s3_fs)
+        self.mock_s3_requests = mock_s3_requests
         self.host = host or 's3.amazonaws.com'
 
+    def mock_request(self, name):
+        """Record that we made a request to S3."""
+        if self.mock_s3_requests is not None:
+            self.mock_s3_requests.append(name)
+
     def _region(self):
         """Infer region from self.host. Return '' if on regionless
         endpoint."""
         return self.host.split('.')[0][3:]
 
     def get_bucket(self, bucket_name, validate=True, headers=None):
+        if validate:
+            self.mock_request('get_bucket')
+
         if bucket_name in self.mock_s3_fs:
             # can't access buckets through wrong region's endpoint
             region = self._region()
@@ -366,10 +405,14 @@ class MockS3Connection(object):
             raise boto.exception.S3ResponseError(404, 'Not Found')
 
     def get_all_buckets(self):
-        return [self.get_bucket(name) for name in self.mock_s3_fs]
+        self.mock_request('get_all_buckets')
+        return [self.get_bucket(name, validate=False)
+                for name in self.mock_s3_fs]
 
     def create_bucket(self, bucket_name, headers=None, location='',
                       policy=None):
+        self.mock_request('create_bucket')
+
         if bucket_name in self.mock_s3_fs:
             raise boto.exception.S3CreateError(409, 'Conflict')
 
@@ -407,23 +450,89 @@ class MockBucket(object):
         return MockKey(bucket=self, name=key_name)
 
     def get_key(self, key_name):
+        self.connection.mock_request('get_key')
+
         if key_name in self.mock_state():
             return MockKey(bucket=self, name=key_name, date_to_str=to_rfc1123)
         else:
             return None
 
     def get_location(self):
+        self.connection.mock_request('get_location')
         return self.connection.mock_s3_fs[self.name]['location']
 
-    def list(self, prefix=''):
+    def list(self, prefix='', delimiter=''):
+        self.connection.mock_request('list')
+
+        seen_prefixes = set()
+
         for key_name in sorted(self.mock_state()):
-            if key_name.startswith(prefix):
-                yield MockKey(bucket=self, name=key_name,
-                              date_to_str=to_iso8601)
+            if not key_name.startswith(prefix):
+                continue
+
+            # roll up keys into "common prefixes"
+            if delimiter and delimiter in key_name[len(prefix):]:
+                common_prefix = key_name[:key_name.index(
+                    delimiter, len(prefix)) + len(delimiter)]
+                if common_prefix not in seen_prefixes:
+                    seen_prefixes.add(common_prefix)
+                    yield boto.s3.prefix.Prefix(bucket=self,
+                                                name=common_prefix)
+                continue
+
+            yield MockKey(bucket=self, name=key_name,
+                          date_to_str=to_iso8601)
 
     def initiate_multipart_upload(self, key_name):
-        key = self.new_key(key_name)
-        return MockMultiPartUpload(key)
+        self.new_key(key_name)
+
+        mpul = MockMultiPartUpload(self)
+        mpul.bucket_name = self.name
+        mpul.key_name = key_name
+        mpul.id = 'mpul-%d' % next(_mpul_ids)
+
+        self.mock_multipart_uploads()[mpul.id] = {}
+
+        return mpul
+
+    def mock_multipart_uploads(self):
+        """Map from upload ID to a map from part number to data, shared
+        by all connections."""
+        return self.connection.mock_s3_fs[self.name].setdefault(
+            'multipart_uploads', {})
+
+    def delete_keys(self, keys, quiet=False):
+        self.connection.mock_request('delete_keys')
+
+        if len(keys) > 1000:
+            raise boto.exception.S3ResponseError(400, 'Bad Request')
+
+        result = boto.s3.multidelete.MultiDeleteResult(self)
+
+        for key in keys:
+            key_name = getattr(key, 'name', key)
+
+            if key_name in self.mock_s3_undeletable_keys():
+                result.errors.append(boto.s3.multidelete.Error(
+                    key=key_name, code='AccessDenied',
+                    message='Access Denied'))
+                continue
+
+            # S3 considers deleting a key that doesn't exist a success
+            self.mock_state().pop(key_name, None)
+
+            if not quiet:
+                result.deleted.append(
+                    boto.s3.multidelete.Deleted(key=key_name))
+
+        return result
+
+    def mock_s3_undeletable_keys(self):
+        """Names of keys that delete_keys() should fail to delete. Add
+        key names to ``mock_s3_fs[bucket_name]['undeletable']`` to
+        simulate permission errors."""
+        return self.connection.mock_s3_fs[self.name].get(
+            'undeletable', ())
 
 
 class MockKey(object):
@@ -459,20 +568,43 @@ class MockKey(object):
             raise boto.exception.S3ResponseError(404, 'Not Found')
 
     def get_contents_to_filename(self, path, headers=None):
+        self.bucket.connection.mock_request('get')
         with open(path, 'wb') as f:
             f.write(self.read_mock_data())
 
     def set_contents_from_filename(self, path):
+        self.bucket.connection.mock_request('put')
         with open(path, 'rb') as f:
             self.write_mock_data(f.read())
 
-    def get_contents_as_string(self):
-        return self.read_mock_data()
+    def get_contents_as_string(self, headers=None):
+        self.bucket.connection.mock_request('get')
+        data = self.read_mock_data()
+
+        headers = headers or {}
+
+        if 'If-Match' in headers:
+            if headers['If-Match'].strip('"') != self.etag.strip('"'):
+                raise boto.exception.S3ResponseError(
+                    412, 'Precondition Failed')
+
+        # only handles bytes=start-end
+        if 'Range' in headers:
+            m = re.match(r'^bytes=(\d+)-(\d+)$', headers['Range'])
+            start, end = int(m.group(1)), int(m.group(2))
+            if start >= len(data):
+                raise boto.exception.S3ResponseError(
+                    416, 'Requested Range Not Satisfiable')
+            data = data[start:end + 1]
+
+        return data
 
     def set_contents_from_string(self, string):
+        self.bucket.connection.mock_request('put')
         self.write_mock_data(string)
 
     def delete(self):
+        self.bucket.connection.mock_request('delete')
         if self.name in self.bucket.mock_state():
             del self.bucket.mock_state()[self.name]
         else:
@@ -522,14 +654,14 @@ class MockKey(object):
 
     def _get_etag(self):
         m = hashlib.md5()
-        m.update(self.get_contents_as_string())
+        m.update(self.read_mock_data())
         return m.hexdigest()
 
     etag = property(_get_etag)
 
     @property
     def size(self):
-        return len(self.get_contents_as_string())
+        return len(self.read_mock_data())
 
 
 class MultiPartUploadCancelled(bytes):
@@ -538,16 +670,29 @@ class MultiPartUploadCancelled(bytes):
     pass
 
 
+# each multipart upload gets a unique ID
+_mpul_ids = itertools.count(1)
+
+
 class MockMultiPartUpload(object):
 
-    def __init__(self, key):
-        """Mock out boto.s3.MultiPartUpload
+    def __init__(self, bucket=None):
+        """Mock out boto.s3.multipart.MultiPartUpload
 
-        Note that real MultiPartUpload objects don't actually know which key
-        they're associated with. It's just simpler this way.
+        Like the real thing, you can make one for an existing upload by
+        setting *key_name* and *id*; parts are stored in the bucket,
+        keyed by *id*.
         """
-        self.key = key
-        self.parts = {}
+        self.bucket = bucket
+        self.bucket_name = None
+        self.key_name = None
+        self.id = None
+
+    def _parts(self):
+        return self.bucket.mock_multipart_uploads()[self.id]
+
+    def _key(self):
+        return MockKey(bucket=self.bucket, name=self.key_name)
 
     def upload_part_from_file(self, fp, part_num):
         part_num = int(part_num)  # boto leaves this to a format string
@@ -556,26 +701,29 @@ class MockMultiPartUpload(object):
         if part_num < 1:
             raise ValueError('Part numbers must be greater than zero')
 
-        self.parts[part_num] = fp.read()
+        self._parts()[part_num] = fp.read()
 
     def complete_upload(self):
+        parts = self.bucket.mock_multipart_uploads().pop(self.id)
         data = b''
 
-        if self.parts:
-            num_parts = max(self.parts)
+        if parts:
+            num_parts = max(parts)
             for part_num in range(1, num_parts + 1):
                 # S3 might be more graceful about missing parts. But we
                 # certainly don't want this to slip past testing
-                data += self.parts[part_num]
+                data += parts[part_num]
 
-        self.key.set_contents_from_string(data)
+        self._key().set_contents_from_string(data)
 
     def cancel_upload(self):
-        self.parts = None  # should break any further calls
+        # should break any further calls
+        self.bucket.mock_multipart_uploads().pop(self.id)
 
         # record that multipart upload was cancelled
-        cancelled = MultiPartUploadCancelled(self.key.get_contents_as_string())
-        self.key.set_contents_from_string(cancelled)
+        key = self._key()
+        cancelled = MultiPartUploadCancelled(key.get_contents_as_string())
+        key.set_contents_from_string(cancelled)
 
 
 ### EMR ###
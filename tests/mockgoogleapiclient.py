@@ -18,6 +18,7 @@ import os
 import tempfile
 import time
 import hashlib
+import itertools
 import sys
 from datetime import datetime
 from httplib2 import Response
@@ -186,11 +187,8 @@ class MockGoogleAPITestCase(SandboxedTestCase):
             GCSFilesystem, 'api_client', self._gcs_client)
         self.gcs_patch_download_io = patch.object(
             GCSFilesystem, '_download_io', self._gcs_client.download_io)
-        self.gcs_patch_upload_io = patch.object(
-            GCSFilesystem, '_upload_io', self._gcs_client.upload_io)
         self.start(self.gcs_patch_api_client)
         self.start(self.gcs_patch_download_io)
-        self.start(self.gcs_patch_upload_io)
 
         self.start(patch('mrjob.dataproc._read_gcloud_config',
                          lambda: _GCLOUD_CONFIG))
@@ -267,11 +265,21 @@ class MockGCSClient(object):
         self._cache_buckets = dict()
 
         self._client_objects = MockGCSClientObjects(self)
+
+        # number of calls in each batch request we executed
+        self.mock_batch_sizes = []
+
+        # name of each objects() method called (e.g. 'list', 'insert'),
+        # so tests can check how many requests we make
+        self.mock_requests = []
         self._client_buckets = MockGCSClientBuckets(self)
 
     def objects(self):
         return self._client_objects
 
+    def new_batch_http_request(self, callback=None):
+        return MockBatchHttpRequest(self, callback=callback)
+
     def buckets(self):
         return self._client_buckets
 
@@ -308,9 +316,8 @@ class MockGCSClient(object):
         return io_obj
 
     def upload_io(self, io_obj, dest_uri):
-        """
-        Clobber GCSFilesystem._upload_io
-        """
+        """Put the contents of *io_obj* at *dest_uri*, without going through
+        the (mock) API."""
         bucket, name = parse_gcs_uri(dest_uri)
 
         assert bucket in self._cache_buckets
@@ -329,6 +336,37 @@ class MockGCSClient(object):
         return object_resp
 
 
+class MockBatchHttpRequest(object):
+    """Mock out googleapiclient.http.BatchHttpRequest"""
+
+    def __init__(self, client, callback=None):
+        self._client = client
+        self._callback = callback
+
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests))
+        self._requests.append((request_id, request, callback))
+
+    def execute(self):
+        if len(self._requests) > 100:
+            raise mock_google_error(400)
+
+        self._client.mock_batch_sizes.append(len(self._requests))
+
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request.execute(), None
+            except google_errors.HttpError as e:
+                response, exception = None, e
+
+            for cb in (callback, self._callback):
+                if cb is not None:
+                    cb(request_id, response, exception)
+
+
 class MockGCSClientObjects(object):
     def __init__(self, client):
         assert isinstance(client, MockGCSClient)
@@ -339,48 +377,203 @@ class MockGCSClientObjects(object):
     def list(self, **kwargs):
         """Emulate objects().list - fields supported - bucket, prefix, fields
         """
+        self._client.mock_requests.append('list')
         bucket = kwargs.get('bucket')
         prefix = kwargs.get('prefix') or ''
+        delimiter = kwargs.get('delimiter')
         fields = kwargs.get('fields') or _LS_FIELDS_TO_RETURN
         assert bucket is not None
 
         # Return only the fields that were requested
-        field_match = re.findall('items\((.*?)\)', fields)[0]
-        actual_fields = set(field_match.split(','))
+        field_matches = re.findall('items\((.*?)\)', fields)
+        if field_matches:
+            actual_fields = set(field_matches[0].split(','))
+        else:
+            actual_fields = None
 
         object_map = _get_deep(self._objects, [bucket], dict())
 
         item_list = []
+        prefixes = set()
         for object_name, current_object in object_map.items():
             # Filter out on prefix match
             if not object_name.startswith(prefix):
                 continue
 
-            # Copy output fields for the requestor
+            # roll up objects into prefixes
+            if delimiter and delimiter in object_name[len(prefix):]:
+                prefixes.add(object_name[:object_name.index(
+                    delimiter, len(prefix)) + len(delimiter)])
+                continue
+
+            if actual_fields is None:
+                continue
+
+            # Copy output fields for the requestor (GCS leaves out
+            # fields the object doesn't have)
             output_item = dict()
             for current_field in actual_fields:
-                output_item[current_field] = current_object[current_field]
+                if current_field in current_object:
+                    output_item[current_field] = current_object[current_field]
 
             item_list.append(output_item)
 
-        return dict(items=item_list, kwargs=kwargs)
+        resp = dict(kwargs=kwargs)
+        if actual_fields is not None:
+            resp['items'] = item_list
+        if 'prefixes' in fields.split(','):
+            resp['prefixes'] = sorted(prefixes)
+
+        return resp
 
     def list_next(self, list_request, resp):
         """list always returns all results in a single shot"""
         return None
 
-    @mock_api
     def delete(self, bucket=None, object=None):
-        bucket_dict = self._objects[bucket]
-        del bucket_dict[object]
+        self._client.mock_requests.append('delete')
 
-    @mock_api
-    def get_media(self, bucket=None, object=None):
-        raise NotImplementedError('See MockGCSClient.download_io')
+        # don't delete anything until the request is executed, so that
+        # we can be part of a batch
+        def execute():
+            bucket_dict = self._objects.get(bucket)
+            if bucket_dict is None or object not in bucket_dict:
+                raise mock_google_error(404)
+            del bucket_dict[object]
+
+        mocked_req = mock.MagicMock(google_http.HttpRequest)
+        mocked_req.execute.side_effect = execute
+
+        return mocked_req
 
     @mock_api
-    def insert(self, bucket=None, name=None, media_body=None):
-        raise NotImplementedError('See MockGCSClient.upload_io')
+    def get(self, bucket=None, object=None):
+        self._client.mock_requests.append('get')
+
+        object_dict = _get_deep(self._objects, [bucket, object])
+        if not object_dict:
+            raise mock_google_error(404)
+
+        return dict((k, v) for k, v in object_dict.items()
+                    if not k.startswith('_'))
+
+    def get_media(self, bucket=None, object=None, generation=None):
+        """Emulate ranged downloads. See MockGCSClient.download_io for
+        downloading whole objects."""
+        self._client.mock_requests.append('get_media')
+
+        return MockGCSMediaRequest(self._objects, bucket, object, generation)
+
+    def insert(self, bucket=None, name=None, media_body=None,
+               ifGenerationMatch=None):
+        """Emulate resumable uploads. The whole object is uploaded with
+        the first call to ``next_chunk()``."""
+        self._client.mock_requests.append('insert')
+
+        def execute():
+            self._check_generation_match(bucket, name, ifGenerationMatch)
+
+            data = media_body.getbytes(0, media_body.size())
+            return self._put_object(bucket, name, data)
+
+        mocked_req = mock.MagicMock(google_http.HttpRequest)
+        mocked_req.execute.side_effect = execute
+        mocked_req.next_chunk.side_effect = (
+            lambda num_retries=0: (None, execute()))
+
+        return mocked_req
+
+    def compose(self, destinationBucket=None, destinationObject=None,
+                body=None, ifGenerationMatch=None):
+        self._client.mock_requests.append('compose')
+
+        def execute():
+            self._check_generation_match(
+                destinationBucket, destinationObject, ifGenerationMatch)
+
+            if len(body['sourceObjects']) > 32:
+                raise mock_google_error(400)
+
+            chunks = []
+            for source in body['sourceObjects']:
+                object_dict = _get_deep(
+                    self._objects, [destinationBucket, source['name']])
+                if not object_dict:
+                    raise mock_google_error(404)
+                chunks.append(object_dict['_data'])
+
+            # composite objects have a CRC32C, but no MD5 hash
+            return self._put_object(
+                destinationBucket, destinationObject, b''.join(chunks),
+                componentCount=len(chunks), md5Hash=None)
+
+        mocked_req = mock.MagicMock(google_http.HttpRequest)
+        mocked_req.execute.side_effect = execute
+
+        return mocked_req
+
+    def _check_generation_match(self, bucket, name, generation):
+        """Raise a 412 error if the object's generation (``'0'`` if it
+        doesn't exist) isn't *generation*."""
+        if generation is None:
+            return
+
+        object_dict = _get_deep(self._objects, [bucket, name])
+        actual_generation = object_dict['generation'] if object_dict else '0'
+
+        if str(generation) != actual_generation:
+            raise mock_google_error(412)
+
+    def _put_object(self, bucket, name, data, **fields):
+        """Store an object. Keyword args override the object's metadata;
+        set a field to ``None`` to remove it."""
+        if bucket not in self._client._cache_buckets:
+            raise mock_google_error(404)
+
+        object_dict = _insert_object_resp(bucket=bucket, name=name, data=data)
+        for k, v in fields.items():
+            if v is None:
+                object_dict.pop(k, None)
+            else:
+                object_dict[k] = v
+        _set_deep(self._objects, [bucket, name], object_dict)
+
+        return dict((k, v) for k, v in object_dict.items()
+                    if not k.startswith('_'))
+
+
+class MockGCSMediaRequest(object):
+    """Mock out the request returned by objects().get_media(), which
+    supports the ``range`` header."""
+
+    def __init__(self, objects, bucket, object, generation=None):
+        self._objects = objects
+        self._bucket = bucket
+        self._object = object
+        self._generation = generation
+
+        self.headers = {}
+
+    def execute(self):
+        object_dict = _get_deep(self._objects, [self._bucket, self._object])
+        if not object_dict:
+            raise mock_google_error(404)
+
+        if (self._generation is not None and
+                self._generation != object_dict['generation']):
+            raise mock_google_error(404)
+
+        data = object_dict['_data']
+
+        # only handles bytes=start-end
+        if 'range' in self.headers:
+            m = re.match(r'^bytes=(\d+)-(\d+)$', self.headers['range'])
+            start, end = int(m.group(1)), int(m.group(2))
+            if start >= len(data):
+                raise mock_google_error(416)
+            data = data[start:end + 1]
+
+        return data
 
 
 class MockGCSClientBuckets(object):
@@ -437,6 +630,10 @@ class MockGCSClientBuckets(object):
         return bucket
 
 
+# each version of each object gets a unique generation
+_generations = itertools.count(1)
+
+
 def _insert_object_resp(bucket=None, name=None, data=None):
     """Fake GCS object metadata"""
     assert type(data) is bytes
@@ -451,6 +648,7 @@ def _insert_object_resp(bucket=None, name=None, data=None):
         u'md5Hash': _hex_to_base64(md5_hex_hash),
         u'timeCreated': _datetime_to_gcptime(),
         u'size': str(len(data)),
+        u'generation': str(next(_generations)),
         u'_data': data
     }
 
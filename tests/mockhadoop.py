@@ -164,10 +164,12 @@ def mock_hadoop_uses_yarn(environ):
     return uses_yarn(environ['MOCK_HADOOP_VERSION'])
 
 
-def get_mock_hadoop_cmd_args():
+def get_mock_hadoop_cmd_args(environ=None):
     """Get a list for each invocation of hadoop, each containing a list of
-    arguments (not including the hadoop binary's path)."""
-    cmd_log = os.path.join(get_mock_dir(), 'cmd.log')
+    arguments (not including the hadoop binary's path).
+
+    Use this to check how many times the hadoop binary was run."""
+    cmd_log = os.path.join(get_mock_dir(environ=environ), 'cmd.log')
 
     if not os.path.exists(cmd_log):
         return []
@@ -523,6 +525,12 @@ def hadoop_fs_put(stdout, stderr, environ, *args):
 
     real_dst = hdfs_uri_to_real_path(dst, environ)
     real_dir = os.path.dirname(real_dst)
+
+    # can only put several files into a directory that exists
+    if len(srcs) > 1 and not os.path.isdir(real_dst):
+        print("put: `%s': No such file or directory" % dst, file=stderr)
+        return 1
+
     # dst could be a dir or a filename; we don't know
     if not (os.path.isdir(real_dst) or os.path.isdir(real_dir)):
         os.makedirs(real_dir)
@@ -23,7 +23,13 @@ MOCK_SSH_VERIFY_KEY_FILE -- set to 'true' if the script should print an error
                             when the key file does not exist
 
 You can optionally set MOCK_SSH_REQUIRES_SUDO to 1 (or any nonempty value)
-to raise an error unless ls and cat are preceded by sudo.
+to raise an error unless ls, cat, and tar are preceded by sudo.
+
+Starting a master connection (-M) creates an empty file at its
+ControlPath, standing in for the control socket; -O check succeeds if
+that file exists, and -O exit deletes it. On the master node, control
+commands and requests to start master connections to slaves always
+succeed.
 
 This is designed to run as: python -m tests.mockssh <ssh args>
 
@@ -37,8 +43,11 @@ import os
 import pipes
 import posixpath
 import re
+import shlex
 import stat
 import sys
+import tarfile
+from io import BytesIO
 
 
 def create_mock_ssh_script(path):
@@ -141,26 +150,44 @@ def main(stdin, stdout, stderr, args, environ):
             return 1
 
     def ls(host, args):
-        """Mock SSH behavior for :py:func:`~mrjob.ssh._ssh_ls()`"""
+        """Mock SSH behavior for :py:func:`~mrjob.ssh._ssh_ls()` and
+        :py:func:`~mrjob.ssh._ssh_ls_detailed()`"""
         dest = args[1]
         if dest == '-L':
             dest = args[2]
         root = path_for_host(host, environ)
         local_dest = rel_posix_to_abs_local(host, dest, environ)
 
+        # -printf's format was quoted once for each remote shell
+        fmt = None
+        if '-printf' in args:
+            fmt = args[args.index('-printf') + 1]
+            for _ in range(host.count('!') + 1):
+                fmt = shlex.split(fmt)[0]
+
+        def print_path(path):
+            if fmt is None:
+                print(path, file=stdout)
+            else:
+                real_path = rel_posix_to_abs_local(host, path, environ)
+                line = fmt.replace('%s', str(os.path.getsize(real_path)))
+                line = line.replace(
+                    '%T@', repr(float(os.path.getmtime(real_path))))
+                line = line.replace('%p', path).replace('\\n', '\n')
+                stdout.write(line)
+
         prefix_length = len(path_for_host(host, environ))
         if not os.path.exists(local_dest):
             print('No such file or directory:', local_dest, file=stderr)
             return 1
         if not os.path.isdir(local_dest):
-            print(dest, file=stdout)
+            print_path(dest)
         for root, dirs, files in os.walk(local_dest):
             components = root.split(os.sep)
             new_root = posixpath.join(*components)
             for filename in files:
-                print(
-                    '/' + posixpath.join(new_root, filename)[prefix_length:],
-                    file=stdout)
+                print_path(
+                    '/' + posixpath.join(new_root, filename)[prefix_length:])
         return 0
 
     def cat(host, args):
@@ -179,6 +206,26 @@ def main(stdin, stdout, stderr, args, environ):
 
         return 0
 
+    def tar(host, args):
+        """Mock SSH behavior for :py:func:`~mrjob.ssh._ssh_tar()`"""
+        dest = args[-1]
+        local_dest = rel_posix_to_abs_local(host, dest, environ)
+        if not os.path.exists(local_dest):
+            print('tar: %s: Cannot stat: No such file or directory' % dest,
+                  file=stderr)
+            return 2
+
+        buf = BytesIO()
+        with tarfile.open(fileobj=buf, mode='w', dereference=True) as t:
+            # (tarfile strips the leading "/" that tar -P would keep)
+            t.add(local_dest, arcname=dest)
+
+        # in Python 3, binary data has to go to sys.stdout.buffer
+        stdout_buffer = getattr(stdout, 'buffer', stdout)
+        stdout_buffer.write(buf.getvalue())
+
+        return 0
+
     def run(host, remote_args, stdout, stderr, environ, slave_key_file=None):
         """Execute a command as a "host." Recursively call for slave if
         necessary.
@@ -189,7 +236,7 @@ def main(stdin, stdout, stderr, args, environ):
         if remote_args[0] == 'sudo':
             remote_args = remote_args[1:]
         elif environ.get('MOCK_SSH_REQUIRES_SUDO'):
-            if remote_args[0] in ('find', 'cat'):
+            if remote_args[0] in ('find', 'cat', 'tar'):
                 print('sudo required', file=stderr)
                 return 1
 
@@ -209,6 +256,10 @@ def main(stdin, stdout, stderr, args, environ):
         if remote_args[0] == 'cat':
             return cat(host, remote_args)
 
+        # ls and cat in one go (this is 'tar -c ...')
+        if remote_args[0] == 'tar':
+            return tar(host, remote_args)
+
         # Recursively call for slaves
         if remote_args[0] == 'ssh':
             # Actually check the existence of the key file on the master node
@@ -231,6 +282,12 @@ def main(stdin, stdout, stderr, args, environ):
             while not remote_args[remote_arg_pos].startswith('hadoop@'):
                 remote_arg_pos += 1
 
+            # pretend to check for or start a master connection to the
+            # slave
+            if ('-O' in remote_args[:remote_arg_pos] or
+                    '-M' in remote_args[:remote_arg_pos]):
+                return 0
+
             slave_host = (
                 host + '!%s' % remote_args[remote_arg_pos].split('@')[1])
 
@@ -264,11 +321,40 @@ def main(stdin, stdout, stderr, args, environ):
 
     host = args[arg_pos].split('@')[1]
 
+    # pretend to start, check, or stop the master connection
+    if '-O' in args[:arg_pos] or '-M' in args[:arg_pos]:
+        return control_master(host, args[:arg_pos])
+
     # the rest are arguments are what to run on the remote machine
 
     arg_pos += 1
     return run(host, args[arg_pos:], stdout, stderr, environ, None)
 
 
+def control_master(host, options):
+    """Handle -M (start a master) and -O <command>, using an empty file
+    at the ControlPath to stand in for the master's control socket."""
+    control_path = None
+    for option in options:
+        if option.startswith('ControlPath='):
+            control_path = option[len('ControlPath='):].replace(
+                '%r', 'hadoop').replace('%h', host).replace('%p', '22')
+
+    if '-M' in options:
+        if control_path:
+            open(control_path, 'w').close()
+        return 0
+
+    command = options[options.index('-O') + 1]
+
+    if command == 'check':
+        return 0 if control_path and os.path.exists(control_path) else 255
+
+    if command == 'exit' and control_path and os.path.exists(control_path):
+        os.remove(control_path)
+
+    return 0
+
+
 if __name__ == '__main__':
     sys.exit(main(sys.stdin, sys.stdout, sys.stderr, sys.argv, os.environ))
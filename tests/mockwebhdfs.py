@@ -0,0 +1,269 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A small fake WebHDFS server, backed by a directory on the local
+filesystem, that runs in a thread.
+
+Like a real namenode, it redirects ``OPEN`` and ``CREATE`` to a "datanode"
+(which is just the same server, with ``namenoderpcaddress`` in the query
+string).
+"""
+import json
+import os
+import os.path
+import shutil
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    from urllib.parse import parse_qsl
+except ImportError:
+    from urlparse import parse_qsl
+
+from mrjob.py2 import unquote
+from mrjob.py2 import urlparse
+
+_WEBHDFS_PATH_PREFIX = '/webhdfs/v1'
+
+
+class MockWebHDFSServer(ThreadingMixIn, HTTPServer):
+    """Fake WebHDFS server. Files live in *root*.
+
+    *requests* is a list of ``(method, op, path)`` for every request
+    we've handled, *user_names* is the ``user.name`` each was sent
+    with, and *num_connections* is how many connections clients have
+    opened to us.
+    """
+    daemon_threads = True
+
+    def __init__(self, root):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), MockWebHDFSHandler)
+        self.root = root
+
+        self.requests = []
+        self.user_names = []
+        self.num_connections = 0
+
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs=dict(poll_interval=0.01))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def local_path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+
+class MockWebHDFSHandler(BaseHTTPRequestHandler):
+
+    # keep connections open, like a real namenode
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.num_connections += 1
+
+    def log_message(self, *args):
+        pass  # don't spam test output
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        _, _, url_path, _, query = urlparse(self.path)[:5]
+        params = dict(parse_qsl(query))
+
+        if not url_path.startswith(_WEBHDFS_PATH_PREFIX):
+            return self._send_error(400, 'IllegalArgumentException',
+                                    'Bad path: %s' % url_path)
+
+        path = unquote(url_path[len(_WEBHDFS_PATH_PREFIX):]) or '/'
+        op = params.get('op', '')
+
+        self.server.requests.append((method, op, path))
+        self.server.user_names.append(params.get('user.name'))
+
+        handler = getattr(self, '_%s_%s' % (method, op.lower()), None)
+        if handler is None:
+            return self._send_error(400, 'IllegalArgumentException',
+                                    'Bad op: %s %s' % (method, op))
+
+        handler(path, params)
+
+    ### responses ###
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in sorted((headers or {}).items()):
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, status=200):
+        self._send(status, json.dumps(data).encode('utf_8'),
+                   {'Content-Type': 'application/json'})
+
+    def _send_error(self, status, exception, message):
+        self._send_json(
+            dict(RemoteException=dict(exception=exception,
+                                      javaClassName=exception,
+                                      message=message)),
+            status=status)
+
+    def _send_not_found(self, path):
+        self._send_error(404, 'FileNotFoundException',
+                         'File does not exist: %s' % path)
+
+    def _redirect_to_datanode(self):
+        self._send(307, headers={
+            'Location': '%s%s&namenoderpcaddress=localhost:8020' % (
+                self.server.url, self.path)})
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    ### ops ###
+
+    def _file_status(self, path, name=''):
+        local_path = self.server.local_path(path)
+        is_dir = os.path.isdir(local_path)
+        return dict(
+            pathSuffix=name,
+            type='DIRECTORY' if is_dir else 'FILE',
+            length=0 if is_dir else os.path.getsize(local_path),
+            modificationTime=int(os.path.getmtime(local_path) * 1000),
+        )
+
+    def _GET_getfilestatus(self, path, params):
+        if not os.path.exists(self.server.local_path(path)):
+            return self._send_not_found(path)
+
+        self._send_json(dict(FileStatus=self._file_status(path)))
+
+    def _GET_liststatus(self, path, params):
+        local_path = self.server.local_path(path)
+
+        if not os.path.exists(local_path):
+            return self._send_not_found(path)
+
+        if os.path.isdir(local_path):
+            statuses = [self._file_status(os.path.join(path, name), name)
+                        for name in sorted(os.listdir(local_path))]
+        else:
+            statuses = [self._file_status(path)]
+
+        self._send_json(dict(FileStatuses=dict(FileStatus=statuses)))
+
+    def _GET_getcontentsummary(self, path, params):
+        local_path = self.server.local_path(path)
+
+        if not os.path.exists(local_path):
+            return self._send_not_found(path)
+
+        length = 0
+        for dirpath, _, filenames in os.walk(local_path):
+            for filename in filenames:
+                length += os.path.getsize(os.path.join(dirpath, filename))
+
+        self._send_json(dict(ContentSummary=dict(length=length)))
+
+    def _GET_open(self, path, params):
+        local_path = self.server.local_path(path)
+
+        if not os.path.isfile(local_path):
+            return self._send_not_found(path)
+
+        if 'namenoderpcaddress' not in params:
+            return self._redirect_to_datanode()
+
+        with open(local_path, 'rb') as f:
+            self._send(200, f.read(),
+                       {'Content-Type': 'application/octet-stream'})
+
+    def _PUT_mkdirs(self, path, params):
+        local_path = self.server.local_path(path)
+
+        if os.path.isfile(local_path):
+            return self._send_error(
+                403, 'FileAlreadyExistsException',
+                'Path is not a directory: %s' % path)
+
+        if not os.path.exists(local_path):
+            os.makedirs(local_path)
+
+        self._send_json(dict(boolean=True))
+
+    def _PUT_create(self, path, params):
+        if 'namenoderpcaddress' not in params:
+            return self._redirect_to_datanode()
+
+        data = self._read_body()
+        local_path = self.server.local_path(path)
+
+        if (os.path.exists(local_path) and
+                params.get('overwrite', 'false') != 'true'):
+            return self._send_error(
+                403, 'FileAlreadyExistsException',
+                '%s already exists' % path)
+
+        if not os.path.isdir(os.path.dirname(local_path)):
+            os.makedirs(os.path.dirname(local_path))
+
+        with open(local_path, 'wb') as f:
+            f.write(data)
+
+        self._send(201, headers={'Location': 'hdfs://localhost:8020' + path})
+
+    def _DELETE_delete(self, path, params):
+        local_path = self.server.local_path(path)
+
+        if os.path.isdir(local_path):
+            if params.get('recursive') != 'true' and os.listdir(local_path):
+                return self._send_error(
+                    403, 'PathIsNotEmptyDirectoryException',
+                    '%s is non empty' % path)
+            shutil.rmtree(local_path)
+            deleted = True
+        elif os.path.exists(local_path):
+            os.remove(local_path)
+            deleted = True
+        else:
+            deleted = False
+
+        self._send_json(dict(boolean=deleted))
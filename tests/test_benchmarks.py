@@ -0,0 +1,71 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Make sure the benchmarks in tests.benchmarks don't rot."""
+import json
+import os
+
+from tests.benchmarks import load_benchmarks
+from tests.benchmarks import main
+from tests.benchmarks import run_benchmark
+from tests.sandbox import SandboxedTestCase
+
+# small enough that every benchmark runs quickly
+_TINY_SCALE = 0.001
+
+
+class LoadBenchmarksTestCase(SandboxedTestCase):
+
+    def test_names_are_unique(self):
+        names = [name for name, _ in load_benchmarks()]
+
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_covers_all_areas(self):
+        prefixes = set(name.split('.')[0] for name, _ in load_benchmarks())
+
+        self.assertEqual(prefixes,
+                         set(['job', 'protocol', 'runner', 'util']))
+
+
+class RunBenchmarksTestCase(SandboxedTestCase):
+
+    def test_all_benchmarks_run(self):
+        for name, func in load_benchmarks():
+            if name == 'runner.local':
+                continue  # spawns subprocesses; too slow
+
+            result = run_benchmark(func, scale=_TINY_SCALE, repeat=1)
+
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertGreaterEqual(result['records'], 0)
+            self.assertGreaterEqual(result['bytes'], 0)
+
+    def test_json_output(self):
+        output_path = os.path.join(self.tmp_dir, 'results.json')
+
+        main(['-q', '-r', '1', '-s', str(_TINY_SCALE),
+              '-k', 'util.to_lines', '-o', output_path])
+
+        with open(output_path) as f:
+            output = json.load(f)
+
+        self.assertEqual(sorted(output['results']),
+                         ['util.to_lines', 'util.to_lines.line_chunks'])
+        self.assertEqual(output['meta']['repeat'], 1)
+        self.assertIn('mb_per_sec', output['results']['util.to_lines'])
+
+        # compare against ourselves
+        main(['-q', '-r', '1', '-s', str(_TINY_SCALE),
+              '-k', 'util.to_lines', '-o', output_path,
+              '--compare', output_path])
@@ -893,6 +893,93 @@ class TestCatFallback(MockGoogleAPITestCase):
         self.assertEqual(list(runner.fs.cat('gs://walrus/one')), [b'one_text'])
 
 
+class UploadCacheTestCase(MockGoogleAPITestCase):
+
+    def setUp(self):
+        super(UploadCacheTestCase, self).setUp()
+        self._gcs_fs.create_bucket(project=_TEST_PROJECT, name='walrus')
+
+        self.path = self.makefile('data.txt', b'dolphins')
+
+    def get_generation(self, gcs_uri):
+        bucket_name, object_name = parse_gcs_uri(gcs_uri)
+        return self._gcs_client._cache_objects[bucket_name][object_name][
+            'generation']
+
+    def upload(self):
+        runner = DataprocJobRunner(cloud_tmp_dir='gs://walrus/tmp/',
+                                   cloud_upload_cache_dir='gs://walrus/cache',
+                                   conf_paths=[])
+        runner._upload_mgr.add(self.path)
+
+        with patch.object(runner.fs, 'put', wraps=runner.fs.put) as put:
+            runner._upload_local_files_to_fs()
+
+        return runner, put
+
+    def test_dont_reupload(self):
+        runner1, put1 = self.upload()
+
+        gcs_uri = runner1._upload_mgr.uri(self.path)
+        self.assertEqual(
+            gcs_uri,
+            'gs://walrus/cache/01b3f378798d72bf73c8050d76707e0a/data.txt')
+        self.assertEqual(list(runner1.fs.cat(gcs_uri)), [b'dolphins'])
+        self.assertTrue(put1.called)
+
+        generation = self.get_generation(gcs_uri)
+        del self._gcs_client.mock_requests[:]
+
+        # rely on the upload's precondition, rather than checking if
+        # the file exists first
+        runner2, put2 = self.upload()
+        self.assertEqual(runner2._upload_mgr.uri(self.path), gcs_uri)
+        self.assertEqual(self._gcs_client.mock_requests, ['insert'])
+
+        # didn't overwrite the file
+        self.assertEqual(self.get_generation(gcs_uri), generation)
+
+    def test_upload_without_cache_doesnt_check_exists(self):
+        runner = DataprocJobRunner(cloud_tmp_dir='gs://walrus/tmp/',
+                                   conf_paths=[])
+        runner._upload_mgr.add(self.path)
+        runner._upload_mgr.add(self.makefile('more.txt', b'porpoises'))
+
+        runner._upload_local_files_to_fs()
+
+        self.assertEqual(self._gcs_client.mock_requests,
+                         ['insert', 'insert'])
+
+    def test_upload_existing_file_without_cache(self):
+        runner = DataprocJobRunner(cloud_tmp_dir='gs://walrus/tmp/',
+                                   conf_paths=[])
+        runner._upload_mgr.add(self.path)
+        self.put_gcs_multi({runner._upload_mgr.uri(self.path): b'whales'})
+
+        self.assertRaises(IOError, runner._upload_local_files_to_fs)
+
+    def test_big_files_are_uploaded_in_parts(self):
+        data = b'dolphins\n' * 300000  # 2.6 MiB
+        path = self.makefile('big.txt', data)
+
+        runner = DataprocJobRunner(cloud_tmp_dir='gs://walrus/tmp/',
+                                   cloud_upload_part_size=1,
+                                   conf_paths=[])
+        runner._upload_mgr.add(path)
+        runner._upload_mgr.add(self.path)
+
+        runner._upload_local_files_to_fs()
+
+        gcs_uri = runner._upload_mgr.uri(path)
+        self.assertEqual(b''.join(runner.fs.cat(gcs_uri)), data)
+        self.assertEqual(b''.join(runner.fs.cat(
+            runner._upload_mgr.uri(self.path))), b'dolphins')
+
+        # three parts for the big file, one insert for the small one
+        self.assertEqual(self._gcs_client.mock_requests.count('insert'), 4)
+        self.assertEqual(self._gcs_client.mock_requests.count('compose'), 1)
+
+
 class CleanUpJobTestCase(MockGoogleAPITestCase):
 
     @contextmanager
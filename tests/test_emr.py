@@ -20,6 +20,7 @@ import os
 import os.path
 import posixpath
 import sys
+import threading
 import time
 from datetime import datetime
 from datetime import timedelta
@@ -35,6 +36,7 @@ from mrjob.emr import _4_X_COMMAND_RUNNER_JAR
 from mrjob.emr import _DEFAULT_IMAGE_VERSION
 from mrjob.emr import _MAX_HOURS_IDLE_BOOTSTRAP_ACTION_PATH
 from mrjob.emr import _PRE_4_X_STREAMING_JAR
+from mrjob.emr import _UPLOAD_PART_MAX_TRIES
 from mrjob.emr import _attempt_to_acquire_lock
 from mrjob.emr import _decode_configurations_from_api
 from mrjob.emr import _lock_acquire_step_1
@@ -44,6 +46,8 @@ from mrjob.emr import _yield_all_bootstrap_actions
 from mrjob.emr import _yield_all_clusters
 from mrjob.emr import _yield_all_instance_groups
 from mrjob.emr import filechunkio
+from mrjob.fs.composite import CompositeFilesystem
+from mrjob.fs.local import LocalFilesystem
 from mrjob.job import MRJob
 from mrjob.parse import parse_s3_uri
 from mrjob.pool import _pool_hash_and_name
@@ -61,6 +65,8 @@ from tests.mockboto import DEFAULT_MAX_STEPS_RETURNED
 from tests.mockboto import MockBotoTestCase
 from tests.mockboto import MockEmrConnection
 from tests.mockboto import MockEmrObject
+from tests.mockboto import MockKey
+from tests.mockboto import MockMultiPartUpload
 from tests.mockssh import mock_ssh_dir
 from tests.mockssh import mock_ssh_file
 from tests.mr_hadoop_format_job import MRHadoopFormatJob
@@ -1386,6 +1392,27 @@ class TestSSHLs(MockBotoTestCase):
         self.assertRaises(IOError, list,
                           self.runner.fs.ls('ssh://testmaster/does_not_exist'))
 
+    def test_cleanup_closes_ssh_connections(self):
+        mock_ssh_file('testmaster', 'one', b'')
+        self.assertTrue(self.runner.fs.exists('ssh://testmaster/one'))
+
+        control_dir = self.runner.fs._ssh_control_dir()
+        self.assertTrue(os.path.isdir(control_dir))
+
+        self.runner.cleanup(mode='NONE')
+
+        self.assertFalse(os.path.exists(control_dir))
+
+    def test_cleanup_when_fs_was_set_elsewhere(self):
+        # with cloud_tmp_dir set, we don't need self.fs to find a temp
+        # bucket, so EMRJobRunner hasn't made any filesystems yet
+        runner = EMRJobRunner(conf_paths=[],
+                              cloud_tmp_dir='s3://walrus/tmp/')
+        runner._fs = CompositeFilesystem(LocalFilesystem())
+
+        # shouldn't try to close S3 or SSH filesystems we never made
+        runner.cleanup(mode='NONE')
+
 
 class TestNoBoto(TestCase):
 
@@ -1847,6 +1874,22 @@ class PoolMatchingTestCase(MockBotoTestCase):
             cluster = runner._describe_cluster()
             self.assertEqual(cluster.status.state, 'WAITING')
 
+    def test_pool_hash_with_multipart_s3_bootstrap_file(self):
+        self.add_mock_s3_data({'walrus': {'bootstrap.sh': b'true\n'}})
+
+        mr_job = MRTwoStepJob([
+            '-r', 'emr', '--pool-clusters',
+            '--bootstrap', 'sh s3://walrus/bootstrap.sh#'])
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as runner:
+            runner._add_bootstrap_files_for_upload()
+
+            # keys uploaded in parts have no MD5 sum; use their etag
+            with patch.object(MockKey, 'etag', '"%s-2"' % ('0' * 32)):
+                self.assertEqual(runner._bootstrap_file_md5sums(),
+                                 [('bootstrap.sh', 'etag:%s-2' % ('0' * 32))])
+
     def test_join_pooled_cluster(self):
         _, cluster_id = self.make_pooled_cluster()
 
@@ -4036,6 +4079,23 @@ class MultiPartUploadTestCase(MockBotoTestCase):
         data = b'Mew' * 20
         self.assert_upload_succeeds(runner, data, expect_multipart=False)
 
+    def test_clears_fs_cache_after_upload(self):
+        runner = EMRJobRunner(fs_cache_secs=60)
+
+        # check if the key exists after we've made it, but before
+        # we've written to it (unlike mock S3, real S3 doesn't create
+        # the key until we write to it)
+        def should_use_multipart_upload(*args):
+            with patch.object(runner._s3_fs, 'exists', return_value=False):
+                self.assertFalse(runner.fs.exists(self.TEST_S3_URI))
+            return False
+
+        with patch.object(runner, '_should_use_multipart_upload',
+                          side_effect=should_use_multipart_upload):
+            self.upload_data(runner, b'beavers mate for life')
+
+        self.assertTrue(runner.fs.exists(self.TEST_S3_URI))
+
     def test_no_filechunkio(self):
         with patch.object(mrjob.emr, 'filechunkio', None):
             runner = EMRJobRunner(cloud_upload_part_size=self.PART_SIZE_IN_MB)
@@ -4060,6 +4120,180 @@ class MultiPartUploadTestCase(MockBotoTestCase):
             s3_key = runner.fs.get_s3_key(self.TEST_S3_URI)
             self.assertTrue(s3_key.mock_multipart_upload_was_cancelled())
 
+    @skipIf(filechunkio is None, 'need filechunkio')
+    def test_upload_parts_in_parallel(self):
+        runner = EMRJobRunner(cloud_upload_part_size=self.PART_SIZE_IN_MB,
+                              cloud_upload_threads=8)
+
+        data = b''.join(('%03d' % i).encode('ascii') for i in range(100))
+        self.assert_upload_succeeds(runner, data, expect_multipart=True)
+
+    @skipIf(filechunkio is None, 'need filechunkio')
+    def test_each_thread_uses_own_connection(self):
+        runner = EMRJobRunner(cloud_upload_part_size=self.PART_SIZE_IN_MB,
+                              cloud_upload_threads=8)
+
+        real_upload_part_from_file = MockMultiPartUpload.upload_part_from_file
+        conn_to_threads = {}
+
+        def recording_upload_part_from_file(mpul, fp, part_num):
+            conn_to_threads.setdefault(
+                id(mpul.bucket.connection), set()).add(
+                    threading.current_thread())
+            return real_upload_part_from_file(mpul, fp, part_num)
+
+        data = b''.join(('%03d' % i).encode('ascii') for i in range(100))
+
+        with patch.object(MockMultiPartUpload, 'upload_part_from_file',
+                          recording_upload_part_from_file):
+            self.assert_upload_succeeds(runner, data, expect_multipart=True)
+
+        self.assertTrue(conn_to_threads)
+        for threads in conn_to_threads.values():
+            self.assertEqual(len(threads), 1)
+
+    @skipIf(filechunkio is None, 'need filechunkio')
+    def test_retry_failed_part(self):
+        runner = EMRJobRunner(cloud_upload_part_size=self.PART_SIZE_IN_MB)
+
+        real_upload_part_from_file = MockMultiPartUpload.upload_part_from_file
+        failed_parts = set()
+
+        def flaky_upload_part_from_file(mpul, fp, part_num):
+            if part_num not in failed_parts:
+                failed_parts.add(part_num)
+                raise IOError('connection reset by walrus')
+            return real_upload_part_from_file(mpul, fp, part_num)
+
+        data = b'Mew' * 20
+
+        self.mock_sleep.reset_mock()
+
+        with patch.object(MockMultiPartUpload, 'upload_part_from_file',
+                          flaky_upload_part_from_file):
+            with logger_disabled('mrjob.emr'):
+                self.assert_upload_succeeds(runner, data,
+                                            expect_multipart=True)
+
+        self.assertEqual(failed_parts, set([1, 2]))
+
+        # each part waited once before retrying
+        self.assertEqual(self.mock_sleep.call_count, 2)
+
+    @skipIf(filechunkio is None, 'need filechunkio')
+    def test_give_up_on_part_after_max_tries(self):
+        runner = EMRJobRunner(cloud_upload_part_size=self.PART_SIZE_IN_MB)
+
+        data = b'Mew' * 20
+
+        self.mock_sleep.reset_mock()
+
+        with patch.object(MockMultiPartUpload, 'upload_part_from_file',
+                          side_effect=IOError) as mock_upload_part:
+            with logger_disabled('mrjob.emr'):
+                self.assertRaises(IOError, self.upload_data, runner, data)
+
+        # back off exponentially between tries
+        self.assertIn(((1.0,),), self.mock_sleep.call_args_list)
+        self.assertIn(((2.0,),), self.mock_sleep.call_args_list)
+
+        s3_key = runner.fs.get_s3_key(self.TEST_S3_URI)
+        self.assertTrue(s3_key.mock_multipart_upload_was_cancelled())
+
+        # part 1 and part 2 each tried _UPLOAD_PART_MAX_TRIES times
+        self.assertLessEqual(mock_upload_part.call_count,
+                             2 * _UPLOAD_PART_MAX_TRIES)
+        self.assertGreaterEqual(mock_upload_part.call_count,
+                                _UPLOAD_PART_MAX_TRIES)
+
+
+class UploadLocalFilesTestCase(MockBotoTestCase):
+
+    def test_upload_many_files_in_parallel(self):
+        runner = EMRJobRunner(cloud_upload_threads=4)
+
+        paths = []
+        for i in range(10):
+            path = self.makefile('%d.txt' % i,
+                                 ('file number %d' % i).encode('ascii'))
+            runner._upload_mgr.add(path)
+            paths.append(path)
+
+        runner._upload_local_files_to_s3()
+
+        for i, path in enumerate(paths):
+            s3_uri = runner._upload_mgr.uri(path)
+            self.assertEqual(b''.join(runner.fs.cat(s3_uri)),
+                             ('file number %d' % i).encode('ascii'))
+
+
+class UploadCacheTestCase(MockBotoTestCase):
+
+    def setUp(self):
+        super(UploadCacheTestCase, self).setUp()
+        self.add_mock_s3_data({'walrus': {}})
+
+        self.path = self.makefile('data.txt', b'dolphins')
+
+    def upload(self, **runner_kwargs):
+        runner = EMRJobRunner(cloud_upload_cache_dir='s3://walrus/cache',
+                              **runner_kwargs)
+        runner._upload_mgr.add(self.path)
+
+        with patch.object(runner, '_upload_contents',
+                          wraps=runner._upload_contents) as upload_contents:
+            runner._upload_local_files_to_s3()
+
+        return runner, upload_contents
+
+    def test_upload_by_md5sum(self):
+        runner, upload_contents = self.upload()
+
+        s3_uri = runner._upload_mgr.uri(self.path)
+        self.assertEqual(
+            s3_uri,
+            's3://walrus/cache/01b3f378798d72bf73c8050d76707e0a/data.txt')
+        self.assertEqual(b''.join(runner.fs.cat(s3_uri)), b'dolphins')
+        self.assertTrue(upload_contents.called)
+
+    def test_dont_reupload(self):
+        runner1, upload_contents1 = self.upload()
+        self.assertTrue(upload_contents1.called)
+
+        runner2, upload_contents2 = self.upload()
+        self.assertFalse(upload_contents2.called)
+
+        self.assertEqual(runner1._upload_mgr.uri(self.path),
+                         runner2._upload_mgr.uri(self.path))
+
+    def test_reupload_changed_file(self):
+        runner1, _ = self.upload()
+
+        with open(self.path, 'wb') as f:
+            f.write(b'porpoises')
+
+        runner2, upload_contents2 = self.upload()
+        self.assertTrue(upload_contents2.called)
+
+        self.assertNotEqual(runner1._upload_mgr.uri(self.path),
+                            runner2._upload_mgr.uri(self.path))
+
+    def test_local_md5_cache(self):
+        md5_cache_path = os.path.join(self.tmp_dir, 'md5_cache.json')
+
+        runner, _ = self.upload(local_md5_cache=md5_cache_path)
+
+        with open(md5_cache_path) as f:
+            self.assertIn(os.path.realpath(self.path), json.load(f))
+
+    def test_cache_dir_not_in_tmp_dir(self):
+        runner, _ = self.upload()
+        s3_uri = runner._upload_mgr.uri(self.path)
+
+        runner._cleanup_cloud_tmp()
+
+        self.assertTrue(runner.fs.exists(s3_uri))
+
 
 class SecurityTokenTestCase(MockBotoTestCase):
 
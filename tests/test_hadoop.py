@@ -37,6 +37,7 @@ from tests.mockhadoop import add_mock_hadoop_output
 from tests.mockhadoop import create_mock_hadoop_script
 from tests.mockhadoop import get_mock_hadoop_cmd_args
 from tests.mockhadoop import get_mock_hdfs_root
+from tests.mockwebhdfs import MockWebHDFSServer
 from tests.mr_jar_and_streaming import MRJarAndStreaming
 from tests.mr_just_a_jar import MRJustAJar
 from tests.mr_null_spark import MRNullSpark
@@ -748,6 +749,39 @@ class HadoopJobRunnerEndToEndTestCase(MockHadoopTestCase):
         with patch.dict('os.environ', MOCK_HADOOP_VERSION='2.0.0'):
             self._test_end_to_end()
 
+    def test_batches_hadoop_fs_commands(self):
+        self._test_end_to_end()
+
+        hadoop_cmd_args = get_mock_hadoop_cmd_args()
+        first_jar_index = [args[:1] for args in hadoop_cmd_args].index(['jar'])
+        fs_cmds = [args[:2] for args in hadoop_cmd_args[:first_jar_index]
+                   if args[:1] == ['fs']]
+
+        # put input file (part of the test), check it exists, create
+        # the files dir, upload all the files at once
+        self.assertEqual(fs_cmds, [['fs', '-put'], ['fs', '-ls'],
+                                   ['fs', '-mkdir'], ['fs', '-put']])
+
+    def test_end_to_end_with_webhdfs(self):
+        server = MockWebHDFSServer(get_mock_hdfs_root())
+        server.start()
+        self.addCleanup(server.stop)
+
+        self._test_end_to_end(['--webhdfs-url', server.url])
+
+        # the only "hadoop fs" command was the one to put the input file
+        fs_cmd_args = [cmd_args for cmd_args in get_mock_hadoop_cmd_args()
+                       if cmd_args[:1] == ['fs']]
+        self.assertEqual([args[:2] for args in fs_cmd_args],
+                         [['fs', '-put']])
+
+        self.assertIn('CREATE', [op for _, op, _ in server.requests])
+
+    def test_end_to_end_with_fs_cache(self):
+        # steps write output behind the cache's back; make sure we still
+        # see it
+        self._test_end_to_end(['--fs-cache-secs', '60'])
+
 
 class StreamingArgsTestCase(EmptyMrjobConfTestCase):
 
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Tests for LocalMRJobRunner"""
+import bz2
+import errno
 import gzip
 import os
 import shutil
@@ -24,10 +26,13 @@ from io import BytesIO
 
 import mrjob
 from mrjob.local import LocalMRJobRunner
+from mrjob.sim import _copy_range
 from mrjob.util import bash_wrap
 from mrjob.util import cmd_line
+from mrjob.util import lzma
 from mrjob.util import read_file
 
+from tests.compress import gzip_compress
 from tests.mr_cmd_job import CmdJob
 from tests.mr_counting_job import MRCountingJob
 from tests.mr_exit_42_job import MRExit42Job
@@ -82,7 +87,8 @@ class LocalMRJobRunnerEndToEndTestCase(SandboxedTestCase):
 
             local_tmp_dir = runner._get_local_tmp_dir()
             assert os.path.exists(local_tmp_dir)
-            self.assertEqual(runner.counters()[0]['count']['combiners'], 8)
+            # stdin and input are small enough to share a mapper
+            self.assertEqual(runner.counters()[0]['count']['combiners'], 6)
 
         # make sure cleanup happens
         assert not os.path.exists(local_tmp_dir)
@@ -275,8 +281,321 @@ class LocalMRJobRunnerEndToEndTestCase(SandboxedTestCase):
                                gz_path_2, path_3])
         with mr_job.make_runner() as r:
             splits = r._get_file_splits([gz_path_1, gz_path_2, path_3], 1)
+
+            # the two small .gz files are packed into one task, but the
+            # uncompressed file gets a task of its own
+            self.assertEqual(
+                len(set(s['task_num'] for s in splits.values())), 2)
+            self.assertEqual(splits[gz_path_1]['task_num'],
+                             splits[gz_path_2]['task_num'])
             self.assertEqual(
-                len(set(s['task_num'] for s in splits.values())), 3)
+                sorted(s['orig_name'] for s in splits.values()),
+                [gz_path_1, gz_path_2, path_3])
+
+    @skipIf(lzma is None, 'lzma module not installed')
+    def test_xz_input(self):
+        xz_path = self.makefile('1.xz', lzma.compress(b'x\nx\n'))
+        path_2 = self.makefile('2', b'y\n')
+
+        mr_job = MRCountingJob(['--no-conf', '-r', 'local',
+                                xz_path, path_2])
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as r:
+            splits = r._get_file_splits([xz_path, path_2], 1)
+
+            # both files are read in place, but the .xz file needs to be
+            # decompressed, so they can't share a task
+            self.assertNotEqual(splits[xz_path]['task_num'],
+                                splits[path_2]['task_num'])
+
+            r.run()
+
+            self.assertEqual(r.counters(),
+                             [{'group': {'counter_name': 3}},
+                              {'group': {'counter_name': 3}},
+                              {'group': {'counter_name': 3}}])
+
+
+class SplitCompressedInputTestCase(SandboxedTestCase):
+
+    # enough words that bzip2 level 1 uses several (100k) blocks
+    NUM_LINES = 20000
+
+    def make_lines(self):
+        return [('%d foo bar baz qux %d\n' % (i, i * 7919)).encode('ascii')
+                for i in range(self.NUM_LINES)]
+
+    def run_word_count(self, input_path, *args):
+        mr_job = MRWordCount(['-r', 'local',
+                              '--jobconf=mapreduce.job.maps=3',
+                              input_path] + list(args))
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as runner:
+            splits = runner._get_file_splits([input_path], 3)
+            runner.run()
+
+            output = dict(mr_job.parse_output_line(line)
+                          for line in runner.stream_output())
+
+        return splits, output
+
+    def test_split_bz2(self):
+        input_path = self.makefile(
+            'input.bz2', bz2.compress(b''.join(self.make_lines()), 1))
+
+        splits, output = self.run_word_count(input_path)
+
+        self.assertEqual(len(splits), 3)
+        for split_path, split_info in splits.items():
+            self.assertTrue(split_path.endswith('.bz2'))
+            self.assertEqual(split_info['orig_name'], input_path)
+
+        self.assertEqual(output, {input_path: self.NUM_LINES * 6})
+
+    def test_split_multi_member_gz(self):
+        lines = self.make_lines()
+        input_path = self.makefile('input.gz', b''.join(
+            gzip_compress(b''.join(lines[i:i + 1000]))
+            for i in range(0, len(lines), 1000)))
+
+        splits, output = self.run_word_count(input_path)
+
+        self.assertEqual(len(splits), 3)
+        self.assertEqual(output, {input_path: self.NUM_LINES * 6})
+
+    def test_gz_index_not_written_to_input_dir(self):
+        input_dir = self.makedirs('input')
+        input_path = os.path.join(input_dir, 'input.gz')
+        with open(input_path, 'wb') as f:
+            f.write(gzip_compress(b'a b\n') + gzip_compress(b'c\n'))
+
+        splits, output = self.run_word_count(input_dir)
+        self.assertEqual(output, {input_path: 3})
+
+        self.assertEqual(os.listdir(input_dir), ['input.gz'])
+
+    def test_gz_index_is_reused(self):
+        lines = self.make_lines()
+        input_path = self.makefile('input.gz', b''.join(
+            gzip_compress(b''.join(lines[i:i + 1000]))
+            for i in range(0, len(lines), 1000)))
+        index_dir = os.path.join(self.tmp_dir, 'gzip-index')
+
+        _, output = self.run_word_count(
+            input_path, '--local-gzip-index-dir', index_dir)
+        self.assertEqual(len(os.listdir(index_dir)), 1)
+
+        # the second job doesn't need to decompress the file to split it
+        with patch('mrjob.split._scan_gzip_members') as m_scan:
+            splits, output = self.run_word_count(
+                input_path, '--local-gzip-index-dir', index_dir)
+            self.assertFalse(m_scan.called)
+
+        self.assertEqual(len(splits), 3)
+        self.assertEqual(output, {input_path: self.NUM_LINES * 6})
+
+
+class SplitUncompressedInputTestCase(SandboxedTestCase):
+
+    def get_splits(self, input_path, num_splits):
+        runner = LocalMRJobRunner(conf_paths=[])
+        self.addCleanup(runner.cleanup)
+
+        splits = runner._get_file_splits([input_path], num_splits)
+
+        results = []
+        for split_path, split_info in sorted(splits.items()):
+            with open(split_path, 'rb') as f:
+                data = f.read()
+            self.assertEqual(len(data), split_info['length'])
+            results.append((split_info['start'], data))
+
+        return results
+
+    def test_splits_on_line_boundaries(self):
+        input_path = self.makefile('input', b'a\nbb\nccc\ndddd\neeeee\n')
+
+        # 20 bytes, so each split should have at least 7 bytes
+        self.assertEqual(self.get_splits(input_path, 3), [
+            (0, b'a\nbb\nccc\n'),
+            (9, b'dddd\neeeee\n'),
+        ])
+
+    def test_no_trailing_newline(self):
+        input_path = self.makefile('input', b'a\nbb\nccc\ndddd\neeeee')
+
+        self.assertEqual(self.get_splits(input_path, 3), [
+            (0, b'a\nbb\nccc\n'),
+            (9, b'dddd\neeeee'),
+        ])
+
+    def test_no_newlines(self):
+        input_path = self.makefile('input', b'abcdefghij')
+
+        self.assertEqual(self.get_splits(input_path, 3),
+                         [(0, b'abcdefghij')])
+
+    def test_empty_file(self):
+        input_path = self.makefile('input', b'')
+
+        self.assertEqual(self.get_splits(input_path, 3), [(0, b'')])
+
+    def test_without_kernel_copy(self):
+        input_path = self.makefile('input', b'a\nbb\nccc\ndddd\neeeee\n')
+
+        with patch('mrjob.sim._kernel_copy_funcs', return_value=[]):
+            self.assertEqual(self.get_splits(input_path, 3), [
+                (0, b'a\nbb\nccc\n'),
+                (9, b'dddd\neeeee\n'),
+            ])
+
+    def test_sendfile_cant_write_to_files(self):
+        input_path = self.makefile('input', b'a\nbb\nccc\ndddd\neeeee\n')
+
+        # like sendfile() on macOS
+        def sendfile(out_fd, in_fd, offset, count):
+            raise OSError(errno.ENOTSOCK, 'Socket operation on non-socket')
+
+        with patch('mrjob.sim.sys.platform', 'linux'), \
+                patch('os.sendfile', sendfile, create=True), \
+                patch('os.copy_file_range', create=True,
+                      side_effect=OSError(errno.ENOSYS, 'Not implemented')):
+            self.assertEqual(self.get_splits(input_path, 3), [
+                (0, b'a\nbb\nccc\n'),
+                (9, b'dddd\neeeee\n'),
+            ])
+
+    def test_no_sendfile_off_linux(self):
+        input_path = self.makefile('input', b'a\nbb\nccc\ndddd\neeeee\n')
+
+        with patch('mrjob.sim.sys.platform', 'darwin'), \
+                patch('os.sendfile', create=True) as mock_sendfile:
+            self.assertEqual(self.get_splits(input_path, 3), [
+                (0, b'a\nbb\nccc\n'),
+                (9, b'dddd\neeeee\n'),
+            ])
+
+        self.assertFalse(mock_sendfile.called)
+
+
+class CopyRangeTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(CopyRangeTestCase, self).setUp()
+
+        self.src_path = self.makefile('src', b'0123456789')
+        self.dst_path = os.path.join(self.tmp_dir, 'dst')
+
+    def copy_range(self, start, length):
+        with open(self.src_path, 'rb') as src:
+            with open(self.dst_path, 'wb') as dst:
+                dst.write(b'>')
+                _copy_range(src, dst, start, length)
+                dst.write(b'<')
+
+        with open(self.dst_path, 'rb') as f:
+            return f.read()
+
+    def test_copy_range(self):
+        self.assertEqual(self.copy_range(2, 5), b'>23456<')
+
+    def test_past_end_of_file(self):
+        self.assertEqual(self.copy_range(8, 5), b'>89<')
+
+    def test_unsupported_kernel_copy(self):
+        def unsupported(in_fd, out_fd, offset, count):
+            raise OSError(errno.EINVAL, 'Invalid argument')
+
+        with patch('mrjob.sim._kernel_copy_funcs',
+                   return_value=[unsupported]):
+            self.assertEqual(self.copy_range(2, 5), b'>23456<')
+
+    def test_other_kernel_copy_errors(self):
+        def no_space(in_fd, out_fd, offset, count):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+
+        with patch('mrjob.sim._kernel_copy_funcs',
+                   return_value=[no_space]):
+            self.assertRaises(OSError, self.copy_range, 2, 5)
+
+
+class PackSmallFilesTestCase(SandboxedTestCase):
+
+    RUNNER = 'local'
+
+    def make_input_files(self, num_files=30):
+        input_dir = self.makedirs('input')
+        paths = []
+        for i in range(num_files):
+            paths.append(self.makefile(
+                os.path.join('input', 'part-%05d' % i),
+                b'word\n' * (i + 1)))
+        return input_dir, paths
+
+    def test_get_file_splits(self):
+        input_dir, paths = self.make_input_files()
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_dir], 3)
+
+        # small files are read in place
+        self.assertEqual(sorted(file_splits), paths)
+        for path, split_info in file_splits.items():
+            self.assertEqual(split_info['orig_name'], path)
+            self.assertEqual(split_info['start'], 0)
+            self.assertEqual(split_info['length'], os.path.getsize(path))
+
+        task_nums = set(t['task_num'] for t in file_splits.values())
+        self.assertEqual(task_nums, set(range(len(task_nums))))
+        self.assertLessEqual(len(task_nums), 4)
+
+    def test_dont_pack_compressed_with_uncompressed(self):
+        input_dir, paths = self.make_input_files(4)
+        gz_path = self.makefile(
+            os.path.join('input', 'part.gz'), gzip_compress(b'word\n'))
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_dir], 1)
+
+        self.assertEqual(len(file_splits), 5)
+        gz_task_num = file_splits[gz_path]['task_num']
+        for path in paths:
+            self.assertNotEqual(file_splits[path]['task_num'], gz_task_num)
+
+    def test_input_file_per_file(self):
+        input_dir, paths = self.make_input_files()
+
+        mr_job = MRWordCount(['-r', self.RUNNER,
+                              '--jobconf=mapreduce.job.maps=3',
+                              input_dir])
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            output = dict(mr_job.parse_output_line(line)
+                          for line in runner.stream_output())
+
+        self.assertEqual(
+            output, dict((path, i + 1) for i, path in enumerate(paths)))
+
+    def test_stat_in_parallel(self):
+        input_dir, paths = self.make_input_files()
+
+        with patch('mrjob.fs.local._MIN_FILES_TO_STAT_IN_PARALLEL', 2):
+            runner = LocalMRJobRunner(conf_paths=[])
+            file_splits = runner._get_file_splits([input_dir], 3)
+
+        self.assertEqual(sorted(file_splits), paths)
+        for path, split_info in file_splits.items():
+            self.assertEqual(split_info['length'], os.path.getsize(path))
+
+
+class InlinePackSmallFilesTestCase(PackSmallFilesTestCase):
+
+    RUNNER = 'inline'
 
 
 class LocalMRJobRunnerNoSymlinksTestCase(LocalMRJobRunnerEndToEndTestCase):
@@ -300,6 +619,16 @@ class LocalMRJobRunnerNoSymlinksTestCase(LocalMRJobRunnerEndToEndTestCase):
             os.symlink = self._real_os_symlink
 
 
+class LocalMRJobRunnerNoLinksTestCase(LocalMRJobRunnerNoSymlinksTestCase):
+    """Test systems without os.symlink or os.link, where we have to copy
+    files into the working dir."""
+
+    def setUp(self):
+        super(LocalMRJobRunnerNoLinksTestCase, self).setUp()
+        self.start(patch('os.link', side_effect=OSError(
+            errno.EXDEV, 'Invalid cross-device link')))
+
+
 class TimeoutException(Exception):
     pass
 
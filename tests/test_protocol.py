@@ -18,6 +18,8 @@ from mrjob.protocol import BytesProtocol
 from mrjob.protocol import BytesValueProtocol
 from mrjob.protocol import JSONProtocol
 from mrjob.protocol import JSONValueProtocol
+from mrjob.protocol import NumpyProtocol
+from mrjob.protocol import NumpyValueProtocol
 from mrjob.protocol import PickleProtocol
 from mrjob.protocol import PickleValueProtocol
 from mrjob.protocol import RawProtocol
@@ -32,11 +34,15 @@ from mrjob.protocol import TextProtocol
 from mrjob.protocol import TextValueProtocol
 from mrjob.protocol import UltraJSONProtocol
 from mrjob.protocol import UltraJSONValueProtocol
+from mrjob.protocol import mean_arrays
+from mrjob.protocol import numpy
 from mrjob.protocol import simplejson
+from mrjob.protocol import sum_arrays
 from mrjob.protocol import ujson
 from mrjob.py2 import PY2
 
 from tests.py2 import TestCase
+from tests.py2 import patch
 from tests.py2 import skipIf
 
 
@@ -470,3 +476,150 @@ class ReprValueProtocolTestCase(ProtocolTestCase):
     def test_can_encode_point_but_not_decode(self):
         points_encoded = ReprValueProtocol().write(None, Point(1, 4))
         self.assertCantDecode(ReprValueProtocol(), points_encoded)
+
+
+@skipIf(numpy is None, 'numpy module not installed')
+class NumpyProtocolTestCase(ProtocolTestCase):
+
+    def assertArrayRoundTripOK(self, protocol, key, value):
+        key_out, value_out = protocol.read(protocol.write(key, value))
+
+        self.assertEqual(key_out, key)
+        self.assertEqual(value_out.dtype, value.dtype)
+        self.assertEqual(value_out.shape, value.shape)
+        self.assertEqual(value_out.tolist(), value.tolist())
+
+    def test_round_trip(self):
+        self.assertArrayRoundTripOK(
+            NumpyProtocol(), 'foo', numpy.arange(6.0).reshape(2, 3))
+        self.assertArrayRoundTripOK(
+            NumpyProtocol(), [1, 2], numpy.array([1, -2, 3], dtype='int8'))
+        self.assertArrayRoundTripOK(
+            NumpyProtocol(), None, numpy.array(7, dtype='>u4'))
+        self.assertArrayRoundTripOK(
+            NumpyProtocol(), {'a': 1}, numpy.zeros((0, 4)))
+
+    def test_round_trip_with_trailing_tab(self):
+        value = numpy.arange(3)
+        protocol = NumpyProtocol()
+
+        key_out, value_out = protocol.read(protocol.write('k', value) + b'\t')
+        self.assertEqual(key_out, 'k')
+        self.assertEqual(value_out.tolist(), [0, 1, 2])
+
+    def test_no_tabs_or_newlines(self):
+        # 9 and 10 are tab and newline in ASCII
+        value = numpy.array([9, 10, 9, 10], dtype='uint8')
+        encoded = NumpyProtocol().write('\t', value)
+
+        self.assertNotIn(b'\n', encoded)
+        self.assertEqual(encoded.count(b'\t'), 1)
+
+    def test_encodes_lists(self):
+        key, value = NumpyProtocol().read(
+            NumpyProtocol().write('foo', [1.5, 2.5]))
+
+        self.assertEqual(value.dtype, numpy.dtype('float64'))
+        self.assertEqual(value.tolist(), [1.5, 2.5])
+
+    def test_decoded_arrays_are_read_only(self):
+        _, value = NumpyProtocol().read(
+            NumpyProtocol().write('foo', numpy.arange(3)))
+
+        self.assertRaises(ValueError, value.__setitem__, 0, 1)
+
+    def test_bad_data(self):
+        self.assertCantDecode(NumpyProtocol(), b'"foo"\t{@#$@#!^&*$%^')
+        self.assertCantDecode(NumpyProtocol(), b'"foo"\t<f8:3:AAAA')
+
+    def test_cant_encode_objects(self):
+        self.assertCantEncode(NumpyProtocol(), 'foo',
+                              numpy.array([Point(1, 4)]))
+
+
+@skipIf(numpy is None, 'numpy module not installed')
+class NumpyValueProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        value = numpy.arange(12, dtype='float32').reshape(3, 2, 2)
+        key_out, value_out = NumpyValueProtocol().read(
+            NumpyValueProtocol().write('foo', value))
+
+        self.assertEqual(key_out, None)
+        self.assertEqual(value_out.dtype, value.dtype)
+        self.assertEqual(value_out.tolist(), value.tolist())
+
+    def test_uses_numpy_format(self):
+        value = numpy.array([1, 2], dtype='<i2')
+        ENCODED = b'<i2:2:AQACAA=='
+
+        self.assertEqual(NumpyValueProtocol().write(None, value), ENCODED)
+        self.assertEqual(
+            NumpyValueProtocol().read(ENCODED)[1].tolist(), [1, 2])
+
+    def test_bad_data(self):
+        self.assertCantDecode(NumpyValueProtocol(), b'{@#$@#!^&*$%^')
+
+
+class NoNumpyTestCase(TestCase):
+
+    def setUp(self):
+        super(NoNumpyTestCase, self).setUp()
+
+        self.start(patch('mrjob.protocol.numpy', None))
+
+    def start(self, patcher):
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_protocols_require_numpy(self):
+        self.assertRaises(ImportError, NumpyProtocol)
+        self.assertRaises(ImportError, NumpyValueProtocol)
+
+    def test_sum_lists(self):
+        self.assertEqual(sum_arrays([[1, 2], [3, 4], [5, 6]]), [9, 12])
+        self.assertEqual(sum_arrays(iter([[[1], [2]], [[3], [4]]])),
+                         [[4], [6]])
+
+    def test_mean_lists(self):
+        self.assertEqual(mean_arrays([[1, 2], [2, 4]]), [1.5, 3.0])
+
+    def test_empty(self):
+        self.assertRaises(ValueError, sum_arrays, [])
+        self.assertRaises(ValueError, mean_arrays, [])
+
+
+@skipIf(numpy is None, 'numpy module not installed')
+class SumArraysTestCase(TestCase):
+
+    def test_sum(self):
+        total = sum_arrays([numpy.arange(3), numpy.ones(3, dtype=int)])
+
+        self.assertEqual(total.tolist(), [1, 2, 3])
+
+    def test_upcast(self):
+        total = sum_arrays([numpy.arange(3), numpy.array([0.5, 0.5, 0.5])])
+
+        self.assertEqual(total.dtype, numpy.dtype('float64'))
+        self.assertEqual(total.tolist(), [0.5, 1.5, 2.5])
+
+    def test_read_only_arrays(self):
+        protocol = NumpyValueProtocol()
+        values = (protocol.read(protocol.write(None, numpy.arange(2)))[1]
+                  for _ in range(3))
+
+        self.assertEqual(sum_arrays(values).tolist(), [0, 3])
+
+    def test_doesnt_modify_first_array(self):
+        first = numpy.arange(2)
+        sum_arrays([first, first])
+
+        self.assertEqual(first.tolist(), [0, 1])
+
+    def test_mean(self):
+        mean = mean_arrays([numpy.array([1, 2]), numpy.array([2, 5])])
+
+        self.assertEqual(mean.tolist(), [1.5, 3.5])
+
+    def test_empty(self):
+        self.assertRaises(ValueError, sum_arrays, iter([]))
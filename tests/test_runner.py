@@ -28,10 +28,12 @@ from subprocess import CalledProcessError
 from zipfile import ZipFile
 from zipfile import ZIP_DEFLATED
 
+import mrjob.runner
 from mrjob.hadoop import HadoopJobRunner
 from mrjob.inline import InlineMRJobRunner
 from mrjob.job import MRJob
 from mrjob.local import LocalMRJobRunner
+from mrjob.protocol import JSONProtocol
 from mrjob.py2 import PY2
 from mrjob.py2 import StringIO
 from mrjob.runner import MRJobRunner
@@ -227,6 +229,47 @@ class CreateMrjobZipTestCase(SandboxedTestCase):
             compileall.compile_dir(os.path.join(self.tmp_dir, 'mrjob'),
                                    quiet=1))
 
+    def test_mrjob_zip_is_reproducible(self):
+        with no_handlers_for_logger('mrjob.runner'):
+            with InlineMRJobRunner(conf_paths=[]) as runner1:
+                with open(runner1._create_mrjob_zip(), 'rb') as f:
+                    zip1 = f.read()
+
+            with InlineMRJobRunner(conf_paths=[]) as runner2:
+                with open(runner2._create_mrjob_zip(), 'rb') as f:
+                    zip2 = f.read()
+
+        self.assertEqual(zip1, zip2)
+
+    def test_local_archive_cache_dir(self):
+        cache_dir = os.path.join(self.tmp_dir, 'archive-cache')
+
+        with no_handlers_for_logger('mrjob.runner'):
+            with patch('mrjob.runner.zip_dir',
+                       wraps=mrjob.runner.zip_dir) as zip_dir:
+                with InlineMRJobRunner(
+                        conf_paths=[],
+                        local_archive_cache_dir=cache_dir) as runner1:
+                    mrjob_zip_path1 = runner1._create_mrjob_zip()
+
+                self.assertEqual(zip_dir.call_count, 1)
+
+                with InlineMRJobRunner(
+                        conf_paths=[],
+                        local_archive_cache_dir=cache_dir) as runner2:
+                    mrjob_zip_path2 = runner2._create_mrjob_zip()
+
+                # didn't build it again
+                self.assertEqual(zip_dir.call_count, 1)
+
+        self.assertEqual(mrjob_zip_path1, mrjob_zip_path2)
+        self.assertTrue(mrjob_zip_path1.startswith(cache_dir))
+        self.assertEqual(os.path.basename(mrjob_zip_path1), 'mrjob.zip')
+
+        # runner cleanup doesn't delete cached archives
+        self.assertTrue(os.path.exists(mrjob_zip_path1))
+        self.assertIn('mrjob/job.py', ZipFile(mrjob_zip_path1).namelist())
+
 
 class TestStreamingOutput(TestCase):
 
@@ -278,6 +321,76 @@ class TestStreamingOutput(TestCase):
         self.assertEqual(sorted(runner.stream_output()),
                          [b'A', b'B', b'C'])
 
+    def write_part_files(self, num_files, num_lines):
+        for i in range(num_files):
+            with open(os.path.join(self.tmp_dir, 'part-%05d' % i), 'w') as f:
+                for j in range(num_lines):
+                    f.write('%d\t%d\n' % (i, j))
+
+        return [('%d\t%d\n' % (i, j)).encode('ascii')
+                for i in range(num_files) for j in range(num_lines)]
+
+    def test_stream_output_in_order(self):
+        self.write_part_files(20, 100)
+
+        runner = InlineMRJobRunner(conf_paths=[], output_dir=self.tmp_dir)
+
+        # same order as reading the files one by one
+        lines = [line for path in runner.fs.ls(self.tmp_dir)
+                 for line in runner.fs._cat_file(path)]
+
+        self.assertEqual(list(runner.stream_output()), lines)
+        # tiny buffer
+        self.assertEqual(list(runner.stream_output(max_buffer_bytes=1)),
+                         lines)
+        # no threads
+        self.assertEqual(list(runner.stream_output(num_threads=1)), lines)
+
+    def test_stream_output_unordered(self):
+        lines = self.write_part_files(20, 100)
+
+        runner = InlineMRJobRunner(conf_paths=[], output_dir=self.tmp_dir)
+        output = list(runner.stream_output(ordered=False))
+
+        self.assertEqual(sorted(output), sorted(lines))
+
+        # lines from each file are still in order
+        for i in range(20):
+            prefix = ('%d\t' % i).encode('ascii')
+            self.assertEqual(
+                [line for line in output if line.startswith(prefix)],
+                [line for line in lines if line.startswith(prefix)])
+
+    def test_cat_output(self):
+        self.write_part_files(3, 2)
+
+        runner = InlineMRJobRunner(conf_paths=[], output_dir=self.tmp_dir,
+                                   output_protocol=JSONProtocol())
+
+        self.assertEqual(sorted(runner.cat_output()), [
+            (0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)])
+
+    def test_cat_output_needs_protocol(self):
+        self.write_part_files(3, 2)
+
+        runner = InlineMRJobRunner(conf_paths=[], output_dir=self.tmp_dir)
+
+        self.assertRaises(ValueError, list, runner.cat_output())
+
+    def test_make_runner_sets_output_protocol(self):
+        job = MRWordCount(['-r', 'inline', '--no-conf', '-'])
+        job.sandbox(stdin=BytesIO(b'one fish\ntwo fish\n'))
+
+        with job.make_runner() as runner:
+            runner.run()
+
+            output = list(runner.cat_output())
+
+            self.assertEqual([count for _, count in output], [4])
+            self.assertEqual(output,
+                             [job.parse_output_line(line)
+                              for line in runner.stream_output()])
+
 
 class TestInvokeSort(TestCase):
 
@@ -21,6 +21,7 @@ from mrjob.setup import name_uniquely
 from mrjob.setup import parse_legacy_hash_path
 from mrjob.setup import parse_setup_cmd
 
+from tests.py2 import Mock
 from tests.py2 import TestCase
 from tests.py2 import patch
 
@@ -383,6 +384,39 @@ class UploadDirManagerTestCase(TestCase):
                           '._.txt': 'hdfs:///1.txt',
                           '._foo': 'hdfs:///foo'})
 
+    def test_cache_prefix(self):
+        md5sums = {'foo/bar.py': 'abc123', 'bar.py': 'def456'}
+
+        sd = UploadDirManager('s3://walrus/tmp/files/',
+                              cache_prefix='s3://walrus/cache/',
+                              md5sum=md5sums.get)
+        sd.add('foo/bar.py')
+        sd.add('bar.py')
+
+        # keep names unique, so they don't collide in cluster's working dir
+        self.assertEqual(sd.path_to_uri(),
+                         {'foo/bar.py': 's3://walrus/cache/abc123/bar.py',
+                          'bar.py': 's3://walrus/cache/def456/bar-1.py'})
+
+    def test_cache_prefix_only_hashes_once(self):
+        md5sum = Mock(return_value='abc123')
+
+        sd = UploadDirManager('s3://walrus/tmp/files/',
+                              cache_prefix='s3://walrus/cache/',
+                              md5sum=md5sum)
+        sd.add('foo/bar.py')
+
+        self.assertEqual(sd.uri('foo/bar.py'),
+                         's3://walrus/cache/abc123/bar.py')
+        self.assertEqual(sd.uri('foo/bar.py'),
+                         's3://walrus/cache/abc123/bar.py')
+        md5sum.assert_called_once_with('foo/bar.py')
+
+    def test_cache_prefix_doesnt_affect_uris(self):
+        sd = UploadDirManager('s3://walrus/tmp/files/',
+                              cache_prefix='s3://walrus/cache/')
+        self.assertEqual(sd.add('s3://walrus/data/'), 's3://walrus/data/')
+
 
 class WorkingDirManagerTestCase(TestCase):
 
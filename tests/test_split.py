@@ -0,0 +1,254 @@
+# Copyright 2016 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bz2
+import json
+import os
+import random
+from io import BytesIO
+
+from mrjob.split import _BitWriter
+from mrjob.split import _Bzip2Units
+from mrjob.split import _find_bit_pattern
+from mrjob.split import _gzip_index_path
+from mrjob.split import _gzip_members
+from mrjob.split import _read_bits
+from mrjob.split import _split_compressed_file
+from mrjob.util import read_file
+
+from tests.compress import gzip_compress
+from tests.py2 import TestCase
+from tests.py2 import patch
+from tests.sandbox import SandboxedTestCase
+from tests.sandbox import random_seed
+
+
+def _random_lines(num_lines, seed=0):
+    with random_seed(seed):
+        return [
+            ('%d %s\n' % (i, ' '.join(
+                str(random.randint(0, 10 ** 9))
+                for _ in range(random.randint(0, 20))))).encode('ascii')
+            for i in range(num_lines)
+        ]
+
+
+class BitsTestCase(TestCase):
+
+    def test_read_bits(self):
+        f = BytesIO(b'\xf0\x0f\xaa')
+
+        self.assertEqual(_read_bits(f, 0, 4), 0xf)
+        self.assertEqual(_read_bits(f, 4, 12), 0x00)
+        self.assertEqual(_read_bits(f, 12, 24), 0xfaa)
+        self.assertEqual(_read_bits(f, 3, 5), 0x2)
+
+    def test_bit_writer(self):
+        out = BytesIO()
+        w = _BitWriter(out)
+        w.write(0x1, 1)
+        w.write(0x7f, 7)
+        w.write(0x5, 3)
+        w.close()
+
+        self.assertEqual(out.getvalue(), b'\xff\xa0')
+
+    def test_find_bit_pattern_at_every_shift(self):
+        pattern = 0x314159265359
+
+        for shift in range(8):
+            for prefix_len in (0, 1, 5):
+                value = pattern << (8 * 8 - 48 - shift)
+                data = (b'\x00' * prefix_len +
+                        bytes(bytearray(
+                            (value >> (8 * (7 - i))) & 0xff
+                            for i in range(8))))
+
+                self.assertEqual(
+                    _find_bit_pattern(BytesIO(data), pattern, 48),
+                    [prefix_len * 8 + shift])
+
+    def test_find_bit_pattern_across_buffer_boundaries(self):
+        pattern = 0x177245385090
+        data = b'\x00' * 9 + b'\x17\x72\x45\x38\x50\x90' + b'\x00' * 9
+
+        with patch('mrjob.split._BUFSIZE', 4):
+            self.assertEqual(
+                _find_bit_pattern(BytesIO(data), pattern, 48), [72])
+
+
+class Bzip2UnitsTestCase(SandboxedTestCase):
+
+    def test_repack_blocks(self):
+        # level 1 means 100k blocks
+        data = b''.join(_random_lines(20000))
+        path = self.makefile('data.bz2', bz2.compress(data, 1))
+
+        units = _Bzip2Units(path)
+        self.assertGreater(len(units), 2)
+
+        # each block decompresses on its own, and they add up to the data
+        self.assertEqual(
+            b''.join(units.decompress(k) for k in range(len(units))), data)
+
+        # so do ranges of blocks
+        out = BytesIO()
+        units.write(out, 1, len(units))
+        self.assertEqual(
+            units.decompress(0) + bz2.decompress(out.getvalue()), data)
+
+
+class GzipMembersTestCase(SandboxedTestCase):
+
+    def test_single_member(self):
+        data = gzip_compress(b''.join(_random_lines(1000)))
+        path = self.makefile('data.gz', data)
+
+        self.assertEqual(_gzip_members(path), [(0, len(data), None)])
+
+    def test_multiple_members(self):
+        parts = [gzip_compress(b'foo\n'), gzip_compress(b'bar'),
+                 gzip_compress(b'\nbaz\n')]
+        path = self.makefile('data.gz', b''.join(parts))
+
+        self.assertEqual(_gzip_members(path), [
+            (0, len(parts[0]), True),
+            (len(parts[0]), len(parts[0]) + len(parts[1]), False),
+            (len(parts[0]) + len(parts[1]), len(b''.join(parts)), True),
+        ])
+
+    def test_index_is_cached(self):
+        path = self.makefile(
+            'data.gz', gzip_compress(b'foo\n') + gzip_compress(b'bar\n'))
+        index_dir = self.makedirs('index')
+        members = _gzip_members(path, index_dir=index_dir)
+
+        index_path = _gzip_index_path(path, index_dir)
+        self.assertEqual(os.path.dirname(index_path), index_dir)
+        self.assertTrue(os.path.exists(index_path))
+
+        with patch('mrjob.split._scan_gzip_members') as m_scan:
+            self.assertEqual(_gzip_members(path, index_dir=index_dir),
+                             members)
+            self.assertFalse(m_scan.called)
+
+    def test_creates_index_dir(self):
+        path = self.makefile(
+            'data.gz', gzip_compress(b'foo\n') + gzip_compress(b'bar\n'))
+        index_dir = os.path.join(self.tmp_dir, 'cache', 'index')
+
+        _gzip_members(path, index_dir=index_dir)
+
+        self.assertTrue(
+            os.path.exists(_gzip_index_path(path, index_dir)))
+        self.assertEqual(len(os.listdir(index_dir)), 1)
+
+    def test_no_index_without_index_dir(self):
+        path = self.makefile(
+            'data.gz', gzip_compress(b'foo\n') + gzip_compress(b'bar\n'))
+
+        self.assertEqual(len(_gzip_members(path)), 2)
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['data.gz'])
+
+    def test_single_member_index_isnt_cached(self):
+        path = self.makefile('data.gz', gzip_compress(b'foo\n'))
+        index_dir = self.makedirs('index')
+
+        self.assertEqual(len(_gzip_members(path, index_dir=index_dir)), 1)
+        self.assertEqual(os.listdir(index_dir), [])
+
+    def test_index_path_depends_on_dir(self):
+        self.assertNotEqual(_gzip_index_path('/a/data.gz', '/tmp'),
+                            _gzip_index_path('/b/data.gz', '/tmp'))
+
+    def test_stale_index_is_ignored(self):
+        path = self.makefile(
+            'data.gz', gzip_compress(b'foo\n') + gzip_compress(b'bar\n'))
+        index_dir = self.makedirs('index')
+
+        with open(_gzip_index_path(path, index_dir), 'w') as f:
+            json.dump(dict(size=1, mtime=0, members=[[0, 1, True]]), f)
+
+        self.assertEqual(len(_gzip_members(path, index_dir=index_dir)), 2)
+
+    def test_truncated_file(self):
+        data = gzip_compress(b'foo\n') + gzip_compress(b'bar\n')
+        path = self.makefile('data.gz', data[:-4])
+
+        self.assertEqual(_gzip_members(path), [])
+
+
+class SplitCompressedFileTestCase(SandboxedTestCase):
+
+    def split_path(self, i):
+        return os.path.join(self.tmp_dir, 'split-%d' % i)
+
+    def assert_splits_have_lines(self, splits, lines):
+        split_lines = [list(read_file(s['path'])) for s in splits]
+
+        for sl in split_lines:
+            self.assertTrue(sl)
+            for line in sl:
+                self.assertTrue(line.endswith(b'\n'))
+
+        self.assertEqual(sum(split_lines, []), lines)
+
+    def test_bz2(self):
+        lines = _random_lines(20000)
+        path = self.makefile('data.bz2', bz2.compress(b''.join(lines), 1))
+
+        splits = _split_compressed_file(path, 3, self.split_path)
+
+        self.assertEqual(len(splits), 3)
+        self.assertEqual([os.path.basename(s['path']) for s in splits],
+                         ['split-0.bz2', 'split-1.bz2', 'split-2.bz2'])
+        self.assertEqual(splits[0]['start'], 0)
+        self.assertEqual(sorted(s['start'] for s in splits),
+                         [s['start'] for s in splits])
+        self.assertEqual(splits[-1]['start'] + splits[-1]['length'],
+                         os.path.getsize(path))
+        self.assert_splits_have_lines(splits, lines)
+
+    def test_bz2_one_long_line(self):
+        data = b''.join(_random_lines(20000)).replace(b'\n', b' ') + b'\n'
+        path = self.makefile('data.bz2', bz2.compress(data, 1))
+
+        self.assertEqual(
+            _split_compressed_file(path, 3, self.split_path), None)
+
+    def test_multi_member_gzip(self):
+        lines = _random_lines(3000)
+        # break members in the middle of lines
+        data = b''.join(lines)
+        pieces = [data[i:i + 10001] for i in range(0, len(data), 10001)]
+        path = self.makefile(
+            'data.gz', b''.join(gzip_compress(p) for p in pieces))
+
+        splits = _split_compressed_file(path, 4, self.split_path)
+
+        self.assertEqual(len(splits), 4)
+        self.assertEqual(os.path.basename(splits[0]['path']), 'split-0.gz')
+        self.assert_splits_have_lines(splits, lines)
+
+    def test_single_member_gzip(self):
+        path = self.makefile(
+            'data.gz', gzip_compress(b''.join(_random_lines(3000))))
+
+        self.assertEqual(
+            _split_compressed_file(path, 4, self.split_path), None)
+
+    def test_uncompressed(self):
+        path = self.makefile('data.txt', b''.join(_random_lines(3000)))
+
+        self.assertEqual(
+            _split_compressed_file(path, 4, self.split_path), None)
@@ -12,5 +12,124 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Tests for mrjob.ssh"""
+import os
+import threading
+
+from mrjob.ssh import _ssh_run
+from mrjob.ssh import _ssh_start_master
+
+from tests.py2 import TestCase
+from tests.py2 import patch
 
 # this is mostly tested indirectly through fs/test_ssh.py.
+
+
+class MockPopen(object):
+    """Fake ssh process that prints some output and then (if *hang* is
+    true) waits until it's killed."""
+
+    def __init__(self, args, stdin=None, stdout=None, stderr=None,
+                 hang=False, err=b''):
+        self.args = args
+        self.hang = hang
+        self.err = err
+        self.killed = threading.Event()
+
+    def communicate(self, input=None):
+        if self.hang:
+            self.killed.wait(5)
+        return b'partial output\n', self.err
+
+    def kill(self):
+        self.killed.set()
+
+
+class SSHRunTestCase(TestCase):
+
+    def run_with_mock_popen(self, **kwargs):
+        timeout = kwargs.pop('timeout', None)
+
+        procs = []
+
+        def mock_popen(*args, **popen_kwargs):
+            popen_kwargs.update(kwargs)
+            procs.append(MockPopen(*args, **popen_kwargs))
+            return procs[-1]
+
+        with patch('mrjob.ssh.Popen', side_effect=mock_popen):
+            result = _ssh_run(['ssh'], 'testmaster', 'key.pem', ['ls'],
+                              timeout=timeout)
+
+        return result, procs[0]
+
+    def test_no_timeout(self):
+        (stdout, stderr), proc = self.run_with_mock_popen()
+
+        self.assertEqual(stdout, b'partial output\n')
+        self.assertEqual(stderr, b'')
+        self.assertFalse(proc.killed.is_set())
+
+    def test_timeout_not_reached(self):
+        (stdout, stderr), proc = self.run_with_mock_popen(timeout=60)
+
+        self.assertEqual(stdout, b'partial output\n')
+        self.assertEqual(stderr, b'')
+        self.assertFalse(proc.killed.is_set())
+
+    def test_timeout(self):
+        (stdout, stderr), proc = self.run_with_mock_popen(
+            hang=True, timeout=0.01)
+
+        self.assertTrue(proc.killed.is_set())
+        self.assertEqual(stdout, b'partial output\n')
+        self.assertEqual(stderr, b'Timed out after 0.01 seconds\n')
+
+
+class SSHStartMasterTestCase(TestCase):
+
+    def test_master_doesnt_hold_pipes_open(self):
+        with patch('mrjob.ssh.Popen') as mock_popen:
+            _ssh_start_master(['ssh'], 'testmaster', 'key.pem', '/tmp/ctl')
+
+        args, kwargs = mock_popen.call_args
+        self.assertEqual(args[0][:7], [
+            'ssh', '-i', 'key.pem',
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'UserKnownHostsFile=/dev/null'])
+        self.assertEqual(args[0][7:], [
+            '-f', '-N', '-M',
+            '-o', 'ControlPath=/tmp/ctl/%r@%h:%p',
+            '-o', 'ControlPersist=60',
+            'hadoop@testmaster'])
+
+        for name in ('stdin', 'stdout', 'stderr'):
+            self.assertEqual(kwargs[name].name, os.devnull)
+
+        self.assertTrue(mock_popen.return_value.wait.called)
+
+    def test_check_for_master_first(self):
+        with patch('mrjob.ssh.Popen') as mock_popen:
+            # ssh -O check succeeds
+            mock_popen.return_value.wait.return_value = 0
+
+            _ssh_start_master(['ssh'], 'testmaster', 'key.pem', '/tmp/ctl',
+                              check=True)
+
+        # didn't start another master
+        self.assertEqual(mock_popen.call_count, 1)
+        args = mock_popen.call_args[0][0]
+        self.assertEqual(args[7:], [
+            '-O', 'check',
+            '-o', 'ControlPath=/tmp/ctl/%r@%h:%p',
+            'hadoop@testmaster'])
+
+    def test_start_master_if_check_fails(self):
+        with patch('mrjob.ssh.Popen') as mock_popen:
+            # ssh -O check fails
+            mock_popen.return_value.wait.return_value = 255
+
+            _ssh_start_master(['ssh'], 'testmaster', 'key.pem', '/tmp/ctl',
+                              check=True)
+
+        self.assertEqual(mock_popen.call_count, 2)
+        self.assertIn('-M', mock_popen.call_args[0][0])
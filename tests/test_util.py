@@ -20,16 +20,22 @@ import shutil
 import sys
 import tarfile
 import tempfile
+import threading
+import time
 from io import BytesIO
 from subprocess import PIPE
 from subprocess import Popen
+from zipfile import ZipFile
 
 from mrjob.py2 import PY2
 from mrjob.py2 import StringIO
 from mrjob.util import buffer_iterator_to_line_iterator
+from mrjob.util import bunzip2_stream
 from mrjob.util import cmd_line
 from mrjob.util import file_ext
+from mrjob.util import gunzip_stream
 from mrjob.util import log_to_stream
+from mrjob.util import lzma
 from mrjob.util import parse_and_save_options
 from mrjob.util import random_identifier
 from mrjob.util import read_file
@@ -40,10 +46,18 @@ from mrjob.util import tar_and_gzip
 from mrjob.util import to_lines
 from mrjob.util import unarchive
 from mrjob.util import unique
+from mrjob.util import unxz_stream
 from mrjob.util import which
+from mrjob.util import zip_dir
+from mrjob.util import _hash_dir
+from mrjob.util import _prefetch_chain
+from mrjob.util import _thread_imap_unordered
+from mrjob.util import _thread_map
 
+from tests.compress import gzip_compress
 from tests.py2 import TestCase
 from tests.py2 import patch
+from tests.py2 import skipIf
 from tests.quiet import no_handlers_for_logger
 from tests.sandbox import SandboxedTestCase
 from tests.sandbox import random_seed
@@ -94,6 +108,28 @@ class ToLinesTestCase(TestCase):
                  for i in range(0, len(super_long_line), 1024)))),
             [b'a' * 10000 + b'\n', b'b' * 1000 + b'\n', b'last\n'])
 
+    def test_carriage_returns(self):
+        self.assertEqual(
+            list(to_lines(chunk for chunk in
+                          [b'foo\r\nbar\rbaz\n\r',
+                           b'qux\r',
+                           b'\nquux'])),
+            [b'foo\r\n', b'bar\rbaz\n', b'\rqux\r\n', b'quux'])
+
+    def test_other_line_breaks_ignored(self):
+        self.assertEqual(
+            list(to_lines([b'foo\x0bbar\x0cbaz\x1c\n'])),
+            [b'foo\x0bbar\x0cbaz\x1c\n'])
+
+    def test_chunks_are_lines(self):
+        lines = [b'The quick\n', b'brown fox\n', b'jumped\n']
+        self.assertEqual(list(to_lines(iter(lines))), lines)
+
+    def test_newline_at_start_of_chunk(self):
+        self.assertEqual(
+            list(to_lines([b'foo', b'\nbar', b'\n'])),
+            [b'foo\n', b'bar\n'])
+
     def test_deprecated_alias(self):
         with no_handlers_for_logger('mrjob.util'):
             stderr = StringIO()
@@ -409,6 +445,100 @@ class ArchiveTestCase(TestCase):
 
         self.ensure_expected_results(excluded_files=['baz'])
 
+    def touch_all(self, mtime):
+        for dirpath, _, filenames in os.walk(self.tmp_dir):
+            for filename in filenames:
+                os.utime(os.path.join(dirpath, filename), (mtime, mtime))
+
+    def test_tar_and_gzip_is_reproducible(self):
+        join = os.path.join
+
+        tar_and_gzip(join(self.tmp_dir, 'a'), join(self.tmp_dir, '1.tar.gz'))
+        self.touch_all(1234567890)
+        tar_and_gzip(join(self.tmp_dir, 'a'), join(self.tmp_dir, '2.tar.gz'))
+
+        with open(join(self.tmp_dir, '1.tar.gz'), 'rb') as f1:
+            with open(join(self.tmp_dir, '2.tar.gz'), 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+        t = tarfile.open(join(self.tmp_dir, '1.tar.gz'), 'r:gz')
+        self.assertEqual(t.getnames(), ['bar', 'baz', 'foo', 'qux/quux'])
+        self.assertEqual(t.getmember('bar').mtime, 315532800)
+        t.close()
+
+    def test_tar_and_gzip_header(self):
+        join = os.path.join
+
+        tar_and_gzip(join(self.tmp_dir, 'a'), join(self.tmp_dir, 'a.tar.gz'))
+
+        with open(join(self.tmp_dir, 'a.tar.gz'), 'rb') as f:
+            # no filename flag, no timestamp
+            self.assertEqual(f.read(10),
+                             b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff')
+
+    def test_zip_dir_is_reproducible(self):
+        join = os.path.join
+
+        zip_dir(join(self.tmp_dir, 'a'), join(self.tmp_dir, '1.zip'))
+        self.touch_all(1234567890)
+        zip_dir(join(self.tmp_dir, 'a'), join(self.tmp_dir, '2.zip'))
+
+        with open(join(self.tmp_dir, '1.zip'), 'rb') as f1:
+            with open(join(self.tmp_dir, '2.zip'), 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+        zf = ZipFile(join(self.tmp_dir, '1.zip'))
+        self.assertEqual(zf.namelist(), ['bar', 'baz', 'foo', 'qux/quux'])
+        self.assertEqual(zf.read('bar'), b'FOO\n')
+        zf.close()
+
+    def test_zip_dir_doesnt_read_whole_files(self):
+        join = os.path.join
+
+        if sys.version_info < (3, 6):
+            self.skipTest('ZipFile.open() can only read')
+
+        with patch('zipfile.ZipFile.writestr') as mock_writestr:
+            zip_dir(join(self.tmp_dir, 'a'), join(self.tmp_dir, 'a.zip'))
+
+        self.assertFalse(mock_writestr.called)
+
+        zf = ZipFile(join(self.tmp_dir, 'a.zip'))
+        self.assertEqual(zf.read('bar'), b'FOO\n')
+        zf.close()
+
+    def test_zip_dir(self):
+        join = os.path.join
+
+        zip_dir(dir=join(self.tmp_dir, 'a'),
+                out_path=join(self.tmp_dir, 'a.zip'),
+                filter=lambda path: not path.endswith('z'),
+                prefix='b')
+
+        unarchive(join(self.tmp_dir, 'a.zip'), self.tmp_dir)
+
+        self.ensure_expected_results(excluded_files=['baz'])
+
+    def test_hash_dir(self):
+        join = os.path.join
+        a_dir = join(self.tmp_dir, 'a')
+
+        a_hash = _hash_dir(a_dir)
+
+        # timestamps don't matter
+        self.touch_all(1234567890)
+        self.assertEqual(_hash_dir(a_dir), a_hash)
+
+        # filter and prefix do
+        self.assertNotEqual(_hash_dir(a_dir, prefix='b'), a_hash)
+        self.assertNotEqual(
+            _hash_dir(a_dir, filter=lambda path: path != 'baz'), a_hash)
+
+        # contents do
+        with open(join(a_dir, 'baz'), 'w') as baz:
+            baz.write('BAZZ\n')
+        self.assertNotEqual(_hash_dir(a_dir), a_hash)
+
     def archive_and_unarchive(self, extension, archive_template,
                               added_files=[]):
         join = os.path.join
@@ -477,6 +607,67 @@ class ArchiveTestCase(TestCase):
             unarchive, join(self.tmp_dir, 'a', 'foo'), join(self.tmp_dir, 'b'))
 
 
+class DecompressStreamTestCase(TestCase):
+
+    DATA = b''.join(('line %d\n' % i).encode('ascii') for i in range(10000))
+
+    def test_gunzip(self):
+        self.assertEqual(
+            b''.join(gunzip_stream(BytesIO(gzip_compress(self.DATA)))),
+            self.DATA)
+
+    def test_gunzip_small_bufsize(self):
+        self.assertEqual(
+            b''.join(gunzip_stream(BytesIO(gzip_compress(self.DATA)),
+                                   bufsize=7)),
+            self.DATA)
+
+    def test_gunzip_multiple_members(self):
+        gz_data = gzip_compress(b'foo\n') + gzip_compress(b'bar\n')
+
+        for bufsize in (1, 2, 5, 1024):
+            self.assertEqual(
+                b''.join(gunzip_stream(BytesIO(gz_data), bufsize=bufsize)),
+                b'foo\nbar\n')
+
+    def test_gunzip_ignores_trailing_garbage(self):
+        gz_data = gzip_compress(b'foo\n') + b'\0' * 100
+
+        self.assertEqual(b''.join(gunzip_stream(BytesIO(gz_data))), b'foo\n')
+
+    def test_bunzip2(self):
+        self.assertEqual(
+            b''.join(bunzip2_stream(BytesIO(bz2.compress(self.DATA)))),
+            self.DATA)
+
+    def test_bunzip2_multiple_streams(self):
+        bz2_data = bz2.compress(b'foo\n') + bz2.compress(b'bar\n')
+
+        for bufsize in (1, 2, 5, 1024):
+            self.assertEqual(
+                b''.join(bunzip2_stream(BytesIO(bz2_data), bufsize=bufsize)),
+                b'foo\nbar\n')
+
+    @skipIf(lzma is None, 'lzma module not installed')
+    def test_unxz(self):
+        self.assertEqual(
+            b''.join(unxz_stream(BytesIO(lzma.compress(self.DATA)))),
+            self.DATA)
+
+    @skipIf(lzma is None, 'lzma module not installed')
+    def test_unxz_multiple_streams(self):
+        xz_data = lzma.compress(b'foo\n') + lzma.compress(b'bar\n')
+
+        for bufsize in (1, 2, 5, 1024):
+            self.assertEqual(
+                b''.join(unxz_stream(BytesIO(xz_data), bufsize=bufsize)),
+                b'foo\nbar\n')
+
+    def test_unxz_without_lzma(self):
+        with patch('mrjob.util.lzma', None):
+            self.assertRaises(Exception, list, unxz_stream(BytesIO(b'')))
+
+
 class OnlyReadWrapper(object):
     """Restrict a file object to only the read() method (used by
     ReadFileTestCase)."""
@@ -598,6 +789,109 @@ class ReadFileTestCase(TestCase):
 
         self.assertEqual(output, [b'bar\n', b'bar\n', b'foo\n'])
 
+    @skipIf(lzma is None, 'lzma module not installed')
+    def test_read_xz_file(self):
+        input_xz_path = os.path.join(self.tmp_dir, 'input.xz')
+        with open(input_xz_path, 'wb') as input_xz:
+            input_xz.write(lzma.compress(b'foo\nbar\n'))
+
+        output = []
+        for line in read_file(input_xz_path):
+            output.append(line)
+
+        self.assertEqual(output, [b'foo\n', b'bar\n'])
+
+
+class ReadFileExternalDecompressTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(ReadFileExternalDecompressTestCase, self).setUp()
+
+        # decompress files of any size in a subprocess
+        self.start(patch('mrjob.util._EXTERNAL_DECOMPRESS_MIN_SIZE', 0))
+
+        # fake pigz and lbzip2 in our tmp dir, using gzip and bzip2
+        bin_dir = self.makedirs('bin')
+        for fake, real in [('pigz', 'gzip'), ('lbzip2', 'bzip2')]:
+            self.makefile(os.path.join('bin', fake),
+                          '#!/bin/sh\nexec %s "$@"\n' % real,
+                          executable=True)
+
+        os.environ['PATH'] = bin_dir + ':' + os.environ.get('PATH', '')
+
+        self.popen = self.start(patch('mrjob.util.Popen', wraps=Popen))
+
+    def test_gz(self):
+        path = self.makefile('input.gz', gzip_compress(b'foo\nbar\n'))
+
+        self.assertEqual(list(read_file(path)), [b'foo\n', b'bar\n'])
+        self.assertTrue(self.popen.called)
+        self.assertEqual(self.popen.call_args[0][0][-1], path)
+
+    def test_bz2(self):
+        path = self.makefile('input.bz2', bz2.compress(b'foo\nbar\n'))
+
+        self.assertEqual(list(read_file(path)), [b'foo\n', b'bar\n'])
+        self.assertTrue(self.popen.called)
+
+    def test_small_files_decompressed_in_process(self):
+        self.start(patch('mrjob.util._EXTERNAL_DECOMPRESS_MIN_SIZE', 1000))
+
+        path = self.makefile('input.gz', gzip_compress(b'foo\nbar\n'))
+
+        self.assertEqual(list(read_file(path)), [b'foo\n', b'bar\n'])
+        self.assertFalse(self.popen.called)
+
+    def test_not_with_fileobj(self):
+        path = self.makefile('input.gz', gzip_compress(b'foo\nbar\n'))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(list(read_file(path, fileobj=f)),
+                             [b'foo\n', b'bar\n'])
+        self.assertFalse(self.popen.called)
+
+    def test_no_binary(self):
+        os.environ['PATH'] = ''
+
+        path = self.makefile('input.gz', gzip_compress(b'foo\nbar\n'))
+
+        self.assertEqual(list(read_file(path)), [b'foo\n', b'bar\n'])
+        self.assertFalse(self.popen.called)
+
+    def test_corrupt_file(self):
+        path = self.makefile('input.gz', b'not gzipped')
+
+        with self.assertRaises(IOError) as cm:
+            list(read_file(path))
+
+        # error includes what gzip said
+        self.assertIn('not in gzip format', str(cm.exception))
+
+    def test_lots_of_stderr(self):
+        # write more to stderr than fits in a pipe before any output
+        self.makefile(os.path.join('bin', 'pigz'),
+                      '#!/bin/sh\n'
+                      'head -c 1000000 /dev/zero >&2\n'
+                      'exec gzip "$@"\n',
+                      executable=True)
+
+        path = self.makefile('input.gz', gzip_compress(b'foo\nbar\n'))
+
+        self.assertEqual(list(read_file(path)), [b'foo\n', b'bar\n'])
+        self.assertTrue(self.popen.called)
+
+    def test_stop_reading_early(self):
+        path = self.makefile(
+            'input.gz',
+            gzip_compress(b''.join(
+                ('%d\n' % i).encode('ascii') for i in range(100000))))
+
+        lines = read_file(path)
+        self.assertEqual(next(lines), b'0\n')
+        lines.close()
+
+        self.assertTrue(self.popen.called)
+
 
 class RandomIdentifierTestCase(TestCase):
 
@@ -631,6 +925,154 @@ class UniqueTestCase(TestCase):
                          ['a', None, 33])
 
 
+class ThreadMapTestCase(TestCase):
+
+    def test_empty(self):
+        self.assertEqual(_thread_map(abs, [], 4), [])
+
+    def test_preserves_order(self):
+        self.assertEqual(_thread_map(abs, range(-10, 0), 4),
+                         list(range(10, 0, -1)))
+
+    def test_one_thread(self):
+        self.assertEqual(_thread_map(abs, [-1, -2], 1), [1, 2])
+
+    def test_reraises_exceptions(self):
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        self.assertRaises(ValueError, _thread_map, fail_on_3, range(5), 4)
+
+
+class ThreadIMapUnorderedTestCase(TestCase):
+
+    def test_empty(self):
+        self.assertEqual(list(_thread_imap_unordered(abs, [], 4)), [])
+
+    def test_yields_args_and_results(self):
+        self.assertEqual(
+            sorted(_thread_imap_unordered(abs, range(-10, 0), 4)),
+            [(x, -x) for x in range(-10, 0)])
+
+    def test_one_thread(self):
+        self.assertEqual(list(_thread_imap_unordered(abs, [-1, -2], 1)),
+                         [(-1, 1), (-2, 2)])
+
+    def test_yields_results_as_they_arrive(self):
+        slow_started = threading.Event()
+        fast_done = threading.Event()
+
+        def func(x):
+            if x == 'slow':
+                slow_started.set()
+                fast_done.wait(5)
+            return x
+
+        results = _thread_imap_unordered(func, ['slow', 'fast'], 2)
+
+        # we get 'fast' while 'slow' is still running
+        self.assertEqual(next(results), ('fast', 'fast'))
+        self.assertTrue(slow_started.is_set())
+        fast_done.set()
+
+        self.assertEqual(list(results), [('slow', 'slow')])
+
+    def test_reraises_exceptions(self):
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        self.assertRaises(ValueError, list,
+                          _thread_imap_unordered(fail_on_3, range(5), 4))
+
+
+class PrefetchChainTestCase(TestCase):
+
+    def make_funcs(self, num_funcs, num_items):
+        def func(i):
+            return lambda: (('%d-%d' % (i, j)).encode('ascii')
+                            for j in range(num_items))
+
+        return [func(i) for i in range(num_funcs)]
+
+    def expected(self, num_funcs, num_items):
+        return [('%d-%d' % (i, j)).encode('ascii')
+                for i in range(num_funcs) for j in range(num_items)]
+
+    def test_empty(self):
+        self.assertEqual(list(_prefetch_chain([], 4, 1000)), [])
+
+    def test_ordered(self):
+        self.assertEqual(list(_prefetch_chain(self.make_funcs(10, 50),
+                                              4, 1000)),
+                         self.expected(10, 50))
+
+    def test_one_thread(self):
+        self.assertEqual(list(_prefetch_chain(self.make_funcs(10, 50),
+                                              1, 1000)),
+                         self.expected(10, 50))
+
+    def test_tiny_buffer(self):
+        self.assertEqual(list(_prefetch_chain(self.make_funcs(10, 50),
+                                              4, 1)),
+                         self.expected(10, 50))
+
+    def test_unordered(self):
+        output = list(_prefetch_chain(self.make_funcs(10, 50), 4, 1000,
+                                      ordered=False))
+
+        self.assertEqual(sorted(output), sorted(self.expected(10, 50)))
+
+        # output of each function is still in order
+        for i in range(10):
+            prefix = ('%d-' % i).encode('ascii')
+            self.assertEqual(
+                [item for item in output if item.startswith(prefix)],
+                [('%d-%d' % (i, j)).encode('ascii') for j in range(50)])
+
+    def test_reraises_exceptions(self):
+        def fail():
+            yield b'a'
+            raise IOError
+
+        for ordered in (True, False):
+            funcs = self.make_funcs(3, 10) + [fail] + self.make_funcs(3, 10)
+            self.assertRaises(IOError, list,
+                              _prefetch_chain(funcs, 4, 1000, ordered=ordered))
+
+    def test_buffer_is_bounded(self):
+        read = []
+
+        def func(i):
+            def f():
+                for j in range(100):
+                    read.append((i, j))
+                    yield b'x' * 10
+            return f
+
+        items = _prefetch_chain([func(i) for i in range(4)], 2, 100)
+        next(items)
+
+        # give background threads a chance to fill their buffers
+        time.sleep(0.1)
+
+        # 2 threads, each with a 50-byte budget, plus a little slop
+        self.assertLessEqual(len(read), 2 * (5 + 2))
+
+        items.close()
+
+    def test_close_early(self):
+        items = _prefetch_chain(self.make_funcs(10, 1000), 4, 100)
+
+        self.assertEqual(next(items), b'0-0')
+        items.close()
+
+        self.assertRaises(StopIteration, next, items)
+
+
 class WhichTestCase(SandboxedTestCase):
 
     # which() is just a passthrough to shutil.which() and
@@ -44,7 +44,9 @@ class ClusterInspectionTestCase(ToolTestCase):
                 'cloud_fs_sync_secs': None,
                 'cloud_log_dir': None,
                 'cloud_tmp_dir': None,
+                'cloud_upload_cache_dir': None,
                 'cloud_upload_part_size': None,
+                'cloud_upload_threads': None,
                 'conf_paths': None,
                 'core_instance_bid_price': None,
                 'core_instance_type': None,
@@ -60,6 +62,8 @@ class ClusterInspectionTestCase(ToolTestCase):
                 'image_version': None,
                 'instance_type': None,
                 'label': None,
+                'local_archive_cache_dir': None,
+                'local_md5_cache': None,
                 'master_instance_bid_price': None,
                 'master_instance_type': None,
                 'max_hours_idle': None,
@@ -73,6 +77,7 @@ class ClusterInspectionTestCase(ToolTestCase):
                 'region': None,
                 'release_label': None,
                 's3_endpoint': None,
+                's3_region_cache': None,
                 'subnet': None,
                 'tags': None,
                 'task_instance_bid_price': None,
@@ -22,6 +22,7 @@ from mrjob.emr import EMRJobRunner
 from mrjob.tools.emr.mrboss import _run_on_all_nodes
 from tests.mockssh import mock_ssh_file
 from tests.mockboto import MockBotoTestCase
+from tests.py2 import patch
 from tests.test_emr import BUCKET_URI
 from tests.test_emr import LOG_DIR
 
@@ -86,3 +87,38 @@ class MRBossTestCase(MockBotoTestCase):
 
         self.assertEqual(sorted(os.listdir(self.output_dir)),
                          ['master', 'slave testslave0'])
+
+    def test_many_nodes(self):
+        for i in range(5):
+            self.add_slave()
+            mock_ssh_file('testmaster!testslave%d' % i, 'some_file',
+                          b'slave %d' % i)
+        self.runner._opts['num_ec2_instances'] = 6
+
+        mock_ssh_file('testmaster', 'some_file', b'master')
+
+        _run_on_all_nodes(self.runner, self.output_dir, ['cat', 'some_file'],
+                          print_stderr=False, max_threads=3)
+
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            ['master'] + ['slave testslave%d' % i for i in range(5)])
+
+        for i in range(5):
+            with open(os.path.join(self.output_dir, 'slave testslave%d' % i,
+                                   'stdout'), 'r') as f:
+                self.assertEqual(f.read().strip(), 'slave %d' % i)
+
+    def test_timeout(self):
+        mock_ssh_file('testmaster', 'some_file', b'file contents')
+
+        with patch('mrjob.tools.emr.mrboss._ssh_run_with_recursion',
+                   return_value=(b'', b'Timed out after 1.5 seconds\n')) as m:
+            _run_on_all_nodes(self.runner, self.output_dir,
+                              ['cat', 'some_file'],
+                              print_stderr=False, timeout=1.5)
+
+        self.assertEqual(m.call_args[1]['timeout'], 1.5)
+
+        with open(os.path.join(self.output_dir, 'master', 'stderr'), 'r') as f:
+            self.assertEqual(f.read(), 'Timed out after 1.5 seconds\n')
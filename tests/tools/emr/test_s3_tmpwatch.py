@@ -102,3 +102,42 @@ class S3TmpWatchTestCase(MockBotoTestCase):
         self.assertEqual(key_bar, None)
         # Failing as of d0c07eb:
         # self.assertEqual(key_qux, None)
+
+    def test_one_listing_and_bulk_delete(self):
+        old = datetime.utcnow() - timedelta(days=45)
+
+        self.add_mock_s3_data(
+            {'walrus': dict(('tmp/old-%04d' % i, b'x' * 10)
+                            for i in range(2500))},
+            time_modified=old)
+        self.add_mock_s3_data(
+            {'walrus': {'tmp/new': b'new\n'}})
+
+        self.assertEqual(
+            _s3_cleanup('s3://walrus/tmp/', timedelta(days=30),
+                        conf_paths=[]),
+            (2500, 25000))
+
+        self.assertEqual(self.mock_s3_requests.count('list'), 1)
+        # 1,000 keys per request
+        self.assertEqual(self.mock_s3_requests.count('delete_keys'), 3)
+        self.assertEqual(sorted(self.mock_s3_fs['walrus']['keys']),
+                         ['tmp/new'])
+
+    def test_dry_run_summary(self):
+        old = datetime.utcnow() - timedelta(days=45)
+
+        self.add_mock_s3_data(
+            {'walrus': {'tmp/foo': b'foo\n', 'tmp/bar': b'bar!\n'}},
+            time_modified=old)
+        self.add_mock_s3_data(
+            {'walrus': {'tmp/new': b'new\n'}})
+
+        self.assertEqual(
+            _s3_cleanup('s3://walrus/tmp/', timedelta(days=30),
+                        dry_run=True, conf_paths=[]),
+            (2, 9))
+
+        self.assertEqual(self.mock_s3_requests.count('list'), 1)
+        self.assertNotIn('delete_keys', self.mock_s3_requests)
+        self.assertEqual(len(self.mock_s3_fs['walrus']['keys']), 3)